@@ -0,0 +1,69 @@
+"""
+Benchmarks for labgraph, run with pytest-benchmark. They use the in-memory storage backend unless told otherwise:
+
+.. code-block:: bash
+
+    python -m pytest benchmarks
+    python -m pytest benchmarks --labgraph-backend sqlite
+    python -m pytest benchmarks --labgraph-backend mongodb  # wipes the database in your labgraph config -- point LABGRAPH_CONFIG at a scratch database!
+
+Results can be saved as JSON, to compare them between commits:
+
+.. code-block:: bash
+
+    python -m pytest benchmarks --benchmark-autosave  # saved in .benchmarks/
+    python -m pytest benchmarks --benchmark-compare   # compared against the last saved run
+    python -m pytest benchmarks --benchmark-json results.json
+"""
+
+import pytest
+
+from labgraph.backends import SQLiteBackend, make_backend, use_backend
+from labgraph.utils.dev import _drop_collections
+
+from .synthetic import LabGraph, LabGraphShape, make_lab_graph
+
+SHAPES = [
+    LabGraphShape(num_samples=10, depth=4, fan_in=2, fan_out=1, num_precursors=5),
+    LabGraphShape(num_samples=100, depth=6, fan_in=3, fan_out=2, num_precursors=10),
+]
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--labgraph-backend",
+        default="memory",
+        choices=["memory", "sqlite", "mongodb"],
+        help="Storage backend to benchmark against (default: memory).",
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def backend(request, tmp_path_factory):
+    engine = request.config.getoption("--labgraph-backend")
+    if engine == "sqlite":
+        path = tmp_path_factory.mktemp("labgraph") / "benchmark.sqlite"
+        backend = SQLiteBackend(str(path))
+    else:
+        backend = make_backend(engine)
+    with use_backend(backend):
+        yield backend
+
+
+@pytest.fixture(params=SHAPES, ids=[shape.id for shape in SHAPES])
+def shape(request) -> LabGraphShape:
+    return request.param
+
+
+@pytest.fixture
+def empty_db():
+    _drop_collections()
+    yield
+    _drop_collections()
+
+
+@pytest.fixture
+def lab_graph(shape, empty_db) -> LabGraph:
+    graph = make_lab_graph(shape)
+    graph.add_to_database()
+    return graph
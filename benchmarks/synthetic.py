@@ -0,0 +1,164 @@
+"""
+Builds synthetic lab graphs for the benchmarks. A synthetic lab has a pool of procured precursor Materials (each in its own procurement Sample), shared by many Samples. Each Sample mixes `fan_in` precursors, processes the mixture through a linear process of `depth` Actions, and characterizes the final Material with `fan_out` Measurements, each with an Analysis.
+
+    precursors --(fan_in)--> mix -> step -> ... -> step -> final material --(fan_out)--> measurement -> analysis
+"""
+
+from dataclasses import dataclass
+import random
+from typing import List
+
+from bson import ObjectId
+
+from labgraph import (
+    Action,
+    Actor,
+    Analysis,
+    Material,
+    Measurement,
+    Sample,
+    WholeIngredient,
+)
+from labgraph.views import ActorView, SampleView
+
+TAG = "labgraph-benchmark"
+STEPS = ["grind", "sinter", "anneal", "press", "mill", "dry"]
+
+
+@dataclass
+class LabGraphShape:
+    """Size and connectivity of a synthetic lab graph.
+
+    Args:
+        num_samples (int): Number of Samples
+        depth (int): Number of Actions in the linear process of each Sample
+        fan_in (int): Number of precursor Materials mixed by the first Action of each Sample
+        fan_out (int): Number of Measurements (each followed by an Analysis) on the final Material of each Sample
+        num_precursors (int): Number of procured precursor Materials shared by all Samples
+    """
+
+    num_samples: int = 10
+    depth: int = 4
+    fan_in: int = 2
+    fan_out: int = 1
+    num_precursors: int = 5
+
+    @property
+    def id(self) -> str:
+        return f"{self.num_samples}x{self.depth}-in{self.fan_in}-out{self.fan_out}"
+
+
+@dataclass
+class LabGraph:
+    """A synthetic lab graph. Nothing is written to the database until `add_to_database` is called."""
+
+    shape: LabGraphShape
+    actors: List[Actor]
+    precursors: List[Material]
+    procurements: List[Sample]
+    samples: List[Sample]
+
+    @property
+    def all_samples(self) -> List[Sample]:
+        return self.procurements + self.samples
+
+    @property
+    def num_nodes(self) -> int:
+        return sum(len(sample.nodes) for sample in self.all_samples)
+
+    @property
+    def node_ids(self) -> List[ObjectId]:
+        return [node.id for sample in self.all_samples for node in sample.nodes]
+
+    def add_actors(self):
+        """Add the actors to the database. Samples can only be added once their actors are."""
+        actorview = ActorView()
+        for actor in self.actors:
+            actorview.add(actor)
+
+    def add_samples(self):
+        """Add the procurement Samples, then every other Sample, to the database. The precursors have edges to Actions of later Samples, so every node of the graph is declared as incoming."""
+        node_ids = self.node_ids
+        sampleview = SampleView()
+        for sample in self.all_samples:
+            sampleview.add(sample, additional_incoming_node_ids=node_ids)
+
+    def add_to_database(self):
+        """Add the actors and every Sample to the database."""
+        self.add_actors()
+        self.add_samples()
+
+
+def make_lab_graph(shape: LabGraphShape, seed: int = 0) -> LabGraph:
+    """Build a synthetic lab graph. The same shape and seed always give graphs with the same structure (but new ids).
+
+    Args:
+        shape (LabGraphShape): Size and connectivity of the graph
+        seed (int, optional): Seed for the choice of precursors and processing steps. Defaults to 0.
+
+    Returns:
+        LabGraph: The graph
+    """
+    if shape.fan_in > shape.num_precursors:
+        raise ValueError("fan_in cannot be larger than the number of precursors.")
+    rng = random.Random(seed)
+
+    operator = Actor(name="Operator", description="synthetic benchmark actor")
+    furnace = Actor(name="Furnace", description="synthetic benchmark actor")
+    diffractometer = Actor(
+        name="Diffractometer", description="synthetic benchmark actor"
+    )
+    analyst = Actor(name="Analyst", description="synthetic benchmark actor")
+
+    precursors = []
+    procurements = []
+    for i in range(shape.num_precursors):
+        precursor = Material(name=f"precursor {i}")
+        procurement = Action(
+            "procurement", generated_materials=[precursor], actor=operator
+        )
+        procurements.append(
+            Sample(name=f"procurement {i}", nodes=[procurement, precursor], tags=[TAG])
+        )
+        precursors.append(precursor)
+
+    samples = []
+    for i in range(shape.num_samples):
+        sample = Sample(name=f"sample {i}", tags=[TAG, f"batch {i % 10}"])
+        actions = [
+            Action(
+                "mix",
+                ingredients=[
+                    WholeIngredient(m) for m in rng.sample(precursors, shape.fan_in)
+                ],
+                actor=operator,
+            )
+        ]
+        for _ in range(shape.depth - 1):
+            step = rng.choice(STEPS)
+            actions.append(
+                Action(
+                    step, actor=furnace if step in ["sinter", "anneal"] else operator
+                )
+            )
+        sample.add_linear_process(actions)
+
+        final_material = actions[-1].generated_materials[0]
+        for j in range(shape.fan_out):
+            measurement = Measurement(
+                name=f"XRD {j}", material=final_material, actor=diffractometer
+            )
+            analysis = Analysis(
+                name="Phase Identification", measurements=[measurement], actor=analyst
+            )
+            sample.add_node(measurement)
+            sample.add_node(analysis)
+        samples.append(sample)
+
+    return LabGraph(
+        shape=shape,
+        actors=[operator, furnace, diffractometer, analyst],
+        precursors=precursors,
+        procurements=procurements,
+        samples=samples,
+    )
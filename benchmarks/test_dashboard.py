@@ -0,0 +1,77 @@
+import pytest
+
+
+@pytest.fixture
+def client(lab_graph):
+    from labgraph.dashboard import create_app
+
+    return create_app().test_client()
+
+
+@pytest.fixture
+def layout_cache(client):
+    from labgraph.dashboard.routes.graph import layout_cache
+
+    layout_cache.clear()
+    yield layout_cache
+    layout_cache.clear()
+
+
+def test_sample_summary(benchmark, client, lab_graph):
+    response = benchmark(client.get, "/api/sample/summary/0")
+    assert response.status_code == 200
+
+
+def test_sample_summary_page(benchmark, client, lab_graph):
+    response = benchmark(client.get, "/api/sample/summary?limit=50")
+    assert response.status_code == 200
+
+
+def test_complete_graph(benchmark, client, layout_cache):
+
+    response = benchmark.pedantic(
+        client.get, args=("/api/graph/complete",), setup=layout_cache.clear, rounds=5
+    )
+    assert response.status_code == 200
+
+
+def test_samples_graph(benchmark, client, layout_cache, lab_graph):
+    sample_ids = [str(sample.id) for sample in lab_graph.samples]
+
+    response = benchmark.pedantic(
+        client.post,
+        args=("/api/graph/samples",),
+        kwargs={"json": {"sample_ids": sample_ids}},
+        setup=layout_cache.clear,
+        rounds=5,
+    )
+    assert response.status_code == 200
+
+
+def test_samples_graph_cached(benchmark, client, layout_cache, lab_graph):
+    url = "/api/graph/samples?ids=" + ",".join(
+        str(sample.id) for sample in lab_graph.samples
+    )
+    etag = client.get(url).headers["ETag"]
+
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_complete_graph_ndjson(benchmark, client, layout_cache):
+    url = "/api/graph/complete?format=ndjson"
+    client.get(url)  # lay out once, the benchmark measures streaming the documents
+
+    response = benchmark(lambda: client.get(url).data)
+    assert len(response) > 0
+
+
+def test_lod_overview(benchmark, client):
+    from labgraph.dashboard.overview import overview_cache
+
+    response = benchmark.pedantic(
+        client.get, args=("/api/graph/lod",), setup=overview_cache.clear, rounds=5
+    )
+    assert response.status_code == 200
@@ -0,0 +1,35 @@
+import networkx as nx
+import pytest
+
+from labgraph.utils.graph import hierarchical_layout, union_of_sample_graphs
+
+from .synthetic import make_lab_graph
+
+
+@pytest.fixture
+def graph(shape) -> nx.DiGraph:
+    lab_graph = make_lab_graph(shape)
+    return union_of_sample_graphs(sample.graph for sample in lab_graph.all_samples)
+
+
+def test_hierarchical_layout(benchmark, graph):
+    layout = benchmark(hierarchical_layout, graph)
+    assert len(layout) == len(graph)
+
+
+def test_graphviz_layout(benchmark, graph):
+    pytest.importorskip("pygraphviz")
+    from networkx.drawing.nx_agraph import graphviz_layout
+
+    layout = benchmark.pedantic(
+        graphviz_layout, args=(graph,), kwargs={"prog": "dot"}, rounds=3
+    )
+    assert len(layout) == len(graph)
+
+
+def test_hierarchical_layout_deep_chain(benchmark):
+    # deeper than the recursion limit
+    chain = nx.path_graph(5000, create_using=nx.DiGraph)
+
+    layout = benchmark(hierarchical_layout, chain)
+    assert len(layout) == 5000
@@ -0,0 +1,68 @@
+import random
+from typing import List
+
+import pytest
+
+from labgraph import Sample
+from labgraph.data.sample import action_sequence_distance
+
+from .synthetic import LabGraphShape, make_lab_graph
+
+# Actions in the linear process of a single large Sample. Each Action generates one Material, so depth 5000 is a Sample of about 10k nodes.
+DEPTHS = [10, 100, 1000, 5000]
+
+
+@pytest.fixture(params=DEPTHS, ids=[f"depth{depth}" for depth in DEPTHS])
+def deep_sample_nodes(request) -> List:
+    """Nodes of one Sample with a long process, shuffled so that Sample has to sort them."""
+    graph = make_lab_graph(LabGraphShape(num_samples=1, depth=request.param), seed=1)
+    nodes = list(graph.samples[0].nodes)
+    random.Random(0).shuffle(nodes)
+    return nodes
+
+
+@pytest.fixture
+def deep_sample(deep_sample_nodes) -> Sample:
+    return Sample(name="deep sample", nodes=deep_sample_nodes)
+
+
+@pytest.mark.parametrize("depth", [4, 6, 8])
+def test_action_sequence_distance(benchmark, depth):
+    graph = make_lab_graph(LabGraphShape(num_samples=2, depth=depth), seed=1)
+
+    distance = benchmark(action_sequence_distance, *graph.samples)
+    assert distance >= 0
+
+
+def test_sample_build(benchmark, deep_sample_nodes):
+    sample = benchmark(Sample, name="deep sample", nodes=deep_sample_nodes)
+    assert len(sample.nodes) == len(deep_sample_nodes)
+
+
+def test_sample_add_existing_nodes(benchmark, deep_sample, deep_sample_nodes):
+    # every node is already in the Sample, so only the membership check runs
+    def add_nodes():
+        for node in deep_sample_nodes:
+            deep_sample.add_node(node)
+
+    benchmark(add_nodes)
+    assert len(deep_sample.nodes) == len(deep_sample_nodes)
+
+
+def test_sample_validate(benchmark, deep_sample):
+    def clear_cache():
+        deep_sample._graph_cache = {}
+
+    valid = benchmark.pedantic(
+        lambda: deep_sample.has_valid_graph, setup=clear_cache, rounds=20
+    )
+    assert valid
+
+
+def test_sample_sort(benchmark, deep_sample):
+    benchmark(deep_sample._sort_nodes)
+
+
+def test_sample_action_graph(benchmark, deep_sample):
+    graph = benchmark(deep_sample.get_action_graph)
+    assert graph.number_of_nodes() > 0
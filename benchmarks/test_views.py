@@ -0,0 +1,81 @@
+import networkx as nx
+import pytest
+from labgraph.views import MaterialView, SampleView
+from labgraph.views.graph_integrity import get_affected_samples
+from labgraph.utils.dev import _drop_collections
+
+from .synthetic import TAG, LabGraph, make_lab_graph
+
+
+def test_SampleView_add(benchmark, shape, empty_db):
+    def setup():
+        _drop_collections()
+        graph = make_lab_graph(shape)
+        graph.add_actors()
+        return (graph,), {}
+
+    benchmark.pedantic(LabGraph.add_samples, setup=setup, rounds=3)
+
+
+def test_SampleView_get(benchmark, lab_graph):
+    view = SampleView()
+    sample = lab_graph.samples[-1]
+
+    retrieved = benchmark(view.get, sample.id)
+    assert retrieved == sample
+
+
+def test_SampleView_get_by_tags(benchmark, lab_graph):
+    view = SampleView()
+
+    samples = benchmark(view.get_by_tags, [TAG])
+    assert len(samples) == len(lab_graph.all_samples)
+
+
+@pytest.mark.parametrize("mode", ["sequential", "batched", "threaded"])
+def test_SampleView_hydration_modes(benchmark, lab_graph, mode):
+    view = SampleView(hydration_mode=mode)
+
+    samples = benchmark(view.filter, {"tags": TAG})
+    assert len(samples) == len(lab_graph.all_samples)
+
+
+def test_SampleView_get_graph(benchmark, lab_graph):
+    view = SampleView()
+    sample_ids = [sample.id for sample in lab_graph.all_samples]
+
+    graph = benchmark(view.get_graph, sample_ids)
+    assert graph.number_of_nodes() >= len(sample_ids)
+
+
+def test_union_of_retrieved_sample_graphs(benchmark, lab_graph):
+    # what get_graph replaces: retrieving every Sample, then combining their graphs
+    view = SampleView()
+    sample_ids = [sample.id for sample in lab_graph.all_samples]
+
+    def union():
+        graph = nx.DiGraph()
+        for sample in map(view.get, sample_ids):
+            graph = nx.compose(graph, sample.graph)
+        return graph
+
+    graph = benchmark(union)
+    assert graph.number_of_nodes() >= len(sample_ids)
+
+
+def test_remove_cascade(benchmark, shape, empty_db):
+    # removing a precursor removes every node downstream of it, in every Sample
+    def setup():
+        _drop_collections()
+        graph = make_lab_graph(shape)
+        graph.add_to_database()
+        return (graph.precursors[0].id,), {"_force_dangerous": True}
+
+    benchmark.pedantic(MaterialView().remove, setup=setup, rounds=3)
+
+
+def test_get_affected_samples(benchmark, lab_graph):
+    precursor = MaterialView().get(lab_graph.precursors[0].id)
+
+    samples = benchmark(get_affected_samples, precursor)
+    assert len(samples) > 1
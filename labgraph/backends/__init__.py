@@ -0,0 +1,120 @@
+"""
+Storage backends. The views store and query labgraph data through the collections of the active backend, which is chosen (in order of priority) by:
+
+1. `set_backend` (or the `use_backend` context manager)
+2. the ``LABGRAPH_BACKEND`` environment variable ("mongodb", "memory" or "sqlite")
+3. the ``engine`` key of the ``[storage]`` section of the labgraph config file
+4. MongoDB, which is the default
+
+Views keep the collections they were created with, so switch backends before creating any views. The asyncio views (see `labgraph.views.aio`) always use MongoDB.
+"""
+
+from contextlib import contextmanager
+import os
+from typing import Iterator, Optional, Union
+
+from .base import NODE_COLLECTIONS, NODE_TYPES, StorageBackend
+from .collection import DocumentCollection, DocumentCursor
+from .memory import MemoryBackend, MemoryCollection
+from .mongo import MongoBackend
+from .query import UnsupportedQueryError
+from .sqlite import SQLiteBackend, SQLiteCollection
+
+BACKENDS = {
+    "mongodb": MongoBackend,
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+}
+
+_BACKEND: Optional[StorageBackend] = None
+
+
+def make_backend(engine: str, **options) -> StorageBackend:
+    """Create a storage backend by name.
+
+    Args:
+        engine (str): Name of the backend. One of `BACKENDS` ("mongodb", "memory" or "sqlite").
+        **options: Passed on to the backend class.
+
+    Raises:
+        ValueError: Unknown backend name
+
+    Returns:
+        StorageBackend: The backend
+    """
+    if engine not in BACKENDS:
+        raise ValueError(
+            f"Unknown storage backend: {engine}. Must be one of {list(BACKENDS)}"
+        )
+    return BACKENDS[engine](**options)
+
+
+def _backend_from_config() -> StorageBackend:
+    from labgraph.utils.config.config import get_config
+
+    engine = os.getenv("LABGRAPH_BACKEND")
+    if engine:
+        return make_backend(engine)
+    try:
+        storage = dict(get_config().get("storage", {}))
+    except ValueError:
+        # no usable config file. MongoBackend will complain about it if it is used.
+        return MongoBackend()
+    return make_backend(storage.pop("engine", "mongodb"), **storage)
+
+
+def get_backend() -> StorageBackend:
+    """Get the active storage backend. If none has been set, it is chosen from the environment and the labgraph config file.
+
+    Returns:
+        StorageBackend: The active backend
+    """
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _backend_from_config()
+    return _BACKEND
+
+
+def set_backend(
+    backend: Optional[Union[str, StorageBackend]],
+) -> Optional[StorageBackend]:
+    """Set the active storage backend. Views created afterwards use it.
+
+    Args:
+        backend (Optional[Union[str, StorageBackend]]): The backend, or the name of a backend to create (see `make_backend`). None goes back to choosing the backend from the environment and the labgraph config file.
+
+    Returns:
+        Optional[StorageBackend]: The previously active backend
+    """
+    from labgraph.views.actor_cache import get_actor_cache
+
+    global _BACKEND
+    previous = _BACKEND
+    if isinstance(backend, str):
+        backend = make_backend(backend)
+    _BACKEND = backend
+    # cached actors belong to the previous backend
+    get_actor_cache().clear()
+    return previous
+
+
+@contextmanager
+def use_backend(backend: Union[str, StorageBackend]) -> Iterator[StorageBackend]:
+    """Context manager that makes a storage backend active, and restores the previous one afterwards.
+
+    .. code-block:: python
+
+        with use_backend("memory") as backend:
+            SampleView().add(sample)
+
+    Args:
+        backend (Union[str, StorageBackend]): The backend, or the name of a backend to create
+
+    Yields:
+        Iterator[StorageBackend]: The active backend
+    """
+    previous = set_backend(backend)
+    try:
+        yield get_backend()
+    finally:
+        set_backend(previous)
@@ -0,0 +1,175 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+NODE_TYPES = ["Material", "Action", "Measurement", "Analysis"]
+NODE_COLLECTIONS = {
+    "Material": "materials",
+    "Action": "actions",
+    "Measurement": "measurements",
+    "Analysis": "analyses",
+}
+
+Direction = Literal["upstream", "downstream"]
+
+
+class StorageBackend(ABC):
+    """
+    Where labgraph stores its nodes, samples, and actors. The views only talk to the collections returned by `get_collection`, which must support the subset of the pymongo ``Collection`` API that labgraph uses:
+
+    - ``find`` (filter, projection, skip, limit, sort; returns a cursor supporting ``sort``, ``skip``, ``limit``, ``batch_size`` and iteration), ``find_one``, ``count_documents``
+    - ``insert_one``, ``replace_one``, ``update_many`` (including ``$pull``), ``delete_one``, ``delete_many``
+    - ``bulk_write`` with pymongo's ``InsertOne``, ``UpdateOne``, ``ReplaceOne``, ``DeleteOne`` (and their ``upsert`` flag)
+    - ``create_indexes``, ``index_information``, ``drop`` and a ``name`` attribute
+
+    Every method accepts (and may ignore) a ``session`` keyword argument, which is only meaningful for MongoDB transactions. Filters, updates, and projections are written in MongoDB's query language.
+
+    Backends can also answer graph traversals across the node collections (see `StorageBackend.traverse`) more efficiently than query-at-a-time.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> Any:
+        """Get a collection by name. Collections are created on first use, with the indexes declared in `labgraph.utils.indexes`.
+
+        Args:
+            name (str): Name of the collection (ie "materials")
+
+        Returns:
+            Any: The collection
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_database(self) -> Any:
+        """Get the database holding the labgraph collections. Collections can be looked up on it by name (``db["materials"]``).
+
+        Returns:
+            Any: The database
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_collection_names(self) -> List[str]:
+        """Names of the collections in the database.
+
+        Returns:
+            List[str]: Collection names
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def drop_collection(self, name: str):
+        """Delete all entries of a collection.
+
+        Args:
+            name (str): Name of the collection
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """Context manager that runs database operations atomically, if the backend supports it. The yielded session should be passed to each operation (``session=...``). Backends without transactions run the operations as usual.
+
+        Yields:
+            Iterator[Any]: The session, or None
+        """
+        yield None
+
+    def traverse(
+        self,
+        edges: Iterable[dict],
+        direction: Direction = "downstream",
+        exclude: Optional[Dict[str, Iterable[ObjectId]]] = None,
+    ) -> Dict[str, List[ObjectId]]:
+        """Walk the graph from the given edges, following `direction` edges until no new nodes are found. Nodes are visited breadth-first.
+
+        This implementation makes (at most) one query per node collection per level of the graph, and only reads the edges of each node. MongoDB's `$graphLookup` would do this in one query, but it cannot cross collections, and our edges do. Backends override this when they can do better.
+
+        Args:
+            edges (Iterable[dict]): Edges to start from, as {"node_type": ..., "node_id": ...}
+            direction (Direction, optional): "downstream" or "upstream". Defaults to "downstream".
+            exclude (Optional[Dict[str, Iterable[ObjectId]]], optional): Node ids (keyed by node type) that are not visited, nor walked through. Defaults to None.
+
+        Returns:
+            Dict[str, List[ObjectId]]: ids of the visited nodes keyed by node type, in the order they were found.
+        """
+        visited = {node_type: [] for node_type in NODE_TYPES}
+        seen: Dict[str, Set[ObjectId]] = {
+            node_type: set((exclude or {}).get(node_type, []))
+            for node_type in NODE_TYPES
+        }
+
+        def _visit(edges: Iterable[dict]) -> Dict[str, List[ObjectId]]:
+            frontier = {node_type: [] for node_type in NODE_TYPES}
+            for edge in edges:
+                node_type = edge["node_type"]
+                node_id = edge["node_id"]
+                if node_id in seen[node_type]:
+                    continue
+                seen[node_type].add(node_id)
+                visited[node_type].append(node_id)
+                frontier[node_type].append(node_id)
+            return frontier
+
+        frontier = _visit(edges)
+        while any(len(ids) > 0 for ids in frontier.values()):
+            next_edges = []
+            for node_type, ids in frontier.items():
+                if len(ids) == 0:
+                    continue
+                collection = self.get_collection(NODE_COLLECTIONS[node_type])
+                for entry in collection.find({"_id": {"$in": ids}}, {direction: 1}):
+                    next_edges.extend(entry.get(direction, []))
+            frontier = _visit(next_edges)
+        return visited
+
+    def export(
+        self,
+        target: Optional["StorageBackend"] = None,
+        collections: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ) -> Dict[str, int]:
+        """Copy the documents of this backend into another one, ie to move the data of a standalone workstation into the lab's MongoDB. Documents are upserted by _id, so exporting again updates the copies instead of duplicating them. Nothing is deleted from either backend.
+
+        Args:
+            target (Optional[StorageBackend], optional): Backend to copy into. Defaults to None (MongoDB, as configured in the labgraph config file).
+            collections (Optional[List[str]], optional): Names of the collections to copy. Defaults to None (all of them, except for database locks).
+            batch_size (int, optional): Number of documents written per bulk write. Defaults to 1000.
+
+        Returns:
+            Dict[str, int]: Number of documents copied, keyed by collection name
+        """
+        if target is None:
+            from .mongo import MongoBackend
+
+            target = MongoBackend()
+        if collections is None:
+            collections = [
+                name for name in self.list_collection_names() if name != "_lock"
+            ]
+
+        counts = {}
+        for name in collections:
+            destination = target.get_collection(name)
+            counts[name] = 0
+            operations = []
+            for document in self.get_database()[name].find({}).batch_size(batch_size):
+                operations.append(
+                    ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                )
+                if len(operations) == batch_size:
+                    destination.bulk_write(operations, ordered=False)
+                    counts[name] += len(operations)
+                    operations = []
+            if len(operations) > 0:
+                destination.bulk_write(operations, ordered=False)
+                counts[name] += len(operations)
+        return counts
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>"
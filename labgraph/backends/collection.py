@@ -0,0 +1,409 @@
+"""
+The pymongo-style collection API shared by the storage backends that are not MongoDB. Subclasses store the documents; `DocumentCollection` turns the pymongo calls labgraph makes (``find``, ``update_many``, ``bulk_write``, ...) into a few primitives: select the documents matching a filter, and insert, replace, or delete a single document.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from pymongo import (
+    DeleteMany,
+    DeleteOne,
+    IndexModel,
+    InsertOne,
+    ReplaceOne,
+    UpdateMany,
+    UpdateOne,
+)
+from pymongo.errors import (
+    BulkWriteError,
+    DuplicateKeyError,
+    InvalidOperation,
+    OperationFailure,
+)
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from labgraph.utils.instrumentation import timed_command
+from .query import (
+    Document,
+    SortSpec,
+    UnsupportedQueryError,
+    apply_update,
+    copy_document,
+    hashable,
+    normalize_sort,
+    project,
+    resolve,
+    sort_documents,
+    upsert_document,
+)
+
+
+class DocumentCursor:
+    """Cursor over the results of `DocumentCollection.find`. Like a pymongo cursor, the query runs when the cursor is first iterated, and ``sort``, ``skip``, and ``limit`` can be chained until then."""
+
+    def __init__(
+        self,
+        collection: "DocumentCollection",
+        filter: Optional[Document],
+        projection: Optional[Union[List[str], Document]] = None,
+        skip: int = 0,
+        limit: int = 0,
+        sort: Optional[SortSpec] = None,
+    ):
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._skip = skip
+        self._limit = limit
+        self._sort = normalize_sort(sort) if sort is not None else None
+        self._results: Optional[Iterator[Document]] = None
+
+    def _check_not_started(self):
+        if self._results is not None:
+            raise InvalidOperation("Cannot modify a cursor after it has been used")
+
+    def sort(
+        self, key_or_list: Any, direction: Optional[int] = None
+    ) -> "DocumentCursor":
+        self._check_not_started()
+        self._sort = normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "DocumentCursor":
+        self._check_not_started()
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "DocumentCursor":
+        self._check_not_started()
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "DocumentCursor":
+        # results are already in memory, there are no round trips to batch
+        return self
+
+    def _execute(self) -> Iterator[Document]:
+        with self._collection._command("find"):
+            documents = self._collection._select(self._filter)
+            if self._sort:
+                documents = sort_documents(documents, self._sort)
+        end = self._skip + abs(self._limit) if self._limit else None
+        for document in documents[self._skip : end]:
+            yield project(document, self._projection)
+
+    def __iter__(self) -> "DocumentCursor":
+        return self
+
+    def __next__(self) -> Document:
+        if self._results is None:
+            self._results = self._execute()
+        return next(self._results)
+
+    def to_list(self, length: Optional[int] = None) -> List[Document]:
+        if length is None:
+            return list(self)
+        return [document for document, _ in zip(self, range(length))]
+
+    def close(self):
+        self._results = iter([])
+
+
+class DocumentCollection:
+    """Base class for collections of documents that are not stored in MongoDB. Supports the subset of the pymongo ``Collection`` API described in `labgraph.backends.base.StorageBackend`.
+
+    Subclasses implement `_select`, `_insert`, `_replace`, and `_delete`, plus the index methods (``create_indexes``, ``drop_index``, ``index_information``) and ``drop``.
+    """
+
+    name: str
+
+    ## primitives
+
+    def _select(self, filter: Optional[Document]) -> List[Document]:
+        """Documents that match a filter, in natural (insertion) order. The returned documents must not be modified."""
+        raise NotImplementedError
+
+    def _insert(self, document: Document) -> Any:
+        """Insert a document, adding an ``_id`` to it if it has none.
+
+        Raises:
+            DuplicateKeyError: A document with this ``_id`` (or the same keys of a unique index) already exists
+
+        Returns:
+            Any: The ``_id`` of the document
+        """
+        raise NotImplementedError
+
+    def _replace(self, old: Document, new: Document):
+        """Replace a stored document (as returned by `_select`) by a new version with the same ``_id``."""
+        raise NotImplementedError
+
+    def _delete(self, document: Document):
+        """Delete a stored document (as returned by `_select`)."""
+        raise NotImplementedError
+
+    def _count(self, filter: Optional[Document]) -> int:
+        """Number of documents that match a filter."""
+        return len(self._select(filter))
+
+    def _command(self, command_name: str):
+        """Reports a call as a database command to `labgraph.utils.instrumentation`."""
+        return timed_command(command_name, self.database.name, self.name)
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """Context within which a write call (which may change many documents) runs. Subclasses use this to hold a lock or a transaction."""
+        yield
+
+    ## indexes
+
+    def create_indexes(
+        self, indexes: List[IndexModel], session: Any = None
+    ) -> List[str]:
+        raise NotImplementedError
+
+    def create_index(self, keys: Any, **kwargs) -> str:
+        return self.create_indexes([IndexModel(keys, **kwargs)])[0]
+
+    ## reads
+
+    def find(
+        self,
+        filter: Optional[Document] = None,
+        projection: Optional[Union[List[str], Document]] = None,
+        skip: int = 0,
+        limit: int = 0,
+        sort: Optional[SortSpec] = None,
+        batch_size: int = 0,
+        session: Any = None,
+    ) -> DocumentCursor:
+        return DocumentCursor(
+            self, filter, projection=projection, skip=skip, limit=limit, sort=sort
+        )
+
+    def find_one(
+        self,
+        filter: Optional[Any] = None,
+        projection: Optional[Union[List[str], Document]] = None,
+        skip: int = 0,
+        sort: Optional[SortSpec] = None,
+        session: Any = None,
+    ) -> Optional[Document]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        cursor = self.find(filter, projection, skip=skip, limit=1, sort=sort)
+        return next(cursor, None)
+
+    def count_documents(
+        self,
+        filter: Document,
+        skip: int = 0,
+        limit: int = 0,
+        session: Any = None,
+    ) -> int:
+        with self._command("count"):
+            count = max(self._count(filter) - skip, 0)
+        return min(count, limit) if limit else count
+
+    def distinct(
+        self, key: str, filter: Optional[Document] = None, session: Any = None
+    ) -> List[Any]:
+        values = {}
+        with self._command("distinct"):
+            documents = self._select(filter)
+        for document in documents:
+            for value in resolve(document, key):
+                for item in value if isinstance(value, list) else [value]:
+                    values.setdefault(hashable(item), item)
+        return [copy_document(value) for value in values.values()]
+
+    def aggregate(self, pipeline: List[Document], session: Any = None, **kwargs):
+        raise OperationFailure(
+            f"This storage backend does not support aggregation pipelines (collection {self.name})"
+        )
+
+    def estimated_document_count(self) -> int:
+        return self.count_documents({})
+
+    ## writes
+
+    def _update(
+        self,
+        filter: Document,
+        update: Document,
+        upsert: bool = False,
+        multi: bool = False,
+        replace: bool = False,
+    ) -> Dict[str, Any]:
+        """Update (or replace) the documents matching a filter.
+
+        Returns:
+            Dict[str, Any]: pymongo-style raw result: {"n": matched, "nModified": modified, "upserted": upserted id (if any)}
+        """
+        if replace and any(key.startswith("$") for key in update):
+            raise UnsupportedQueryError(
+                "Replacement documents cannot contain update operators"
+            )
+        with self._write():
+            documents = self._select(filter)
+            if not multi:
+                documents = documents[:1]
+            if len(documents) == 0:
+                if not upsert:
+                    return {"n": 0, "nModified": 0}
+                document = upsert_document(filter)
+                if replace:
+                    document = {**document, **copy_document(update)}
+                else:
+                    apply_update(document, update, is_insert=True)
+                return {"n": 1, "nModified": 0, "upserted": self._insert(document)}
+
+            modified = 0
+            for old in documents:
+                if replace:
+                    new = copy_document(update)
+                    if new.setdefault("_id", old["_id"]) != old["_id"]:
+                        raise UnsupportedQueryError(
+                            "The _id of a document cannot be changed by a replacement"
+                        )
+                else:
+                    new = copy_document(old)
+                    apply_update(new, update)
+                if new != old:
+                    self._replace(old, new)
+                    modified += 1
+            return {"n": len(documents), "nModified": modified}
+
+    def _remove(self, filter: Document, multi: bool) -> int:
+        with self._write():
+            documents = self._select(filter)
+            if not multi:
+                documents = documents[:1]
+            for document in documents:
+                self._delete(document)
+            return len(documents)
+
+    def insert_one(self, document: Document, session: Any = None) -> InsertOneResult:
+        with self._command("insert"), self._write():
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(
+        self, documents: Iterable[Document], ordered: bool = True, session: Any = None
+    ) -> InsertManyResult:
+        operations = [InsertOne(document) for document in documents]
+        self.bulk_write(operations, ordered=ordered)
+        return InsertManyResult(
+            [operation._doc["_id"] for operation in operations], True
+        )
+
+    def replace_one(
+        self,
+        filter: Document,
+        replacement: Document,
+        upsert: bool = False,
+        session: Any = None,
+    ) -> UpdateResult:
+        with self._command("update"):
+            raw = self._update(filter, replacement, upsert, replace=True)
+        return UpdateResult(raw, True)
+
+    def update_one(
+        self,
+        filter: Document,
+        update: Document,
+        upsert: bool = False,
+        session: Any = None,
+    ) -> UpdateResult:
+        with self._command("update"):
+            raw = self._update(filter, update, upsert)
+        return UpdateResult(raw, True)
+
+    def update_many(
+        self,
+        filter: Document,
+        update: Document,
+        upsert: bool = False,
+        session: Any = None,
+    ) -> UpdateResult:
+        with self._command("update"):
+            raw = self._update(filter, update, upsert, multi=True)
+        return UpdateResult(raw, True)
+
+    def delete_one(self, filter: Document, session: Any = None) -> DeleteResult:
+        with self._command("delete"):
+            removed = self._remove(filter, multi=False)
+        return DeleteResult({"n": removed}, True)
+
+    def delete_many(self, filter: Document, session: Any = None) -> DeleteResult:
+        with self._command("delete"):
+            removed = self._remove(filter, multi=True)
+        return DeleteResult({"n": removed}, True)
+
+    def _bulk_write_one(self, operation: Any, totals: Dict[str, Any], index: int):
+        if isinstance(operation, InsertOne):
+            self._insert(operation._doc)
+            totals["nInserted"] += 1
+            return
+        if isinstance(operation, (DeleteOne, DeleteMany)):
+            totals["nRemoved"] += self._remove(
+                operation._filter, multi=isinstance(operation, DeleteMany)
+            )
+            return
+        if isinstance(operation, (ReplaceOne, UpdateOne, UpdateMany)):
+            raw = self._update(
+                operation._filter,
+                operation._doc,
+                upsert=bool(operation._upsert),
+                multi=isinstance(operation, UpdateMany),
+                replace=isinstance(operation, ReplaceOne),
+            )
+            if "upserted" in raw:
+                totals["nUpserted"] += 1
+                totals["upserted"].append({"index": index, "_id": raw["upserted"]})
+            else:
+                totals["nMatched"] += raw["n"]
+                totals["nModified"] += raw["nModified"]
+            return
+        raise TypeError(f"{operation!r} is not a valid bulk write request")
+
+    def bulk_write(
+        self,
+        requests: List[Any],
+        ordered: bool = True,
+        session: Any = None,
+        **kwargs,
+    ) -> BulkWriteResult:
+        totals: Dict[str, Any] = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+        with self._command("bulkWrite"), self._write():
+            for index, operation in enumerate(requests):
+                try:
+                    self._bulk_write_one(operation, totals, index)
+                except DuplicateKeyError as e:
+                    totals["writeErrors"].append(
+                        {
+                            "index": index,
+                            "code": 11000,
+                            "errmsg": str(e),
+                            "op": operation,
+                        }
+                    )
+                    if ordered:
+                        break
+        if len(totals["writeErrors"]) > 0:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
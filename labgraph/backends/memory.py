@@ -0,0 +1,368 @@
+"""
+An in-memory storage backend. Documents live in Python dicts, with hash indexes on the fields declared in `labgraph.utils.indexes`, so lookups by id, name, tag, edge, or sample contents do not scan the collection. Nothing is persisted -- this is meant for tests, CI, and simulations that push many nodes through labgraph without a MongoDB server.
+
+.. code-block:: python
+
+    from labgraph.backends import MemoryBackend, set_backend
+
+    set_backend(MemoryBackend())
+    # ...or set LABGRAPH_BACKEND=memory, or `engine = "memory"` in the [storage] section of the config file
+
+Stored documents are never modified in place: every write replaces the document with an updated copy. Reads therefore only need the backend's lock while they collect the matching documents, and transactions roll back by restoring the previous copies. Transactions are not isolated from reads on other threads -- they hold the backend's lock, so other threads simply wait for them to finish.
+
+Queries are evaluated by `labgraph.backends.query`, which supports the MongoDB operators labgraph uses.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import threading
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from labgraph.utils.indexes import ensure_indexes
+from labgraph.utils.instrumentation import timed_command
+from .base import NODE_COLLECTIONS, NODE_TYPES, Direction, StorageBackend
+from .collection import DocumentCollection
+from .query import (
+    Document,
+    copy_document,
+    hashable,
+    index_keys,
+    lookup_keys,
+    matches,
+    prepare_filter,
+    resolve,
+)
+
+
+class MemoryCollection(DocumentCollection):
+    """A collection of documents held in memory, with hash indexes on the declared index fields."""
+
+    def __init__(self, name: str, backend: "MemoryBackend"):
+        self.name = name
+        self._backend = backend
+        self._lock = backend._lock
+        self._documents: Dict[Any, Document] = {}
+        # insertion order of each document, so index lookups return documents in natural order
+        self._sequence: Dict[Any, int] = {}
+        self._next_sequence = 0
+        # index name -> {"key": [(field, direction), ...], "unique": bool}
+        self._index_specs: Dict[str, dict] = {}
+        # indexed field -> index key -> ids of the documents holding that key
+        self._indexes: Dict[str, Dict[Hashable, Set[Any]]] = {}
+        # unique index name -> tuple of index keys -> id of the document holding them
+        self._unique: Dict[str, Dict[Tuple, Any]] = {}
+
+    @property
+    def database(self) -> "MemoryBackend":
+        return self._backend
+
+    @property
+    def full_name(self) -> str:
+        return f"memory.{self.name}"
+
+    ## indexes
+
+    def _unique_key(self, document: Document, fields: List[str]) -> Tuple:
+        return tuple(
+            hashable(next(iter(resolve(document, field)), None)) for field in fields
+        )
+
+    def _index(self, document: Document):
+        id = document["_id"]
+        for field, index in self._indexes.items():
+            for key in set(index_keys(document, field)):
+                index.setdefault(key, set()).add(id)
+        for name, unique in self._unique.items():
+            fields = [field for field, _ in self._index_specs[name]["key"]]
+            unique[self._unique_key(document, fields)] = id
+
+    def _unindex(self, document: Document):
+        id = document["_id"]
+        for field, index in self._indexes.items():
+            for key in set(index_keys(document, field)):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(id)
+                    if len(ids) == 0:
+                        del index[key]
+        for name, unique in self._unique.items():
+            fields = [field for field, _ in self._index_specs[name]["key"]]
+            key = self._unique_key(document, fields)
+            if unique.get(key) == id:
+                del unique[key]
+
+    def _check_unique(self, document: Document):
+        for name, unique in self._unique.items():
+            fields = [field for field, _ in self._index_specs[name]["key"]]
+            key = self._unique_key(document, fields)
+            existing = unique.get(key)
+            if existing is not None and existing != document["_id"]:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {name} dup key: {dict(zip(fields, key))}",
+                    code=11000,
+                )
+
+    def _rebuild_indexes(self):
+        fields = {spec["key"][0][0] for spec in self._index_specs.values()}
+        self._indexes = {field: {} for field in fields}
+        self._unique = {
+            name: {} for name, spec in self._index_specs.items() if spec["unique"]
+        }
+        for document in self._documents.values():
+            self._check_unique(document)
+            self._index(document)
+
+    def create_indexes(
+        self, indexes: List[IndexModel], session: Any = None
+    ) -> List[str]:
+        with self._lock:
+            specs = dict(self._index_specs)
+            names = []
+            for index in indexes:
+                document = index.document
+                names.append(document["name"])
+                specs[document["name"]] = {
+                    "key": list(document["key"].items()),
+                    "unique": bool(document.get("unique", False)),
+                }
+            if specs != self._index_specs:
+                previous = self._index_specs
+                self._index_specs = specs
+                try:
+                    self._rebuild_indexes()
+                except DuplicateKeyError:
+                    self._index_specs = previous
+                    self._rebuild_indexes()
+                    raise
+            return names
+
+    def drop_index(self, name: str):
+        with self._lock:
+            if name not in self._index_specs:
+                raise OperationFailure(f"index not found with name [{name}]")
+            del self._index_specs[name]
+            self._rebuild_indexes()
+
+    def index_information(self) -> Dict[str, dict]:
+        information = {"_id_": {"key": [("_id", 1)]}}
+        for name, spec in self._index_specs.items():
+            information[name] = {"key": list(spec["key"])}
+            if spec["unique"]:
+                information[name]["unique"] = True
+        return information
+
+    def drop(self, session: Any = None):
+        """Delete all documents and indexes, like dropping a MongoDB collection."""
+        with self._lock:
+            self._documents = {}
+            self._sequence = {}
+            self._index_specs = {}
+            self._indexes = {}
+            self._unique = {}
+
+    ## reads
+
+    def _plan(self, filter: Optional[Document]) -> Optional[Set[Any]]:
+        """Ids of the documents that could match a filter, according to the indexes. None if no index applies (a full scan is needed). The result is a superset of the matching documents."""
+        if not filter:
+            return None
+        candidate_sets = []
+        for field, condition in filter.items():
+            if field == "$and":
+                candidate_sets.extend(
+                    c for c in (self._plan(f) for f in condition) if c is not None
+                )
+                continue
+            if field != "_id" and field not in self._indexes:
+                continue
+            lookup = lookup_keys(condition)
+            if lookup is None:
+                continue
+            mode, keys = lookup
+            if field == "_id":
+                found = [{key} if key in self._documents else set() for key in keys]
+            else:
+                index = self._indexes[field]
+                found = [index.get(key, set()) for key in keys]
+            if mode == "any":
+                candidate_sets.append(set().union(*found))
+            else:
+                candidate_sets.append(set.intersection(*found))
+        if len(candidate_sets) == 0:
+            return None
+        candidate_sets.sort(key=len)
+        return candidate_sets[0].intersection(*candidate_sets[1:])
+
+    def _select(self, filter: Optional[Document]) -> List[Document]:
+        """Stored documents that match a filter, in natural (insertion) order. The documents must not be modified."""
+        with self._lock:
+            candidates = self._plan(filter)
+            if candidates is None:
+                documents = list(self._documents.values())
+            else:
+                documents = [
+                    self._documents[id]
+                    for id in sorted(candidates, key=self._sequence.__getitem__)
+                ]
+        # stored documents are never modified in place, so we can match them without the lock
+        filter = prepare_filter(filter)
+        return [document for document in documents if matches(document, filter)]
+
+    def estimated_document_count(self) -> int:
+        return len(self._documents)
+
+    ## writes
+
+    def _write(self):
+        return self._lock
+
+    def _record(self, id: Any):
+        # remember the current version of a document, so an enclosing transaction can roll back
+        journal = self._backend._journal
+        if journal is not None:
+            journal.append((self, id, self._documents.get(id), self._sequence.get(id)))
+
+    def _restore(self, id: Any, document: Optional[Document], sequence: Optional[int]):
+        current = self._documents.pop(id, None)
+        if current is not None:
+            self._unindex(current)
+            self._sequence.pop(id, None)
+        if document is not None:
+            self._documents[id] = document
+            self._sequence[id] = sequence
+            self._index(document)
+
+    def _insert(self, document: Document) -> Any:
+        if "_id" not in document:
+            document["_id"] = (
+                ObjectId()
+            )  # like pymongo, the id is added to the caller's document
+        stored = copy_document(document)
+        id = stored["_id"]
+        if id in self._documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{ _id: {id!r} }}",
+                code=11000,
+            )
+        self._check_unique(stored)
+        self._record(id)
+        self._documents[id] = stored
+        self._sequence[id] = self._next_sequence
+        self._next_sequence += 1
+        self._index(stored)
+        return id
+
+    def _replace(self, old: Document, new: Document):
+        self._check_unique(new)
+        self._record(old["_id"])
+        self._unindex(old)
+        self._documents[old["_id"]] = new
+        self._index(new)
+
+    def _delete(self, document: Document):
+        self._record(document["_id"])
+        self._unindex(document)
+        del self._documents[document["_id"]]
+        del self._sequence[document["_id"]]
+
+    def __repr__(self):
+        return f"<MemoryCollection {self.name}: {len(self._documents)} documents>"
+
+
+class MemoryBackend(StorageBackend):
+    """Stores labgraph data in memory. See `labgraph.backends.memory`."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._indexed_collections: Set[str] = set()
+        # (collection, id, previous document, previous sequence) for every write in the current transaction
+        self._journal: Optional[List[tuple]] = None
+
+    def get_collection(self, name: str) -> MemoryCollection:
+        with self._lock:
+            collection = self[name]
+            if name not in self._indexed_collections:
+                self._indexed_collections.add(name)
+                ensure_indexes(collection)
+        return collection
+
+    def get_database(self) -> "MemoryBackend":
+        return self
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name, self)
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    def drop_collection(self, name: str):
+        with self._lock:
+            if name in self._collections:
+                self._collections[name].drop()
+            # indexes are dropped with the collection, so recreate them on next use
+            self._indexed_collections.discard(name)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Runs the writes made inside the context atomically: if an error is raised, every write is rolled back. Other threads wait until the transaction is over. Nested transactions join the outer one."""
+        with self._lock:
+            if self._journal is not None:
+                yield None
+                return
+            journal = self._journal = []
+            try:
+                yield None
+            except BaseException:
+                self._journal = None
+                for collection, id, document, sequence in reversed(journal):
+                    collection._restore(id, document, sequence)
+                raise
+            finally:
+                self._journal = None
+
+    def traverse(
+        self,
+        edges: Iterable[dict],
+        direction: Direction = "downstream",
+        exclude: Optional[Dict[str, Iterable[ObjectId]]] = None,
+    ) -> Dict[str, List[ObjectId]]:
+        """Walk the graph from the given edges, reading the stored documents directly. See `StorageBackend.traverse`."""
+        collections = {
+            node_type: self.get_collection(NODE_COLLECTIONS[node_type])
+            for node_type in NODE_TYPES
+        }
+        visited = {node_type: [] for node_type in NODE_TYPES}
+        seen: Dict[str, Set[ObjectId]] = {
+            node_type: set((exclude or {}).get(node_type, []))
+            for node_type in NODE_TYPES
+        }
+        queue = deque(edges)
+        with timed_command("traverse", self.name, None), self._lock:
+            while len(queue) > 0:
+                edge = queue.popleft()
+                node_type, node_id = edge["node_type"], edge["node_id"]
+                if node_id in seen[node_type]:
+                    continue
+                seen[node_type].add(node_id)
+                visited[node_type].append(node_id)
+                entry = collections[node_type]._documents.get(node_id)
+                if entry is not None:
+                    queue.extend(entry.get(direction, []))
+        return visited
+
+    def __repr__(self):
+        sizes = ", ".join(
+            f"{name}: {len(collection._documents)}"
+            for name, collection in self._collections.items()
+        )
+        return f"<MemoryBackend ({sizes})>"
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from pymongo import collection, database
+from pymongo.client_session import ClientSession
+
+from labgraph.utils.data_objects import _GetMongoCollection
+from .base import StorageBackend
+
+
+class MongoBackend(StorageBackend):
+    """Stores labgraph data in MongoDB, using the connection settings in the labgraph config file. This is the default backend."""
+
+    name = "mongodb"
+
+    def get_collection(self, name: str) -> collection.Collection:
+        return _GetMongoCollection.get_collection(name)
+
+    def get_database(self) -> database.Database:
+        return _GetMongoCollection.get_database()
+
+    def list_collection_names(self) -> List[str]:
+        return _GetMongoCollection.get_database().list_collection_names()
+
+    def drop_collection(self, name: str):
+        _GetMongoCollection.get_database()[name].drop()
+        # indexes are dropped with the collection, so recreate them on next use
+        _GetMongoCollection.indexed_collections.discard(name)
+
+    @contextmanager
+    def transaction(self) -> Iterator[ClientSession]:
+        """Runs database operations in a MongoDB transaction. Requires MongoDB to be running as a replica set."""
+        with _GetMongoCollection.transaction() as session:
+            yield session
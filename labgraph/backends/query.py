@@ -0,0 +1,676 @@
+"""
+Evaluates MongoDB-style filters, projections, updates, and sorts against plain documents, for the storage backends that are not MongoDB (see `labgraph.backends.memory` and `labgraph.backends.sqlite`).
+
+Only the operators that labgraph (and typical labgraph queries) rely on are supported:
+
+- filters: ``$eq``, ``$ne``, ``$gt``, ``$gte``, ``$lt``, ``$lte``, ``$in``, ``$nin``, ``$exists``, ``$all``, ``$elemMatch``, ``$size``, ``$regex``, ``$not``, ``$and``, ``$or``, ``$nor``
+- updates: ``$set``, ``$unset``, ``$inc``, ``$push``, ``$addToSet``, ``$pull``, ``$setOnInsert``
+- projections: inclusion or exclusion of (dotted) fields
+
+Anything else raises `UnsupportedQueryError`. As in MongoDB, a condition on an array field matches if the array itself or any of its elements matches, and dotted paths reach into embedded documents and arrays of documents.
+"""
+
+from datetime import datetime
+import re
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from bson import ObjectId
+
+Document = Dict[str, Any]
+SortSpec = List[Tuple[str, int]]
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised when a query uses an operator that the storage backend does not support"""
+
+    pass
+
+
+def copy_document(value: Any) -> Any:
+    """Copy a document. Only dicts and lists are copied -- everything else a document holds (ObjectIds, datetimes, strings, numbers) is immutable. This is much faster than `copy.deepcopy`.
+
+    Args:
+        value (Any): Document (or value within a document) to copy
+
+    Returns:
+        Any: The copy
+    """
+    if isinstance(value, dict):
+        return {k: copy_document(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_document(v) for v in value]
+    return value
+
+
+_SCALAR_TYPES = frozenset([str, int, float, type(None), ObjectId, datetime])
+
+
+def hashable(value: Any) -> Hashable:
+    """A hashable stand-in for a document value, so that values (including embedded documents and arrays) can be used as keys of an index. Equal values give equal keys.
+
+    Args:
+        value (Any): Document value
+
+    Returns:
+        Hashable: Index key
+    """
+    if type(value) in _SCALAR_TYPES:
+        return value
+    if isinstance(value, bool):
+        return ("__bool__", value)  # MongoDB does not consider True == 1
+    if isinstance(value, dict):
+        return (
+            "__document__",
+            tuple(sorted((k, hashable(v)) for k, v in value.items())),
+        )
+    if isinstance(value, list):
+        return ("__array__", tuple(hashable(v) for v in value))
+    try:
+        hash(value)
+    except TypeError:
+        return ("__unhashable__", repr(value))
+    return value
+
+
+def resolve(document: Any, path: Union[str, List[str]]) -> List[Any]:
+    """All values found at a dotted path. Arrays of embedded documents along the path are expanded, like MongoDB does (ie "upstream.node_id" gives the node_id of every upstream edge).
+
+    Args:
+        document (Any): Document to look in
+        path (Union[str, List[str]]): Dotted path (ie "nodes.Material"), or its parts
+
+    Returns:
+        List[Any]: Values at the path. Empty if the path does not exist.
+    """
+    if isinstance(path, str):
+        if "." not in path and isinstance(document, dict):
+            return [document[path]] if path in document else []
+        path = path.split(".")
+    if len(path) == 0:
+        return [document]
+    key, rest = path[0], path[1:]
+    if isinstance(document, dict):
+        if key not in document:
+            return []
+        return resolve(document[key], rest)
+    if isinstance(document, list):
+        if key.isdigit():
+            index = int(key)
+            return resolve(document[index], rest) if index < len(document) else []
+        values = []
+        for item in document:
+            if isinstance(item, dict):
+                values.extend(resolve(item, path))
+        return values
+    return []
+
+
+def index_keys(document: Document, field: str) -> List[Hashable]:
+    """Index keys for a field of a document. Arrays are indexed by each of their elements as well as by the whole array, and missing fields are indexed as None, like MongoDB does.
+
+    Args:
+        document (Document): Document to index
+        field (str): Dotted path of the indexed field
+
+    Returns:
+        List[Hashable]: Index keys (see `hashable`)
+    """
+    values = resolve(document, field)
+    if len(values) == 0:
+        return [None]
+    keys = []
+    for value in values:
+        keys.append(hashable(value))
+        if isinstance(value, list):
+            keys.extend(hashable(v) for v in value)
+    return keys
+
+
+def lookup_keys(condition: Any) -> Optional[Tuple[str, List[Hashable]]]:
+    """The index keys (see `index_keys`) that can answer a filter condition.
+
+    Args:
+        condition (Any): Condition on a single field
+
+    Returns:
+        Optional[Tuple[str, List[Hashable]]]: ("any", keys) if a document matches when one of its keys is in keys, ("all", keys) if it must have every one of them. None if the condition cannot be answered by an index.
+    """
+    if isinstance(condition, re.Pattern):
+        return None
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        if "$eq" in condition:
+            return "any", [hashable(condition["$eq"])]
+        if "$in" in condition and not any(
+            isinstance(v, re.Pattern) for v in condition["$in"]
+        ):
+            return "any", [hashable(v) for v in condition["$in"]]
+        if (
+            "$all" in condition
+            and len(condition["$all"]) > 0
+            and not any(isinstance(v, (dict, re.Pattern)) for v in condition["$all"])
+        ):
+            return "all", [hashable(v) for v in condition["$all"]]
+        return None
+    return "any", [hashable(condition)]
+
+
+def _is_operator_dict(condition: Any) -> bool:
+    return (
+        isinstance(condition, dict)
+        and len(condition) > 0
+        and all(key.startswith("$") for key in condition)
+    )
+
+
+def _candidates(values: List[Any]) -> List[Any]:
+    # values to compare against: each value, and the elements of array values
+    candidates = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _equals(value: Any, target: Any) -> bool:
+    if isinstance(target, re.Pattern):
+        return isinstance(value, str) and target.search(value) is not None
+    if isinstance(value, bool) != isinstance(target, bool):
+        return False  # MongoDB does not consider True == 1
+    return value == target
+
+
+def _values_equal(values: List[Any], target: Any) -> bool:
+    if len(values) == 0:
+        return target is None  # missing fields match null
+    return any(_equals(candidate, target) for candidate in _candidates(values))
+
+
+class _Targets:
+    """The argument of $in or $nin, prepared for fast membership tests."""
+
+    __slots__ = ("keys", "patterns")
+
+    def __init__(self, targets: Iterable[Any]):
+        targets = list(targets)
+        self.patterns = [t for t in targets if isinstance(t, re.Pattern)]
+        self.keys = {hashable(t) for t in targets if not isinstance(t, re.Pattern)}
+
+    def match(self, values: List[Any]) -> bool:
+        if len(values) == 0:
+            return None in self.keys  # missing fields match null
+        for candidate in _candidates(values):
+            if hashable(candidate) in self.keys:
+                return True
+            if isinstance(candidate, str) and any(
+                pattern.search(candidate) for pattern in self.patterns
+            ):
+                return True
+        return False
+
+
+def _targets(argument: Any) -> _Targets:
+    return argument if isinstance(argument, _Targets) else _Targets(argument)
+
+
+_NUMBERS = (int, float)
+
+
+def _comparable(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool)
+    if isinstance(a, _NUMBERS) and isinstance(b, _NUMBERS):
+        return True
+    return type(a) is type(b) and isinstance(a, (str, datetime, ObjectId))
+
+
+_COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _match_operators(values: List[Any], condition: Document) -> bool:
+    for operator, argument in condition.items():
+        if operator == "$eq":
+            if not _values_equal(values, argument):
+                return False
+        elif operator == "$ne":
+            if _values_equal(values, argument):
+                return False
+        elif operator in _COMPARISONS:
+            compare = _COMPARISONS[operator]
+            if not any(
+                _comparable(candidate, argument) and compare(candidate, argument)
+                for candidate in _candidates(values)
+            ):
+                return False
+        elif operator == "$in":
+            if not _targets(argument).match(values):
+                return False
+        elif operator == "$nin":
+            if _targets(argument).match(values):
+                return False
+        elif operator == "$exists":
+            if (len(values) > 0) != bool(argument):
+                return False
+        elif operator == "$all":
+            if len(argument) == 0 or not all(
+                _values_equal(values, target) for target in argument
+            ):
+                return False
+        elif operator == "$elemMatch":
+            if not any(
+                isinstance(value, list)
+                and any(_element_matches(element, argument) for element in value)
+                for value in values
+            ):
+                return False
+        elif operator == "$size":
+            if not any(
+                isinstance(value, list) and len(value) == argument for value in values
+            ):
+                return False
+        elif operator == "$regex":
+            pattern = re.compile(argument, _regex_flags(condition.get("$options", "")))
+            if not any(
+                isinstance(candidate, str) and pattern.search(candidate)
+                for candidate in _candidates(values)
+            ):
+                return False
+        elif operator == "$options":
+            if "$regex" not in condition:
+                raise UnsupportedQueryError("$options is only valid alongside $regex")
+        elif operator == "$not":
+            if match_value(values, argument):
+                return False
+        else:
+            raise UnsupportedQueryError(f"Unsupported query operator: {operator}")
+    return True
+
+
+def _regex_flags(options: str) -> int:
+    flags = 0
+    for option in options:
+        if option == "i":
+            flags |= re.IGNORECASE
+        elif option == "m":
+            flags |= re.MULTILINE
+        elif option == "s":
+            flags |= re.DOTALL
+        elif option == "x":
+            flags |= re.VERBOSE
+        else:
+            raise UnsupportedQueryError(f"Unsupported $regex option: {option}")
+    return flags
+
+
+def _element_matches(element: Any, condition: Any) -> bool:
+    # an element of an array, for $elemMatch and $pull
+    if _is_operator_dict(condition):
+        return _match_operators([element], condition)
+    if isinstance(condition, dict):
+        return isinstance(element, dict) and matches(element, condition)
+    return _equals(element, condition)
+
+
+def match_value(values: List[Any], condition: Any) -> bool:
+    """Whether the values found at a path satisfy a condition.
+
+    Args:
+        values (List[Any]): Values at the path (see `resolve`)
+        condition (Any): A value to compare for equality, or a dict of query operators (ie {"$gte": 3})
+
+    Raises:
+        UnsupportedQueryError: The condition uses an unsupported operator
+
+    Returns:
+        bool: True if the condition is satisfied
+    """
+    if _is_operator_dict(condition):
+        return _match_operators(values, condition)
+    return _values_equal(values, condition)
+
+
+def _prepare_operators(condition: Document) -> Document:
+    prepared = dict(condition)
+    for operator in ["$in", "$nin"]:
+        if operator in prepared:
+            prepared[operator] = _targets(prepared[operator])
+    if _is_operator_dict(prepared.get("$not")):
+        prepared["$not"] = _prepare_operators(prepared["$not"])
+    if isinstance(prepared.get("$elemMatch"), dict):
+        prepared["$elemMatch"] = (
+            _prepare_operators(prepared["$elemMatch"])
+            if _is_operator_dict(prepared["$elemMatch"])
+            else prepare_filter(prepared["$elemMatch"])
+        )
+    return prepared
+
+
+def prepare_filter(filter: Optional[Document]) -> Optional[Document]:
+    """Prepare a filter for matching against many documents. The arguments of ``$in`` and ``$nin`` are turned into hash sets, so matching does not slow down with the number of values listed. The given filter is not modified.
+
+    Args:
+        filter (Optional[Document]): The filter
+
+    Returns:
+        Optional[Document]: An equivalent filter, to pass to `matches`
+    """
+    if not filter:
+        return filter
+    prepared = {}
+    for key, condition in filter.items():
+        if key in ["$and", "$or", "$nor"]:
+            prepared[key] = [prepare_filter(f) for f in condition]
+        elif _is_operator_dict(condition):
+            prepared[key] = _prepare_operators(condition)
+        else:
+            prepared[key] = condition
+    return prepared
+
+
+def matches(document: Document, filter: Optional[Document]) -> bool:
+    """Whether a document matches a MongoDB-style filter. Use `prepare_filter` first when matching many documents against the same filter.
+
+    Args:
+        document (Document): The document
+        filter (Optional[Document]): The filter. None or {} matches every document.
+
+    Raises:
+        UnsupportedQueryError: The filter uses an unsupported operator
+
+    Returns:
+        bool: True if the document matches
+    """
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches(document, f) for f in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, f) for f in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(document, f) for f in condition):
+                return False
+        elif key.startswith("$"):
+            raise UnsupportedQueryError(f"Unsupported query operator: {key}")
+        elif not match_value(resolve(document, key), condition):
+            return False
+    return True
+
+
+def _normalize_projection(
+    projection: Optional[Union[List[str], Document]],
+) -> Optional[Document]:
+    if projection is None:
+        return None
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    for field, include in projection.items():
+        if isinstance(include, dict):
+            raise UnsupportedQueryError(
+                f"Unsupported projection operator for field {field}: {include}"
+            )
+    return projection
+
+
+def _include_path(source: Any, target: Document, path: List[str]):
+    key, rest = path[0], path[1:]
+    if key not in source:
+        return
+    value = source[key]
+    if len(rest) == 0:
+        target[key] = copy_document(value)
+    elif isinstance(value, dict):
+        _include_path(value, target.setdefault(key, {}), rest)
+    elif isinstance(value, list):
+        projected = target.setdefault(key, [{} for _ in value])
+        for item, projected_item in zip(value, projected):
+            if isinstance(item, dict):
+                _include_path(item, projected_item, rest)
+
+
+def _exclude_path(target: Any, path: List[str]):
+    key, rest = path[0], path[1:]
+    if isinstance(target, list):
+        for item in target:
+            _exclude_path(item, path)
+    elif isinstance(target, dict) and key in target:
+        if len(rest) == 0:
+            del target[key]
+        else:
+            _exclude_path(target[key], rest)
+
+
+def project(
+    document: Document, projection: Optional[Union[List[str], Document]]
+) -> Document:
+    """Apply a MongoDB-style projection to a document. The result is always a copy.
+
+    Args:
+        document (Document): The document
+        projection (Optional[Union[List[str], Document]]): List of fields to include, or a dict of fields to include (1) or exclude (0). ``_id`` is included unless explicitly excluded. None returns the whole document.
+
+    Raises:
+        UnsupportedQueryError: The projection uses an operator (ie $slice)
+
+    Returns:
+        Document: Projected copy of the document
+    """
+    projection = _normalize_projection(projection)
+    if projection is None:
+        return copy_document(document)
+
+    include_id = bool(projection.get("_id", True))
+    fields = {field: include for field, include in projection.items() if field != "_id"}
+    if any(fields.values()):
+        projected = {}
+        if include_id and "_id" in document:
+            projected["_id"] = document["_id"]
+        for field, include in fields.items():
+            if include:
+                _include_path(document, projected, field.split("."))
+        return projected
+
+    projected = copy_document(document)
+    for field in fields:
+        _exclude_path(projected, field.split("."))
+    if not include_id:
+        projected.pop("_id", None)
+    return projected
+
+
+def _parent(document: Document, path: List[str], create: bool) -> Optional[Any]:
+    target = document
+    for key in path[:-1]:
+        if isinstance(target, list) and key.isdigit():
+            target = target[int(key)]
+            continue
+        if not isinstance(target, dict):
+            raise UnsupportedQueryError(
+                f"Cannot update {'.'.join(path)}: {key} is not an embedded document"
+            )
+        if key not in target:
+            if not create:
+                return None
+            target[key] = {}
+        target = target[key]
+    return target
+
+
+def _set(document: Document, field: str, value: Any):
+    path = field.split(".")
+    parent = _parent(document, path, create=True)
+    if isinstance(parent, list):
+        parent[int(path[-1])] = value
+    else:
+        parent[path[-1]] = value
+
+
+def _get(document: Document, field: str, default: Any = None) -> Any:
+    path = field.split(".")
+    parent = _parent(document, path, create=False)
+    if isinstance(parent, dict):
+        return parent.get(path[-1], default)
+    if isinstance(parent, list) and path[-1].isdigit():
+        return parent[int(path[-1])]
+    return default
+
+
+def _unset(document: Document, field: str):
+    path = field.split(".")
+    parent = _parent(document, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(path[-1], None)
+
+
+def _array(document: Document, field: str, operator: str) -> list:
+    array = _get(document, field)
+    if array is None:
+        array = []
+        _set(document, field, array)
+    if not isinstance(array, list):
+        raise UnsupportedQueryError(f"{operator} requires {field} to be an array")
+    return array
+
+
+def _each(argument: Any) -> List[Any]:
+    if isinstance(argument, dict) and "$each" in argument:
+        return list(argument["$each"])
+    return [argument]
+
+
+def apply_update(document: Document, update: Document, is_insert: bool = False):
+    """Apply MongoDB-style update operators to a document, in place.
+
+    Args:
+        document (Document): The document to modify
+        update (Document): The update (ie {"$set": {"name": "new name"}})
+        is_insert (bool, optional): Whether the document is being inserted by an upsert. ``$setOnInsert`` is only applied if so. Defaults to False.
+
+    Raises:
+        UnsupportedQueryError: The update uses an unsupported operator, or is not made of operators
+    """
+    for operator, fields in update.items():
+        if not operator.startswith("$"):
+            raise UnsupportedQueryError(
+                f"Update documents must only contain update operators, but found {operator}. Use replace_one to replace a document."
+            )
+        for field, argument in fields.items():
+            if field == "_id" and operator != "$setOnInsert":
+                raise UnsupportedQueryError("The _id of a document cannot be updated")
+            if operator == "$set":
+                _set(document, field, copy_document(argument))
+            elif operator == "$setOnInsert":
+                if is_insert:
+                    _set(document, field, copy_document(argument))
+            elif operator == "$unset":
+                _unset(document, field)
+            elif operator == "$inc":
+                _set(document, field, _get(document, field, 0) + argument)
+            elif operator == "$push":
+                _array(document, field, operator).extend(copy_document(_each(argument)))
+            elif operator == "$addToSet":
+                array = _array(document, field, operator)
+                for value in _each(argument):
+                    if value not in array:
+                        array.append(copy_document(value))
+            elif operator == "$pull":
+                array = _get(document, field)
+                if isinstance(array, list):
+                    array[:] = [
+                        element
+                        for element in array
+                        if not _element_matches(element, argument)
+                    ]
+            else:
+                raise UnsupportedQueryError(f"Unsupported update operator: {operator}")
+
+
+def upsert_document(filter: Optional[Document]) -> Document:
+    """The document an upsert starts from: the plain equality conditions of its filter.
+
+    Args:
+        filter (Optional[Document]): Filter of the upsert
+
+    Returns:
+        Document: New document holding the filter's equality conditions
+    """
+    document: Document = {}
+    for field, condition in (filter or {}).items():
+        if field.startswith("$"):
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" not in condition:
+                continue
+            condition = condition["$eq"]
+        _set(document, field, copy_document(condition))
+    return document
+
+
+# the order in which MongoDB sorts values of different types
+_TYPE_ORDER = [
+    (type(None), 0),
+    (bool, 8),
+    (int, 1),
+    (float, 1),
+    (str, 2),
+    (dict, 3),
+    (list, 4),
+    (bytes, 5),
+    (ObjectId, 7),
+    (datetime, 9),
+]
+
+
+def _sort_value(value: Any) -> Tuple[int, Any]:
+    for value_type, order in _TYPE_ORDER:
+        if isinstance(value, value_type):
+            if value_type in (dict, list):
+                return order, repr(value)
+            return order, value
+    return 10, repr(value)
+
+
+def normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> SortSpec:
+    """Normalize the ways pymongo accepts a sort specification into a list of (field, direction) pairs.
+
+    Args:
+        key_or_list (Any): Field name, list of (field, direction) pairs, or dict of {field: direction}
+        direction (Optional[int], optional): Direction, if a single field name is given. Defaults to None (ascending).
+
+    Returns:
+        SortSpec: List of (field, direction) pairs
+    """
+    if isinstance(key_or_list, str):
+        return [(key_or_list, 1 if direction is None else direction)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [tuple(pair) for pair in key_or_list]
+
+
+def sort_documents(documents: Iterable[Document], sort: SortSpec) -> List[Document]:
+    """Sort documents like MongoDB does. Missing fields sort first, and values of different types are ordered by type.
+
+    Args:
+        documents (Iterable[Document]): Documents to sort
+        sort (SortSpec): List of (field, direction) pairs, most significant first
+
+    Returns:
+        List[Document]: Sorted documents
+    """
+    documents = list(documents)
+    # stable sorts, from the least significant key to the most significant one
+    for field, direction in reversed(sort):
+        documents.sort(
+            key=lambda document: _sort_value(
+                next(iter(resolve(document, field)), None)
+            ),
+            reverse=direction < 0,
+        )
+    return documents
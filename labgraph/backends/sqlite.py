@@ -0,0 +1,618 @@
+"""
+An embedded storage backend that keeps labgraph data in a single SQLite file, for instrument PCs and other standalone workstations that should not need a MongoDB server. The data can be exported into MongoDB later with `StorageBackend.export` (or ``labgraph export <path>`` from the command line).
+
+.. code-block:: toml
+
+    [storage]
+    engine = "sqlite"
+    path = "~/labgraph/labgraph.sqlite"
+
+Documents are stored as BSON, so ObjectIds and datetimes round-trip exactly like they do through MongoDB. Next to each document, the database keeps:
+
+- its ``name`` and ``created_at`` in indexed columns
+- one row per value of the other declared index fields (tags, actor ids, sample contents, ...) in ``index_keys``
+- one row per upstream/downstream edge of each node in ``edges``, which graph traversals walk with a recursive CTE
+
+Filters use these to narrow down the candidate documents in SQL. The full filter is then evaluated in Python by `labgraph.backends.query`, so every query `labgraph.backends.memory` supports works here too.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import sqlite3
+import threading
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import bson
+from bson import ObjectId
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from labgraph.utils.indexes import ensure_indexes
+from labgraph.utils.instrumentation import timed_command
+from .base import NODE_COLLECTIONS, NODE_TYPES, Direction, StorageBackend
+from .collection import DocumentCollection
+from .query import (
+    Document,
+    hashable,
+    index_keys,
+    lookup_keys,
+    matches,
+    prepare_filter,
+    resolve,
+)
+
+DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.expanduser("~"), ".labgraph", "labgraph.sqlite"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    created_at TEXT,
+    body BLOB NOT NULL,
+    UNIQUE (collection, id)
+);
+CREATE INDEX IF NOT EXISTS documents_name ON documents (collection, name);
+CREATE INDEX IF NOT EXISTS documents_created_at ON documents (collection, created_at);
+
+CREATE TABLE IF NOT EXISTS index_keys (
+    collection TEXT NOT NULL,
+    field TEXT NOT NULL,
+    key TEXT NOT NULL,
+    id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS index_keys_lookup ON index_keys (collection, field, key);
+CREATE INDEX IF NOT EXISTS index_keys_document ON index_keys (collection, id);
+
+CREATE TABLE IF NOT EXISTS edges (
+    node_type TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    target_type TEXT NOT NULL,
+    target_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS edges_walk ON edges (node_type, node_id, direction);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (target_type, target_id, direction);
+
+CREATE TABLE IF NOT EXISTS collection_indexes (
+    collection TEXT NOT NULL,
+    name TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    PRIMARY KEY (collection, name)
+);
+"""
+
+_TRAVERSE = """
+WITH RECURSIVE walk(node_type, node_id) AS (
+    SELECT node_type, node_id FROM traverse_start
+    UNION
+    SELECT edges.target_type, edges.target_id
+    FROM walk
+    JOIN edges
+        ON edges.node_type = walk.node_type
+        AND edges.node_id = walk.node_id
+        AND edges.direction = ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM traverse_exclude
+        WHERE traverse_exclude.node_type = walk.node_type
+        AND traverse_exclude.node_id = walk.node_id
+    )
+)
+SELECT node_type, node_id FROM walk
+"""
+
+_NODE_TYPE_OF_COLLECTION = {
+    name: node_type for node_type, name in NODE_COLLECTIONS.items()
+}
+_EDGE_FIELDS = ["upstream", "downstream"]
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _normalize(key: Hashable) -> Hashable:
+    if isinstance(key, float) and key.is_integer():
+        return int(key)
+    if isinstance(key, tuple):
+        return tuple(_normalize(k) for k in key)
+    return key
+
+
+def _encode_key(key: Hashable) -> str:
+    """Text form of an index key (see `labgraph.backends.query.hashable`), as stored in SQLite. Equal keys give equal text."""
+    if isinstance(key, ObjectId):
+        return "o" + str(key)
+    if isinstance(key, str):
+        return "s" + key
+    return "r" + repr(_normalize(key))
+
+
+def _encode_id(value: Any) -> str:
+    return _encode_key(hashable(value))
+
+
+def _edge_target(key: Hashable) -> Optional[str]:
+    """ "<node_type> <node_id>" for the index key of an edge ({"node_type": ..., "node_id": ...}), as matched against the edges table. None if the key is not an edge."""
+    if not (isinstance(key, tuple) and key[0] == "__document__"):
+        return None
+    edge = dict(key[1])
+    if set(edge) != {"node_type", "node_id"} or not isinstance(edge["node_type"], str):
+        return None
+    return f"{edge['node_type']} {_encode_key(edge['node_id'])}"
+
+
+def _decode_id(key: str) -> Any:
+    if key[0] == "o":
+        return ObjectId(key[1:])
+    if key[0] == "s":
+        return key[1:]
+    return key  # not used for node ids
+
+
+def _datetime_key(value: datetime) -> str:
+    # BSON stores naive UTC datetimes with millisecond precision
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="milliseconds")
+
+
+class SQLiteCollection(DocumentCollection):
+    """A collection of documents stored in a SQLite database. See `labgraph.backends.sqlite`."""
+
+    def __init__(self, name: str, backend: "SQLiteBackend"):
+        self.name = name
+        self._backend = backend
+        self._lock = backend._lock
+        self._node_type = _NODE_TYPE_OF_COLLECTION.get(name)
+        self._index_specs: Dict[str, dict] = {
+            index_name: json.loads(spec)
+            for index_name, spec in self._execute(
+                "SELECT name, spec FROM collection_indexes WHERE collection = ?",
+                [name],
+            )
+        }
+
+    @property
+    def database(self) -> "SQLiteBackend":
+        return self._backend
+
+    @property
+    def full_name(self) -> str:
+        return f"sqlite.{self.name}"
+
+    def _execute(self, sql: str, parameters: Iterable[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._backend._connection.execute(sql, list(parameters)).fetchall()
+
+    def _write(self):
+        return self._backend._write()
+
+    ## indexes
+
+    @property
+    def _key_fields(self) -> Set[str]:
+        """Indexed fields kept in the index_keys table. name and created_at have their own columns, and the edges of nodes have their own table."""
+        fields = {spec["key"][0][0] for spec in self._index_specs.values()}
+        fields -= {"_id", "name", "created_at"}
+        if self._node_type is not None:
+            fields -= set(_EDGE_FIELDS)
+        return fields
+
+    def _index(self, document: Document):
+        connection = self._backend._connection
+        id = _encode_id(document["_id"])
+        rows = [
+            (self.name, field, key, id)
+            for field in self._key_fields
+            for key in {_encode_key(key) for key in index_keys(document, field)}
+        ]
+        connection.executemany(
+            "INSERT INTO index_keys (collection, field, key, id) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        if self._node_type is not None:
+            connection.executemany(
+                "INSERT INTO edges (node_type, node_id, direction, target_type, target_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        self._node_type,
+                        id,
+                        direction,
+                        edge["node_type"],
+                        _encode_id(edge["node_id"]),
+                    )
+                    for direction in _EDGE_FIELDS
+                    for edge in document.get(direction, [])
+                    if isinstance(edge, dict) and "node_type" in edge
+                ],
+            )
+
+    def _unindex(self, document: Document):
+        connection = self._backend._connection
+        id = _encode_id(document["_id"])
+        connection.execute(
+            "DELETE FROM index_keys WHERE collection = ? AND id = ?", [self.name, id]
+        )
+        if self._node_type is not None:
+            connection.execute(
+                "DELETE FROM edges WHERE node_type = ? AND node_id = ?",
+                [self._node_type, id],
+            )
+
+    def _check_unique(self, document: Document):
+        for name, spec in self._index_specs.items():
+            if not spec["unique"]:
+                continue
+            fields = [field for field, _ in spec["key"]]
+            filter = {
+                field: next(iter(resolve(document, field)), None) for field in fields
+            }
+            for existing in self._select(filter):
+                if existing["_id"] != document["_id"]:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.full_name} index: {name} dup key: {filter}",
+                        code=11000,
+                    )
+
+    def _save_index_specs(self, specs: Dict[str, dict]):
+        rebuild = {spec["key"][0][0] for spec in specs.values()} != {
+            spec["key"][0][0] for spec in self._index_specs.values()
+        }
+        connection = self._backend._connection
+        connection.execute(
+            "DELETE FROM collection_indexes WHERE collection = ?", [self.name]
+        )
+        connection.executemany(
+            "INSERT INTO collection_indexes (collection, name, spec) VALUES (?, ?, ?)",
+            [(self.name, name, json.dumps(spec)) for name, spec in specs.items()],
+        )
+        self._index_specs = specs
+        if rebuild:
+            documents = self._select(None)
+            for document in documents:
+                self._unindex(document)
+                self._index(document)
+
+    def create_indexes(
+        self, indexes: List[IndexModel], session: Any = None
+    ) -> List[str]:
+        with self._write():
+            specs = dict(self._index_specs)
+            names = []
+            for index in indexes:
+                document = index.document
+                names.append(document["name"])
+                specs[document["name"]] = {
+                    "key": [list(pair) for pair in document["key"].items()],
+                    "unique": bool(document.get("unique", False)),
+                }
+            if specs != self._index_specs:
+                previous = self._index_specs
+                self._save_index_specs(specs)
+                try:
+                    for document in self._select(None):
+                        self._check_unique(document)
+                except DuplicateKeyError:
+                    self._save_index_specs(previous)
+                    raise
+            return names
+
+    def drop_index(self, name: str):
+        with self._write():
+            if name not in self._index_specs:
+                raise OperationFailure(f"index not found with name [{name}]")
+            specs = dict(self._index_specs)
+            del specs[name]
+            self._save_index_specs(specs)
+
+    def index_information(self) -> Dict[str, dict]:
+        information = {"_id_": {"key": [("_id", 1)]}}
+        for name, spec in self._index_specs.items():
+            information[name] = {"key": [tuple(pair) for pair in spec["key"]]}
+            if spec["unique"]:
+                information[name]["unique"] = True
+        return information
+
+    def drop(self, session: Any = None):
+        """Delete all documents and indexes, like dropping a MongoDB collection."""
+        with self._write():
+            connection = self._backend._connection
+            for table in ["documents", "index_keys", "collection_indexes"]:
+                connection.execute(
+                    f"DELETE FROM {table} WHERE collection = ?", [self.name]
+                )
+            if self._node_type is not None:
+                connection.execute(
+                    "DELETE FROM edges WHERE node_type = ?", [self._node_type]
+                )
+            self._index_specs = {}
+
+    ## reads
+
+    def _plan(self, filter: Optional[Document]) -> Tuple[List[str], List[Any]]:
+        """SQL conditions (and their parameters) that select a superset of the documents matching a filter, using the indexed columns and tables."""
+        clauses: List[str] = []
+        parameters: List[Any] = []
+        if not filter:
+            return clauses, parameters
+        for field, condition in filter.items():
+            if field == "$and":
+                for subfilter in condition:
+                    subclauses, subparameters = self._plan(subfilter)
+                    clauses.extend(subclauses)
+                    parameters.extend(subparameters)
+                continue
+            if field == "created_at":
+                self._plan_created_at(condition, clauses, parameters)
+                continue
+            lookup = lookup_keys(condition)
+            if lookup is None:
+                continue
+            mode, keys = lookup
+            if field == "_id":
+                if mode == "any":
+                    clauses.append("id IN (SELECT value FROM json_each(?))")
+                    parameters.append(json.dumps([_encode_key(k) for k in keys]))
+            elif field == "name":
+                if mode == "any" and all(isinstance(k, str) for k in keys):
+                    clauses.append("name IN (SELECT value FROM json_each(?))")
+                    parameters.append(json.dumps(keys))
+            elif field in self._key_fields:
+                encoded = [_encode_key(k) for k in keys]
+                groups = [encoded] if mode == "any" else [[k] for k in encoded]
+                for group in groups:
+                    clauses.append(
+                        "id IN (SELECT id FROM index_keys WHERE collection = ? AND field = ? AND key IN (SELECT value FROM json_each(?)))"
+                    )
+                    parameters.extend([self.name, field, json.dumps(group)])
+            elif field in _EDGE_FIELDS and self._node_type is not None:
+                targets = [_edge_target(k) for k in keys]
+                if mode == "any" and None not in targets:
+                    clauses.append(
+                        "id IN (SELECT node_id FROM edges WHERE node_type = ? AND direction = ? AND target_type || ' ' || target_id IN (SELECT value FROM json_each(?)))"
+                    )
+                    parameters.extend([self._node_type, field, json.dumps(targets)])
+        return clauses, parameters
+
+    @staticmethod
+    def _plan_created_at(condition: Any, clauses: List[str], parameters: List[Any]):
+        if isinstance(condition, datetime):
+            clauses.append("created_at = ?")
+            parameters.append(_datetime_key(condition))
+            return
+        if not isinstance(condition, dict):
+            return
+        for operator, argument in condition.items():
+            if not isinstance(argument, datetime):
+                continue
+            if operator == "$eq":
+                clauses.append("created_at = ?")
+            elif operator in _COMPARISONS:
+                clauses.append(f"created_at {_COMPARISONS[operator]} ?")
+            else:
+                continue
+            parameters.append(_datetime_key(argument))
+
+    def _select(self, filter: Optional[Document]) -> List[Document]:
+        clauses, parameters = self._plan(filter)
+        rows = self._execute(
+            "SELECT body FROM documents WHERE collection = ?"
+            + "".join(f" AND {clause}" for clause in clauses)
+            + " ORDER BY seq",
+            [self.name, *parameters],
+        )
+        documents = [bson.decode(body) for body, in rows]
+        filter = prepare_filter(filter)
+        return [document for document in documents if matches(document, filter)]
+
+    def _count(self, filter: Optional[Document]) -> int:
+        if filter:
+            return super()._count(filter)
+        return self.estimated_document_count()
+
+    def estimated_document_count(self) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM documents WHERE collection = ?", [self.name]
+        )[0][0]
+
+    ## writes
+
+    def _columns(
+        self, document: Document
+    ) -> Tuple[Optional[str], Optional[str], bytes]:
+        name = document.get("name")
+        created_at = document.get("created_at")
+        return (
+            name if isinstance(name, str) else None,
+            _datetime_key(created_at) if isinstance(created_at, datetime) else None,
+            bson.encode(document),
+        )
+
+    def _insert(self, document: Document) -> Any:
+        if "_id" not in document:
+            # like pymongo, the id is added to the caller's document
+            document["_id"] = ObjectId()
+        self._check_unique(document)
+        try:
+            self._backend._connection.execute(
+                "INSERT INTO documents (collection, id, name, created_at, body) VALUES (?, ?, ?, ?, ?)",
+                [self.name, _encode_id(document["_id"]), *self._columns(document)],
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{ _id: {document['_id']!r} }}",
+                code=11000,
+            )
+        self._index(document)
+        return document["_id"]
+
+    def _replace(self, old: Document, new: Document):
+        self._check_unique(new)
+        self._backend._connection.execute(
+            "UPDATE documents SET name = ?, created_at = ?, body = ? WHERE collection = ? AND id = ?",
+            [*self._columns(new), self.name, _encode_id(old["_id"])],
+        )
+        self._unindex(old)
+        self._index(new)
+
+    def _delete(self, document: Document):
+        self._backend._connection.execute(
+            "DELETE FROM documents WHERE collection = ? AND id = ?",
+            [self.name, _encode_id(document["_id"])],
+        )
+        self._unindex(document)
+
+    def __repr__(self):
+        return f"<SQLiteCollection {self.name}: {self.estimated_document_count()} documents>"
+
+
+class SQLiteBackend(StorageBackend):
+    """Stores labgraph data in a SQLite file. See `labgraph.backends.sqlite`."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (Optional[str], optional): Path to the database file, which is created if needed. Use ":memory:" for a temporary database. Defaults to None (DEFAULT_SQLITE_PATH, next to the default labgraph config file).
+        """
+        path = path or DEFAULT_SQLITE_PATH
+        if path != ":memory:":
+            path = os.path.abspath(os.path.expanduser(path))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self._collections: Dict[str, SQLiteCollection] = {}
+        self._indexed_collections: Set[str] = set()
+        self._pid: Optional[int] = None
+        self.__connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # like MongoClient, a sqlite connection must not be shared with forked processes
+        if self.__connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            if self.path != ":memory:":
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(_SCHEMA)
+            self.__connection = connection
+            self._pid = os.getpid()
+        return self.__connection
+
+    def close(self):
+        """Close the connection to the database file. It is reopened if the backend is used again."""
+        with self._lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """Runs the enclosed writes in a SQLite transaction, or joins the current one."""
+        with self._lock:
+            connection = self._connection
+            if self._transaction_depth == 0:
+                connection.execute("BEGIN")
+            self._transaction_depth += 1
+            try:
+                yield
+            except BaseException:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    connection.execute("ROLLBACK")
+                raise
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                connection.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Runs the writes made inside the context in a single SQLite transaction: if an error is raised, every write is rolled back. Other threads wait until the transaction is over."""
+        with self._write():
+            yield None
+
+    def get_collection(self, name: str) -> SQLiteCollection:
+        with self._lock:
+            collection = self[name]
+            if name not in self._indexed_collections:
+                self._indexed_collections.add(name)
+                ensure_indexes(collection)
+        return collection
+
+    def get_database(self) -> "SQLiteBackend":
+        return self
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = SQLiteCollection(name, self)
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT collection FROM documents UNION SELECT DISTINCT collection FROM collection_indexes"
+            ).fetchall()
+        return [name for name, in rows]
+
+    def drop_collection(self, name: str):
+        self[name].drop()
+        # indexes are dropped with the collection, so recreate them on next use
+        self._indexed_collections.discard(name)
+
+    def traverse(
+        self,
+        edges: Iterable[dict],
+        direction: Direction = "downstream",
+        exclude: Optional[Dict[str, Iterable[ObjectId]]] = None,
+    ) -> Dict[str, List[ObjectId]]:
+        """Walk the graph from the given edges in a single recursive query over the edges table. See `StorageBackend.traverse`."""
+        excluded = {
+            (node_type, _encode_id(node_id))
+            for node_type, node_ids in (exclude or {}).items()
+            for node_id in node_ids
+        }
+        visited = {node_type: [] for node_type in NODE_TYPES}
+        with timed_command("traverse", self.name, None), self._write():
+            connection = self._connection
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS traverse_start (node_type TEXT, node_id TEXT)"
+            )
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS traverse_exclude (node_type TEXT, node_id TEXT, PRIMARY KEY (node_type, node_id))"
+            )
+            connection.execute("DELETE FROM traverse_start")
+            connection.execute("DELETE FROM traverse_exclude")
+            connection.executemany(
+                "INSERT INTO traverse_start (node_type, node_id) VALUES (?, ?)",
+                [(edge["node_type"], _encode_id(edge["node_id"])) for edge in edges],
+            )
+            connection.executemany(
+                "INSERT INTO traverse_exclude (node_type, node_id) VALUES (?, ?)",
+                excluded,
+            )
+            rows = connection.execute(_TRAVERSE, [direction]).fetchall()
+        for node_type, node_id in rows:
+            if (node_type, node_id) not in excluded:
+                visited[node_type].append(_decode_id(node_id))
+        return visited
+
+    def __repr__(self):
+        return f"<SQLiteBackend {self.path}>"
@@ -0,0 +1,206 @@
+"""
+Caches the graphs laid out by the dashboard graph endpoints (see `labgraph.dashboard.routes.graph`). Laying out a graph with graphviz takes seconds for a few hundred nodes, so each version of a graph is laid out once, on a background thread, and the response is kept in a least-recently-used cache.
+
+A version of a graph is identified by its ETag: a hash of the ids, ``version`` and ``updated_at`` of everything it draws, which is cheap to get from the database. Browsers can send the ETag back (``If-None-Match``) to revalidate their copy without anything being laid out or sent again.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from datetime import datetime
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+@dataclass
+class CachedLayout:
+    """A laid out graph, ready to be sent.
+
+    Args:
+        etag (str): Version of the graph (see `graph_version`)
+        last_modified (Optional[datetime]): Most recent ``updated_at`` of anything in the graph
+        body (bytes): JSON response body
+        compute_time (float): Seconds it took to build and lay out the graph
+    """
+
+    etag: str
+    last_modified: Optional[datetime]
+    body: bytes
+    compute_time: float
+
+
+FINGERPRINT_FIELDS = {"version": 1, "updated_at": 1}
+
+
+def graph_version(kind: str, entries: Iterable[dict]) -> Tuple[str, Optional[datetime]]:
+    """Identify a version of a graph from the entries it draws. ``updated_at`` only has a precision of one second, so the ``version`` of each entry is used too.
+
+    Args:
+        kind (str): Name of the graph (ie the endpoint), so that different graphs of the same entries get different versions
+        entries (Iterable[dict]): Database entries of each sample and node drawn. Only ``_id`` and the `FINGERPRINT_FIELDS` are needed.
+
+    Returns:
+        Tuple[str, Optional[datetime]]: (ETag, last modified). Last modified is None if nothing had an ``updated_at``.
+    """
+    stamps = sorted(
+        (str(entry["_id"]), entry.get("version"), entry.get("updated_at"))
+        for entry in entries
+    )
+    digest = hashlib.sha1(kind.encode())
+    for id, version, updated_at in stamps:
+        updated_at = updated_at.isoformat() if updated_at else ""
+        digest.update(f"{id}@{version}@{updated_at};".encode())
+    last_modified = max(
+        (updated_at for _, _, updated_at in stamps if updated_at), default=None
+    )
+    return digest.hexdigest(), last_modified
+
+
+def _in_greenlet() -> bool:
+    try:
+        import gevent
+    except ImportError:
+        return False
+    return isinstance(gevent.getcurrent(), gevent.Greenlet)
+
+
+class _Task:
+    """A layout being computed, on a gevent hub threadpool when called from a gevent server (so that waiting for it does not block other requests), or on a regular thread pool otherwise."""
+
+    def __init__(
+        self, function: Callable[[], CachedLayout], executor: ThreadPoolExecutor
+    ):
+        if _in_greenlet():
+            import gevent
+
+            self._result = gevent.get_hub().threadpool.spawn(function)
+            self._future = None
+        else:
+            self._result = None
+            self._future = executor.submit(function)
+
+    def get(self, timeout: Optional[float]) -> Optional[CachedLayout]:
+        """The computed layout, or None if it is not ready within `timeout` seconds. Exceptions raised by the computation are raised here."""
+        if self._future is not None:
+            try:
+                return self._future.result(timeout)
+            except FutureTimeoutError:
+                return None
+        import gevent
+
+        try:
+            return self._result.get(timeout=timeout)
+        except gevent.Timeout:
+            return None
+
+
+class LayoutCache:
+    """Least-recently-used cache of laid out graphs, keyed by ETag. Layouts are computed in the background, and concurrent requests for the same graph share the computation."""
+
+    def __init__(self, max_entries: int = 32, max_workers: int = 2):
+        """
+        Args:
+            max_entries (int, optional): Number of layouts kept. The least recently used layouts are evicted first. Defaults to 32.
+            max_workers (int, optional): Number of layouts computed at the same time. Defaults to 2.
+        """
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedLayout]" = OrderedDict()
+        self._pending: Dict[str, _Task] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get(self, etag: str) -> Optional[CachedLayout]:
+        """The cached layout for a version of a graph, if any."""
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def _store(self, entry: CachedLayout):
+        with self._lock:
+            self._entries[entry.etag] = entry
+            self._entries.move_to_end(entry.etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _compute(
+        self,
+        etag: str,
+        last_modified: Optional[datetime],
+        compute: Callable[[], bytes],
+    ) -> CachedLayout:
+        try:
+            start = time.perf_counter()
+            body = compute()
+            entry = CachedLayout(
+                etag=etag,
+                last_modified=last_modified,
+                body=body,
+                compute_time=time.perf_counter() - start,
+            )
+            self._store(entry)
+            return entry
+        finally:
+            with self._lock:
+                self._pending.pop(etag, None)
+
+    def get_or_compute(
+        self,
+        etag: str,
+        last_modified: Optional[datetime],
+        compute: Callable[[], bytes],
+        timeout: Optional[float] = None,
+    ) -> Optional[CachedLayout]:
+        """Get a layout from the cache, or compute it in the background.
+
+        Args:
+            etag (str): Version of the graph (see `graph_version`)
+            last_modified (Optional[datetime]): Most recent ``updated_at`` of anything in the graph
+            compute (Callable[[], bytes]): Builds and lays out the graph, returning the JSON response body
+            timeout (Optional[float], optional): Seconds to wait for the layout to be computed. 0 returns immediately. Defaults to None (wait until it is done).
+
+        Returns:
+            Optional[CachedLayout]: The layout, or None if it is still being computed after `timeout` seconds.
+        """
+        entry = self.get(etag)
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            task = self._pending.get(etag)
+            if task is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="labgraph-layout",
+                    )
+                task = _Task(
+                    lambda: self._compute(etag, last_modified, compute),
+                    self._executor,
+                )
+                self._pending[etag] = task
+        return task.get(timeout)
+
+    def clear(self):
+        """Forget every cached layout. Layouts being computed are still cached when they are done."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, etag: str) -> bool:
+        return etag in self._entries
+
+    def __repr__(self):
+        return f"<LayoutCache {len(self)}/{self.max_entries} layouts, {self.hits} hits, {self.misses} misses>"
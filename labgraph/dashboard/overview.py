@@ -0,0 +1,476 @@
+"""
+Aggregated views of the whole lab graph, for the dashboard's level-of-detail graph endpoint (see `labgraph.dashboard.routes.graph`). Nodes are grouped into super-nodes -- one per Sample, per Actor, or per node type -- and the edges between groups are counted. Groups can then be expanded into their nodes on demand.
+
+On MongoDB, the aggregates are computed by aggregation pipelines, so nothing proportional to the number of nodes is sent to the dashboard. Storage backends without aggregation pipelines (see `labgraph.backends`) compute the same aggregates from projected queries. Aggregates are cached until the database changes, which is checked cheaply with the document count and latest ``updated_at`` of each collection.
+"""
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+
+from labgraph.backends.base import NODE_COLLECTIONS, NODE_TYPES
+from labgraph.utils.data_objects import get_collection
+from .layout_cache import LayoutCache, graph_version
+
+GROUPINGS = ["sample", "actor", "type"]
+NO_GROUP = "none"
+
+overview_cache = LayoutCache(max_entries=8)
+
+
+@dataclass
+class SuperNode:
+    """A group of nodes.
+
+    Args:
+        id (str): "<grouping>:<key>", ie "sample:647a3f470996f47f43dc1e2f" or "type:Material"
+        label (str): Name of the Sample or Actor, or the node type
+        size (int): Number of nodes in the group
+        internal_edges (int): Number of edges between nodes of the group
+        node_counts (Dict[str, int]): Number of nodes of each type in the group
+    """
+
+    id: str
+    label: str
+    size: int = 0
+    internal_edges: int = 0
+    node_counts: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class SuperEdge:
+    """Edges from the nodes of one group to the nodes of another.
+
+    Args:
+        source (str): Id of the upstream super-node
+        target (str): Id of the downstream super-node
+        count (int): Number of edges
+    """
+
+    source: str
+    target: str
+    count: int
+
+
+@dataclass
+class Overview:
+    """The lab graph, grouped.
+
+    Args:
+        grouping (str): How nodes are grouped, one of `GROUPINGS`
+        nodes (List[SuperNode]): Groups, largest first
+        edges (List[SuperEdge]): Edges between different groups
+    """
+
+    grouping: str
+    nodes: List[SuperNode]
+    edges: List[SuperEdge]
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> "Overview":
+        return cls(
+            grouping=entry["grouping"],
+            nodes=[SuperNode(**node) for node in entry["nodes"]],
+            edges=[SuperEdge(**edge) for edge in entry["edges"]],
+        )
+
+
+def _check_grouping(grouping: str):
+    if grouping not in GROUPINGS:
+        raise ValueError(f"Invalid grouping: {grouping}. Must be one of {GROUPINGS}")
+
+
+def super_node_id(grouping: str, key: Any) -> str:
+    return f"{grouping}:{NO_GROUP if key is None else key}"
+
+
+def parse_super_node_id(id: str) -> Tuple[str, Any]:
+    """(grouping, key) of a super-node id. Sample and Actor keys are ObjectIds, type keys are node types, and nodes outside of any group have a key of None.
+
+    Raises:
+        ValueError: Not a valid super-node id
+    """
+    grouping, _, key = id.partition(":")
+    _check_grouping(grouping)
+    if key == NO_GROUP:
+        return grouping, None
+    if grouping == "type":
+        if key not in NODE_TYPES:
+            raise ValueError(f"Invalid node type in super-node id: {id}")
+        return grouping, key
+    if not ObjectId.is_valid(key):
+        raise ValueError(f"Invalid super-node id: {id}")
+    return grouping, ObjectId(key)
+
+
+def database_fingerprints() -> List[dict]:
+    """A cheap fingerprint of each collection drawn in the overview: its (estimated) document count and its latest ``updated_at``. These change whenever nodes, Samples, or Actors are added, updated, or removed.
+
+    Returns:
+        List[dict]: One entry per collection, usable with `labgraph.dashboard.layout_cache.graph_version`
+    """
+    fingerprints = []
+    for name in list(NODE_COLLECTIONS.values()) + ["samples", "actors"]:
+        collection = get_collection(name)
+        latest = collection.find_one(
+            {}, {"updated_at": 1}, sort=[("updated_at", DESCENDING)]
+        )
+        fingerprints.append(
+            {
+                "_id": name,
+                "version": collection.estimated_document_count(),
+                "updated_at": None if latest is None else latest.get("updated_at"),
+            }
+        )
+    return fingerprints
+
+
+### Aggregation pipelines
+# Edges are counted from the upstream list of each node: it is written with the node, while the downstream list of a node that is already in the database is not updated when a later Sample builds on it.
+def _edge_source_lookups(grouping: str) -> List[dict]:
+    """Stages that find the group key (``source``) of the upstream node of each unwound edge, and count the edges between groups. Every node collection is looked up, only the one holding the upstream node matches."""
+    stages = []
+    for node_type in NODE_TYPES:
+        if grouping == "sample":
+            lookup = {
+                "from": "samples",
+                "localField": "upstream.node_id",
+                "foreignField": f"nodes.{node_type}",
+                "as": f"from_{node_type}",
+            }
+        else:
+            lookup = {
+                "from": NODE_COLLECTIONS[node_type],
+                "localField": "upstream.node_id",
+                "foreignField": "_id",
+                "as": f"from_{node_type}",
+            }
+        stages.append({"$lookup": lookup})
+    source_key = "$source._id" if grouping == "sample" else "$source.actor_id"
+    stages += [
+        {
+            "$project": {
+                "target": 1,
+                "source": {"$concatArrays": [f"$from_{t}" for t in NODE_TYPES]},
+            }
+        },
+        {"$unwind": "$source"},
+        {
+            "$group": {
+                "_id": {
+                    "source": {"$ifNull": [source_key, None]},
+                    "target": "$target",
+                },
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    return stages
+
+
+def _edge_pipeline(grouping: str, node_type: str) -> List[dict]:
+    """Counts the edges into the nodes of one collection, by (source group, target group)."""
+    if grouping == "sample":
+        stages = [
+            {"$project": {"upstream": 1}},
+            {"$match": {"upstream.0": {"$exists": True}}},
+            {
+                "$lookup": {
+                    "from": "samples",
+                    "localField": "_id",
+                    "foreignField": f"nodes.{node_type}",
+                    "as": "target",
+                }
+            },
+            {"$unwind": "$target"},
+            {"$project": {"target": "$target._id", "upstream": 1}},
+        ]
+    else:
+        stages = [
+            {
+                "$project": {
+                    "target": {"$ifNull": ["$actor_id", None]},
+                    "upstream": 1,
+                }
+            },
+        ]
+    return stages + [{"$unwind": "$upstream"}] + _edge_source_lookups(grouping)
+
+
+def _aggregate_edges(grouping: str) -> Dict[Tuple[str, str], int]:
+    counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    for node_type in NODE_TYPES:
+        collection = get_collection(NODE_COLLECTIONS[node_type])
+        for entry in collection.aggregate(_edge_pipeline(grouping, node_type)):
+            source = super_node_id(grouping, entry["_id"].get("source"))
+            target = super_node_id(grouping, entry["_id"].get("target"))
+            counts[(source, target)] += entry["count"]
+    return counts
+
+
+def _overview_with_pipelines(grouping: str) -> Tuple[Dict[str, SuperNode], Dict]:
+    nodes: Dict[str, SuperNode] = {}
+    if grouping == "sample":
+        for entry in get_collection("samples").aggregate(
+            [
+                {
+                    "$project": {
+                        "name": 1,
+                        **{
+                            node_type: {
+                                "$size": {"$ifNull": [f"$nodes.{node_type}", []]}
+                            }
+                            for node_type in NODE_TYPES
+                        },
+                    }
+                }
+            ]
+        ):
+            id = super_node_id("sample", entry["_id"])
+            counts = {node_type: entry[node_type] for node_type in NODE_TYPES}
+            nodes[id] = SuperNode(
+                id=id,
+                label=entry["name"],
+                size=sum(counts.values()),
+                node_counts=counts,
+            )
+        return nodes, _aggregate_edges("sample")
+
+    if grouping == "actor":
+        for node_type in NODE_TYPES:
+            collection = get_collection(NODE_COLLECTIONS[node_type])
+            for entry in collection.aggregate(
+                [
+                    {
+                        "$group": {
+                            "_id": {"$ifNull": ["$actor_id", None]},
+                            "count": {"$sum": 1},
+                        }
+                    }
+                ]
+            ):
+                _add_to_group(nodes, "actor", entry["_id"], node_type, entry["count"])
+        return nodes, _aggregate_edges("actor")
+
+    counts = defaultdict(int)
+    for node_type in NODE_TYPES:
+        collection = get_collection(NODE_COLLECTIONS[node_type])
+        count = collection.estimated_document_count()
+        if count > 0:
+            _add_to_group(nodes, "type", node_type, node_type, count)
+        for entry in collection.aggregate(
+            [
+                {"$unwind": "$upstream"},
+                {"$group": {"_id": "$upstream.node_type", "count": {"$sum": 1}}},
+            ]
+        ):
+            counts[
+                (super_node_id("type", entry["_id"]), super_node_id("type", node_type))
+            ] += entry["count"]
+    return nodes, counts
+
+
+### Without aggregation pipelines
+def _add_to_group(
+    nodes: Dict[str, SuperNode], grouping: str, key: Any, node_type: str, count: int
+):
+    id = super_node_id(grouping, key)
+    if id not in nodes:
+        nodes[id] = SuperNode(
+            id=id, label=key if grouping == "type" else "", node_counts={}
+        )
+    node = nodes[id]
+    node.size += count
+    node.node_counts[node_type] = node.node_counts.get(node_type, 0) + count
+
+
+def _overview_with_queries(grouping: str) -> Tuple[Dict[str, SuperNode], Dict]:
+    nodes: Dict[str, SuperNode] = {}
+    membership: Dict[ObjectId, List[str]] = defaultdict(list)
+    if grouping == "sample":
+        for entry in get_collection("samples").find({}, {"name": 1, "nodes": 1}):
+            id = super_node_id("sample", entry["_id"])
+            counts = {
+                node_type: len(entry["nodes"].get(node_type, []))
+                for node_type in NODE_TYPES
+            }
+            nodes[id] = SuperNode(
+                id=id,
+                label=entry["name"],
+                size=sum(counts.values()),
+                node_counts=counts,
+            )
+            for ids in entry["nodes"].values():
+                for node_id in ids:
+                    membership[node_id].append(id)
+    else:
+        for node_type in NODE_TYPES:
+            for entry in get_collection(NODE_COLLECTIONS[node_type]).find(
+                {}, {"actor_id": 1}
+            ):
+                key = entry.get("actor_id") if grouping == "actor" else node_type
+                _add_to_group(nodes, grouping, key, node_type, 1)
+                membership[entry["_id"]].append(super_node_id(grouping, key))
+
+    counts = defaultdict(int)
+    for node_type in NODE_TYPES:
+        for entry in get_collection(NODE_COLLECTIONS[node_type]).find(
+            {}, {"upstream": 1}
+        ):
+            for target in membership.get(entry["_id"], []):
+                for upstream in entry["upstream"]:
+                    for source in membership.get(upstream["node_id"], []):
+                        counts[(source, target)] += 1
+    return nodes, counts
+
+
+### Overview
+def _label_actors(nodes: Dict[str, SuperNode]):
+    ids = []
+    for node in nodes.values():
+        _, key = parse_super_node_id(node.id)
+        if key is None:
+            node.label = "No actor"
+        else:
+            ids.append(key)
+    for actor in get_collection("actors").find({"_id": {"$in": ids}}, {"name": 1}):
+        nodes[super_node_id("actor", actor["_id"])].label = actor["name"]
+
+
+def compute_overview(grouping: str) -> Overview:
+    """Group the lab graph, without caching. Use `get_overview` instead.
+
+    Args:
+        grouping (str): One of `GROUPINGS`
+
+    Returns:
+        Overview: The grouped graph
+    """
+    _check_grouping(grouping)
+    try:
+        nodes, counts = _overview_with_pipelines(grouping)
+    except OperationFailure:
+        # storage backend without aggregation pipelines
+        nodes, counts = _overview_with_queries(grouping)
+    if grouping == "actor":
+        _label_actors(nodes)
+
+    edges = []
+    for (source, target), count in counts.items():
+        if source == target:
+            nodes[source].internal_edges += count
+        elif source in nodes and target in nodes:
+            edges.append(SuperEdge(source=source, target=target, count=count))
+    return Overview(
+        grouping=grouping,
+        nodes=sorted(nodes.values(), key=lambda node: (-node.size, node.id)),
+        edges=sorted(edges, key=lambda edge: (edge.source, edge.target)),
+    )
+
+
+def get_overview(grouping: str, fingerprints: Optional[List[dict]] = None) -> Overview:
+    """The lab graph grouped into super-nodes, from the cache if the database has not changed since it was computed.
+
+    Args:
+        grouping (str): One of `GROUPINGS`
+        fingerprints (Optional[List[dict]], optional): Result of `database_fingerprints`, if already known. Defaults to None.
+
+    Returns:
+        Overview: The grouped graph
+    """
+    _check_grouping(grouping)
+    if fingerprints is None:
+        fingerprints = database_fingerprints()
+    key, last_modified = graph_version(f"overview.{grouping}", fingerprints)
+    entry = overview_cache.get_or_compute(
+        key,
+        last_modified,
+        lambda: json.dumps(asdict(compute_overview(grouping))).encode(),
+    )
+    return Overview.from_dict(json.loads(entry.body))
+
+
+### Expanding groups
+def group_members(
+    grouping: str, key: Any, limit: int
+) -> Tuple[Dict[str, List[ObjectId]], bool]:
+    """Ids of the nodes in a group.
+
+    Args:
+        grouping (str): One of `GROUPINGS`
+        key (Any): Key of the group (see `parse_super_node_id`)
+        limit (int): Maximum number of nodes returned
+
+    Returns:
+        Tuple[Dict[str, List[ObjectId]], bool]: Node ids keyed by node type, and whether the group had more than `limit` nodes
+    """
+    members: Dict[str, List[ObjectId]] = {}
+    remaining = limit
+    truncated = False
+    if grouping == "sample":
+        entry = get_collection("samples").find_one({"_id": key}, {"nodes": 1})
+        nodes = {} if entry is None else entry["nodes"]
+        for node_type in NODE_TYPES:
+            ids = nodes.get(node_type, [])
+            members[node_type] = ids[:remaining]
+            truncated = truncated or len(ids) > remaining
+            remaining -= len(members[node_type])
+        return members, truncated
+
+    for node_type in NODE_TYPES:
+        if grouping == "type" and node_type != key:
+            continue
+        filter = {} if grouping == "type" else {"actor_id": key}
+        ids = [
+            entry["_id"]
+            for entry in get_collection(NODE_COLLECTIONS[node_type])
+            .find(filter, {"_id": 1})
+            .limit(remaining + 1)
+        ]
+        members[node_type] = ids[:remaining]
+        truncated = truncated or len(ids) > remaining
+        remaining -= len(members[node_type])
+    return members, truncated
+
+
+def groups_of(
+    grouping: str, node_ids: Dict[str, Iterable[ObjectId]]
+) -> Dict[ObjectId, List[str]]:
+    """The super-nodes that nodes belong to. A node can be in several Samples.
+
+    Args:
+        grouping (str): One of `GROUPINGS`
+        node_ids (Dict[str, Iterable[ObjectId]]): Node ids keyed by node type
+
+    Returns:
+        Dict[ObjectId, List[str]]: Ids of the super-nodes of each node
+    """
+    groups: Dict[ObjectId, List[str]] = defaultdict(list)
+    for node_type, ids in node_ids.items():
+        ids = list(ids)
+        if len(ids) == 0:
+            continue
+        if grouping == "type":
+            for id in ids:
+                groups[id].append(super_node_id("type", node_type))
+        elif grouping == "actor":
+            for entry in get_collection(NODE_COLLECTIONS[node_type]).find(
+                {"_id": {"$in": ids}}, {"actor_id": 1}
+            ):
+                groups[entry["_id"]].append(
+                    super_node_id("actor", entry.get("actor_id"))
+                )
+        else:
+            wanted = set(ids)
+            for entry in get_collection("samples").find(
+                {f"nodes.{node_type}": {"$in": ids}}, {f"nodes.{node_type}": 1}
+            ):
+                for id in entry["nodes"][node_type]:
+                    if id in wanted:
+                        groups[id].append(super_node_id("sample", entry["_id"]))
+    return dict(groups)
@@ -1,6 +1,10 @@
-from typing import List
+from datetime import timezone
+import math
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from bson import ObjectId
-from flask import Blueprint, request
+from bson.errors import InvalidId
+from flask import Blueprint, Response, request
+from labgraph.utils.indexes import NODE_TYPES
 from labgraph.views import (
     SampleView,
     MeasurementView,
@@ -8,9 +12,19 @@ from labgraph.views import (
     ActionView,
     AnalysisView,
 )
-from dataclasses import dataclass, asdict
+from dataclasses import asdict, dataclass
 import networkx as nx
-from networkx.drawing.nx_agraph import graphviz_layout
+from labgraph.utils.graph import graph_layout
+from ..layout_cache import FINGERPRINT_FIELDS, CachedLayout, LayoutCache, graph_version
+from ..overview import (
+    GROUPINGS,
+    Overview,
+    database_fingerprints,
+    get_overview,
+    group_members,
+    groups_of,
+    parse_super_node_id,
+)
 from .utils import MongoEncoder
 import json
 
@@ -22,6 +36,13 @@ node_views = {
     "analysis": AnalysisView(),
 }
 
+COMPLETE_GRAPH_MAX_NODES = 5000
+LOD_MAX_GROUPS = 200
+LOD_MAX_EXPANDED_NODES = 500
+NDJSON_MIMETYPE = "application/x-ndjson"
+NDJSON_LINES_PER_CHUNK = 256
+layout_cache = LayoutCache()
+
 
 ### Dataclasses
 @dataclass
@@ -47,6 +68,233 @@ class Graph:
     edges: List[EdgeEntry]
 
 
+### Graphs
+# A graph is built in two parts: its topology (node ids, edges, and small node attributes), which is all the layout needs, and the documents of its nodes, which are only read while the response is written.
+Documents = Iterable[Tuple[ObjectId, dict]]
+
+
+def _add_edges(g: nx.DiGraph, node: dict):
+    for u in node["upstream"]:
+        g.add_edge(u["node_id"], node["_id"])
+    for d in node["downstream"]:
+        g.add_edge(node["_id"], d["node_id"])
+
+
+def _complete_graph_topology(node_ids: Dict[str, List[ObjectId]]) -> nx.DiGraph:
+    g = nx.DiGraph()
+    for node_type, view in node_views.items():
+        for node in view._collection.find(
+            {"_id": {"$in": node_ids[node_type]}}, {"upstream": 1, "downstream": 1}
+        ):
+            g.add_node(node["_id"])
+            _add_edges(g, node)
+    return g
+
+
+def _complete_graph_documents(node_ids: Dict[str, List[ObjectId]]) -> Documents:
+    for node_type, view in node_views.items():
+        for node in view._collection.find(
+            {"_id": {"$in": node_ids[node_type]}}, {"upstream": 0, "downstream": 0}
+        ):
+            yield node["_id"], {"type": node_type, **node}
+
+
+def _default_size(node: dict) -> float:
+    return 10
+
+
+def _node_entries(
+    g: nx.DiGraph,
+    layout: dict,
+    documents: Documents,
+    label: Callable[[dict], str],
+    size: Callable[[dict], float] = _default_size,
+) -> Iterator[NodeEntry]:
+    """Nodes of a laid out graph, with the contents given by `documents`. Nodes without a document have the attributes of the graph as contents."""
+
+    def entry(node_id, contents):
+        return NodeEntry(
+            _id=str(node_id),
+            x=float(layout[node_id][0]),
+            y=float(layout[node_id][1]),
+            label=label(contents),
+            size=size(contents),
+            contents=contents,
+        )
+
+    seen = set()
+    for node_id, contents in documents:
+        seen.add(node_id)
+        yield entry(node_id, contents)
+    for node_id, contents in g.nodes(data=True):
+        if node_id not in seen:
+            yield entry(node_id, contents)
+
+
+def _edge_entries(g: nx.DiGraph) -> Iterator[EdgeEntry]:
+    for source, target, data in g.edges(data=True):
+        yield EdgeEntry(source=str(source), target=str(target), contents=data)
+
+
+def _graph_body(
+    g: nx.DiGraph,
+    documents: Documents,
+    label: Callable[[dict], str],
+    size: Callable[[dict], float] = _default_size,
+) -> bytes:
+    """Lay out a graph and encode it as the JSON response body."""
+    layout = graph_layout(g)
+    graph = {
+        "nodes": [
+            vars(node) for node in _node_entries(g, layout, documents, label, size)
+        ],
+        "edges": [vars(edge) for edge in _edge_entries(g)],
+    }
+    return MongoEncoder().encode(graph).encode()
+
+
+def _ndjson_lines(
+    g: nx.DiGraph,
+    layout: dict,
+    documents: Documents,
+    label: Callable[[dict], str],
+    size: Callable[[dict], float] = _default_size,
+) -> Iterator[str]:
+    """Encode a laid out graph as newline-delimited JSON, one node or edge per line, nodes first. Lines are sent in chunks as the node documents are read."""
+    encoder = MongoEncoder()
+    chunk = []
+
+    def items():
+        for node in _node_entries(g, layout, documents, label, size):
+            yield {"type": "node", **vars(node)}
+        for edge in _edge_entries(g):
+            yield {"type": "edge", **vars(edge)}
+
+    for item in items():
+        chunk.append(encoder.encode(item))
+        if len(chunk) == NDJSON_LINES_PER_CHUNK:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if len(chunk) > 0:
+        yield "\n".join(chunk) + "\n"
+
+
+### Responses
+def _wants_ndjson() -> bool:
+    return (
+        request.args.get("format") == "ndjson"
+        or request.accept_mimetypes.best == NDJSON_MIMETYPE
+    )
+
+
+def _not_modified(etag: str, last_modified) -> bool:
+    """Whether the client's copy (from a conditional GET) is current."""
+    if request.method != "GET":
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return request.if_modified_since >= _http_date(last_modified)
+    return False
+
+
+def _http_date(value):
+    # updated_at is a naive local time, HTTP dates are in UTC with 1 second precision
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _with_validators(response: Response, etag: str, last_modified) -> Response:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.cache_control.no_cache = True  # always revalidate, it's cheap
+    response.vary.add("Accept")
+    return response
+
+
+def _pending() -> Response:
+    response = Response(
+        json.dumps({"status": "pending"}),
+        status=202,
+        mimetype="application/json",
+    )
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def _graph_response(
+    kind: str,
+    entries: List[dict],
+    topology: Callable[[], nx.DiGraph],
+    documents: Callable[[], Documents],
+    label: Callable[[dict], str],
+    size: Callable[[dict], float] = _default_size,
+) -> Response:
+    """Respond with a laid out graph. GET requests support conditional requests (ETag and Last-Modified).
+
+    As JSON (the default), the whole response is kept in the layout cache. As NDJSON (``?format=ndjson``, or ``Accept: application/x-ndjson``), only the layout is cached, and the node documents are streamed from the database as the response is written, so memory use does not grow with their size.
+
+    With ``?wait=false``, a graph that is not laid out yet is laid out in the background, and 202 Accepted is returned until it is ready.
+    """
+    ndjson = _wants_ndjson()
+    etag, last_modified = graph_version(f"{kind}.ndjson" if ndjson else kind, entries)
+    if _not_modified(etag, last_modified):
+        return _with_validators(Response(status=304), etag, last_modified)
+
+    wait = request.args.get("wait", "true").lower() not in ["false", "0", "no"]
+    timeout = None if wait else 0
+    if not ndjson:
+        entry: Optional[CachedLayout] = layout_cache.get_or_compute(
+            etag,
+            last_modified,
+            lambda: _graph_body(topology(), documents(), label, size),
+            timeout=timeout,
+        )
+        if entry is None:
+            return _pending()
+        response = Response(entry.body, mimetype="application/json")
+        return _with_validators(response, etag, last_modified)
+
+    g = topology()
+
+    def compute_layout() -> bytes:
+        layout = graph_layout(g)
+        return json.dumps(
+            [[str(node_id), float(x), float(y)] for node_id, (x, y) in layout.items()]
+        ).encode()
+
+    entry = layout_cache.get_or_compute(
+        etag, last_modified, compute_layout, timeout=timeout
+    )
+    if entry is None:
+        return _pending()
+    positions = {node_id: (x, y) for node_id, x, y in json.loads(entry.body)}
+    layout = {node_id: positions[str(node_id)] for node_id in g.nodes}
+    response = Response(
+        _ndjson_lines(g, layout, documents(), label, size), mimetype=NDJSON_MIMETYPE
+    )
+    return _with_validators(response, etag, last_modified)
+
+
+def _parse_ids(ids: List[str]) -> List[ObjectId]:
+    try:
+        return [ObjectId(id) for id in ids]
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid sample ids: {ids}")
+
+
+def _node_fingerprints(nodes_by_type: Dict[str, List[ObjectId]]) -> List[dict]:
+    fingerprints = []
+    for node_type, ids in nodes_by_type.items():
+        if len(ids) == 0:
+            continue
+        view = node_views[node_type.lower()]
+        fingerprints.extend(
+            view._collection.find({"_id": {"$in": ids}}, FINGERPRINT_FIELDS)
+        )
+    return fingerprints
+
+
 ### API
 graph_bp = Blueprint("/graph", __name__, url_prefix="/api/graph")
 
@@ -54,89 +302,262 @@ graph_bp = Blueprint("/graph", __name__, url_prefix="/api/graph")
 @graph_bp.route("/complete", methods=["GET"])
 def get_complete_graph() -> Graph:
     """
-    Get the summary of all samples
+    Get the graph of every node. Larger graphs than `COMPLETE_GRAPH_MAX_NODES` are refused, browse them with the level-of-detail endpoint (`/lod`) instead.
     """
+    num_nodes = sum(
+        view._collection.estimated_document_count() for view in node_views.values()
+    )
+    if num_nodes > COMPLETE_GRAPH_MAX_NODES:
+        return {
+            "status": "error",
+            "errors": f"The lab graph has {num_nodes} nodes, more than can be drawn at once ({COMPLETE_GRAPH_MAX_NODES}). Use /api/graph/lod to browse it by groups of nodes.",
+        }, 422
+
+    node_ids = {}
+    fingerprints = []
+    for node_type, view in node_views.items():
+        node_ids[node_type] = []
+        for entry in view._collection.find({}, FINGERPRINT_FIELDS):
+            node_ids[node_type].append(entry["_id"])
+            fingerprints.append(entry)
+
+    return _graph_response(
+        "complete",
+        fingerprints,
+        topology=lambda: _complete_graph_topology(node_ids),
+        documents=lambda: _complete_graph_documents(node_ids),
+        label=lambda node: node.get("name", "oops"),
+    )
+
+
+def _add_count(g: nx.DiGraph, source, target, count: int):
+    if g.has_edge(source, target):
+        g[source][target]["count"] += count
+    else:
+        g.add_edge(source, target, count=count)
+
+
+def _lod_graph(
+    overview: Overview, max_groups: int, expand: List[str], max_nodes: int
+) -> nx.DiGraph:
+    """The largest groups of the overview as super-nodes, with the `expand` groups replaced by their nodes. Edges carry the number of edges they stand for."""
+    grouping = overview.grouping
+    shown = overview.nodes[:max_groups]
+    hidden = overview.nodes[max_groups:]
+    visible = {node.id for node in shown}
+    other = f"{grouping}:other"
+
+    def visible_id(id: str) -> str:
+        return id if id in visible else other
 
     g = nx.DiGraph()
+    for node in shown:
+        if node.id not in expand:
+            g.add_node(node.id, kind="group", **asdict(node))
+    if len(hidden) > 0:
+        node_counts = {}
+        for node in hidden:
+            for node_type, count in node.node_counts.items():
+                node_counts[node_type] = node_counts.get(node_type, 0) + count
+        g.add_node(
+            other,
+            kind="group",
+            id=other,
+            label=f"{len(hidden)} smaller groups",
+            size=sum(node.size for node in hidden),
+            internal_edges=sum(node.internal_edges for node in hidden),
+            node_counts=node_counts,
+        )
+    for edge in overview.edges:
+        source, target = visible_id(edge.source), visible_id(edge.target)
+        if source in expand or target in expand:
+            continue
+        if source == target:
+            g.nodes[other]["internal_edges"] += edge.count
+        else:
+            _add_count(g, source, target, edge.count)
 
-    for node_type, view in node_views.items():
-        i = 0
-        for node in view._collection.find():
-            upstream = node.pop("upstream")
-            downstream = node.pop("downstream")
-            g.add_node(node["_id"], type=node_type, **node)
-            for u in upstream:
-                g.add_edge(u["node_id"], node["_id"])
-            for d in downstream:
-                g.add_edge(node["_id"], d["node_id"])
-
-            i += 1
-            if i > 100:
-                break
-
-    layout = graphviz_layout(g, prog="dot")
-
-    nodes = []
-    edges = []
-
-    for node_id, node in g.nodes(data=True):
-        nodes.append(
-            NodeEntry(
-                _id=str(node_id),
-                x=layout[node_id][0],
-                y=layout[node_id][1],
-                label=node.get("name", "oops"),
-                size=10,
-                contents=node,
-            )
+    # expanded groups
+    sizes = {node.id: node.size for node in shown}
+    member_groups: Dict[ObjectId, str] = {}
+    members_by_type: Dict[str, List[ObjectId]] = {}
+    for id in expand:
+        members, truncated = group_members(
+            grouping, parse_super_node_id(id)[1], max_nodes
         )
-    for source, target, data in g.edges(data=True):
-        edges.append(
-            EdgeEntry(
-                source=str(source),
-                target=str(target),
-                contents=data,
+        for node_type, ids in members.items():
+            members_by_type.setdefault(node_type, []).extend(ids)
+            member_groups.update({node_id: id for node_id in ids})
+        if truncated:
+            remaining = sizes[id] - sum(len(ids) for ids in members.values())
+            g.add_node(
+                f"{id}:more",
+                kind="more",
+                group=id,
+                label=f"{remaining} more nodes",
+                size=remaining,
             )
-        )
-    gdict = asdict(Graph(nodes, edges))
-    return json.loads(MongoEncoder().encode(gdict))
 
+    # Edges are read from upstream lists only: the downstream list of a node is not updated when a later Sample builds on it.
+    edges = set()
+    neighbors_by_type: Dict[str, List[ObjectId]] = {}
+    member_refs = [
+        {"node_type": node_type, "node_id": node_id}
+        for node_type, ids in members_by_type.items()
+        for node_id in ids
+    ]
+    for node_type, ids in members_by_type.items():
+        view = node_views[node_type.lower()]
+        for node in view._collection.find(
+            {"_id": {"$in": ids}}, {"name": 1, "upstream": 1}
+        ):
+            g.add_node(
+                node["_id"],
+                kind="node",
+                type=node_type,
+                label=node["name"],
+                group=member_groups[node["_id"]],
+            )
+            for u in node["upstream"]:
+                edges.add((u["node_id"], node["_id"]))
+                if u["node_id"] not in member_groups:
+                    neighbors_by_type.setdefault(u["node_type"], []).append(
+                        u["node_id"]
+                    )
+    if len(member_refs) > 0:
+        # downstream neighbours: the nodes with a member in their upstream list
+        for node_type in NODE_TYPES:
+            view = node_views[node_type.lower()]
+            for node in view._collection.find(
+                {"upstream": {"$in": member_refs}}, {"upstream": 1}
+            ):
+                for u in node["upstream"]:
+                    if u["node_id"] in member_groups:
+                        edges.add((u["node_id"], node["_id"]))
+                if node["_id"] not in member_groups:
+                    neighbors_by_type.setdefault(node_type, []).append(node["_id"])
 
-@graph_bp.route("/samples", methods=["POST"])
-def get_samples_graph() -> Graph:
-    content = request.get_json(force=True)
-    print(content)
-    sample_ids = content["sample_ids"]
+    # edges to nodes outside of the expanded groups go to the group of those nodes
+    groups = groups_of(grouping, neighbors_by_type)
+    for source, target in edges:
+        if source in member_groups and target in member_groups:
+            _add_count(g, source, target, 1)
+            continue
+        neighbor = target if source in member_groups else source
+        for group in groups.get(neighbor, []):
+            group = visible_id(group)
+            if group in expand or group not in g:
+                continue  # a node left out of a large expanded group
+            if neighbor == source:
+                _add_count(g, group, target, 1)
+            else:
+                _add_count(g, source, group, 1)
+    return g
 
-    g = nx.DiGraph()
 
-    for sample_id in sample_ids:
-        sample = sample_view.get(ObjectId(sample_id))
-        g = nx.compose(g, sample.graph)
+def _lod_size(node: dict) -> float:
+    # groups grow with the log of their number of nodes
+    return 10 * (1 + math.log10(max(node.get("size", 1), 1)))
 
-    layout = graphviz_layout(g, prog="dot")
 
-    nodes = []
-    edges = []
+def _int_arg(name: str, default: int, maximum: int) -> int:
+    value = int(request.args.get(name, default))
+    if value < 1 or value > maximum:
+        raise ValueError(f"{name} must be between 1 and {maximum}")
+    return value
 
-    for node_id, node in g.nodes(data=True):
-        nodes.append(
-            NodeEntry(
-                _id=str(node_id),
-                x=layout[node_id][0],
-                y=layout[node_id][1],
-                label=node["name"],
-                size=10,
-                contents=node,
-            )
-        )
-    for source, target, data in g.edges(data=True):
-        edges.append(
-            EdgeEntry(
-                source=str(source),
-                target=str(target),
-                contents=data,
-            )
+
+@graph_bp.route("/lod", methods=["GET"])
+def get_lod_graph() -> Graph:
+    """
+    Get the lab graph at a level of detail that can be drawn however large the lab graph is. Nodes are grouped into super-nodes, with edges that carry the number of edges between the groups. Only the largest groups are shown, the others are merged into one. Groups can be expanded into their nodes.
+
+    Query parameters:
+        group_by: "sample" (default), "actor" or "type"
+        max_groups: number of groups shown (default 200)
+        expand: id of a super-node to show the nodes of. Can be given multiple times.
+        max_nodes: maximum number of nodes shown per expanded group (default 500)
+    """
+    try:
+        grouping = request.args.get("group_by", "sample")
+        if grouping not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {GROUPINGS}")
+        max_groups = _int_arg("max_groups", LOD_MAX_GROUPS, 1000)
+        max_nodes = _int_arg("max_nodes", LOD_MAX_EXPANDED_NODES, 5000)
+        expand = sorted(set(request.args.getlist("expand")))
+        for id in expand:
+            if parse_super_node_id(id)[0] != grouping:
+                raise ValueError(f"Cannot expand {id} when grouping by {grouping}")
+    except ValueError as exception:
+        return {"status": "error", "errors": exception.args[0]}, 400
+
+    fingerprints = database_fingerprints()
+    overview = get_overview(grouping, fingerprints)
+    visible = {node.id for node in overview.nodes[:max_groups]}
+    missing = [id for id in expand if id not in visible]
+    if len(missing) > 0:
+        return {
+            "status": "error",
+            "errors": f"No group {', '.join(missing)} among the {max_groups} largest groups",
+        }, 404
+
+    return _graph_response(
+        f"lod.{grouping}.{max_groups}.{max_nodes}.{','.join(expand)}",
+        fingerprints,
+        topology=lambda: _lod_graph(overview, max_groups, expand, max_nodes),
+        documents=lambda: [],
+        label=lambda node: node["label"],
+        size=_lod_size,
+    )
+
+
+def _samples_graph(sample_ids: List[ObjectId]) -> Response:
+    entries = list(
+        sample_view._collection.find(
+            {"_id": {"$in": sample_ids}}, {**FINGERPRINT_FIELDS, "nodes": 1}
         )
-    gdict = asdict(Graph(nodes, edges))
-    return json.loads(MongoEncoder().encode(gdict))
+    )
+    missing = set(sample_ids) - {entry["_id"] for entry in entries}
+    if len(missing) > 0:
+        return {
+            "status": "error",
+            "errors": f"No sample found with id(s) {', '.join(str(id) for id in missing)}",
+        }, 404
+
+    # the samples and every node in them, so that edits to nodes give a new version too
+    nodes_by_type: Dict[str, List[ObjectId]] = {}
+    for entry in entries:
+        for node_type, ids in entry.pop("nodes").items():
+            nodes_by_type.setdefault(node_type, []).extend(ids)
+    fingerprints = entries + _node_fingerprints(nodes_by_type)
+
+    # the contents of sample graph nodes are small, they are part of the topology
+    return _graph_response(
+        "samples",
+        fingerprints,
+        topology=lambda: sample_view.get_graph_of_nodes(nodes_by_type),
+        documents=lambda: [],
+        label=lambda node: node["name"],
+    )
+
+
+@graph_bp.route("/samples", methods=["GET"])
+def get_samples_graph_cached() -> Graph:
+    """
+    Get the graph of some samples, given as ``?ids=<id>,<id>,...``. Unlike the POST version, this supports conditional requests.
+    """
+    try:
+        sample_ids = _parse_ids(request.args.get("ids", "").split(","))
+    except ValueError as exception:
+        return {"status": "error", "errors": exception.args[0]}, 400
+    return _samples_graph(sample_ids)
+
+
+@graph_bp.route("/samples", methods=["POST"])
+def get_samples_graph() -> Graph:
+    content = request.get_json(force=True)
+    try:
+        sample_ids = _parse_ids(content["sample_ids"])
+    except ValueError as exception:
+        return {"status": "error", "errors": exception.args[0]}, 400
+    return _samples_graph(sample_ids)
@@ -1,16 +1,147 @@
+import base64
+from datetime import datetime
+import json
+import re
+from typing import List, Optional, Tuple
 from bson import ObjectId
-from flask import Blueprint
+from bson.errors import InvalidId
+from flask import Blueprint, request
+from pymongo.errors import OperationFailure
+from labgraph.utils.indexes import NODE_TYPES
 from labgraph.views import SampleView
 import pymongo
 
 sample_view: SampleView = SampleView()
 sample_bp = Blueprint("/sample", __name__, url_prefix="/api/sample")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SUMMARY_FIELDS = ["name", "description", "tags", "created_at"]
+SUMMARY_SORT = [("created_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+
+def encode_cursor(created_at: datetime, id: ObjectId) -> str:
+    """Opaque cursor pointing after the sample with this (created_at, _id) in the summary order."""
+    position = json.dumps([created_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), ObjectId(id)
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _summary_filter(
+    tags: List[str], name_prefix: Optional[str], after: Optional[Tuple]
+) -> dict:
+    filter = {}
+    if len(tags) > 0:
+        filter["tags"] = {"$all": tags}
+    if name_prefix:
+        # an anchored, case-sensitive prefix can use the name index
+        filter["name"] = {"$regex": "^" + re.escape(name_prefix)}
+    if after is not None:
+        created_at, id = after
+        filter["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": id}},
+        ]
+    return filter
+
+
+def _summary_entries(filter: dict, limit: int) -> List[dict]:
+    """Summary entries of the samples matching a filter, in summary order, with the number of nodes of each type instead of their ids. The counts are computed by the database when it supports aggregation pipelines."""
+    try:
+        return list(
+            sample_view._collection.aggregate(
+                [
+                    {"$match": filter},
+                    {"$sort": dict(SUMMARY_SORT)},
+                    {"$limit": limit},
+                    {
+                        "$project": {
+                            **{field: 1 for field in SUMMARY_FIELDS},
+                            "node_counts": {
+                                node_type: {
+                                    "$size": {"$ifNull": [f"$nodes.{node_type}", []]}
+                                }
+                                for node_type in NODE_TYPES
+                            },
+                        }
+                    },
+                ]
+            )
+        )
+    except OperationFailure:
+        pass  # storage backend without aggregation, count the node ids here instead
+
+    entries = []
+    for entry in sample_view._collection.find(
+        filter,
+        projection=SUMMARY_FIELDS + ["nodes"],
+        sort=SUMMARY_SORT,
+        limit=limit,
+    ):
+        nodes = entry.pop("nodes")
+        entry["node_counts"] = {
+            node_type: len(nodes.get(node_type, [])) for node_type in NODE_TYPES
+        }
+        entries.append(entry)
+    return entries
+
+
+@sample_bp.route("/summary", methods=["GET"])
+def get_sample_summary_page():
+    """
+    Get a page of the sample summary, in reverse chronological order. Nodes are given as the number of nodes of each type.
+
+    Query parameters:
+        limit: page size (default 50, at most 500)
+        cursor: the "next_cursor" of the previous page
+        tag: only samples with this tag. Can be given multiple times, samples must have every tag.
+        name: only samples whose name starts with this prefix
+    """
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        cursor = request.args.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as exception:
+        return {"status": "error", "errors": exception.args[0]}, 400
+
+    filter = _summary_filter(
+        tags=request.args.getlist("tag"),
+        name_prefix=request.args.get("name"),
+        after=after,
+    )
+    # one extra entry tells us whether there is a next page
+    entries = _summary_entries(filter, limit + 1)
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1]["created_at"], entries[-1]["_id"])
+
+    for entry in entries:
+        entry["_id"] = str(entry["_id"])
+    return {"samples": entries, "next_cursor": next_cursor}
+
+
+@sample_bp.route("/tags", methods=["GET"])
+def get_sample_tags():
+    """
+    Get every tag used by a sample, sorted, to filter the sample summary with.
+    """
+    return sorted(sample_view._collection.distinct("tags"))
+
 
 @sample_bp.route("/summary/<count>", methods=["GET"])
 def get_sample_summary(count: int):
     """
-    Get the summary of the "count" most recent samples. if count==0, returns all samples. samples are returned in reverse chronological order.
+    Get the summary of the "count" most recent samples. if count==0, returns all samples. samples are returned in reverse chronological order. Prefer the paginated `/summary` endpoint, which does not send the id of every node.
     """
     samples = []
     count = int(count)
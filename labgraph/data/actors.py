@@ -3,6 +3,8 @@ import datetime
 from typing import Any, Dict, List
 from bson import BSON, ObjectId
 
+from labgraph.utils.instrumentation import instrumented
+
 
 class BaseActor:
     def __init__(
@@ -62,6 +64,7 @@ class BaseActor:
         return d
 
     @classmethod
+    @instrumented
     def from_dict(cls, entry: Dict[str, Any]):
         _id = entry.pop("_id", None)
         entry.pop("created_at", None)
@@ -0,0 +1,181 @@
+"""
+Lazy references to nodes and actors. When a node is built from its database entry, the nodes and actor it points to (ie the Materials used as ingredients by an Action) are not retrieved right away. Instead, a `LazyReference` stands in for each of them, and the referenced entry is only retrieved the first time one of its attributes is used.
+
+A `LazyReference` passes ``isinstance`` checks for the class it stands in for, and answers ``id``, ``labgraph_node_type``, equality and hashing without touching the database. Copying or pickling a `LazyReference` gives another reference to the same entry, which is only retrieved if the original was.
+
+Use `labgraph.views.hydration.resolve_pending_references` to retrieve every reference that has not been used yet in a handful of queries, rather than one query per reference.
+"""
+
+import builtins
+import weakref
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+# unresolved references, keyed by object id. Entries are dropped once the reference is resolved or garbage collected.
+_PENDING: Dict[int, "weakref.ref[LazyReference]"] = {}
+
+
+def _entry_classes() -> dict:
+    from labgraph.data.actors import Actor
+    from labgraph.data.nodes import Action, Analysis, Material, Measurement
+
+    return {
+        "Material": Material,
+        "Action": Action,
+        "Measurement": Measurement,
+        "Analysis": Analysis,
+        "Actor": Actor,
+    }
+
+
+class LazyReference:
+    """Stand-in for a node or actor that has not been retrieved from the database yet. The entry is retrieved the first time any attribute other than `id`, `labgraph_node_type`, or `__class__` is accessed, and all further attribute access is passed on to it."""
+
+    __slots__ = ("_lazy_entry_type", "_lazy_id", "_lazy_target", "__weakref__")
+
+    def __init__(self, entry_type: str, id: ObjectId):
+        """
+        Args:
+            entry_type (str): Type of the referenced entry (Material, Action, Measurement, Analysis, or Actor)
+            id (ObjectId): id of the referenced entry
+
+        Raises:
+            ValueError: Invalid entry type
+        """
+        if entry_type not in _entry_classes():
+            raise ValueError(
+                f"Invalid entry type: {entry_type}. Must be one of {list(_entry_classes())}"
+            )
+        object.__setattr__(self, "_lazy_entry_type", entry_type)
+        object.__setattr__(self, "_lazy_id", id)
+        object.__setattr__(self, "_lazy_target", None)
+        key = builtins.id(self)
+        _PENDING[key] = weakref.ref(self, lambda _: _PENDING.pop(key, None))
+
+    # answered without retrieving the entry
+    @property
+    def __class__(self):
+        return _entry_classes()[self._lazy_entry_type]
+
+    @property
+    def id(self) -> ObjectId:
+        return self._lazy_id
+
+    @property
+    def _id(self) -> ObjectId:
+        return self._lazy_id
+
+    @property
+    def labgraph_node_type(self) -> str:
+        return self._lazy_entry_type
+
+    @property
+    def is_resolved(self) -> bool:
+        """Whether the referenced entry has been retrieved yet."""
+        return self._lazy_target is not None
+
+    def _set_target(self, target: Any):
+        object.__setattr__(self, "_lazy_target", target)
+        _PENDING.pop(builtins.id(self), None)
+
+    def _resolve(self) -> Any:
+        """Retrieve the referenced entry, if it has not been retrieved yet.
+
+        Returns:
+            Any: The node or actor object
+        """
+        if self._lazy_target is None:
+            from labgraph.views import get_view_by_type
+
+            self._set_target(get_view_by_type(self._lazy_entry_type).get(self._lazy_id))
+        return self._lazy_target
+
+    def __getattr__(self, name: str):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._resolve(), name, value)
+
+    def __getitem__(self, key: str):
+        return self._resolve()[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self._resolve()[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._resolve().keys()
+
+    def __iter__(self):
+        return iter(self._resolve().keys())
+
+    # copies and pickles stay references to the same entry, carrying along the target only if it was already retrieved
+    def __reduce_ex__(self, protocol):
+        return (
+            _restore_reference,
+            (self._lazy_entry_type, self._lazy_id, self._lazy_target),
+        )
+
+    def __copy__(self):
+        return _restore_reference(
+            self._lazy_entry_type, self._lazy_id, self._lazy_target
+        )
+
+    def __deepcopy__(self, memo: dict):
+        from copy import deepcopy
+
+        return _restore_reference(
+            self._lazy_entry_type, self._lazy_id, deepcopy(self._lazy_target, memo)
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+        return other.id == self.id
+
+    def __hash__(self):
+        return hash(self._lazy_id)
+
+    def __repr__(self):
+        if self._lazy_target is not None:
+            return repr(self._lazy_target)
+        return f"<{self._lazy_entry_type}: (not retrieved) {self._lazy_id}>"
+
+
+def _restore_reference(entry_type: str, id: ObjectId, target: Any) -> LazyReference:
+    proxy = LazyReference(entry_type, id)
+    if target is not None:
+        proxy._set_target(target)
+    return proxy
+
+
+def reference(
+    resolved: Optional[Dict[ObjectId, Any]], entry_type: str, id: ObjectId
+) -> Any:
+    """Get an already-retrieved object if it is available, or a lazy reference to it otherwise.
+
+    Args:
+        resolved (Optional[Dict[ObjectId, Any]]): Already-retrieved objects keyed by id (see `labgraph.views.hydration`). Can be None.
+        entry_type (str): Type of the referenced entry (Material, Action, Measurement, Analysis, or Actor)
+        id (ObjectId): id of the referenced entry
+
+    Returns:
+        Any: The object, or a `LazyReference` to it
+    """
+    if resolved is not None and id in resolved:
+        return resolved[id]
+    return LazyReference(entry_type, id)
+
+
+def pending_references() -> List[LazyReference]:
+    """All lazy references (that are still in use) whose entries have not been retrieved yet.
+
+    Returns:
+        List[LazyReference]: Unresolved references
+    """
+    pending = []
+    for ref in list(_PENDING.values()):
+        proxy = ref()
+        if proxy is not None and not proxy.is_resolved:
+            pending.append(proxy)
+    return pending
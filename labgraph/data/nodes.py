@@ -1,8 +1,12 @@
 import datetime
+import weakref
 from bson import ObjectId, BSON
-from typing import Any, Dict, List, Optional, Union, Literal
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union, Literal
 
+from labgraph.utils.instrumentation import instrumented
 from .actors import Actor
+from .lazy import reference
 from abc import ABC, abstractmethod
 
 
@@ -10,14 +14,99 @@ class InvalidNodeDefinition(Exception):
     """Something is wrong with the node definition."""
 
 
+class NodeRef(Mapping):
+    """A reference to a node by its type and id. This behaves like the (read-only) dict ``{"node_type": ..., "node_id": ...}`` that is stored in the database, but is smaller and hashable."""
+
+    __slots__ = ("node_type", "node_id")
+    _KEYS = ("node_type", "node_id")
+
+    def __init__(self, node_type: str, node_id: ObjectId):
+        self.node_type = node_type
+        self.node_id = node_id
+
+    @property
+    def key(self) -> Tuple[str, ObjectId]:
+        return (self.node_type, self.node_id)
+
+    def __getitem__(self, key: str):
+        if key == "node_type":
+            return self.node_type
+        if key == "node_id":
+            return self.node_id
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __eq__(self, other):
+        if isinstance(other, NodeRef):
+            return self.key == other.key
+        if isinstance(other, Mapping):
+            return dict(other) == self.to_dict()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"node_type": self.node_type, "node_id": self.node_id}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
 class NodeList(list):
-    """This is used to store lists of nodes. Nodes are stored as dicts with the node type and key. This prevents cascading database calls to retrieve nodes across a graph.
+    """This is used to store lists of nodes. Nodes are stored as references (`NodeRef`) holding the node type and id. These behave like dicts with "node_type" and "node_id" keys, and are serialized as such by `.to_dict()`. This prevents cascading database calls to retrieve nodes across a graph.
 
-    However the user can append node objects directly, and the NodeList will convert them to dicts. Furthermore, users can retrieve the node objects with the .get() method.
+    However the user can append node objects directly, and the NodeList will convert them to references. Furthermore, users can retrieve the node objects with the .get() method.
+
+    Each node can only appear once. A set of (node_type, node_id) keys is kept alongside the list, so appending and membership checks take constant time.
+
+    A NodeList holding the upstream or downstream edges of a node reports changes back to that node, so that Samples containing the node can keep their graphs up to date.
     """
 
+    _owner: Optional["BaseNode"] = None
+    _direction: Optional[Literal["upstream", "downstream"]] = None
+
+    def __init__(self, values: Iterable[Union["BaseNode", Mapping]] = ()):
+        super().__init__()
+        self._keys: Set[Tuple[str, ObjectId]] = set()
+        for value in values:
+            self.append(value)
+
+    def _bind(
+        self, owner: "BaseNode", direction: Literal["upstream", "downstream"]
+    ) -> "NodeList":
+        self._owner = owner
+        self._direction = direction
+        return self
+
+    def _edges_reset(self):
+        self._keys = {entry.key for entry in self}
+        if self._owner is not None:
+            self._owner._notify_graph_listeners("_on_edges_reset")
+
+    @staticmethod
+    def _to_ref(value: Union["BaseNode", Mapping]) -> NodeRef:
+        if isinstance(value, NodeRef):
+            return value
+        if isinstance(value, BaseNode):
+            return NodeRef(value.__class__.__name__, value._id)
+        if isinstance(value, Mapping):
+            if not all([k in value for k in ["node_type", "node_id"]]):
+                raise ValueError(
+                    "Invalid node entry. Dicts appended to NodeList must have keys 'node_type' and 'node_id'"
+                )
+            return NodeRef(value["node_type"], value["node_id"])
+        raise ValueError(
+            "Invalid node entry. NodeList can only contain BaseNode instances or dicts with keys 'node_type' and 'node_id'"
+        )
+
     def append(self, value: Union["BaseNode", Dict[str, Any]]):
-        """Append a node to the NodeList
+        """Append a node to the NodeList. Nodes that are already in the NodeList are ignored.
 
         Args:
             value (Union[BaseNode, Dict[str, Any]]): Either a Node instance (Material, Measurement, Analysis, Action) or a dict with keys 'node_type' and 'node_id'. If a dict is passed, it must have the correct keys. (This is to prevent accidental appending of dicts that are not nodes.
@@ -25,27 +114,75 @@ class NodeList(list):
         Raises:
             ValueError: Invalid node entry/dict.
         """
-        if isinstance(value, BaseNode):
-            value = {
-                "node_type": value.__class__.__name__,
-                "node_id": value._id,
-            }
-        if isinstance(value, dict):
-            if not all([k in value for k in ["node_type", "node_id"]]):
-                raise ValueError(
-                    "Invalid node entry. Dicts appended to NodeList must have keys 'node_type' and 'node_id'"
-                )
-            entry = {
-                "node_type": value["node_type"],
-                "node_id": value["node_id"],
-            }
-            if entry not in self:
-                super().append(entry)
-        else:
-            raise ValueError(
-                "Invalid node entry. NodeList can only contain BaseNode instances or dicts with keys 'node_type' and 'node_id'"
+        entry = self._to_ref(value)
+        if entry.key in self._keys:
+            return
+        super().append(entry)
+        self._keys.add(entry.key)
+        if self._owner is not None:
+            self._owner._notify_graph_listeners(
+                "_on_edge_added", self._direction, entry
             )
 
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __contains__(self, value) -> bool:
+        try:
+            return self._to_ref(value).key in self._keys
+        except ValueError:
+            return False
+
+    # anything that removes or replaces edges invalidates the graphs built from them
+    def insert(self, index, value):
+        entry = self._to_ref(value)
+        if entry.key in self._keys:
+            return
+        super().insert(index, entry)
+        self._edges_reset()
+
+    def remove(self, value):
+        super().remove(self._to_ref(value))
+        self._edges_reset()
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        self._edges_reset()
+        return value
+
+    def clear(self):
+        super().clear()
+        self._edges_reset()
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self._to_ref(v) for v in value]
+        else:
+            value = self._to_ref(value)
+        super().__setitem__(index, value)
+        self._edges_reset()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._edges_reset()
+
+    def __reduce__(self):
+        # copies/pickles are plain, unbound NodeLists. The node that owns them binds them again, see `BaseNode.__setstate__`
+        return (self.__class__, (self.to_dict(),))
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        """The NodeList as it is stored in the database.
+
+        Returns:
+            List[Dict[str, Any]]: List of {"node_type": ..., "node_id": ...} dicts
+        """
+        return [entry.to_dict() for entry in self]
+
     def get(self, index: Optional[int] = None) -> Union["BaseNode", List["BaseNode"]]:
         """Get a node object from the NodeList. If an index is passed, the node at that index is returned. If no index is passed, a list of all nodes is returned.
 
@@ -98,6 +235,7 @@ class BaseNode(ABC):
     ):
         self.name = name
         self._id = ObjectId()
+        self._graph_listeners: Dict[int, weakref.ref] = {}
         self.upstream = NodeList()
         self.downstream = NodeList()
         for us in upstream or []:
@@ -126,23 +264,72 @@ class BaseNode(ABC):
 
         self.__labgraph_node_type = labgraph_node_type
 
+    @property
+    def upstream(self) -> NodeList:
+        return self._upstream
+
+    @upstream.setter
+    def upstream(self, value: List[Dict[str, ObjectId]]):
+        upstream = NodeList()
+        for us in value:
+            upstream.append(us)
+        self._upstream = upstream._bind(self, "upstream")
+        self._notify_graph_listeners("_on_edges_reset")
+
+    @property
+    def downstream(self) -> NodeList:
+        return self._downstream
+
+    @downstream.setter
+    def downstream(self, value: List[Dict[str, ObjectId]]):
+        downstream = NodeList()
+        for ds in value:
+            downstream.append(ds)
+        self._downstream = downstream._bind(self, "downstream")
+        self._notify_graph_listeners("_on_edges_reset")
+
+    def __getstate__(self) -> dict:
+        # listeners are weak references, which cannot be pickled. Copies start without any, Samples register again when they are copied (see `Sample.__setstate__`)
+        state = self.__dict__.copy()
+        del state["_graph_listeners"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._graph_listeners = {}
+        # new lists, so that a shallow copy does not take the edges of the original node
+        self._upstream = NodeList(self._upstream)._bind(self, "upstream")
+        self._downstream = NodeList(self._downstream)._bind(self, "downstream")
+
+    def _add_graph_listener(self, listener: Any):
+        """Register an object (ie a Sample) to be notified when the edges of this node change. Listeners are held by weak reference.
+
+        Args:
+            listener (Any): Object with `_on_edge_added(node, direction, entry)` and `_on_edges_reset(node)` methods.
+        """
+        self._graph_listeners[id(listener)] = weakref.ref(listener)
+
+    def _remove_graph_listener(self, listener: Any):
+        self._graph_listeners.pop(id(listener), None)
+
+    def _notify_graph_listeners(self, method: str, *args):
+        for key, ref in list(self._graph_listeners.items()):
+            listener = ref()
+            if listener is None:
+                del self._graph_listeners[key]
+                continue
+            getattr(listener, method)(self, *args)
+
     def add_upstream(self, upstream: "BaseNode"):
         if not isinstance(upstream, BaseNode):
             raise TypeError("Upstream nodes must be a BaseObject")
 
-        new_entry = {"node_type": upstream.labgraph_node_type, "node_id": upstream._id}
-        if new_entry not in self.upstream:
-            self.upstream.append(new_entry)
+        self.upstream.append(upstream)  # ignored if already present
 
     def add_downstream(self, downstream: "BaseNode"):
         if not isinstance(downstream, BaseNode):
             raise TypeError("Upstream nodes must be a BaseObject")
-        new_entry = {
-            "node_type": downstream.labgraph_node_type,
-            "node_id": downstream._id,
-        }
-        if new_entry not in self.downstream:
-            self.downstream.append(new_entry)
+        self.downstream.append(downstream)  # ignored if already present
 
     def to_dict(self):
         # hidden_property_mangle_prefix = r"_\w*__\w*"  # matches __property mangle prefix
@@ -152,6 +339,8 @@ class BaseNode(ABC):
             # if not re.match(hidden_property_mangle_prefix, k)
             if not k.startswith("_")
         }  # dont include underscored class attributes
+        full_dict["upstream"] = self.upstream.to_dict()
+        full_dict["downstream"] = self.downstream.to_dict()
 
         # full_dict.pop("_version_history", None)
         # contents = full_dict.pop("_contents", {})
@@ -184,7 +373,9 @@ class BaseNode(ABC):
 
     @classmethod
     @abstractmethod
-    def from_dict(cls, d: Dict[str, Any]):
+    def from_dict(
+        cls, d: Dict[str, Any], _resolved: Optional[Dict[ObjectId, Any]] = None
+    ):
         raise NotImplementedError
 
     def is_valid_for_mongodb(self) -> bool:
@@ -210,7 +401,10 @@ class BaseNode(ABC):
         return self._id
 
     @property
-    def version_history(self):
+    def version_history(self) -> List[dict]:
+        """Previous versions of this node in the database, oldest first. These are loaded from the database the first time they are accessed."""
+        if self._version_history is None:
+            self._version_history = self.__get_view()._load_version_history(self.id)
         return self._version_history
 
     @property
@@ -218,7 +412,7 @@ class BaseNode(ABC):
         return self.__labgraph_node_type
 
     def __hash__(self):
-        return hash(self.name + str(self.id))
+        return hash(self.id)
 
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
@@ -396,9 +590,15 @@ class Material(BaseNode):
                 )
 
     @classmethod
-    def from_dict(cls, entry: dict) -> "Material":
+    @instrumented
+    def from_dict(
+        cls, entry: dict, _resolved: Optional[Dict[ObjectId, Any]] = None
+    ) -> "Material":
         _id = entry.pop("_id", None)
-        version_history = entry.pop("version_history", [])
+        version_history = entry.pop(
+            "version_history", None
+        )  # only present on entries that predate the history collection
+        entry.pop("version", None)
         created_at = entry.pop("created_at", None)
         updated_at = entry.pop("updated_at", None)
         contents = entry.pop("contents", {})
@@ -627,15 +827,14 @@ class Action(BaseNode):
         return d
 
     @classmethod
-    def from_dict(cls, entry: dict) -> "Action":
-        from labgraph.views import ActorView
-        from labgraph.views import MaterialView
-
-        mv = MaterialView()
-        actor = ActorView().get(id=entry.pop("actor_id"))
+    @instrumented
+    def from_dict(
+        cls, entry: dict, _resolved: Optional[Dict[ObjectId, Any]] = None
+    ) -> "Action":
+        actor = reference(_resolved, "Actor", entry.pop("actor_id"))
         ingredients = [
             Ingredient(
-                material=mv.get(id=ing["material_id"]),
+                material=reference(_resolved, "Material", ing["material_id"]),
                 amount=ing["amount"],
                 unit=ing["unit"],
                 name=ing["name"],
@@ -643,16 +842,21 @@ class Action(BaseNode):
             for ing in entry.pop("ingredients")
         ]
         _id = entry.pop("_id", None)
-        version_history = entry.pop("version_history", [])
+        version_history = entry.pop(
+            "version_history", None
+        )  # only present on entries that predate the history collection
+        entry.pop("version", None)
         created_at = entry.pop("created_at", None)
         updated_at = entry.pop("updated_at", None)
         upstream = entry.pop("upstream")
         downstream = entry.pop("downstream")
         contents = entry.pop("contents", {})
-        generated_materials = [mv.get(id=ds["node_id"]) for ds in downstream]
+        generated_materials = [
+            reference(_resolved, "Material", ds["node_id"])
+            for ds in downstream
+            if ds["node_type"] == "Material"
+        ]
         obj = cls(
-            ingredients=ingredients,
-            generated_materials=generated_materials,
             actor=actor,
             **entry,
             **contents,
@@ -663,6 +867,9 @@ class Action(BaseNode):
             obj.upstream.append(us)
         for ds in downstream:
             obj.downstream.append(ds)
+        # the edges are already in the entry, so we don't replay add_ingredient/add_generated_material. That would retrieve every linked Material just to add an edge it already has.
+        obj.ingredients = ingredients
+        obj.__generated_materials = generated_materials
         obj._version_history = version_history
         obj._updated_at = updated_at
         obj._created_at = created_at
@@ -752,24 +959,31 @@ class Measurement(BaseNode):
                 )
 
     @classmethod
-    def from_dict(cls, entry: dict) -> "Measurement":
-        from labgraph.views import ActorView
-        from labgraph.views import MaterialView
-
-        actor = ActorView().get(id=entry.pop("actor_id"))
+    @instrumented
+    def from_dict(
+        cls, entry: dict, _resolved: Optional[Dict[ObjectId, Any]] = None
+    ) -> "Measurement":
+        actor = reference(_resolved, "Actor", entry.pop("actor_id"))
         _id = entry.pop("_id", None)
-        version_history = entry.pop("version_history", [])
+        version_history = entry.pop(
+            "version_history", None
+        )  # only present on entries that predate the history collection
+        entry.pop("version", None)
         created_at = entry.pop("created_at", None)
         updated_at = entry.pop("updated_at", None)
         contents = entry.pop("contents", {})
-        upstream_material_id = entry.pop("upstream")[0][
-            "node_id"
-        ]  # we know each Measurement has exactly one upstream material
+        upstream = entry.pop("upstream")
         downstream = entry.pop("downstream")
-        material = MaterialView().get(id=upstream_material_id)
-        obj = cls(material=material, actor=actor, **entry, **contents)
+        material = reference(
+            _resolved, "Material", upstream[0]["node_id"]
+        )  # we know each Measurement has exactly one upstream material
+        obj = cls(actor=actor, **entry, **contents)
         if _id is not None:
             obj._id = _id
+        # the edges are already in the entry, so we bypass the `material` setter (which would retrieve the Material to add an edge it already has)
+        obj.__material = material
+        for us in upstream:
+            obj.upstream.append(us)
         for ds in downstream:
             obj.downstream.append(ds)
         obj._version_history = version_history
@@ -899,12 +1113,16 @@ class Analysis(BaseNode):
                 )
 
     @classmethod
-    def from_dict(cls, entry: dict) -> "Analysis":
-        from labgraph.views import ActorView, MeasurementView, AnalysisView
-
-        actor = ActorView().get(id=entry.pop("actor_id"))
+    @instrumented
+    def from_dict(
+        cls, entry: dict, _resolved: Optional[Dict[ObjectId, Any]] = None
+    ) -> "Analysis":
+        actor = reference(_resolved, "Actor", entry.pop("actor_id"))
         _id = entry.pop("_id", None)
-        version_history = entry.pop("version_history", [])
+        version_history = entry.pop(
+            "version_history", None
+        )  # only present on entries that predate the history collection
+        entry.pop("version", None)
 
         created_at = entry.pop("created_at", None)
         updated_at = entry.pop("updated_at", None)
@@ -912,21 +1130,17 @@ class Analysis(BaseNode):
         downstream = entry.pop("downstream")
         contents = entry.pop("contents", {})
 
-        mv = MeasurementView()
         measurements = [
-            mv.get(id=meas["node_id"])
+            reference(_resolved, "Measurement", meas["node_id"])
             for meas in upstream
             if meas["node_type"] == "Measurement"
         ]
-        av = AnalysisView()
         upstream_analyses = [
-            av.get(id=ana["node_id"])
+            reference(_resolved, "Analysis", ana["node_id"])
             for ana in upstream
             if ana["node_type"] == "Analysis"
         ]
         obj = cls(
-            measurements=measurements,
-            upstream_analyses=upstream_analyses,
             actor=actor,
             **entry,
             **contents,
@@ -937,6 +1151,9 @@ class Analysis(BaseNode):
             obj.upstream.append(us)
         for ds in downstream:
             obj.downstream.append(ds)
+        # the edges are already in the entry, so we don't replay add_measurement/add_upstream_analysis. That would retrieve every upstream node just to add an edge it already has.
+        obj.__measurements = measurements
+        obj.__upstream_analyses = upstream_analyses
         obj._version_history = version_history
         obj._updated_at = updated_at
         obj._created_at = created_at
@@ -1,4 +1,4 @@
-from typing import Any, List, Union
+from typing import Any, Dict, List, Union
 import networkx as nx
 from bson import ObjectId
 import matplotlib.pyplot as plt
@@ -33,19 +33,84 @@ class Sample:
         self._contents = contents
         self._created_at = None
         self._updated_at = None
+        self._version_history = []
 
         self.description = description or ""
         self.tags = tags or []
-        self.nodes = []
+        self._graph = nx.DiGraph()
+        self._graph_cache = (
+            {}
+        )  # results computed from _graph, cleared whenever the graph changes
+        self._nodes = []
+        self._node_index: Dict[ObjectId, ALLOWED_NODE_TYPE] = {}  # node id -> node
+        self._graph_is_stale = False
         if nodes is not None:
             for node in nodes:
                 # do it this way to type check each node before adding it to this Sample
                 self.add_node(node)
 
+    def __getstate__(self) -> dict:
+        # the graph is rebuilt from the nodes when it is next used
+        state = self.__dict__.copy()
+        state["_graph"] = None
+        state["_graph_cache"] = {}
+        state["_graph_is_stale"] = True
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        for node in self._nodes:
+            node._add_graph_listener(self)
+
     @property
     def id(self):
         return self._id
 
+    @property
+    def nodes(self) -> List[ALLOWED_NODE_TYPE]:
+        return self._nodes
+
+    def has_node(self, node: Union[BaseNode, ObjectId]) -> bool:
+        """Check whether a node is part of this Sample. This is a constant-time lookup.
+
+        Args:
+            node (Union[BaseNode, ObjectId]): Node object, or the id of a node
+
+        Returns:
+            bool: True if the node is in this Sample
+        """
+        node_id = node.id if isinstance(node, BaseNode) else node
+        return node_id in self._node_index
+
+    def get_node(self, node_id: ObjectId) -> ALLOWED_NODE_TYPE:
+        """Get a node in this Sample by its id. This is a constant-time lookup.
+
+        Args:
+            node_id (ObjectId): id of the node
+
+        Raises:
+            KeyError: No node with this id is in this Sample
+
+        Returns:
+            ALLOWED_NODE_TYPE: The node object
+        """
+        return self._node_index[node_id]
+
+    @nodes.setter
+    def nodes(self, nodes: List[ALLOWED_NODE_TYPE]):
+        for node in self._nodes:
+            node._remove_graph_listener(self)
+        self._nodes = []
+        self._node_index = {}
+        for node in nodes:
+            if node.id in self._node_index:
+                continue
+            self._nodes.append(node)
+            self._node_index[node.id] = node
+            node._add_graph_listener(self)
+        self._graph_is_stale = True
+        self._graph_cache = {}
+
     def add_node(self, node: ALLOWED_NODE_TYPE):
         if not any(
             [isinstance(node, x) for x in [Material, Action, Analysis, Measurement]]
@@ -53,9 +118,14 @@ class Sample:
             raise ValueError(
                 "Node must be a Material, Action, Analysis, or Measurement object!"
             )
-        if node in self.nodes:
+        if node.id in self._node_index:
             return  # we already have this node. Do we need to update it? TODO
-        self.nodes.append(node)
+        self._nodes.append(node)
+        self._node_index[node.id] = node
+        node._add_graph_listener(self)
+        if not self._graph_is_stale:
+            self._add_node_to_graph(self._graph, node)
+        self._graph_cache = {}
 
     def add_linear_process(self, actions: List[Action]):
         """
@@ -106,33 +176,89 @@ class Sample:
         for final_material in actions[-1].generated_materials:
             self.add_node(final_material)
 
+    @staticmethod
+    def _add_node_to_graph(graph: nx.DiGraph, node: BaseNode):
+        graph.add_node(node.id, type=node.labgraph_node_type, name=node.name)
+        for upstream in node.upstream:
+            if upstream["node_id"] not in graph.nodes:
+                graph.add_node(
+                    upstream["node_id"], type=upstream["node_type"], name=""
+                )  # TODO how should we name nodes that are outside of the sample scope? Currently just empty name
+            graph.add_edge(upstream["node_id"], node.id)
+        for downstream in node.downstream:
+            if downstream["node_id"] not in graph.nodes:
+                graph.add_node(
+                    downstream["node_id"], type=downstream["node_type"], name=""
+                )
+            graph.add_edge(node.id, downstream["node_id"])
+
+    def _on_edge_added(self, node: BaseNode, direction: str, entry: dict):
+        """Called by a node in this Sample when it gains an upstream or downstream edge."""
+        self._graph_cache = {}
+        if self._graph_is_stale:
+            return
+        if entry["node_id"] not in self._graph.nodes:
+            self._graph.add_node(entry["node_id"], type=entry["node_type"], name="")
+        if direction == "upstream":
+            self._graph.add_edge(entry["node_id"], node.id)
+        else:
+            self._graph.add_edge(node.id, entry["node_id"])
+
+    def _on_edges_reset(self, node: BaseNode):
+        """Called by a node in this Sample when its edges were removed or replaced. The graph is rebuilt on next use."""
+        self._graph_is_stale = True
+        self._graph_cache = {}
+
+    def _get_graph(self) -> nx.DiGraph:
+        """The internally maintained Sample graph. Do not modify it -- use `.graph` for a copy."""
+        if self._graph_is_stale:
+            graph = nx.DiGraph()
+            for node in self.nodes:
+                self._add_node_to_graph(graph, node)
+            self._graph = graph
+            self._graph_is_stale = False
+        return self._graph
+
+    def _cached(self, key: str, compute):
+        if key not in self._graph_cache:
+            self._graph_cache[key] = compute(self._get_graph())
+        return self._graph_cache[key]
+
     @property
-    def graph(self):
-        graph = nx.DiGraph()
+    def graph(self) -> nx.DiGraph:
+        """The Sample graph. Nodes are keyed by node id, and carry "type" and "name" attributes. Nodes outside of this Sample that are connected to it by an edge are included, with an empty name.
+
+        The graph is maintained as nodes and edges are added, so accessing it is cheap. A copy is returned, so it is safe to modify.
+        """
+        graph = self._get_graph().copy()
         for node in self.nodes:
-            node: BaseNode
-            graph.add_node(node.id, type=node.labgraph_node_type, name=node.name)
-            for upstream in node.upstream:
-                if upstream["node_id"] not in graph.nodes:
-                    graph.add_node(
-                        upstream["node_id"], type=upstream["node_type"], name=""
-                    )  # TODO how should we name nodes that are outside of the sample scope? Currently just empty name
-                graph.add_edge(upstream["node_id"], node.id)
-            for downstream in node.downstream:
-                if downstream["node_id"] not in graph.nodes:
-                    graph.add_node(
-                        downstream["node_id"], type=downstream["node_type"], name=""
-                    )
-                graph.add_edge(node.id, downstream["node_id"])
+            graph.nodes[node.id]["name"] = node.name  # names may have changed
         return graph
 
     @property
-    def has_valid_graph(self) -> bool:
-        is_acyclic = nx.is_directed_acyclic_graph(self.graph)
-        num_connected_components = len(
-            list(nx.connected_components(self.graph.to_undirected()))
+    def is_acyclic(self) -> bool:
+        return self._cached("is_acyclic", nx.is_directed_acyclic_graph)
+
+    @property
+    def num_connected_components(self) -> int:
+        return self._cached(
+            "num_connected_components", nx.number_weakly_connected_components
         )
-        return is_acyclic and (num_connected_components == 1)
+
+    @property
+    def topological_order(self) -> List[ObjectId]:
+        """Node ids (including nodes outside of this Sample) in topological order.
+
+        Raises:
+            networkx.NetworkXUnfeasible: The graph contains a cycle.
+        """
+        return self._cached(
+            "topological_order", lambda graph: list(nx.topological_sort(graph))
+        )
+
+    @property
+    def has_valid_graph(self) -> bool:
+        return self.is_acyclic and (self.num_connected_components == 1)
 
     def get_action_graph(self, include_outside_nodes: bool = False) -> nx.DiGraph:
         """
@@ -152,10 +278,7 @@ class Sample:
             g.remove_node(node)
 
         if not include_outside_nodes:
-            nodes_to_delete = []
-            for nid in g.nodes:
-                if not any([nid == node.id for node in self.nodes]):
-                    nodes_to_delete.append(nid)
+            nodes_to_delete = [nid for nid in g.nodes if nid not in self._node_index]
             for nid in nodes_to_delete:
                 g.remove_node(nid)
         return g
@@ -205,8 +328,10 @@ class Sample:
         """
         sort the node list in graph hierarchical order
         """
-        weights = list(nx.topological_sort(self.graph))
-        self.nodes.sort(key=lambda node: weights.index(node.id))
+        position = {
+            node_id: index for index, node_id in enumerate(self.topological_order)
+        }
+        self.nodes.sort(key=lambda node: position[node.id])
 
     def __repr__(self):
         return f"<Sample: {self.name}>"
@@ -367,6 +492,15 @@ class Sample:
             return f"{self} has not been saved to the database yet."
         return self._updated_at
 
+    @property
+    def version_history(self) -> List[dict]:
+        """Previous versions of this Sample in the database, oldest first. These are loaded from the database the first time they are accessed."""
+        if self._version_history is None:
+            from labgraph.views import SampleView
+
+            self._version_history = SampleView()._load_version_history(self.id)
+        return self._version_history
+
 
 def action_sequence_distance(
     s1: Sample, s2: Sample, include_outside_nodes: float = False
@@ -48,3 +48,45 @@ def launch_mongodb_config():
     from labgraph.utils.config import make_config
 
     make_config()
+
+
+@cli.command(
+    "indexes", short_help="Create and check the MongoDB indexes used by Labgraph."
+)
+@click.option(
+    "--report-only",
+    default=False,
+    is_flag=True,
+    help="Only report missing and unused indexes, don't create anything.",
+)
+def indexes_cli(report_only):
+    from labgraph.utils.data_objects import get_database
+    from labgraph.utils.indexes import ensure_all_indexes, index_report
+
+    db = get_database()
+    if not report_only:
+        for collection_name, index_names in ensure_all_indexes(db).items():
+            click.echo(f"{collection_name}: ensured {len(index_names)} indexes")
+
+    for collection_name, report in index_report(db).items():
+        missing = ", ".join(report["missing"]) or "none"
+        unused = ", ".join(report["unused"]) or "none"
+        click.echo(f"{collection_name}:\n\tmissing: {missing}\n\tunused: {unused}")
+
+
+@cli.command(
+    "export", short_help="Copy the data in a SQLite database file into MongoDB."
+)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--batch-size",
+    default=1000,
+    type=int,
+    help="Number of documents written to MongoDB at a time.",
+)
+def export_cli(path, batch_size):
+    from labgraph.backends import MongoBackend, SQLiteBackend
+
+    counts = SQLiteBackend(path).export(MongoBackend(), batch_size=batch_size)
+    for collection_name, count in counts.items():
+        click.echo(f"{collection_name}: exported {count} documents")
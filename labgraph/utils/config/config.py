@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 import toml
 import os
 from getpass import getpass
@@ -10,16 +10,72 @@ DEFAULT_CONFIG_PATH = os.path.join(
 )
 
 
+# optional [mongodb] settings that are passed on to pymongo.MongoClient, as {config key: MongoClient keyword}
+CLIENT_OPTIONS = {
+    "max_pool_size": "maxPoolSize",
+    "min_pool_size": "minPoolSize",
+    "max_idle_time_ms": "maxIdleTimeMS",
+    "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+    "compressors": "compressors",
+    "zlib_compression_level": "zlibCompressionLevel",
+    "read_preference": "readPreference",
+    "w": "w",
+    "journal": "journal",
+    "w_timeout_ms": "wTimeoutMS",
+    "connect_timeout_ms": "connectTimeoutMS",
+    "socket_timeout_ms": "socketTimeoutMS",
+    "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+    "replica_set": "replicaSet",
+    "app_name": "appname",
+}
+
+
 class MongoDBConfigValidator(BaseModel):
     host: str
     port: int
     db_name: str
-    username: Optional[str]
-    password: Optional[str]
+    username: Optional[str] = None
+    password: Optional[str] = None
+
+    # connection pool
+    max_pool_size: Optional[int] = None
+    min_pool_size: Optional[int] = None
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+
+    # wire compression. zstd and snappy need the `zstandard` and `python-snappy` packages, respectively
+    compressors: Optional[List[Literal["zstd", "snappy", "zlib"]]] = None
+    zlib_compression_level: Optional[int] = None
+
+    # read preference and write concern
+    read_preference: Optional[
+        Literal[
+            "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+        ]
+    ] = None
+    w: Optional[Union[int, str]] = None
+    journal: Optional[bool] = None
+    w_timeout_ms: Optional[int] = None
+
+    # timeouts
+    connect_timeout_ms: Optional[int] = None
+    socket_timeout_ms: Optional[int] = None
+    server_selection_timeout_ms: Optional[int] = None
+
+    replica_set: Optional[str] = None
+    app_name: Optional[str] = None
+
+
+class StorageConfigValidator(BaseModel):
+    # see labgraph.backends
+    engine: Literal["mongodb", "memory", "sqlite"] = "mongodb"
+    # database file of the sqlite engine
+    path: Optional[str] = None
 
 
 class ConfigValidator(BaseModel):
-    mongodb: dict
+    mongodb: Optional[MongoDBConfigValidator] = None
+    storage: Optional[StorageConfigValidator] = None
 
 
 def validate_config(config: dict):
@@ -32,13 +88,41 @@ def validate_config(config: dict):
         ValueError: The config file is invalid.
     """
     try:
-        ConfigValidator(**config)
+        validated = ConfigValidator(**config)
+        engine = "mongodb" if validated.storage is None else validated.storage.engine
+        if engine == "mongodb" and validated.mongodb is None:
+            raise ValueError("The [mongodb] section is required to use MongoDB.")
+        if engine != "sqlite" and getattr(validated.storage, "path", None):
+            raise ValueError("[storage] path is only used by the sqlite engine.")
     except Exception as e:
         raise ValueError(
             f"The config file is invalid. Please check the config file and try again. You can use `labgraph.utils.make_config()` to walk you through creating a valid config file. Error: {e}"
         )
 
 
+def client_options(db_config: dict) -> Dict[str, Any]:
+    """Keyword arguments for ``pymongo.MongoClient`` (or motor's ``AsyncIOMotorClient``) from the [mongodb] section of the config file. Optional settings that are not in the config file are left to the pymongo defaults.
+
+    Args:
+        db_config (dict): The [mongodb] section of the config file
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for the client
+    """
+    options = {
+        "host": db_config.get("host", None),
+        "port": db_config.get("port", None),
+        "username": db_config.get("username", ""),
+        "password": db_config.get("password", ""),
+    }
+    for key, keyword in CLIENT_OPTIONS.items():
+        if db_config.get(key, None) is not None:
+            options[keyword] = db_config[key]
+    if "compressors" in options:
+        options["compressors"] = ",".join(options["compressors"])
+    return options
+
+
 def get_config():
     config_path = os.getenv("LABGRAPH_CONFIG", DEFAULT_CONFIG_PATH)
     try:
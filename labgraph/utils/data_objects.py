@@ -1,49 +1,113 @@
 """
-A convenient wrapper for MongoClient. We can get a database object by calling ``get_collection`` function.
+A convenient wrapper for MongoClient. We can get a database object by calling ``get_collection`` function, which returns a collection of the active storage backend (MongoDB unless configured otherwise, see `labgraph.backends`).
+
+The client is created lazily from the labgraph config (including any connection pool, compression, read preference, write concern, and timeout settings). MongoClient is not fork-safe, so the client is re-created the first time it is used in a new process (ie a gunicorn or multiprocessing worker).
 """
 
-from typing import Optional
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set
 
 import pymongo
 from pymongo import collection, database
+from pymongo.client_session import ClientSession
 
 from .db_lock import MongoLock
+from .indexes import ensure_indexes
 
 
 class _GetMongoCollection:
     client: Optional[pymongo.MongoClient] = None
     db: Optional[database.Database] = None
     db_lock: Optional[MongoLock] = None
+    indexed_collections: Set[str] = set()
+    pid: Optional[int] = None
 
     @classmethod
     def init(cls):
-        from labgraph.utils import get_config
+        from labgraph.utils.config.config import client_options, get_config
+        from labgraph.utils.instrumentation import command_listener
 
         db_config = get_config()["mongodb"]
         cls.client = pymongo.MongoClient(
-            host=db_config.get("host", None),
-            port=db_config.get("port", None),
-            username=db_config.get("username", ""),
-            password=db_config.get("password", ""),
+            **client_options(db_config), event_listeners=[command_listener]
         )
         cls.db = cls.client[db_config.get("db_name")]  # type: ignore # pylint: disable=unsubscriptable-object
+        cls.db_lock = None
+        cls.indexed_collections = set()  # the new database may not have our indexes
+        cls.pid = os.getpid()
+
+    @classmethod
+    def _ensure_client(cls):
+        # a client inherited from a parent process shares its sockets and background threads, so we don't touch it (not even to close it) and make our own instead
+        if cls.client is None or cls.pid != os.getpid():
+            cls.init()
+
+    @classmethod
+    def get_database(cls) -> database.Database:
+        """
+        Get the labgraph database
+        """
+        cls._ensure_client()
+
+        return cls.db  # type: ignore
 
     @classmethod
     def get_collection(cls, name: str) -> collection.Collection:
         """
-        Get collection by name
+        Get collection by name. The first time a collection is requested, its indexes are created (if they don't exist already).
         """
-        if cls.client is None:
-            cls.init()
+        collection_ = cls.get_database()[name]  # type: ignore # pylint: disable=unsubscriptable-object
+        if name not in cls.indexed_collections:
+            cls.indexed_collections.add(name)
+            ensure_indexes(collection_)
+        return collection_
 
-        return cls.db[name]  # type: ignore # pylint: disable=unsubscriptable-object
+    @classmethod
+    @contextmanager
+    def transaction(cls) -> Iterator[ClientSession]:
+        """
+        Context manager that runs database operations in a MongoDB transaction. Pass the yielded session to each operation (``session=...``) that should be part of the transaction. The transaction is committed when the context exits, or aborted if an error is raised. Transactions require MongoDB to be running as a replica set.
+        """
+        cls._ensure_client()
+
+        with cls.client.start_session() as session:  # type: ignore
+            with session.start_transaction():
+                yield session
 
     @classmethod
     def get_lock(cls, name: str) -> MongoLock:
+        cls._ensure_client()
         if cls.db_lock is None:
             cls.db_lock = MongoLock(collection=cls.get_collection("_lock"), name=name)
         return cls.db_lock
 
 
-get_collection = _GetMongoCollection.get_collection
+def get_database():
+    """
+    Get the labgraph database of the active storage backend (see `labgraph.backends`)
+    """
+    from labgraph.backends import get_backend
+
+    return get_backend().get_database()
+
+
+def get_collection(name: str):
+    """
+    Get a collection of the active storage backend by name (see `labgraph.backends`). The first time a collection is requested, its indexes are created (if they don't exist already).
+    """
+    from labgraph.backends import get_backend
+
+    return get_backend().get_collection(name)
+
+
+def transaction():
+    """
+    Context manager that runs database operations in a transaction of the active storage backend (see `labgraph.backends`). Pass the yielded session to each operation (``session=...``). With MongoDB, this requires MongoDB to be running as a replica set.
+    """
+    from labgraph.backends import get_backend
+
+    return get_backend().transaction()
+
+
 get_lock = _GetMongoCollection.get_lock
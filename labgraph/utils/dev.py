@@ -1,4 +1,6 @@
 def _drop_collections():
+    from labgraph.backends import get_backend
+    from labgraph.views.actor_cache import get_actor_cache
     from labgraph.views import (
         MaterialView,
         ActionView,
@@ -16,4 +18,9 @@ def _drop_collections():
         ActorView(),
         SampleView(),
     ]:
-        view._collection.drop()
+        collections = [view._collection]
+        if not isinstance(view, ActorView):
+            collections.append(view._history_collection)
+        for collection in collections:
+            get_backend().drop_collection(collection.name)
+    get_actor_cache().clear()
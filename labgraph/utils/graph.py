@@ -1,5 +1,9 @@
 import networkx as nx
-from typing import List, Dict, Tuple
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from networkx.drawing.nx_agraph import graphviz_layout
+from typing import Any, Iterable, Iterator, List, Dict, Tuple
 
 
 def get_subgraphs(graph: nx.DiGraph) -> List[nx.DiGraph]:
@@ -17,63 +21,296 @@ def get_subgraphs(graph: nx.DiGraph) -> List[nx.DiGraph]:
     return subgraphs
 
 
-def _walk_graph_for_positions(graph, positions=None, node=None, x0=0, y0=0, width=1):
-    if node is None:
-        node = list(nx.topological_sort(graph))[0]
-    if positions is None:
-        positions = {}
-    positions[node] = (x0, y0)
-
-    successors = list(graph.successors(node))
-    if len(successors) == 0:
-        return
-
-    if len(successors) == 1:
-        dx = width
-        x = [0]
-    else:
-        dx = width / (len(successors) - 1)
-        x = [i * dx - width / 2 for i in range(len(successors))]
-
-    for delta_x, successor in zip(x, successors):
-        next_successors = list(graph.successors(successor))
-        if len(next_successors) != 0:
-            width = dx * (len(next_successors) - 1) / len(next_successors) * 0.95
-        _walk_graph_for_positions(
-            graph, positions, successor, x0=x0 + delta_x, y0=y0 - 1, width=width
+def union_of_sample_graphs(graphs: Iterable[nx.DiGraph]) -> nx.DiGraph:
+    """Combine Sample graphs (see `labgraph.data.sample.Sample.graph`) into one graph, in a single pass. Unlike repeated `nx.compose`, the combined graph is not copied for every Sample. A node that is named in one graph keeps its name when it is a nameless neighbor in another.
+
+    Args:
+        graphs (Iterable[nx.DiGraph]): Sample graphs
+
+    Returns:
+        nx.DiGraph: union of the graphs
+    """
+    union = nx.DiGraph()
+    for graph in graphs:
+        for node, attributes in graph.nodes(data=True):
+            if node not in union or union.nodes[node].get("name", "") == "":
+                union.add_node(node, **attributes)
+        union.add_edges_from(graph.edges)
+    return union
+
+
+### Layered (Sugiyama) layout
+# Nodes are placed on horizontal layers so that every edge points down, then ordered within their layer to reduce edge crossings, then given x coordinates close to their neighbors. Edges longer than one layer are split by "dummy" nodes that take part in ordering and placement, but are not returned. Nodes are numbered 0..n-1, edges are pairs of arrays (sources, targets) of node numbers.
+
+
+def _gather(starts: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Indices of the edges of `nodes` in a CSR-like edge array, where the edges of node i are starts[i]:starts[i+1]."""
+    counts = starts[nodes + 1] - starts[nodes]
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts[nodes] - offsets, counts) + np.arange(counts.sum())
+
+
+def _acyclic_edges(
+    graph: nx.DiGraph, index: Dict[Any, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Edges of the graph as arrays, with the edges that close a cycle reversed and self loops removed. Also returns the rank of each node in a topological order (of the acyclic graph)."""
+    n = len(index)
+    rank = np.empty(n, dtype=np.int64)
+    postorder = [index[node] for node in nx.dfs_postorder_nodes(graph)]
+    rank[postorder] = np.arange(n - 1, -1, -1)
+
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges], dtype=np.int64)
+    edges = edges.reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    backward = rank[edges[:, 0]] > rank[edges[:, 1]]
+    edges[backward] = edges[backward][:, ::-1]
+    edges = np.unique(edges, axis=0)
+    return edges[:, 0], edges[:, 1], rank
+
+
+def _longest_path_layers(n: int, source: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Layer of each node of an acyclic graph: the length of the longest path to it from a node without predecessors. Nodes without predecessors are then moved down to just above their highest successor, so that they do not draw long edges from the top layer."""
+    order = np.argsort(source, kind="stable")
+    targets = target[order]
+    starts = np.searchsorted(source[order], np.arange(n + 1))
+    indegree = np.bincount(target, minlength=n)
+    roots = indegree == 0
+
+    layer = np.zeros(n, dtype=np.int64)
+    frontier = np.flatnonzero(roots)
+    depth = 0
+    while len(frontier) > 0:  # one layer at a time, in topological order
+        layer[frontier] = depth
+        successors = targets[_gather(starts, frontier)]
+        np.subtract.at(indegree, successors, 1)
+        frontier = np.unique(successors[indegree[successors] == 0])
+        depth += 1
+
+    highest_successor = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(highest_successor, source, layer[target])
+    pulled = roots & (np.diff(starts) > 0)
+    layer[pulled] = highest_successor[pulled] - 1
+    return layer
+
+
+def _split_long_edges(
+    n: int, source: np.ndarray, target: np.ndarray, layer: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Replace every edge spanning k > 1 layers with a chain through k - 1 dummy nodes, numbered from n.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: sources and targets of the edges, the layers of the dummy nodes, and the edge each dummy node belongs to
+    """
+    num_dummies = layer[target] - layer[source] - 1
+    total = num_dummies.sum()
+    first = n + np.cumsum(num_dummies) - num_dummies  # first dummy of each edge
+    edge_of_dummy = np.repeat(np.arange(len(source)), num_dummies)
+    step = np.arange(total) - (first - n)[edge_of_dummy]  # 0 for the first dummy
+    dummy_layer = layer[source][edge_of_dummy] + step + 1
+
+    dummies = n + np.arange(total)
+    is_last = step == num_dummies[edge_of_dummy] - 1
+    after_dummy = np.where(is_last, target[edge_of_dummy], dummies + 1)
+    segment_source = np.concatenate([source, dummies])
+    segment_target = np.concatenate(
+        [np.where(num_dummies > 0, first, target), after_dummy]
+    )
+    return segment_source, segment_target, dummy_layer, edge_of_dummy
+
+
+class _Layers:
+    """Nodes grouped by layer, and edges grouped by the layer of their target (for downward sweeps) and of their source (for upward sweeps)."""
+
+    def __init__(
+        self,
+        layer: np.ndarray,
+        keys: Tuple[np.ndarray, ...],
+        source: np.ndarray,
+        target: np.ndarray,
+    ):
+        self.layer, self.source, self.target = layer, source, target
+        self.num_layers = int(layer.max()) + 1
+        # members of each layer, sorted by `keys` (the last key first)
+        self.members = np.lexsort((*keys, layer))
+        self.bounds = np.searchsorted(
+            layer[self.members], np.arange(self.num_layers + 1)
+        )
+        self.slot = np.empty(len(layer), dtype=np.int64)
+        self._update_slots()
+
+        self._edges = {}
+        for end, nodes in [("target", target), ("source", source)]:
+            order = np.argsort(layer[nodes], kind="stable")
+            bounds = np.searchsorted(
+                layer[nodes][order], np.arange(self.num_layers + 1)
+            )
+            self._edges[end] = (order, bounds)
+
+    def _update_slots(self):
+        # index of each node within the members of its layer
+        self.slot[self.members] = (
+            np.arange(len(self.members)) - self.bounds[self.layer[self.members]]
+        )
+
+    def sort_members(self, position: np.ndarray):
+        """Sort the members of each layer by position."""
+        self.members = np.lexsort((position, self.layer))
+        self._update_slots()
+
+    def nodes(self, l: int) -> np.ndarray:
+        return self.members[self.bounds[l] : self.bounds[l + 1]]
+
+    def sweep(
+        self, downward: bool
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        """For each layer (from the second, top to bottom or bottom to top), yield its index, its nodes, and the edges to the previous layer as (nodes of this layer, neighbors in the previous layer)."""
+        end = "target" if downward else "source"
+        order, bounds = self._edges[end]
+        layers = (
+            range(1, self.num_layers)
+            if downward
+            else range(self.num_layers - 2, -1, -1)
+        )
+        for l in layers:
+            edges = order[bounds[l] : bounds[l + 1]]
+            if downward:
+                yield l, self.nodes(l), self.target[edges], self.source[edges]
+            else:
+                yield l, self.nodes(l), self.source[edges], self.target[edges]
+
+    def barycenters(self, nodes, ends, neighbors, value: np.ndarray) -> np.ndarray:
+        """Mean value of the neighbors of each node, or the value of the node itself when it has none."""
+        slots = self.slot[ends]
+        sums = np.bincount(slots, weights=value[neighbors], minlength=len(nodes))
+        counts = np.bincount(slots, minlength=len(nodes))
+        means = sums / np.maximum(counts, 1)
+        return np.where(counts > 0, means, value[nodes])
+
+
+def _reduce_crossings(
+    layers: _Layers, position: np.ndarray, component: np.ndarray, sweeps: int
+):
+    """Barycentric crossing reduction: reorder each layer by the mean position of the neighbors of its nodes in the previous layer, sweeping down then up. Connected components are never interleaved. `position` is updated in place."""
+    for _ in range(sweeps):
+        previous = position.copy()
+        for downward in [True, False]:
+            for _, nodes, ends, neighbors in layers.sweep(downward):
+                if len(nodes) < 2:
+                    continue
+                barycenter = layers.barycenters(nodes, ends, neighbors, position)
+                ordered = nodes[
+                    np.lexsort((position[nodes], barycenter, component[nodes]))
+                ]
+                position[ordered] = np.arange(len(ordered))
+        if np.array_equal(previous, position):
+            break
+
+
+def _assign_coordinates(
+    layers: _Layers,
+    position: np.ndarray,
+    component: np.ndarray,
+    sweeps: int,
+    component_gap: float = 2.0,
+) -> np.ndarray:
+    """x coordinate of each node. Nodes keep their order within their layer, at least 1 apart (`component_gap` between components), and move towards the mean x of their neighbors in the previous layer, sweeping down then up."""
+    layers.sort_members(position)
+    separations = []
+    x = np.zeros(len(position))
+    for l in range(layers.num_layers):
+        nodes = layers.nodes(l)
+        gaps = np.where(
+            component[nodes][1:] != component[nodes][:-1], component_gap, 1.0
         )
+        separations.append(np.cumsum(np.concatenate([[0.0], gaps]))[: len(nodes)])
+        x[nodes] = separations[l]
 
-    return positions
+    for _ in range(sweeps):
+        previous = x.copy()
+        for downward in [True, False]:
+            for l, nodes, ends, neighbors in layers.sweep(downward):
+                wanted = layers.barycenters(nodes, ends, neighbors, x)
+                # closest placement that keeps the separations: x - separation must not decrease along the layer. Pushing nodes right, then left, and averaging keeps it balanced.
+                excess = wanted - separations[l]
+                right = np.maximum.accumulate(excess)
+                left = np.minimum.accumulate(excess[::-1])[::-1]
+                x[nodes] = (right + left) / 2 + separations[l]
+        if np.allclose(previous, x):
+            break
+    return x
 
 
-def hierarchical_layout(graph: nx.DiGraph) -> Dict[str, Tuple[float, float]]:
-    """Create a hierarchical layout for a directed graph
+def hierarchical_layout(
+    graph: nx.DiGraph,
+    node_separation: float = 1.0,
+    layer_separation: float = 1.0,
+    sweeps: int = 4,
+) -> Dict[Any, Tuple[float, float]]:
+    """Create a layered (Sugiyama-style) layout for a directed graph, with edges pointing down like graphviz "dot" does. This needs neither graphviz nor recursion, and scales to graphs with tens of thousands of nodes.
 
-    Args:s
+    Nodes are layered by longest path, edges longer than one layer are routed through invisible nodes, crossings are reduced by barycentric ordering, and nodes are then placed close to their neighbors. Connected components are laid out side by side. Edges that close a cycle are reversed for the layout.
+
+    Args:
+        graph (nx.DiGraph): graph to layout
+        node_separation (float, optional): Minimum horizontal distance between nodes on a layer. Defaults to 1.0.
+        layer_separation (float, optional): Vertical distance between layers. Defaults to 1.0.
+        sweeps (int, optional): Maximum number of down-and-up sweeps for crossing reduction and for placement. Defaults to 4.
+
+    Returns:
+        dict: mapping of node ids to (x,y) coordinates
+    """
+    nodes = list(graph.nodes)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {node: i for i, node in enumerate(nodes)}
+    source, target, rank = _acyclic_edges(graph, index)
+    layer = _longest_path_layers(n, source, target)
+    _, component = connected_components(
+        coo_matrix((np.ones(len(source)), (source, target)), shape=(n, n)),
+        directed=True,
+        connection="weak",
+    )
+
+    source, target, dummy_layer, edge_of_dummy = _split_long_edges(
+        n, source, target, layer
+    )
+    layer = np.concatenate([layer, dummy_layer])
+    component = np.concatenate([component, component[source[edge_of_dummy]]])
+    rank = np.concatenate([rank, rank[source[edge_of_dummy]]])
+
+    # start from a topological order, grouped by component
+    layers = _Layers(layer, (rank, component), source, target)
+    position = np.empty(len(layer), dtype=np.int64)
+    position[layers.members] = layers.slot[layers.members]
+    _reduce_crossings(layers, position, component, sweeps)
+    x = _assign_coordinates(layers, position, component, sweeps)
+
+    x = (x[:n] - x[:n].min()) * node_separation
+    y = (layer[:n].max() - layer[:n]) * layer_separation
+    return {node: (float(x[i]), float(y[i])) for i, node in enumerate(nodes)}
+
+
+# graphviz "dot" draws small graphs a little nicer, but is slow above a few thousand nodes
+GRAPHVIZ_MAX_NODES = 1000
+# distance between nodes and between layers in "dot" layouts (in points), with its default node size and separations
+DOT_SEPARATION = 72.0
+
+
+def graph_layout(graph: nx.DiGraph) -> Dict[Any, Tuple[float, float]]:
+    """Layout used to draw lab graphs. Graphs of up to `GRAPHVIZ_MAX_NODES` nodes are laid out by graphviz "dot" if graphviz and pygraphviz are installed, others by `hierarchical_layout`, on the same scale.
+
+    Args:
         graph (nx.DiGraph): graph to layout
 
     Returns:
         dict: mapping of node ids to (x,y) coordinates
     """
-    subgraphs = get_subgraphs(graph)
-    subgraph_positions = []
-    subgraph_bounds = []
-    for subgraph in get_subgraphs(graph):
-        subgraph_positions.append(_walk_graph_for_positions(subgraph))
-
-        max_x = max([x for x, y in subgraph_positions[-1].values()])
-        min_x = min([x for x, y in subgraph_positions[-1].values()])
-        subgraph_bounds.append((min_x, max_x))
-
-    positions = {}
-    reference_x = 0
-    total_width = sum([max_x - min_x for min_x, max_x in subgraph_bounds])
-    TARGET_MARGIN = total_width * 0.05
-    for subgraph, (min_x, max_x) in zip(subgraphs, subgraph_bounds):
-        overlap = reference_x - min_x
-        offset = TARGET_MARGIN + overlap
-        for node, (x, y) in subgraph_positions.pop(0).items():
-            positions[node] = (x + offset, y)
-        reference_x = max_x + offset
-
-    return positions
+    if len(graph) <= GRAPHVIZ_MAX_NODES:
+        try:
+            return graphviz_layout(graph, prog="dot")
+        except Exception:
+            pass  # graphviz is optional, and pygraphviz fails in many ways without it
+    return hierarchical_layout(
+        graph, node_separation=DOT_SEPARATION, layer_separation=DOT_SEPARATION
+    )
@@ -0,0 +1,189 @@
+"""
+Declares the MongoDB indexes used by labgraph's query patterns, and tools to create them and check on them. Indexes are created automatically (and idempotently) the first time each collection is requested through ``get_collection``. You can also run ``labgraph indexes`` from the command line.
+"""
+
+import warnings
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
+
+NODE_TYPES = ["Material", "Action", "Measurement", "Analysis"]
+
+
+def _common_indexes() -> List[IndexModel]:
+    # get_by_name, get_by_tags, and created_at sorts/filters are common to every view
+    return [
+        IndexModel([("name", ASCENDING)]),
+        IndexModel([("tags", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        # latest change to a collection, to tell whether dashboard aggregates are stale
+        IndexModel([("updated_at", DESCENDING)]),
+    ]
+
+
+def _node_indexes(has_actor: bool) -> List[IndexModel]:
+    indexes = _common_indexes() + [
+        # element matches on {"node_type", "node_id"} when removing edges to deleted nodes
+        IndexModel([("upstream", ASCENDING)]),
+        IndexModel([("downstream", ASCENDING)]),
+    ]
+    if has_actor:
+        indexes.append(IndexModel([("actor_id", ASCENDING)]))
+    return indexes
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "materials": _node_indexes(has_actor=False),
+    "actions": _node_indexes(has_actor=True),
+    "measurements": _node_indexes(has_actor=True),
+    "analyses": _node_indexes(has_actor=True),
+    "samples": _common_indexes()
+    + [
+        # SampleView.get_by_node_info
+        IndexModel([(f"nodes.{node_type}", ASCENDING)])
+        for node_type in NODE_TYPES
+    ]
+    + [
+        # pages of the dashboard sample summary
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "actors": _common_indexes(),
+}
+# previous versions of nodes and samples (see labgraph.views.history), looked up by entry and version
+INDEXES.update(
+    {
+        f"{name}_history": [
+            IndexModel([("entry_id", ASCENDING), ("version", DESCENDING)], unique=True)
+        ]
+        for name in ["materials", "actions", "measurements", "analyses", "samples"]
+    }
+)
+
+
+def ensure_indexes(collection: Collection) -> List[str]:
+    """Create the indexes declared for a collection. This is idempotent -- indexes that already exist are left alone. If the indexes cannot be created (for example, the database user lacks permission), a warning is raised instead of an error.
+
+    Args:
+        collection (Collection): collection to create indexes for. Collections without declared indexes are ignored.
+
+    Returns:
+        List[str]: names of the declared indexes for this collection
+    """
+    # we use the default index names (ie "name_1") so that equivalent indexes created by hand don't conflict with ours
+    indexes = INDEXES.get(collection.name, [])
+    if len(indexes) == 0:
+        return []
+    try:
+        return collection.create_indexes(indexes)
+    except PyMongoError as e:
+        warnings.warn(
+            f"Labgraph could not create indexes for the {collection.name} collection. Queries will still work, but may be slow on large databases. Error: {e}"
+        )
+        return []
+
+
+async def ensure_indexes_async(collection: Any) -> List[str]:
+    """Like `ensure_indexes`, for an asyncio (motor) collection. See `labgraph.views.aio`.
+
+    Args:
+        collection (Any): collection to create indexes for, as a ``motor.motor_asyncio.AsyncIOMotorCollection``. Collections without declared indexes are ignored.
+
+    Returns:
+        List[str]: names of the declared indexes for this collection
+    """
+    indexes = INDEXES.get(collection.name, [])
+    if len(indexes) == 0:
+        return []
+    try:
+        return await collection.create_indexes(indexes)
+    except PyMongoError as e:
+        warnings.warn(
+            f"Labgraph could not create indexes for the {collection.name} collection. Queries will still work, but may be slow on large databases. Error: {e}"
+        )
+        return []
+
+
+def ensure_all_indexes(db: Database) -> Dict[str, List[str]]:
+    """Create the declared indexes for all labgraph collections.
+
+    Args:
+        db (Database): labgraph database
+
+    Returns:
+        Dict[str, List[str]]: names of the declared indexes, keyed by collection name
+    """
+    return {name: ensure_indexes(db[name]) for name in INDEXES}
+
+
+def _normalize_key(key) -> List[tuple]:
+    # the server may report index directions as floats (ie 1.0)
+    return [
+        (field, int(direction) if isinstance(direction, float) else direction)
+        for field, direction in key
+    ]
+
+
+def missing_indexes(db: Database) -> Dict[str, List[str]]:
+    """Find declared indexes that do not exist in the database. Indexes are compared by their keys, not their names.
+
+    Args:
+        db (Database): labgraph database
+
+    Returns:
+        Dict[str, List[str]]: names of the missing indexes, keyed by collection name
+    """
+    missing = {}
+    for name, indexes in INDEXES.items():
+        existing_keys = [
+            _normalize_key(info["key"])
+            for info in db[name].index_information().values()
+        ]
+        missing[name] = [
+            index.document["name"]
+            for index in indexes
+            if _normalize_key(index.document["key"].items()) not in existing_keys
+        ]
+    return missing
+
+
+def unused_indexes(db: Database) -> Dict[str, List[str]]:
+    """Find indexes (declared or not) that have not been used since the MongoDB server was last started, according to ``$indexStats``. The default ``_id_`` index is never reported.
+
+    Args:
+        db (Database): labgraph database
+
+    Returns:
+        Dict[str, List[str]]: names of the unused indexes, keyed by collection name. Collections whose index statistics cannot be read are omitted.
+    """
+    unused = {}
+    for name in INDEXES:
+        try:
+            stats = list(db[name].aggregate([{"$indexStats": {}}]))
+        except OperationFailure:
+            continue
+        unused[name] = [
+            stat["name"]
+            for stat in stats
+            if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+        ]
+    return unused
+
+
+def index_report(db: Database) -> Dict[str, Dict[str, List[str]]]:
+    """Report which declared indexes are missing and which indexes are unused, per collection.
+
+    Args:
+        db (Database): labgraph database
+
+    Returns:
+        Dict[str, Dict[str, List[str]]]: {collection name: {"missing": [...], "unused": [...]}}
+    """
+    missing = missing_indexes(db)
+    unused = unused_indexes(db)
+    return {
+        name: {"missing": missing[name], "unused": unused.get(name, [])}
+        for name in INDEXES
+    }
@@ -0,0 +1,445 @@
+"""
+Counts the database commands issued by labgraph, and attributes them (with their latency and size) to the labgraph operation that issued them, ie ``SampleView.get``, ``Action.from_dict`` or ``_remove_references_to_node``.
+
+Commands are recorded while a `track_queries` block is active, or while a hook is registered with `add_command_hook` (ie `log_commands`, or a function feeding your metrics system):
+
+.. code-block:: python
+
+    from labgraph.utils.instrumentation import track_queries
+
+    with track_queries() as tracker:
+        SampleView().get(sample_id)
+    print(tracker.summary())
+
+In tests, `assert_max_queries` fails when a block issues more commands than expected, which catches N+1 query patterns in the views:
+
+.. code-block:: python
+
+    with assert_max_queries(3):
+        SampleView().get(sample_id)
+
+MongoDB commands are captured by a pymongo ``CommandListener`` that is installed on the labgraph clients, including the motor client of the asyncio views (`labgraph.views.aio`), whose methods are operations too. The other storage backends (see `labgraph.backends`) report their collection operations the same way, without byte counts. When nothing is tracking or hooked, the instrumentation costs one flag check per operation.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+_OPERATIONS: ContextVar[Tuple[str, ...]] = ContextVar("labgraph_operations", default=())
+_lock = threading.Lock()
+_trackers: List["QueryTracker"] = []
+_hooks: List[Callable[["CommandRecord"], None]] = []
+_enabled = False  # True when any tracker or hook is active
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CommandRecord:
+    """A database command issued by labgraph.
+
+    Args:
+        command_name (str): Name of the command (ie "find", "insert", "update")
+        database (str): Name of the database
+        collection (Optional[str]): Name of the collection the command ran on, if any
+        duration (float): Time taken by the command, in seconds
+        succeeded (bool): False if the command failed
+        request_bytes (Optional[int]): Size of the command document. None if the backend does not report it.
+        reply_bytes (Optional[int]): Size of the reply document. None if the backend does not report it.
+        operations (Tuple[str, ...]): labgraph operations the command was issued from, outermost first
+    """
+
+    command_name: str
+    database: str
+    collection: Optional[str]
+    duration: float
+    succeeded: bool = True
+    request_bytes: Optional[int] = None
+    reply_bytes: Optional[int] = None
+    operations: Tuple[str, ...] = ()
+
+    @property
+    def operation(self) -> Optional[str]:
+        """The innermost labgraph operation that issued this command, or None if it was issued outside of labgraph's operations."""
+        return self.operations[-1] if self.operations else None
+
+
+@dataclass
+class OperationStats:
+    """Totals of the commands issued by one labgraph operation."""
+
+    commands: int = 0
+    duration: float = 0.0
+    request_bytes: int = 0
+    reply_bytes: int = 0
+    command_names: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, record: CommandRecord):
+        self.commands += 1
+        self.duration += record.duration
+        self.request_bytes += record.request_bytes or 0
+        self.reply_bytes += record.reply_bytes or 0
+        self.command_names[record.command_name] = (
+            self.command_names.get(record.command_name, 0) + 1
+        )
+
+
+class QueryTracker:
+    """Collects the commands issued while it is active. See `track_queries`."""
+
+    def __init__(self):
+        self.records: List[CommandRecord] = []
+        self._lock = threading.Lock()
+
+    def _add(self, record: CommandRecord):
+        with self._lock:
+            self.records.append(record)
+
+    @property
+    def count(self) -> int:
+        """Number of commands issued."""
+        return len(self.records)
+
+    @property
+    def duration(self) -> float:
+        """Total time spent in database commands, in seconds."""
+        return sum(record.duration for record in self.records)
+
+    def by_operation(
+        self, outermost: bool = False
+    ) -> Dict[Optional[str], OperationStats]:
+        """Totals of the commands, keyed by the labgraph operation that issued them.
+
+        Args:
+            outermost (bool, optional): If True, commands are attributed to the outermost operation (ie the ``SampleView.get`` call) instead of the innermost one (ie the ``Action.from_dict`` it made). Defaults to False.
+
+        Returns:
+            Dict[Optional[str], OperationStats]: Totals keyed by operation name. Commands issued outside of labgraph's operations are keyed by None.
+        """
+        stats: Dict[Optional[str], OperationStats] = defaultdict(OperationStats)
+        for record in self.records:
+            if outermost:
+                key = record.operations[0] if record.operations else None
+            else:
+                key = record.operation
+            stats[key].add(record)
+        return dict(stats)
+
+    def count_for(self, operation: str) -> int:
+        """Number of commands issued from within an operation (at any depth).
+
+        Args:
+            operation (str): Name of the operation (ie "SampleView.get")
+
+        Returns:
+            int: Number of commands
+        """
+        return sum(1 for record in self.records if operation in record.operations)
+
+    def summary(self) -> str:
+        """A human-readable table of the commands issued per operation."""
+        lines = [f"{self.count} commands in {self.duration * 1e3:.2f} ms"]
+        stats = sorted(self.by_operation().items(), key=lambda item: -item[1].commands)
+        for operation, operation_stats in stats:
+            names = ", ".join(
+                f"{name} x{count}"
+                for name, count in operation_stats.command_names.items()
+            )
+            lines.append(
+                f"  {operation or '<outside labgraph>'}: {operation_stats.commands} commands, {operation_stats.duration * 1e3:.2f} ms ({names})"
+            )
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by `assert_max_queries` when a block issues too many commands."""
+
+
+def _update_enabled():
+    global _enabled
+    _enabled = len(_trackers) > 0 or len(_hooks) > 0
+
+
+def is_enabled() -> bool:
+    """Whether commands are being recorded (by a tracker or a hook)."""
+    return _enabled
+
+
+def record_command(record: CommandRecord):
+    """Report a command to the active trackers and hooks. Used by the pymongo listener and the storage backends.
+
+    Args:
+        record (CommandRecord): The command
+    """
+    for tracker in list(_trackers):
+        tracker._add(record)
+    for hook in list(_hooks):
+        try:
+            hook(record)
+        except Exception:
+            logger.exception("labgraph command hook %r failed", hook)
+
+
+def current_operations() -> Tuple[str, ...]:
+    """The labgraph operations currently running in this context, outermost first."""
+    return _OPERATIONS.get()
+
+
+def instrumented(func: Callable) -> Callable:
+    """Decorator that marks a function as a labgraph operation, so that the database commands it issues are attributed to it. Methods are named after the class of the object (or class) they are called on, ie ``MaterialView.get``.
+
+    Coroutine functions and async generators (ie the methods of the asyncio views in `labgraph.views.aio`) are instrumented too. Motor runs commands in worker threads with a copy of the calling context, so they are attributed like synchronous ones.
+
+    Args:
+        func (Callable): Function or method to instrument
+
+    Returns:
+        Callable: The instrumented function
+    """
+    qualified = "." in func.__qualname__ and "<locals>" not in func.__qualname__
+
+    def operation_name(args: tuple) -> str:
+        if qualified and len(args) > 0:
+            owner = args[0] if isinstance(args[0], type) else type(args[0])
+            return f"{owner.__name__}.{func.__name__}"
+        return func.__name__
+
+    if inspect.isasyncgenfunction(func):
+
+        @functools.wraps(func)
+        async def async_generator_wrapper(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            name = operation_name(args)
+            try:
+                while True:
+                    # the generator runs in its consumer's context, so the operation is only pushed while it runs
+                    token = _OPERATIONS.set(_OPERATIONS.get() + (name,))
+                    try:
+                        item = await generator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _OPERATIONS.reset(token)
+                    yield item
+            finally:
+                await generator.aclose()
+
+        return async_generator_wrapper
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def coroutine_wrapper(*args, **kwargs):
+            if not _enabled:
+                return await func(*args, **kwargs)
+            token = _OPERATIONS.set(_OPERATIONS.get() + (operation_name(args),))
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _OPERATIONS.reset(token)
+
+        return coroutine_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        token = _OPERATIONS.set(_OPERATIONS.get() + (operation_name(args),))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _OPERATIONS.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryTracker]:
+    """Context manager that records every database command issued while it is active, from any thread.
+
+    Yields:
+        Iterator[QueryTracker]: The tracker holding the recorded commands
+    """
+    tracker = QueryTracker()
+    with _lock:
+        _trackers.append(tracker)
+        _update_enabled()
+    try:
+        yield tracker
+    finally:
+        with _lock:
+            _trackers.remove(tracker)
+            _update_enabled()
+
+
+@contextmanager
+def assert_max_queries(
+    max_queries: int, operation: Optional[str] = None
+) -> Iterator[QueryTracker]:
+    """Context manager for tests that fails if the enclosed block issues more than `max_queries` database commands.
+
+    Args:
+        max_queries (int): Maximum number of commands allowed
+        operation (Optional[str], optional): Only count the commands issued from within this labgraph operation (ie "SampleView.get"). Defaults to None (count every command).
+
+    Raises:
+        QueryBudgetExceeded: Too many commands were issued. The message lists them per operation.
+
+    Yields:
+        Iterator[QueryTracker]: The tracker holding the recorded commands
+    """
+    with track_queries() as tracker:
+        yield tracker
+    count = tracker.count if operation is None else tracker.count_for(operation)
+    if count > max_queries:
+        scope = "" if operation is None else f" from {operation}"
+        raise QueryBudgetExceeded(
+            f"Expected at most {max_queries} database commands{scope}, but {count} were issued.\n{tracker.summary()}"
+        )
+
+
+def add_command_hook(hook: Callable[[CommandRecord], None]):
+    """Call a function with every database command labgraph issues from now on, ie to feed a metrics system. Exceptions raised by the hook are logged and ignored.
+
+    Args:
+        hook (Callable[[CommandRecord], None]): Function called with each command
+    """
+    with _lock:
+        _hooks.append(hook)
+        _update_enabled()
+
+
+def remove_command_hook(hook: Callable[[CommandRecord], None]):
+    """Stop calling a function added with `add_command_hook`.
+
+    Args:
+        hook (Callable[[CommandRecord], None]): The function
+    """
+    with _lock:
+        _hooks.remove(hook)
+        _update_enabled()
+
+
+def log_commands(
+    log: Optional[logging.Logger] = None, level: int = logging.DEBUG
+) -> Callable[[CommandRecord], None]:
+    """Log every database command labgraph issues from now on, as structured log records. The fields of the `CommandRecord` are available to log handlers as the ``labgraph_command`` attribute of each record.
+
+    Args:
+        log (Optional[logging.Logger], optional): Logger to log to. Defaults to None (this module's logger).
+        level (int, optional): Log level. Defaults to logging.DEBUG.
+
+    Returns:
+        Callable[[CommandRecord], None]: The hook, which can be removed with `remove_command_hook`
+    """
+    log = log or logger
+
+    def hook(record: CommandRecord):
+        log.log(
+            level,
+            "%s %s.%s took %.2f ms (%s)",
+            record.command_name,
+            record.database,
+            record.collection,
+            record.duration * 1e3,
+            record.operation or "outside labgraph",
+            extra={"labgraph_command": asdict(record)},
+        )
+
+    add_command_hook(hook)
+    return hook
+
+
+def _size(document: Any) -> Optional[int]:
+    try:
+        return len(bson.encode(document))
+    except Exception:
+        return None
+
+
+class CommandListener(monitoring.CommandListener):
+    """pymongo listener that reports the commands of the labgraph MongoDB clients. Commands are only inspected while something is recording them."""
+
+    def __init__(self):
+        self._pending: Dict[
+            Tuple[int, Any], Tuple[Tuple[str, ...], Optional[str], Optional[int]]
+        ] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if not _enabled:
+            return
+        target = event.command.get(event.command_name)
+        self._pending[(event.request_id, event.connection_id)] = (
+            _OPERATIONS.get(),
+            target if isinstance(target, str) else None,
+            _size(event.command),
+        )
+
+    def _finished(self, event, succeeded: bool, reply: Optional[dict]):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        operations, collection, request_bytes = pending
+        record_command(
+            CommandRecord(
+                command_name=event.command_name,
+                database=event.database_name,
+                collection=collection,
+                duration=event.duration_micros / 1e6,
+                succeeded=succeeded,
+                request_bytes=request_bytes,
+                reply_bytes=None if reply is None else _size(reply),
+                operations=operations,
+            )
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, True, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, False, None)
+
+
+command_listener = CommandListener()
+
+
+@contextmanager
+def timed_command(
+    command_name: str, database: str, collection: Optional[str]
+) -> Iterator[None]:
+    """Context manager used by the storage backends that are not MongoDB to report a collection operation as a command. Does nothing unless commands are being recorded.
+
+    Args:
+        command_name (str): Name of the equivalent MongoDB command (ie "find")
+        database (str): Name of the database or backend
+        collection (Optional[str]): Name of the collection, if the operation is on a single collection
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        record_command(
+            CommandRecord(
+                command_name=command_name,
+                database=database,
+                collection=collection,
+                duration=time.perf_counter() - start,
+                succeeded=succeeded,
+                operations=_OPERATIONS.get(),
+            )
+        )
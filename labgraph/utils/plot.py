@@ -1,18 +1,29 @@
-from typing import List, TYPE_CHECKING
+from typing import List, TYPE_CHECKING, Union
+from bson import ObjectId
 import matplotlib.pyplot as plt
 import networkx as nx
-from networkx.drawing.nx_agraph import graphviz_layout
-import warnings
+from labgraph.utils.graph import graph_layout, union_of_sample_graphs
 
 if TYPE_CHECKING:
     from labgraph.data.sample import Sample
 
 
-def plot_multiple_samples(samples: List["Sample"], ax: plt.axes = None):
-    graph = nx.DiGraph()
-    for sample in samples:
-        graph = nx.compose(graph, sample.graph)
-    plot_graph(graph, ax=ax)
+def plot_multiple_samples(
+    samples: List[Union["Sample", ObjectId]], ax: plt.axes = None
+):
+    """Plots the union of the graphs of several Samples.
+
+    Args:
+        samples (List[Union[Sample, ObjectId]]): Samples, or ids of Samples in the database. Samples given by id are not retrieved, their graph is read straight from the database (see `labgraph.views.SampleView.get_graph`), which is much faster for many Samples.
+        ax (matplotlib.pyplot.Axes, optional): Existing plot Axes to draw the graph onto. If None, a new plot figure+axes will be created. Defaults to None.
+    """
+    graphs = [sample.graph for sample in samples if not isinstance(sample, ObjectId)]
+    sample_ids = [sample for sample in samples if isinstance(sample, ObjectId)]
+    if len(sample_ids) > 0:
+        from labgraph.views import SampleView  # views import this module
+
+        graphs.append(SampleView().get_graph(sample_ids))
+    plot_graph(union_of_sample_graphs(graphs), ax=ax)
 
 
 def plot_graph(graph: nx.DiGraph, with_labels: bool = True, ax: plt.axes = None):
@@ -39,14 +50,7 @@ def plot_graph(graph: nx.DiGraph, with_labels: bool = True, ax: plt.axes = None)
                 [*color[:3], 0.4]
             )  # low opacity for attached nodes that are not part of the sample
         node_colors.append(color)
-    try:
-        layout = graphviz_layout(graph, prog="dot")
-    except:
-        warnings.warn(
-            "Could not use graphviz layout, falling back to default networkx layout. Ensure that graphviz and pygraphviz are installed to enable hierarchical graph layouts. This only affects graph visualization."
-        )
-        layout = nx.spring_layout(graph)
-        # layout = hierarchical_layout(self.graph) #TODO substitute graphviz to remove dependency.
+    layout = graph_layout(graph)
     nx.draw(
         graph,
         with_labels=with_labels,
@@ -7,6 +7,9 @@ from .nodes import (
     AnalysisView,
 )
 from .actors import ActorView
+from .session import Session
+from .actor_cache import ActorCache, get_actor_cache
+from .hydration import resolve_pending_references
 
 def get_view(node) -> BaseView:
     """Get the view corresponding to a given node type
@@ -0,0 +1,189 @@
+"""
+A process-wide cache of Actor entries. A lab typically has a few dozen Actors, but every Action, Measurement, and Analysis references one, so retrieving many nodes would otherwise read the same Actor documents over and over.
+
+Cached entries are trusted for `ActorCache.ttl` seconds. After that, the next lookup revalidates them with a small query that only reads each Actor's ``version`` and ``updated_at``; the full document is only read again if either has changed. Updates made through `ActorView.update` in this process invalidate the cached entry right away. Updates made by other processes are seen once the TTL has elapsed.
+
+.. code-block:: python
+
+    from labgraph.views import get_actor_cache
+
+    cache = get_actor_cache()
+    cache.ttl = 5  # seconds
+    print(cache.stats())  # {"hits": ..., "misses": ..., "revalidations": ..., "size": ...}
+"""
+
+from copy import deepcopy
+import time
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.collection import Collection
+
+_FINGERPRINT_FIELDS = {"version": 1, "updated_at": 1}
+
+
+def _fingerprint(entry: dict) -> Tuple[Any, Any]:
+    return entry.get("version"), entry.get("updated_at")
+
+
+class ActorCache:
+    """Cache of Actor database entries keyed by id. Entries are stored as documents and handed out as copies, so callers can build (and modify) their own Actor objects without affecting the cache."""
+
+    def __init__(self, ttl: float = 60.0, enabled: bool = True):
+        """
+        Args:
+            ttl (float, optional): Seconds for which a cached entry is trusted without checking the database. Use 0 to check the version of an entry on every lookup (this still avoids reading the full document). Defaults to 60.
+            enabled (bool, optional): Whether the cache is used at all. Defaults to True.
+        """
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: Dict[ObjectId, Tuple[dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def _lookup(
+        self, ids: Iterable[ObjectId]
+    ) -> Generator[Tuple[dict, Optional[dict]], List[dict], Dict[ObjectId, dict]]:
+        """Look up Actor entries, yielding each database query that is needed as (filter, projection) and receiving its results. This keeps the cache logic independent of how the queries are run (see `get_entries` and `get_entries_async`)."""
+        ids = set(ids)
+        if not self.enabled:
+            self.misses += len(ids)
+            entries = yield {"_id": {"$in": list(ids)}}, None
+            return {entry["_id"]: entry for entry in entries}
+
+        now = time.monotonic()
+        found: Dict[ObjectId, dict] = {}
+        expired: Dict[ObjectId, dict] = {}
+        for id in ids:
+            cached = self._entries.get(id)
+            if cached is None:
+                continue
+            entry, validated_at = cached
+            if now - validated_at < self.ttl:
+                found[id] = entry
+            else:
+                expired[id] = entry
+
+        if len(expired) > 0:
+            self.revalidations += len(expired)
+            currents = yield {"_id": {"$in": list(expired)}}, _FINGERPRINT_FIELDS
+            for current in currents:
+                entry = expired[current["_id"]]
+                if _fingerprint(current) == _fingerprint(entry):
+                    self._entries[current["_id"]] = (entry, now)
+                    found[current["_id"]] = entry
+            for id in expired:
+                if id not in found:
+                    self._entries.pop(id, None)
+        self.hits += len(found)
+
+        missing = [id for id in ids if id not in found]
+        if len(missing) > 0:
+            self.misses += len(missing)
+            for entry in (yield {"_id": {"$in": missing}}, None):
+                self._entries[entry["_id"]] = (entry, now)
+                found[entry["_id"]] = entry
+
+        return {id: deepcopy(entry) for id, entry in found.items()}
+
+    def get_entries(
+        self, collection: Collection, ids: Iterable[ObjectId]
+    ) -> Dict[ObjectId, dict]:
+        """Get the database entries of the given Actors, from the cache where possible. This makes at most two queries: one to revalidate expired entries, and one to read the entries that are missing or out of date.
+
+        Args:
+            collection (Collection): The actors collection
+            ids (Iterable[ObjectId]): ids of the Actors
+
+        Returns:
+            Dict[ObjectId, dict]: Copies of the Actor entries keyed by id. Actors that are not in the database are omitted.
+        """
+        lookup = self._lookup(ids)
+        try:
+            query = next(lookup)
+            while True:
+                query = lookup.send(list(collection.find(*query)))
+        except StopIteration as result:
+            return result.value
+
+    async def get_entries_async(
+        self, collection: Any, ids: Iterable[ObjectId]
+    ) -> Dict[ObjectId, dict]:
+        """Like `get_entries`, for an asyncio (motor) collection. See `labgraph.views.aio`.
+
+        Args:
+            collection (Any): The actors collection, as a ``motor.motor_asyncio.AsyncIOMotorCollection``
+            ids (Iterable[ObjectId]): ids of the Actors
+
+        Returns:
+            Dict[ObjectId, dict]: Copies of the Actor entries keyed by id. Actors that are not in the database are omitted.
+        """
+        lookup = self._lookup(ids)
+        try:
+            query = next(lookup)
+            while True:
+                query = lookup.send(await collection.find(*query).to_list(None))
+        except StopIteration as result:
+            return result.value
+
+    def get_entry(self, collection: Collection, id: ObjectId) -> Optional[dict]:
+        """Get the database entry of a single Actor, from the cache where possible.
+
+        Args:
+            collection (Collection): The actors collection
+            id (ObjectId): id of the Actor
+
+        Returns:
+            Optional[dict]: A copy of the Actor entry, or None if it is not in the database.
+        """
+        return self.get_entries(collection, [id]).get(id)
+
+    def invalidate(self, id: ObjectId):
+        """Drop an Actor from the cache. The next lookup will read it from the database.
+
+        Args:
+            id (ObjectId): id of the Actor
+        """
+        self._entries.pop(id, None)
+
+    def clear(self):
+        """Drop all entries from the cache. The hit/miss counters are kept."""
+        self._entries.clear()
+
+    def reset_stats(self):
+        """Reset the hit, miss, and revalidation counters to zero."""
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters describing how well the cache is doing.
+
+        Returns:
+            Dict[str, int]: {"hits": ..., "misses": ..., "revalidations": ..., "size": ...}. Hits are lookups answered from the cache (including those that needed a revalidation query), misses are lookups that read the full document from the database, and revalidations are version checks of expired entries.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "size": len(self._entries),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<ActorCache: {len(self)} entries, ttl={self.ttl}s, {self.hits} hits, {self.misses} misses>"
+
+
+_ACTOR_CACHE = ActorCache()
+
+
+def get_actor_cache() -> ActorCache:
+    """Get the process-wide Actor cache.
+
+    Returns:
+        ActorCache: The Actor cache
+    """
+    return _ACTOR_CACHE
@@ -0,0 +1,1127 @@
+"""
+Asyncio counterparts of the views, built on `motor <https://motor.readthedocs.io>`_. These share the data classes (`Material`, `Action`, `Sample`, ...) and the write planning of the synchronous views, but every database call is awaited, so they can be used from an asyncio application without pushing each call into a thread.
+
+Motor is an optional dependency: ``pip install labgraph-db[async]``.
+
+.. code-block:: python
+
+    from labgraph.views.aio import AsyncSampleView
+
+    async def main():
+        samples = AsyncSampleView()
+        sample = await samples.get(sample_id)
+        async for s in samples.iter_filter({"tags": "my_tag"}):
+            ...
+
+The database connection uses the same labgraph config file as the synchronous views. Motor clients are bound to the event loop they are first used in, so use these views from a single event loop (or call `set_async_database` with your own database object).
+
+Nodes built by these views reference their linked nodes lazily (see `labgraph.data.lazy`). Resolving a reference on attribute access is a synchronous call, so use `resolve_pending_references_async` to resolve them in a batch instead.
+
+Node and Sample removal never asks for confirmation. If removing a node would remove or alter other nodes or Samples, nothing is removed unless ``_force_dangerous=True`` is passed.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from bson import ObjectId
+import pymongo
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover
+    AsyncIOMotorClient = None
+
+from labgraph.data.actors import Actor, BaseActor
+from labgraph.data.lazy import pending_references
+from labgraph.data.nodes import Action, Analysis, BaseNode, Material, Measurement
+from labgraph.data.sample import Sample
+from labgraph.utils.indexes import ensure_indexes_async
+from labgraph.utils.instrumentation import instrumented
+from labgraph.views.actor_cache import get_actor_cache
+from labgraph.views.base import (
+    AlreadyInDatabaseError,
+    BaseActorView,
+    BaseNodeView,
+    BaseView,
+    NotFoundInDatabaseError,
+)
+from labgraph.views.history import history_collection_name
+from labgraph.views.hydration import (
+    build_nodes,
+    remember_in_session,
+    split_cached_actors,
+    split_cached_nodes,
+)
+from labgraph.views.sample import SampleView
+from labgraph.views.session import get_active_session
+
+
+class _GetAsyncMongoCollection:
+    client: Optional[Any] = None
+    db: Optional[Any] = None
+    indexed_collections: Set[str] = set()
+
+    @classmethod
+    def init(cls):
+        if AsyncIOMotorClient is None:
+            raise ImportError(
+                "The asyncio views require motor. Install it with `pip install labgraph-db[async]`."
+            )
+        from labgraph.utils.config.config import client_options, get_config
+        from labgraph.utils.instrumentation import command_listener
+
+        db_config = get_config()["mongodb"]
+        cls.client = AsyncIOMotorClient(
+            **client_options(db_config), event_listeners=[command_listener]
+        )
+        cls.db = cls.client[db_config.get("db_name")]
+
+    @classmethod
+    def set_database(cls, db: Any):
+        """
+        Use the given (motor) database instead of connecting with the labgraph config.
+        """
+        cls.client = db.client
+        cls.db = db
+        cls.indexed_collections = set()
+
+    @classmethod
+    def get_database(cls) -> Any:
+        """
+        Get the labgraph database, as a ``motor.motor_asyncio.AsyncIOMotorDatabase``
+        """
+        if cls.db is None:
+            cls.init()
+        return cls.db
+
+    @classmethod
+    def get_collection(cls, name: str) -> Any:
+        """
+        Get collection by name, as a ``motor.motor_asyncio.AsyncIOMotorCollection``. Indexes are created by `ensure_indexes`, which the views call before their first query.
+        """
+        return cls.get_database()[name]
+
+    @classmethod
+    async def ensure_indexes(cls, collection: Any):
+        """
+        Create the declared indexes for a collection, the first time it is used.
+        """
+        if collection.name in cls.indexed_collections:
+            return
+        cls.indexed_collections.add(collection.name)
+        await ensure_indexes_async(collection)
+
+
+get_async_database = _GetAsyncMongoCollection.get_database
+get_async_collection = _GetAsyncMongoCollection.get_collection
+set_async_database = _GetAsyncMongoCollection.set_database
+
+
+## CRUD = Create Update Retrieve Delete
+class AsyncBaseView:
+    """
+    Asyncio counterpart of `labgraph.views.base.BaseView`.
+    """
+
+    _conversion_chunk_size = 1  # entries converted to objects at a time by iter_filter
+
+    _build_filter = staticmethod(BaseView._build_filter)
+    _entry_to_object = BaseView._entry_to_object
+    _get_from_session = BaseView._get_from_session
+    _invalidate_in_session = BaseView._invalidate_in_session
+
+    def __init__(
+        self, collection: str, entry_class: type, allow_duplicate_names: bool = True
+    ):
+        self._collection = get_async_collection(collection)
+        self._history_collection = get_async_collection(
+            history_collection_name(collection)
+        )
+        self._entry_class = entry_class
+        self.allow_duplicate_names = allow_duplicate_names
+
+    async def _ensure_indexes(self):
+        await _GetAsyncMongoCollection.ensure_indexes(self._collection)
+        await _GetAsyncMongoCollection.ensure_indexes(self._history_collection)
+
+    @instrumented
+    async def add(
+        self, entry, if_already_in_db: Literal["raise", "skip", "update"] = "raise"
+    ) -> ObjectId:
+        await self._ensure_indexes()
+        if not isinstance(entry, self._entry_class):
+            raise ValueError(
+                f"Entry {entry} must be of type {self._entry_class.__name__}"
+            )
+
+        if not self.allow_duplicate_names:
+            existing = await self._collection.find_one(
+                {"name": entry.name, "_id": {"$ne": entry.id}}, {"_id": 1}
+            )
+            if existing is not None:
+                raise AlreadyInDatabaseError(
+                    f"Cannot add {entry} because an entry with the same name already exists in the database! Duplicate names are not allowed for entries of type {self._entry_class.__name__}."
+                )
+
+        if await self._exists(entry.id):
+            if if_already_in_db == "skip":
+                return entry.id
+            elif if_already_in_db == "update":
+                await self.update(entry)
+                return entry.id
+            else:
+                raise AlreadyInDatabaseError(
+                    f"{self._entry_class.__name__} (name={entry.name}, id={entry.id}) already exists in the database!"
+                )
+
+        created_at = datetime.now().replace(
+            microsecond=0
+        )  # remove microseconds, they get lost in MongoDB anyways,
+        result = await self._collection.insert_one(
+            {
+                **entry.to_dict(),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        )
+        entry._id = result.inserted_id
+        return result.inserted_id
+
+    async def update(self, entry):
+        raise NotImplementedError()
+
+    @instrumented
+    async def get(self, id: ObjectId) -> Any:
+        cached = self._get_from_session(id)
+        if cached is not None:
+            return cached
+        await self._ensure_indexes()
+        data = await self._collection.find_one({"_id": id})
+        if data is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot find an {self._entry_class.__name__} with id: {id}"
+            )
+        return (await self._entries_to_objects([data]))[0]
+
+    @instrumented
+    async def get_by_tags(self, tags: list) -> list:
+        entries = await self._find({"tags": {"$all": tags}})
+        if len(entries) == 0:
+            raise NotFoundInDatabaseError(
+                f"Cannot find a {self._entry_class.__name__} with tags: {tags}"
+            )
+        return entries
+
+    @instrumented
+    async def get_by_name(self, name: str) -> list:
+        entries = await self._find({"name": name})
+        if len(entries) == 0:
+            raise NotFoundInDatabaseError(
+                f"Cannot find an {self._entry_class.__name__} with name: {name}"
+            )
+        return entries
+
+    async def remove(self, id: ObjectId):
+        raise NotImplementedError()
+
+    async def _find(self, filter_dict: Dict, skip: int = 0, limit: int = 0) -> list:
+        await self._ensure_indexes()
+        cursor = self._collection.find(filter_dict, skip=skip, limit=limit).sort(
+            "created_at", pymongo.DESCENDING
+        )
+        return await self._entries_to_objects(await cursor.to_list(None))
+
+    @instrumented
+    async def iter_filter(
+        self,
+        filter_dict: Dict,
+        datetime_min: datetime = None,
+        datetime_max: datetime = None,
+        limit: int = 0,
+        skip: int = 0,
+        batch_size: Optional[int] = None,
+        projection: Optional[Union[List[str], Dict[str, Any]]] = None,
+    ) -> AsyncIterator[Any]:
+        """Like `AsyncBaseView.filter`, but yields the results one at a time from an async cursor instead of building the whole list. See `BaseView.iter_filter`.
+
+        Args:
+            filter_dict (Dict): standard mongodb filter dictionary
+            datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
+            datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+            limit (int, optional): Maximum number of results. Defaults to 0 (no limit).
+            skip (int, optional): Number of results to skip. Defaults to 0.
+            batch_size (Optional[int], optional): Number of entries to read from the database per round trip. Defaults to None (MongoDB's default).
+            projection (Optional[Union[List[str], Dict[str, Any]]], optional): standard mongodb projection. If given, the raw (partial) database entries are yielded instead of objects. Defaults to None.
+
+        Yields:
+            AsyncIterator[Any]: Objects (nodes, samples, or actors) that match the filter, from most recent to oldest. Raw entries if a projection is given.
+        """
+        await self._ensure_indexes()
+        cursor = self._collection.find(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            projection=projection,
+            skip=skip,
+            limit=limit,
+        ).sort("created_at", pymongo.DESCENDING)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+
+        if projection is not None:
+            async for entry in cursor:
+                yield entry
+            return
+
+        chunk_size = batch_size or self._conversion_chunk_size
+        chunk = []
+        async for entry in cursor:
+            chunk.append(entry)
+            if len(chunk) == chunk_size:
+                for obj in await self._entries_to_objects(chunk):
+                    yield obj
+                chunk = []
+        for obj in await self._entries_to_objects(chunk):
+            yield obj
+
+    @instrumented
+    async def filter(
+        self,
+        filter_dict: Dict,
+        datetime_min: datetime = None,
+        datetime_max: datetime = None,
+        limit: int = 0,
+        skip: int = 0,
+    ) -> list:
+        """Thin wrapper around the motor find method, with an extra datetime filter. Use `AsyncBaseView.iter_filter` for large result sets.
+
+        Args:
+            filter_dict (Dict): standard mongodb filter dictionary
+            datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
+            datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+            limit (int, optional): Maximum number of results. Defaults to 0 (no limit).
+            skip (int, optional): Number of results to skip. Defaults to 0.
+
+        Returns:
+            list: List of Objects (nodes, samples, or actors) that match the filter
+        """
+        return await self._find(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            skip=skip,
+            limit=limit,
+        )
+
+    @instrumented
+    async def filter_one(
+        self,
+        filter_dict: Dict,
+        datetime_min: datetime = None,
+        datetime_max: datetime = None,
+    ) -> Any:
+        """Return only the most recent entry that matches the filter. Useful if only one matching entry is expected.
+
+        Args:
+            filter_dict (Dict): standard mongodb filter dictionary
+            datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
+            datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+
+        Raises:
+            NotFoundInDatabaseError: No entry matches the filter
+
+        Returns:
+            Any: The most recent Object (node, sample, or actor) that matches the filter
+        """
+        await self._ensure_indexes()
+        result = await self._collection.find_one(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            sort=[("created_at", pymongo.DESCENDING)],
+        )
+        if result is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot find any {self._entry_class.__name__} with filter: {filter_dict}"
+            )
+        return (await self._entries_to_objects([result]))[0]
+
+    @instrumented
+    async def _entries_to_objects(self, entries: Iterable[dict]) -> list:
+        """Convert multiple database entries to objects. Views whose objects reference other documents override this to batch their database calls.
+
+        Args:
+            entries (Iterable[dict]): database entries
+
+        Returns:
+            list: List of objects, in the same order as the entries
+        """
+        return BaseView._entries_to_objects(self, entries)
+
+    async def _exists(self, id: ObjectId) -> bool:
+        """Checks if an entry exists by this id
+
+        Args:
+            id (ObjectId): id
+
+        Returns:
+            bool: True if exists, False if does not exist
+        """
+        return await self._collection.count_documents({"_id": id}, limit=1) > 0
+
+
+class AsyncBaseNodeView(AsyncBaseView):
+    """
+    Asyncio counterpart of `labgraph.views.base.BaseNodeView`.
+    """
+
+    _plan_write = BaseNodeView._plan_write
+
+    @instrumented
+    async def update(self, entry: BaseNode):
+        """Updates an entry in the database. The previous entry will be placed in the history collection (see `labgraph.views.history`).
+
+        Args:
+            entry (BaseNode): Node object to be updated
+
+        Raises:
+            TypeError: Node is of wrong type
+            NotFoundInDatabaseError: Node does not exist in the database
+            ValueError: Upstream nodes can only be added, not removed! Removing can break the graph.
+            ValueError: Downstream nodes can only be added, not removed! Removing can break the graph.
+        """
+        if not isinstance(entry, self._entry_class):
+            raise TypeError(f"Entry must be of type {self._entry_class.__name__}")
+
+        await self._ensure_indexes()
+        old_entry = await self._collection.find_one({"_id": entry.id})
+        if old_entry is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot update {self._entry_class.__name__} with id {entry.id} because it does not exist in the database."
+            )
+
+        operation, history_operations, local_changes = self._plan_write(
+            entry,
+            old_entry=old_entry,
+            now=datetime.now().replace(
+                microsecond=0
+            ),  # remove microseconds, they get lost in MongoDB anyways
+        )
+        if operation is None:
+            return  # nothing to update
+        if len(history_operations) > 0:
+            # history first, so a failed update never loses the previous version
+            await self._history_collection.bulk_write(history_operations, ordered=False)
+        await self._collection.bulk_write([operation])
+
+        # update our local copy of the node to reflect database changes
+        for attribute, value in local_changes.items():
+            setattr(entry, attribute, value)
+        self._invalidate_in_session(entry.id)
+
+    _strip_removed_nodes = staticmethod(BaseNodeView._strip_removed_nodes)
+
+    @instrumented
+    async def remove(self, id: ObjectId, _force_dangerous: bool = False):
+        """Removes a node from the database, along with all nodes downstream of it (these would be invalidated). See `BaseNodeView.remove`. References to the removed nodes are removed from the remaining nodes and Samples, and Samples left with a broken graph are removed.
+
+        Unlike `BaseNodeView.remove`, this never asks for confirmation. If other nodes or Samples are affected, nothing is removed unless `_force_dangerous` is True.
+
+        Args:
+            id (ObjectId): id of the node to be removed
+            _force_dangerous (bool, optional): If True, the node is removed even if other nodes or Samples are affected, and no error is raised if the node does not exist. Defaults to False.
+
+        Raises:
+            NotFoundInDatabaseError: Node does not exist in the database
+            ValueError: Other nodes or Samples are affected, and `_force_dangerous` is False
+        """
+        if isinstance(id, BaseNode):
+            # catch if user passes in a node object instead of an id
+            id = id.id
+        await self._ensure_indexes()
+        entry = await self._collection.find_one({"_id": id}, {"downstream": 1})
+        if entry is None:
+            if _force_dangerous:
+                return
+            raise NotFoundInDatabaseError(
+                f"Cannot remove {self._entry_class.__name__} with id {id} because it does not exist in the database."
+            )
+
+        node_type = self._entry_class.__name__
+        affected_nodes = await _get_affected_nodes_async(entry.get("downstream", []))
+        sampleview = AsyncSampleView()
+        affected_samples = await sampleview._find(
+            _samples_containing(
+                [{"node_type": node_type, "node_id": id}, *affected_nodes]
+            )
+        )
+
+        if len(affected_nodes) == 0 and len(affected_samples) == 0:
+            await self._collection.delete_one({"_id": id})
+            self._invalidate_in_session(id)
+            return
+
+        if not _force_dangerous:
+            raise ValueError(
+                f"Removing {node_type} {id} would also remove {len(affected_nodes)} downstream nodes, and affect {len(affected_samples)} samples which contain some or all of these nodes. Nothing was removed. Use _force_dangerous=True to remove them anyways."
+            )
+
+        affected_nodes.append(
+            {"node_type": node_type, "node_id": id}
+        )  # we should delete this node too!
+        invalidated_samples = self._strip_removed_nodes(
+            affected_samples, {node["node_id"] for node in affected_nodes}
+        )
+        for sample in invalidated_samples:
+            await sampleview.remove(
+                sample.id, remove_nodes=False, _force_dangerous=True
+            )
+        await _remove_nodes_async(affected_nodes)
+
+        session = get_active_session()
+        if session is not None:
+            # edges were removed from many other nodes and samples, so we can't trust anything in the identity map anymore
+            session.clear()
+
+
+class AsyncMaterialView(AsyncBaseNodeView):
+
+    def __init__(self):
+        super().__init__("materials", Material)
+
+
+class AsyncActionView(AsyncBaseNodeView):
+
+    def __init__(self):
+        super().__init__("actions", Action)
+
+
+class AsyncMeasurementView(AsyncBaseNodeView):
+
+    def __init__(self):
+        super().__init__("measurements", Measurement)
+
+
+class AsyncAnalysisView(AsyncBaseNodeView):
+
+    def __init__(self):
+        super().__init__("analyses", Analysis)
+
+
+class AsyncActorView(AsyncBaseView):
+    """
+    Asyncio counterpart of `labgraph.views.ActorView`. Actors are read through the process-wide actor cache (see `labgraph.views.actor_cache`), which is shared with the synchronous views.
+    """
+
+    def __init__(self):
+        super().__init__("actors", Actor, allow_duplicate_names=False)
+
+    @instrumented
+    async def get(self, id: ObjectId) -> BaseActor:
+        cached = self._get_from_session(id)
+        if cached is not None:
+            return cached
+        await self._ensure_indexes()
+        entries = await get_actor_cache().get_entries_async(self._collection, [id])
+        if id not in entries:
+            raise NotFoundInDatabaseError(
+                f"Cannot find an {self._entry_class.__name__} with id: {id}"
+            )
+        return (await self._entries_to_objects([entries[id]]))[0]
+
+    @instrumented
+    async def get_many(self, ids: Iterable[ObjectId]) -> Dict[ObjectId, BaseActor]:
+        """Get several actors by id, using the process-wide actor cache. This makes at most two queries, however many actors are requested.
+
+        Args:
+            ids (Iterable[ObjectId]): ids of the actors
+
+        Returns:
+            Dict[ObjectId, BaseActor]: actors keyed by id. Actors that are not in the database are omitted.
+        """
+        await self._ensure_indexes()
+        entries = await get_actor_cache().get_entries_async(self._collection, ids)
+        return {
+            actor.id: actor
+            for actor in await self._entries_to_objects(entries.values())
+        }
+
+    @instrumented
+    async def update(self, entry: BaseActor):
+        if not isinstance(entry, BaseActor):
+            raise TypeError(f"Entry must be of type {BaseActor.__name__}")
+
+        await self._ensure_indexes()
+        old_entry = await self._collection.find_one({"_id": entry.id})
+        if old_entry is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot update {self._entry_class.__name__} with id {entry.id} because it does not exist in the database."
+            )
+
+        new_entry = BaseActorView._plan_update(entry, old_entry)
+        await self._collection.replace_one({"_id": entry.id}, new_entry)
+        get_actor_cache().invalidate(entry.id)
+        self._invalidate_in_session(entry.id)
+
+    @instrumented
+    async def remove(self, id: ObjectId):
+        raise NotImplementedError("Actor removal is not yet supported.")
+
+
+ASYNC_NODE_VIEWS = {
+    "Material": AsyncMaterialView,
+    "Action": AsyncActionView,
+    "Measurement": AsyncMeasurementView,
+    "Analysis": AsyncAnalysisView,
+}
+
+
+def get_async_view_by_type(node_type: str) -> AsyncBaseView:
+    """Get the async view corresponding to a given node type
+
+    Args:
+        node_type (str): Node/Actor/Sample type to get view for
+
+    Returns:
+        AsyncBaseView: View for type
+    """
+    VIEWS = {
+        **ASYNC_NODE_VIEWS,
+        "Actor": AsyncActorView,
+        "Sample": AsyncSampleView,
+    }
+    if node_type not in VIEWS:
+        raise ValueError(
+            f"Invalid node type: {node_type}. Must be one of {VIEWS.keys()}"
+        )
+    return VIEWS[node_type]()
+
+
+def _samples_containing(nodes: Iterable[dict]) -> dict:
+    """Build a filter matching every Sample that contains any of the given nodes.
+
+    Args:
+        nodes (Iterable[dict]): node references, with "node_type" and "node_id" keys
+
+    Returns:
+        dict: MongoDB filter for the samples collection
+    """
+    ids_by_type: Dict[str, List[ObjectId]] = {}
+    for node in nodes:
+        ids_by_type.setdefault(node["node_type"], []).append(node["node_id"])
+    return {
+        "$or": [
+            {f"nodes.{node_type}": {"$in": ids}}
+            for node_type, ids in ids_by_type.items()
+        ]
+    }
+
+
+async def _get_affected_nodes_async(downstream: Iterable[dict]) -> List[dict]:
+    """Get all nodes affected by a change to a node, given the node's downstream edges. See `labgraph.views.graph_integrity.get_affected_nodes`. Each level of the downstream graph is walked with one concurrent query per node collection.
+
+    Args:
+        downstream (Iterable[dict]): downstream edges of the changed node, with "node_type" and "node_id" keys
+
+    Returns:
+        List[dict]: References to the affected nodes, with "node_type" and "node_id" keys, in the order they were found.
+    """
+    affected_nodes = []
+    seen: Set[ObjectId] = set()
+    frontier = list(downstream)
+    while len(frontier) > 0:
+        ids_by_type: Dict[str, List[ObjectId]] = {}
+        for node in frontier:
+            if node["node_id"] in seen:
+                continue
+            seen.add(node["node_id"])
+            affected_nodes.append(
+                {"node_type": node["node_type"], "node_id": node["node_id"]}
+            )
+            ids_by_type.setdefault(node["node_type"], []).append(node["node_id"])
+        results = await asyncio.gather(
+            *[
+                ASYNC_NODE_VIEWS[node_type]()
+                ._collection.find({"_id": {"$in": ids}}, {"downstream": 1})
+                .to_list(None)
+                for node_type, ids in ids_by_type.items()
+            ]
+        )
+        frontier = [
+            node
+            for found in results
+            for entry in found
+            for node in entry.get("downstream", [])
+        ]
+    return affected_nodes
+
+
+async def _remove_nodes_async(nodes: List[dict]):
+    """Deletes nodes from the database, and removes all edges and Sample references that point to them. See `labgraph.views.graph_integrity._remove_references_to_node`. This will NOT check for graph integrity -- this is used internally by `AsyncBaseNodeView.remove`.
+
+    Args:
+        nodes (List[dict]): References to the nodes to be deleted, with "node_type" and "node_id" keys
+    """
+    node_ids = [node["node_id"] for node in nodes]
+    ids_by_type: Dict[str, List[ObjectId]] = {}
+    for node in nodes:
+        ids_by_type.setdefault(node["node_type"], []).append(node["node_id"])
+    node_views = [view_class() for view_class in ASYNC_NODE_VIEWS.values()]
+
+    await asyncio.gather(
+        *[
+            ASYNC_NODE_VIEWS[node_type]()._collection.delete_many({"_id": {"$in": ids}})
+            for node_type, ids in ids_by_type.items()
+        ]
+    )
+    await asyncio.gather(
+        *[
+            view._collection.update_many(
+                {f"{direction}.node_id": {"$in": node_ids}},
+                {"$pull": {direction: {"node_id": {"$in": node_ids}}}},
+            )
+            for view in node_views
+            for direction in ["upstream", "downstream"]
+        ],
+        AsyncSampleView()._collection.update_many(
+            _samples_containing(nodes),
+            {
+                "$pull": {
+                    f"nodes.{node_type}": {"$in": ids}
+                    for node_type, ids in ids_by_type.items()
+                }
+            },
+        ),
+    )
+
+
+@instrumented
+async def hydrate_nodes_async(
+    node_ids: Dict[str, Iterable[ObjectId]],
+) -> Dict[ObjectId, BaseNode]:
+    """Asyncio counterpart of `labgraph.views.hydration.hydrate_nodes`. The node collections are queried concurrently (one ``$in`` query each), followed by one lookup for the actors.
+
+    Args:
+        node_ids (Dict[str, Iterable[ObjectId]]): node ids to retrieve, keyed by node type (Material, Action, Measurement, Analysis)
+
+    Returns:
+        Dict[ObjectId, BaseNode]: node objects keyed by node id. Nodes that were not found in the database are omitted. The actors of the requested nodes are also included.
+    """
+    session = get_active_session()
+    to_fetch, cached = split_cached_nodes(node_ids, session)
+    node_types = list(to_fetch)
+    results = await asyncio.gather(
+        *[
+            ASYNC_NODE_VIEWS[node_type]()
+            ._collection.find({"_id": {"$in": to_fetch[node_type]}})
+            .to_list(None)
+            for node_type in node_types
+        ]
+    )
+    node_entries: Dict[ObjectId, Tuple[str, dict]] = {}
+    for node_type, entries in zip(node_types, results):
+        for entry in entries:
+            node_entries[entry["_id"]] = (node_type, entry)
+
+    actor_ids = split_cached_actors(node_entries, session, cached)
+    actor_entries = {}
+    if len(actor_ids) > 0:
+        actor_entries = await get_actor_cache().get_entries_async(
+            get_async_collection("actors"), actor_ids
+        )
+
+    resolved = build_nodes(node_entries, actor_entries, known=cached)
+    remember_in_session(session, node_entries, actor_entries, resolved)
+    return resolved
+
+
+@instrumented
+async def resolve_pending_references_async() -> int:
+    """Asyncio counterpart of `labgraph.views.hydration.resolve_pending_references`.
+
+    Returns:
+        int: Number of references that were resolved. References whose entries are no longer in the database are left unresolved.
+    """
+    pending = pending_references()
+    if len(pending) == 0:
+        return 0
+
+    node_ids: Dict[str, Set[ObjectId]] = {}
+    actor_ids: Set[ObjectId] = set()
+    for proxy in pending:
+        if proxy.labgraph_node_type == "Actor":
+            actor_ids.add(proxy.id)
+        else:
+            node_ids.setdefault(proxy.labgraph_node_type, set()).add(proxy.id)
+
+    resolved: Dict[ObjectId, Any] = (
+        await hydrate_nodes_async(node_ids) if node_ids else {}
+    )
+    missing_actor_ids = actor_ids - set(resolved)
+    if len(missing_actor_ids) > 0:
+        resolved.update(await AsyncActorView().get_many(missing_actor_ids))
+
+    count = 0
+    for proxy in pending:
+        target = resolved.get(proxy.id)
+        if target is not None:
+            proxy._set_target(target)
+            count += 1
+    return count
+
+
+class AsyncSampleView(AsyncBaseView):
+    """
+    Asyncio counterpart of `labgraph.views.SampleView`.
+    """
+
+    _conversion_chunk_size = (
+        100  # samples whose nodes are retrieved together by iter_filter
+    )
+
+    _new_sample_document = staticmethod(SampleView._new_sample_document)
+    _check_if_nodes_are_valid = SampleView._check_if_nodes_are_valid
+    _external_node_ids = staticmethod(SampleView._external_node_ids)
+    _group_nodes_by_type = staticmethod(SampleView._group_nodes_by_type)
+    _plan_node_writes = SampleView._plan_node_writes
+    _apply_written_nodes = SampleView._apply_written_nodes
+    _plan_update = staticmethod(SampleView._plan_update)
+    _sample_from_entry = staticmethod(SampleView._sample_from_entry)
+
+    def __init__(self):
+        super().__init__("samples", Sample)
+        self.actionview = AsyncActionView()
+        self.materialview = AsyncMaterialView()
+        self.analysisview = AsyncAnalysisView()
+        self.measurementview = AsyncMeasurementView()
+
+    def _node_views(self) -> Dict[str, AsyncBaseNodeView]:
+        return {
+            "Action": self.actionview,
+            "Material": self.materialview,
+            "Measurement": self.measurementview,
+            "Analysis": self.analysisview,
+        }
+
+    async def _ensure_indexes(self):
+        await asyncio.gather(
+            super()._ensure_indexes(),
+            *[view._ensure_indexes() for view in self._node_views().values()],
+        )
+
+    @instrumented
+    async def add(
+        self,
+        entry: Sample,
+        additional_incoming_node_ids: Optional[List[ObjectId]] = None,
+        if_already_in_db: Literal["raise", "skip", "update"] = "raise",
+        transaction: bool = False,
+    ) -> ObjectId:
+        """Adds a Sample, and all of its nodes, to the database. See `SampleView.add`.
+
+        Args:
+            entry (Sample): Sample to be added
+            additional_incoming_node_ids (Optional[List[ObjectId]], optional): ids of nodes that are not in this Sample or the database yet, but are guaranteed to be added. Edges to these nodes are considered valid. Defaults to None.
+            if_already_in_db (Literal["raise", "skip", "update"], optional): What to do if the Sample is already in the database. Defaults to "raise".
+            transaction (bool, optional): If True, the nodes and the Sample are written in a single MongoDB transaction. Requires MongoDB to be running as a replica set. Defaults to False.
+
+        Raises:
+            ValueError: Entry is not a Sample, or the Sample graph is not valid.
+            AlreadyInDatabaseError: Sample is already in the database and `if_already_in_db` is "raise".
+
+        Returns:
+            ObjectId: id of the Sample
+        """
+        if not isinstance(entry, self._entry_class):
+            raise ValueError(f"Entry must be of type {self._entry_class.__name__}")
+
+        if not entry.has_valid_graph:
+            raise ValueError(
+                "Sample graph is not valid! Check for isolated nodes or graph cycles."
+            )
+
+        await self._ensure_indexes()
+        if await self._exists(entry.id):
+            if if_already_in_db == "raise":
+                raise AlreadyInDatabaseError(
+                    f"{self._entry_class.__name__} (name={entry.name}, id={entry.id}) already exists in the database!"
+                )
+            elif if_already_in_db == "skip":
+                return entry.id
+            elif if_already_in_db == "update":
+                await self.update(entry, transaction=transaction)
+                return entry.id
+        self._check_if_nodes_are_valid(
+            entry
+        )  # will throw error if any nodes cannot be encoded to BSON
+
+        if not await self._has_valid_graph_in_db(
+            entry, additional_incoming_node_ids=additional_incoming_node_ids
+        ):
+            raise ValueError(
+                "Sample graph is not valid! Check for isolated nodes, graph cycles, or node dependencies that are not covered by either 1. existing database entries 2. nodes in this Sample or 3. nodes in the `additional_incoming_nodes` list."
+            )
+
+        created_at = datetime.now().replace(
+            microsecond=0
+        )  # remove microseconds, they get lost in MongoDB anyways
+
+        async def insert_sample(db_session):
+            await self._collection.insert_one(
+                self._new_sample_document(entry, created_at), session=db_session
+            )
+
+        await self._write_with_nodes(entry, insert_sample, transaction=transaction)
+
+        # update local copy of entry to reflect database changes
+        entry._created_at = created_at
+        entry._updated_at = created_at
+        return entry.id
+
+    @instrumented
+    async def update(self, entry: Sample, transaction: bool = False):
+        """Updates an entry in the database. See `SampleView.update`.
+
+        Args:
+            entry (Sample): Sample object to be updated
+            transaction (bool, optional): If True, the nodes and the Sample are written in a single MongoDB transaction. Requires MongoDB to be running as a replica set. Defaults to False.
+
+        Raises:
+            TypeError: Node is of wrong type
+            NotFoundInDatabaseError: Node does not exist in the database
+            ValueError: Upstream nodes can only be added, not removed! Removing can break the graph.
+            ValueError: Downstream nodes can only be added, not removed! Removing can break the graph.
+        """
+        if not isinstance(entry, Sample):
+            raise TypeError("Entry must be of type Sample!")
+
+        if not entry.has_valid_graph:
+            raise ValueError(
+                "Sample graph is not valid! Check for isolated nodes or graph cycles."
+            )
+        await self._ensure_indexes()
+        old_entry = await self._collection.find_one({"_id": entry.id})
+        if old_entry is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot update Sample with id {entry.id} because it does not exist in the database."
+            )
+
+        self._check_if_nodes_are_valid(
+            entry
+        )  # will throw error if any nodes cannot be encoded to BSON
+
+        updated_at = datetime.now().replace(
+            microsecond=0
+        )  # remove microseconds, they get lost in MongoDB anyways
+        operation, history_operations, local_changes = self._plan_update(
+            entry, old_entry, updated_at
+        )
+
+        async def write_sample(db_session):
+            if len(history_operations) > 0:
+                await self._history_collection.bulk_write(
+                    history_operations, ordered=False, session=db_session
+                )
+            await self._collection.bulk_write([operation], session=db_session)
+
+        await self._write_with_nodes(entry, write_sample, transaction=transaction)
+
+        # update local copy of entry to reflect database changes
+        for attribute, value in local_changes.items():
+            setattr(entry, attribute, value)
+        self._invalidate_in_session(entry.id)
+
+    @instrumented
+    async def remove(
+        self, id: ObjectId, remove_nodes: bool = False, _force_dangerous: bool = False
+    ):
+        """Removes a Sample from the database. See `SampleView.remove`.
+
+        Args:
+            id (ObjectId): id of the Sample to be removed
+            remove_nodes (bool, optional): If True, the nodes of the Sample are removed as well, see `AsyncBaseNodeView.remove`. Defaults to False.
+            _force_dangerous (bool, optional): Passed on to the removal of each node. If True, no error is raised if the Sample does not exist. Defaults to False.
+
+        Raises:
+            NotFoundInDatabaseError: Sample does not exist in the database
+            ValueError: Removing the nodes affects other nodes or Samples, and `_force_dangerous` is False
+        """
+        await self._ensure_indexes()
+        entry = await self._collection.find_one({"_id": id}, {"nodes": 1})
+        if entry is None:
+            if _force_dangerous:
+                return
+            raise NotFoundInDatabaseError(
+                f"Cannot remove Sample with id {id} because it does not exist in the database."
+            )
+
+        if remove_nodes:
+            node_views = self._node_views()
+            for node_type, node_ids in entry["nodes"].items():
+                for node_id in node_ids:
+                    await node_views[node_type].remove(
+                        node_id, _force_dangerous=_force_dangerous
+                    )
+
+        result = await self._collection.delete_one({"_id": id})
+        self._invalidate_in_session(id)
+        if result.deleted_count == 0 and not remove_nodes:
+            # if removing nodes, this sample may have been deleted in the node removal sequence, so no error raise is needed
+            raise NotFoundInDatabaseError(
+                f"Cannot remove Sample with id {id} because it does not exist in the database."
+            )
+
+    @instrumented
+    async def get_by_node(self, node: BaseNode) -> List[Sample]:
+        """Return any Sample(s) that contain the given node. See `SampleView.get_by_node`."""
+        return await self.get_by_node_info(node.__class__.__name__, node.id)
+
+    @instrumented
+    async def get_by_node_info(self, node_type: str, node_id: ObjectId) -> List[Sample]:
+        """Return any Sample(s) that contain a node of the given type and ID. See `SampleView.get_by_node_info`."""
+        if node_type not in ASYNC_NODE_VIEWS:
+            raise ValueError(
+                "node_type must be one of 'Action', 'Material', 'Measurement', 'Analysis'"
+            )
+        entries = await self._find({f"nodes.{node_type}": node_id})
+        if len(entries) == 0:
+            raise NotFoundInDatabaseError(
+                f"No Sample found containing node of type {node_type} with id {node_id}!"
+            )
+        return entries
+
+    async def _has_valid_graph_in_db(
+        self,
+        sample: Sample,
+        additional_incoming_node_ids: Optional[List[ObjectId]] = None,
+    ) -> bool:
+        external_node_ids = {
+            nodetype: node_ids
+            for nodetype, node_ids in self._external_node_ids(
+                sample, additional_incoming_node_ids
+            ).items()
+            if len(node_ids) > 0
+        }
+        node_views = self._node_views()
+        results = await asyncio.gather(
+            *[
+                node_views[nodetype]
+                ._collection.find({"_id": {"$in": list(node_ids)}}, {"_id": 1})
+                .to_list(None)
+                for nodetype, node_ids in external_node_ids.items()
+            ]
+        )
+        for (nodetype, node_ids), found in zip(external_node_ids.items(), results):
+            for node_id in node_ids - {result["_id"] for result in found}:
+                print(f"Cannot find an {nodetype} with id: {node_id}")
+                return False
+        return True
+
+    async def _bulk_write_nodes(
+        self, nodes: Iterable[BaseNode], db_session: Optional[Any] = None
+    ) -> List[Tuple[BaseNode, Dict[str, Any]]]:
+        """Adds or updates many nodes at once. See `SampleView._bulk_write_nodes`. The node collections are read, and then written, concurrently."""
+        node_views = self._node_views()
+        nodes_by_type = self._group_nodes_by_type(nodes)
+        node_types = list(nodes_by_type)
+        results = await asyncio.gather(
+            *[
+                node_views[nodetype]
+                ._collection.find(
+                    {"_id": {"$in": list(nodes_by_type[nodetype])}},
+                    session=db_session,
+                )
+                .to_list(None)
+                for nodetype in node_types
+            ]
+        )
+        planned, history_writes, writes = self._plan_node_writes(
+            nodes_by_type, dict(zip(node_types, results))
+        )
+
+        # history first, so a failed update never loses the previous version
+        await asyncio.gather(
+            *[
+                node_views[nodetype]._history_collection.bulk_write(
+                    operations, ordered=False, session=db_session
+                )
+                for nodetype, operations in history_writes
+            ]
+        )
+        await asyncio.gather(
+            *[
+                node_views[nodetype]._collection.bulk_write(
+                    operations, ordered=False, session=db_session
+                )
+                for nodetype, operations in writes
+            ]
+        )
+        return planned
+
+    async def _write_with_nodes(self, entry: Sample, write_sample, transaction=False):
+        """Writes all nodes of a Sample, then the Sample itself. See `SampleView._write_with_nodes`.
+
+        Args:
+            entry (Sample): Sample whose nodes should be written
+            write_sample: Coroutine function that writes the Sample entry, given the MongoDB session to write in.
+            transaction (bool, optional): If True, everything is written in a single MongoDB transaction. Defaults to False.
+        """
+        if transaction:
+            client = get_async_database().client
+            async with await client.start_session() as db_session:
+                async with db_session.start_transaction():
+                    written_nodes = await self._bulk_write_nodes(
+                        entry.nodes, db_session=db_session
+                    )
+                    await write_sample(db_session)
+        else:
+            written_nodes = await self._bulk_write_nodes(entry.nodes)
+            await write_sample(None)
+
+        self._apply_written_nodes(written_nodes)
+
+    @instrumented
+    async def _entries_to_objects(self, entries: Iterable[dict]) -> List[Sample]:
+        """Build Sample objects from their database entries. The nodes of all Samples are retrieved together, with one concurrent query per node collection (plus one for actors).
+
+        Args:
+            entries (Iterable[dict]): Sample entries from the database
+
+        Returns:
+            List[Sample]: Sample objects, in the same order as the entries
+        """
+        entries = list(entries)
+        session = get_active_session()
+        cached_samples = {}
+        if session is not None:
+            for entry in entries:
+                cached = session.get("Sample", entry["_id"])
+                if cached is not None:
+                    cached_samples[entry["_id"]] = cached
+
+        node_ids: Dict[str, Set[ObjectId]] = {
+            nodetype: set() for nodetype in ASYNC_NODE_VIEWS
+        }
+        for entry in entries:
+            if entry["_id"] in cached_samples:
+                continue
+            for nodetype, nodeids in entry["nodes"].items():
+                node_ids[nodetype].update(nodeids)
+        resolved = await hydrate_nodes_async(node_ids)
+
+        samples = []
+        for entry in entries:
+            if entry["_id"] in cached_samples:
+                samples.append(cached_samples[entry["_id"]])
+                continue
+            s = self._sample_from_entry(entry, resolved)
+            if session is not None:
+                session.put("Sample", s.id, s)
+            samples.append(s)
+        return samples
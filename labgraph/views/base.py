@@ -1,10 +1,38 @@
 from bson import ObjectId
 from datetime import datetime
-from typing import Literal, cast, List, Dict
+import itertools
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+    List,
+    Dict,
+    Set,
+    TYPE_CHECKING,
+)
 from labgraph.utils.data_objects import get_collection
 from labgraph.data.nodes import BaseNode
 from labgraph.data.actors import BaseActor
+from labgraph.views.history import (
+    get_history_collection,
+    load_version_history,
+    plan_history_writes,
+)
+from labgraph.views.actor_cache import get_actor_cache
+from labgraph.views.session import get_active_session
+from labgraph.utils.instrumentation import instrumented
 import pymongo
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+
+if TYPE_CHECKING:
+    from labgraph.data.sample import Sample
+
+WriteOperation = Union[InsertOne, UpdateOne, ReplaceOne]
 
 
 class NotFoundInDatabaseError(ValueError):
@@ -25,13 +53,17 @@ class BaseView:
     Basic view to add, get, and remove entries from the database collections.
     """
 
+    _conversion_chunk_size = 1  # entries converted to objects at a time by iter_filter
+
     def __init__(
         self, collection: str, entry_class: type, allow_duplicate_names: bool = True
     ):
         self._collection = get_collection(collection)
+        self._history_collection = get_history_collection(self._collection)
         self._entry_class = entry_class
         self.allow_duplicate_names = allow_duplicate_names
 
+    @instrumented
     def add(
         self, entry, if_already_in_db: Literal["raise", "skip", "update"] = "raise"
     ) -> ObjectId:
@@ -94,11 +126,12 @@ class BaseView:
         entry._id = result.inserted_id
         return cast(ObjectId, result.inserted_id)
 
+    @instrumented
     def get_by_tags(self, tags: list) -> List[BaseNode]:
         results = self._collection.find({"tags": {"$all": tags}}).sort(
             "created_at", pymongo.DESCENDING
         )
-        entries = [self._entry_to_object(entry) for entry in results]
+        entries = self._entries_to_objects(results)
         if len(entries) == 0:
             raise NotFoundInDatabaseError(
                 f"Cannot find a {self._entry_class.__name__} with tags: {tags}"
@@ -106,11 +139,12 @@ class BaseView:
 
         return entries
 
+    @instrumented
     def get_by_name(self, name: str) -> List[BaseNode]:
         results = self._collection.find({"name": name}).sort(
             "created_at", pymongo.DESCENDING
         )
-        entries = [self._entry_to_object(entry) for entry in results]
+        entries = self._entries_to_objects(results)
 
         if len(entries) == 0:
             raise NotFoundInDatabaseError(
@@ -118,66 +152,205 @@ class BaseView:
             )
         return entries
 
+    @instrumented
     def get(self, id: ObjectId) -> BaseNode:
+        cached = self._get_from_session(id)
+        if cached is not None:
+            return cached
         data = self._collection.find_one({"_id": id})
         if data is None:
             raise NotFoundInDatabaseError(
                 f"Cannot find an {self._entry_class.__name__} with id: {id}"
             )
-        return self._entry_to_object(data)
+        return self._entries_to_objects([data])[0]
 
     def remove(self, id: ObjectId):
         raise NotImplementedError()
 
+    @staticmethod
+    def _build_filter(
+        filter_dict: Dict,
+        datetime_min: datetime = None,
+        datetime_max: datetime = None,
+    ) -> Dict:
+        """Add the datetime bounds to a mongodb filter dictionary. The given dictionary is not modified."""
+        filter_dict = dict(filter_dict)
+        created_at = {}
+        if isinstance(filter_dict.get("created_at"), dict):
+            created_at.update(filter_dict["created_at"])
+        elif "created_at" in filter_dict:
+            created_at["$eq"] = filter_dict["created_at"]
+        if datetime_min is not None:
+            created_at["$gte"] = datetime_min
+        if datetime_max is not None:
+            created_at["$lte"] = datetime_max
+        if len(created_at) > 0:
+            filter_dict["created_at"] = created_at
+        return filter_dict
+
+    def iter_filter(
+        self,
+        filter_dict: Dict,
+        datetime_min: datetime = None,
+        datetime_max: datetime = None,
+        limit: int = 0,
+        skip: int = 0,
+        batch_size: Optional[int] = None,
+        projection: Optional[Union[List[str], Dict[str, Any]]] = None,
+    ) -> Iterator[Any]:
+        """Like `BaseView.filter`, but yields the results one at a time instead of building the whole list. Entries are read from the database in batches and converted to objects as they are consumed, so this is suitable for very large result sets.
+
+        Args:
+            filter_dict (Dict): standard mongodb filter dictionary
+            datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
+            datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+            limit (int, optional): Maximum number of results. Defaults to 0 (no limit).
+            skip (int, optional): Number of results to skip. Defaults to 0.
+            batch_size (Optional[int], optional): Number of entries to read from the database per round trip. Defaults to None (MongoDB's default).
+            projection (Optional[Union[List[str], Dict[str, Any]]], optional): standard mongodb projection. If given, the raw (partial) database entries are yielded instead of objects. Defaults to None.
+
+        Yields:
+            Iterator[Any]: Objects (nodes, samples, or actors) that match the filter, from most recent to oldest. Raw entries if a projection is given.
+        """
+        cursor = self._collection.find(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            projection=projection,
+            skip=skip,
+            limit=limit,
+        ).sort("created_at", pymongo.DESCENDING)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+
+        if projection is not None:
+            yield from cursor
+            return
+
+        chunk_size = batch_size or self._conversion_chunk_size
+        while True:
+            chunk = list(itertools.islice(cursor, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield from self._entries_to_objects(chunk)
+
+    @instrumented
     def filter(
         self,
         filter_dict: Dict,
         datetime_min: datetime = None,
         datetime_max: datetime = None,
+        limit: int = 0,
+        skip: int = 0,
     ) -> List[BaseNode]:
-        """Thin wrapper around pymongo find method, with an extra datetime filter
+        """Thin wrapper around pymongo find method, with an extra datetime filter. Use `BaseView.iter_filter` for large result sets.
 
         Args:
             filter_dict (Dict): standard mongodb filter dictionary
             datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
             datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+            limit (int, optional): Maximum number of results. Defaults to 0 (no limit).
+            skip (int, optional): Number of results to skip. Defaults to 0.
 
         Returns:
             List[BaseObject]: List of Objects (nodes or samples) that match the filter
         """
-        if datetime_min is not None:
-            if "created_at" in filter_dict:
-                filter_dict["created_at"]["$gte"] = datetime_max
-            else:
-                filter_dict["created_at"] = {"$gte": datetime_min}
-        if datetime_max is not None:
-            if "created_at" in filter_dict:
-                filter_dict["created_at"]["$lte"] = datetime_max
-            else:
-                filter_dict["created_at"] = {"$lte": datetime_max}
-
-        results = self._collection.find(filter_dict).sort(
-            "created_at", pymongo.DESCENDING
-        )
-        return [self._entry_to_object(result) for result in results]
-
+        results = self._collection.find(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            skip=skip,
+            limit=limit,
+        ).sort("created_at", pymongo.DESCENDING)
+        return self._entries_to_objects(results)
+
+    @instrumented
     def filter_one(
         self,
         filter_dict: Dict,
         datetime_min: datetime = None,
         datetime_max: datetime = None,
     ):
-        """Return only the first entry from BaseView.filter. Useful if only one matching entry is expected."""
-        results = self.filter(filter_dict, datetime_min, datetime_max)
-        if len(results) == 0:
+        """Return only the most recent entry that matches the filter. Useful if only one matching entry is expected.
+
+        Args:
+            filter_dict (Dict): standard mongodb filter dictionary
+            datetime_min (datetime, optional): entries from before this datetime will not be shown. Defaults to None.
+            datetime_max (datetime, optional): entries from after this datetime will not be shown. Defaults to None.
+
+        Raises:
+            NotFoundInDatabaseError: No entry matches the filter
+
+        Returns:
+            BaseObject: The most recent Object (node or sample) that matches the filter
+        """
+        result = self._collection.find_one(
+            self._build_filter(filter_dict, datetime_min, datetime_max),
+            sort=[("created_at", pymongo.DESCENDING)],
+        )
+        if result is None:
             raise NotFoundInDatabaseError(
                 f"Cannot find any {self._entry_class.__name__} with filter: {filter_dict}"
             )
-        return self.filter(filter_dict, datetime_min, datetime_max)[0]
+        return self._entries_to_objects([result])[0]
 
     def _entry_to_object(self, entry: dict):
         return self._entry_class.from_dict(entry)
 
+    def _entries_to_objects(self, entries: Iterable[dict]) -> list:
+        """Convert multiple database entries to objects. Views whose objects reference other documents can override this to batch their database calls.
+
+        Args:
+            entries (Iterable[dict]): database entries (e.g. a pymongo cursor)
+
+        Returns:
+            list: List of objects, in the same order as the entries
+        """
+        session = get_active_session()
+        if session is None:
+            return [self._entry_to_object(entry) for entry in entries]
+
+        entry_type = self._entry_class.__name__
+        objects = []
+        for entry in entries:
+            obj = session.get(entry_type, entry["_id"])
+            if obj is None:
+                obj = self._entry_to_object(entry)
+                session.put(entry_type, obj.id, obj)
+            objects.append(obj)
+        return objects
+
+    def _get_from_session(self, id: ObjectId) -> Optional[Any]:
+        """Get an entry from the active Session's identity map, if a Session is active.
+
+        Args:
+            id (ObjectId): id of the entry
+
+        Returns:
+            Optional[Any]: The entry object, or None if there is no active Session or the entry is not in it.
+        """
+        session = get_active_session()
+        if session is None:
+            return None
+        return session.get(self._entry_class.__name__, id)
+
+    def _invalidate_in_session(self, id: ObjectId):
+        """Remove an entry from the active Session's identity map, if a Session is active. Call this whenever an entry is changed in the database.
+
+        Args:
+            id (ObjectId): id of the entry
+        """
+        session = get_active_session()
+        if session is not None:
+            session.invalidate(self._entry_class.__name__, id)
+
+    def _load_version_history(self, id: ObjectId) -> List[dict]:
+        """Loads all previous versions of a node or sample from the database, oldest first.
+
+        Args:
+            id (ObjectId): id of the entry
+
+        Returns:
+            List[dict]: Previous versions of the entry. Each has a "version" field.
+        """
+        return load_version_history(self._collection, id)
+
     def _exists(self, id: ObjectId) -> bool:
         """Checks if an entry exists by this id
 
@@ -191,8 +364,9 @@ class BaseView:
 
 
 class BaseNodeView(BaseView):
+    @instrumented
     def update(self, entry: BaseNode, _nodes_pending_deletion: List[dict] = None):
-        """Updates an entry in the database. The previous entry will be placed in a `version_history` field of the entry.
+        """Updates an entry in the database. The previous entry will be placed in the history collection (see `labgraph.views.history`).
 
         Args:
             entry (BaseObject): Node object to be updated
@@ -212,14 +386,64 @@ class BaseNodeView(BaseView):
                 f"Cannot update {self._entry_class.__name__} with id {entry.id} because it does not exist in the database."
             )
 
+        operation, history_operations, local_changes = self._plan_write(
+            entry,
+            old_entry=old_entry,
+            now=datetime.now().replace(
+                microsecond=0
+            ),  # remove microseconds, they get lost in MongoDB anyways
+        )
+        if operation is None:
+            return  # nothing to update
+        if len(history_operations) > 0:
+            # history first, so a failed update never loses the previous version
+            self._history_collection.bulk_write(history_operations, ordered=False)
+        self._collection.bulk_write([operation])
+
+        # update our local copy of the node to reflect database changes
+        for attribute, value in local_changes.items():
+            setattr(entry, attribute, value)
+        self._invalidate_in_session(entry.id)
+
+    def _plan_write(
+        self, entry: BaseNode, old_entry: Optional[dict], now: datetime
+    ) -> Tuple[Optional[WriteOperation], List[ReplaceOne], Dict[str, Any]]:
+        """Plans the database write that adds a node (if it is not in the database yet) or updates it (if it is), without touching the database. This lets callers diff many nodes against the database at once and send all of the writes in a single `bulk_write`.
+
+        When an update creates a new version, the previous version is written to the history collection (see `labgraph.views.history`).
+
+        Args:
+            entry (BaseNode): Node object to be written
+            old_entry (Optional[dict]): The node's current database entry, or None if it is not in the database yet.
+            now (datetime): Timestamp to use for created_at/updated_at.
+
+        Raises:
+            ValueError: Upstream nodes can only be added, not removed! Removing can break the graph.
+            ValueError: Downstream nodes can only be added, not removed! Removing can break the graph.
+
+        Returns:
+            Tuple[Optional[WriteOperation], List[ReplaceOne], Dict[str, Any]]: (operation, history operations, local changes). The operation is None if nothing needs to be written. The history operations go to `self._history_collection`, and should be written before the operation. The local changes are attributes to set on the node object once the operation has been written.
+        """
         new_entry = entry.to_dict()
+        if old_entry is None:
+            operation = InsertOne(
+                {
+                    **new_entry,
+                    "created_at": now,
+                    "updated_at": now,
+                    "version": 1,
+                }
+            )
+            return operation, [], {"_created_at": now, "_updated_at": now}
+
+        old_entry = dict(old_entry)
         old_entry_for_comparison = {
             k: v
             for k, v in old_entry.items()
-            if k not in ["version_history", "updated_at", "created_at"]
+            if k not in ["version", "version_history", "updated_at", "created_at"]
         }
         if new_entry == old_entry_for_comparison:
-            return  # nothing to update
+            return None, [], {}  # nothing to update
 
         if any(
             [
@@ -251,34 +475,39 @@ class BaseNodeView(BaseView):
 
         if only_adding_nodes:
             # no need for version history if we are only adding nodes
-            updated_at = datetime.now().replace(microsecond=0)
-            self._collection.update_one(
-                {"_id": entry.id},
-                {
-                    "$set": {
-                        "upstream": new_entry["upstream"],
-                        "downstream": new_entry["downstream"],
-                        "updated_at": updated_at,  # remove microseconds, they get lost in MongoDB anyways,
-                    }
-                },
+            history_operations, version = plan_history_writes(
+                old_entry, new_entry=None, now=now
             )
-            entry._updated_at = updated_at
-        else:
-            # if other things are changing, lets keep a version history
-            new_entry["created_at"] = old_entry["created_at"]
-            new_entry["updated_at"] = datetime.now().replace(
-                microsecond=0
-            )  # remove microseconds, they get lost in MongoDB anyways
-            new_entry["version_history"] = old_entry.get("version_history", [])
-            old_entry.pop("_id", None)
-            old_entry.pop("version_history", None)
-            new_entry["version_history"].append(old_entry)
-            self._collection.replace_one({"_id": entry.id}, new_entry)
-
-            # update our local copy of the node to reflect database changes
-            entry._created_at = new_entry["created_at"]
-            entry._updated_at = new_entry["updated_at"]
-            entry._version_history = new_entry["version_history"]
+            update = {
+                "$set": {
+                    "upstream": new_entry["upstream"],
+                    "downstream": new_entry["downstream"],
+                    "updated_at": now,
+                    "version": version,
+                }
+            }
+            if "version_history" in old_entry:
+                # embedded history was moved to the history collection
+                update["$unset"] = {"version_history": ""}
+            operation = UpdateOne({"_id": entry.id}, update)
+            return operation, history_operations, {"_updated_at": now}
+
+        # if other things are changing, lets keep a version history
+        new_entry["created_at"] = old_entry["created_at"]
+        new_entry["updated_at"] = now
+        history_operations, new_entry["version"] = plan_history_writes(
+            old_entry, new_entry=new_entry, now=now
+        )
+        operation = ReplaceOne({"_id": entry.id}, new_entry)
+        return (
+            operation,
+            history_operations,
+            {
+                "_created_at": new_entry["created_at"],
+                "_updated_at": new_entry["updated_at"],
+                "_version_history": None,  # reloaded from the history collection when needed
+            },
+        )
 
     def __delete_node(self, id: ObjectId):
         """Immediately deletes a single node from the database. This will NOT check for graph integrity -- use .remove() instead! This is used internally by .remove().
@@ -288,6 +517,41 @@ class BaseNodeView(BaseView):
         """
         self._collection.delete_one({"_id": id})
 
+    @staticmethod
+    def _strip_removed_nodes(
+        affected_samples: List["Sample"], removed_node_ids: Set[ObjectId]
+    ) -> List["Sample"]:
+        """Remove the given nodes, and all edges to them, from local copies of the Samples that contain them. This is used by `.remove()` to find the Samples that would be left with a broken graph.
+
+        Args:
+            affected_samples (List[Sample]): Samples containing some of the removed nodes. These are modified in place.
+            removed_node_ids (Set[ObjectId]): ids of the nodes being removed
+
+        Returns:
+            List[Sample]: Samples whose graph is no longer valid without the removed nodes
+        """
+        invalidated_samples = []
+        for sample in affected_samples:
+            # remove all references to affected nodes from sample
+            sample.nodes = [
+                node for node in sample.nodes if node.id not in removed_node_ids
+            ]
+            for node in sample.nodes:
+                node.upstream = [
+                    upstream_node
+                    for upstream_node in node.upstream
+                    if upstream_node["node_id"] not in removed_node_ids
+                ]
+                node.downstream = [
+                    downstream_node
+                    for downstream_node in node.downstream
+                    if downstream_node["node_id"] not in removed_node_ids
+                ]
+            if not sample.has_valid_graph:
+                invalidated_samples.append(sample)
+        return invalidated_samples
+
+    @instrumented
     def remove(self, id: ObjectId, _force_dangerous: bool = False):
         if isinstance(id, BaseNode):
             # catch if user passes in a node object instead of an id. common mistake we can catch here :)
@@ -307,10 +571,13 @@ class BaseNodeView(BaseView):
 
         node_in_question = self.get(id)
         affected_nodes = get_affected_nodes(node_in_question)
-        affected_samples = get_affected_samples(node_in_question)
+        affected_samples = get_affected_samples(
+            node_in_question, affected_nodes=affected_nodes
+        )
 
         if len(affected_nodes) == 0 and len(affected_samples) == 0:
             self._collection.delete_one({"_id": id})
+            self._invalidate_in_session(id)
             return
 
         if len(affected_nodes) > 0 and not _force_dangerous:
@@ -339,28 +606,12 @@ class BaseNodeView(BaseView):
             "Analysis": views.AnalysisView(),
         }
         # ensure samples will maintain valid graphs after node removals
-        invalidated_samples = []
-        affected_node_ids = [
-            affected_node["node_id"] for affected_node in affected_nodes
-        ]  # node ids to remove from samples
-        for sample in affected_samples:
-            # remove all references to affected nodes from sample
-            sample.nodes = [
-                node for node in sample.nodes if node.id not in affected_node_ids
-            ]
-            for node in sample.nodes:
-                node.upstream = [
-                    upstream_node
-                    for upstream_node in node.upstream
-                    if upstream_node["node_id"] not in affected_node_ids
-                ]
-                node.downstream = [
-                    downstream_node
-                    for downstream_node in node.downstream
-                    if downstream_node["node_id"] not in affected_node_ids
-                ]
-            if not sample.has_valid_graph:
-                invalidated_samples.append(sample)
+        invalidated_samples = self._strip_removed_nodes(
+            affected_samples,
+            {
+                affected_node["node_id"] for affected_node in affected_nodes
+            },  # node ids to remove from samples
+        )
 
         if len(invalidated_samples) > 0 and not _force_dangerous:
             response = input(
@@ -383,6 +634,11 @@ class BaseNodeView(BaseView):
                 node_type=node["node_type"], node_id=node["node_id"]
             )
 
+        session = get_active_session()
+        if session is not None:
+            # edges were removed from many other nodes and samples, so we can't trust anything in the identity map anymore
+            session.clear()
+
         if not _force_dangerous:
             print(
                 f"{len(affected_nodes)} nodes and {len(invalidated_samples)} samples were removed. The remaining {len(affected_samples) - len(invalidated_samples)} samples were updated to remove references to the removed nodes."
@@ -393,6 +649,32 @@ class BaseNodeView(BaseView):
 
 
 class BaseActorView(BaseView):
+    @instrumented
+    def get(self, id: ObjectId) -> BaseActor:
+        cached = self._get_from_session(id)
+        if cached is not None:
+            return cached
+        data = get_actor_cache().get_entry(self._collection, id)
+        if data is None:
+            raise NotFoundInDatabaseError(
+                f"Cannot find an {self._entry_class.__name__} with id: {id}"
+            )
+        return self._entries_to_objects([data])[0]
+
+    @instrumented
+    def get_many(self, ids: Iterable[ObjectId]) -> Dict[ObjectId, BaseActor]:
+        """Get several actors by id, using the process-wide actor cache (see `labgraph.views.actor_cache`). This makes at most two queries, however many actors are requested.
+
+        Args:
+            ids (Iterable[ObjectId]): ids of the actors
+
+        Returns:
+            Dict[ObjectId, BaseActor]: actors keyed by id. Actors that are not in the database are omitted.
+        """
+        entries = get_actor_cache().get_entries(self._collection, ids)
+        return {actor.id: actor for actor in self._entries_to_objects(entries.values())}
+
+    @instrumented
     def update(self, entry: BaseActor):
         if not isinstance(entry, BaseActor):
             raise TypeError(f"Entry must be of type {BaseActor.__name__}")
@@ -403,20 +685,39 @@ class BaseActorView(BaseView):
                 f"Cannot update {self._entry_class.__name__} with id {entry.id} because it does not exist in the database."
             )
 
+        new_entry = self._plan_update(entry, old_entry)
+        self._collection.replace_one({"_id": entry.id}, new_entry)
+        get_actor_cache().invalidate(entry.id)
+        self._invalidate_in_session(entry.id)
+
+    @staticmethod
+    def _plan_update(entry: BaseActor, old_entry: dict) -> dict:
+        """Build the database entry that replaces an actor's current entry, without touching the database.
+
+        Args:
+            entry (BaseActor): Actor object to be written
+            old_entry (dict): The actor's current database entry
+
+        Raises:
+            ValueError: The database entry is at a later version than the actor object.
+
+        Returns:
+            dict: The new database entry
+        """
         old_version = max([v["version"] for v in old_entry["version_history"]])
 
         if old_version > entry.version:
             raise ValueError(
-                "Cannot update! The current database entry is ahead (version {old.version} of the version you want to update to {entry.version}!"
+                f"Cannot update! The current database entry is ahead (version {old_version}) of the version you want to update to ({entry.version})!"
             )
 
         # all remaining changes can be made without breaking the graph.
         new_entry = entry.to_dict()
         new_entry["created_at"] = old_entry["created_at"]
-        new_entry["updated_at"] = (
-            datetime.now().replace(microsecond=0),
+        new_entry["updated_at"] = datetime.now().replace(
+            microsecond=0
         )  # remove microseconds, they get lost in MongoDB anyways
-        self._collection.replace_one({"_id": entry.id}, new_entry)
+        return new_entry
 
     def remove(self, id: ObjectId):
         raise NotImplementedError("Actor removal is not yet supported.")
@@ -1,40 +1,43 @@
 from typing import Dict, List, Optional, TYPE_CHECKING
 
 from bson import ObjectId
+import pymongo
+from labgraph.backends import get_backend
 from labgraph.data.nodes import BaseNode, NodeList
+from labgraph.utils.instrumentation import instrumented
 from labgraph import views
 
 if TYPE_CHECKING:
     from labgraph.data.sample import Sample
 
 
+NODE_TYPES = ["Material", "Action", "Measurement", "Analysis"]
+
+
 def _get_affected_nodes(
-    node: BaseNode, affected_nodes: Optional[Dict[str, List[str]]] = None
-):
-    """Recursively gets node ids that would be affected by a change to a given node. This assumes that all nodes downstream of a given node are dependent on it!"""
-    VIEWS = {
-        "Action": views.ActionView,
-        "Analysis": views.AnalysisView,
-        "Measurement": views.MeasurementView,
-        "Material": views.MaterialView,
-    }
-
-    affected_nodes = affected_nodes or {
-        "Action": [],
-        "Analysis": [],
-        "Measurement": [],
-        "Material": [],
-    }
-    for i, downstream in enumerate(node.downstream):
-        type_list = affected_nodes[downstream["node_type"]]
-        if downstream["node_id"] in type_list:
-            continue
-        type_list.append(downstream["node_id"])
-        affected_nodes = _get_affected_nodes(node.downstream.get(i), affected_nodes)
+    node: BaseNode, affected_nodes: Optional[Dict[str, List[ObjectId]]] = None
+) -> Dict[str, List[ObjectId]]:
+    """Gets node ids that would be affected by a change to a given node. This assumes that all nodes downstream of a given node are dependent on it!
+
+    The downstream graph is walked by the active storage backend (see `labgraph.backends.base.StorageBackend.traverse`). With MongoDB, each level of the walk makes (at most) one query per node collection, and only the `downstream` field of each node is retrieved.
 
+    Args:
+        node (BaseNode): Node to check
+        affected_nodes (Optional[Dict[str, List[ObjectId]]], optional): Node ids already known to be affected, keyed by node type. These are not walked again. Defaults to None.
+
+    Returns:
+        Dict[str, List[ObjectId]]: Affected node ids keyed by node type, in the order they were found.
+    """
+    affected_nodes = affected_nodes or {node_type: [] for node_type in NODE_TYPES}
+    found = get_backend().traverse(
+        node.downstream, direction="downstream", exclude=affected_nodes
+    )
+    for node_type, node_ids in found.items():
+        affected_nodes.setdefault(node_type, []).extend(node_ids)
     return affected_nodes
 
 
+@instrumented
 def get_affected_nodes(node: BaseNode) -> NodeList:
     """Get all nodes affected by a change to a given node. This assumes that all nodes downstream of a given node are dependent on it!
 
@@ -57,27 +60,42 @@ def get_affected_nodes(node: BaseNode) -> NodeList:
     return affected_nodes
 
 
-def get_affected_samples(node: BaseNode) -> List["Sample"]:
+@instrumented
+def get_affected_samples(
+    node: BaseNode, affected_nodes: Optional[NodeList] = None
+) -> List["Sample"]:
     """Get all samples affected by a change to a given node. This assumes that all nodes downstream of a given node are dependent on it!
 
     Args:
         node (Node): Node to check
+        affected_nodes (Optional[NodeList], optional): Nodes affected by a change to this node, if they have already been computed by `get_affected_nodes`. Defaults to None, in which case they are computed here.
 
     Returns:
-        list: List of affected samples
+        list: List of affected samples, sorted from most recent to oldest.
     """
-    sampleview = views.SampleView()
-    affected_nodes = get_affected_nodes(node)
-    affected_nodes.append(node)  # this node matters too!
-    affected_samples = []
-    for node in affected_nodes.get():
-        for sample in sampleview.get_by_node(node):
-            if sample not in affected_samples:
-                affected_samples.append(sample)
-
-    return affected_samples
+    if affected_nodes is None:
+        affected_nodes = get_affected_nodes(node)
 
+    ids_by_type = {node_type: [] for node_type in NODE_TYPES}
+    ids_by_type[node.__class__.__name__].append(node.id)  # this node matters too!
+    for affected_node in affected_nodes:
+        ids_by_type[affected_node["node_type"]].append(affected_node["node_id"])
 
+    # one query for all samples containing any of the affected nodes
+    sampleview = views.SampleView()
+    result = sampleview._collection.find(
+        {
+            "$or": [
+                {f"nodes.{node_type}": {"$in": ids}}
+                for node_type, ids in ids_by_type.items()
+                if len(ids) > 0
+            ]
+        }
+    ).sort("created_at", pymongo.DESCENDING)
+    return sampleview._entries_to_objects(result)
+
+
+@instrumented
 def _remove_references_to_node(node_type: str, node_id: ObjectId):
     """Removes all edges and sample references that point to the given node.
         This is used internally by node/sample deletion routines. Not intended for users, be careful with this -- it can render graphs invalid!
@@ -0,0 +1,217 @@
+"""
+Version history for nodes and samples. Instead of embedding every previous version in the live document, previous versions are stored in a separate ``<collection>_history`` collection, one document per version. The live document only carries a ``version`` counter.
+
+Each history document holds either a full ``snapshot`` of that version, or a ``diff`` against the next (newer) version. Snapshots are stored every `SNAPSHOT_INTERVAL` versions, so any version can be rebuilt from at most `SNAPSHOT_INTERVAL` history documents. Diffs are top-level: fields that changed are stored whole.
+
+Edges (upstream/downstream) and Sample node lists can be extended in place without creating a new version. An older version therefore shows the edges of the following version at the time it was replaced.
+
+Documents written before history was externalized hold their previous versions in an embedded ``version_history`` list. These are moved to the history collection the next time the document is updated.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+import pymongo
+from pymongo import ReplaceOne
+from pymongo.collection import Collection
+
+SNAPSHOT_INTERVAL = 10
+_UNVERSIONED_FIELDS = ["_id", "version", "version_history"]
+
+
+def history_collection_name(collection_name: str) -> str:
+    """Name of the collection holding the version history of a collection.
+
+    Args:
+        collection_name (str): Name of the live collection (ie "materials")
+
+    Returns:
+        str: Name of the history collection (ie "materials_history")
+    """
+    return f"{collection_name}_history"
+
+
+def get_history_collection(collection: Collection) -> Collection:
+    from labgraph.utils.data_objects import get_collection
+
+    return get_collection(history_collection_name(collection.name))
+
+
+def current_version(entry: dict) -> int:
+    """Version number of a live database entry. Entries written before history was externalized have no counter, so their version is inferred from their embedded history.
+
+    Args:
+        entry (dict): Live database entry
+
+    Returns:
+        int: Version number, starting from 1
+    """
+    return entry.get("version", len(entry.get("version_history", [])) + 1)
+
+
+def _versioned_fields(entry: dict) -> dict:
+    return {k: v for k, v in entry.items() if k not in _UNVERSIONED_FIELDS}
+
+
+def diff_documents(newer: dict, older: dict) -> dict:
+    """Compute the changes that turn one version of a document into the previous version.
+
+    Args:
+        newer (dict): Newer version of the document
+        older (dict): Older version of the document
+
+    Returns:
+        dict: {"set": {field: older value}, "unset": [fields missing from the older version]}
+    """
+    return {
+        "set": {k: v for k, v in older.items() if k not in newer or newer[k] != v},
+        "unset": [k for k in newer if k not in older],
+    }
+
+
+def apply_diff(newer: dict, diff: dict) -> dict:
+    """Rebuild the previous version of a document from a diff made by `diff_documents`.
+
+    Args:
+        newer (dict): Newer version of the document
+        diff (dict): Diff from the newer to the older version
+
+    Returns:
+        dict: Older version of the document
+    """
+    older = {k: v for k, v in newer.items() if k not in diff["unset"]}
+    older.update(diff["set"])
+    return older
+
+
+def plan_history_writes(
+    old_entry: dict, new_entry: Optional[dict], now: datetime
+) -> Tuple[List[ReplaceOne], int]:
+    """Plan the history writes needed when a live document is updated, without touching the database. The writes are upserts keyed on (entry_id, version), so repeating them is harmless.
+
+    Args:
+        old_entry (dict): The live document, as it is in the database before the update.
+        new_entry (Optional[dict]): The new version of the document, if the update creates a new version. None if the live document is changed in place (ie only edges are added) and keeps its version.
+        now (datetime): Time of the update.
+
+    Returns:
+        Tuple[List[ReplaceOne], int]: (history writes, version of the live document after the update). Any embedded `version_history` is included in the writes, so it can be removed from the live document.
+    """
+    archive = [_versioned_fields(old) for old in old_entry.get("version_history", [])]
+    old_version = current_version(old_entry)
+    if new_entry is None:
+        newer = _versioned_fields(old_entry)
+        new_version = old_version
+    else:
+        archive.append(_versioned_fields(old_entry))
+        newer = _versioned_fields(new_entry)
+        new_version = old_version + 1
+
+    operations = []
+    first_version = new_version - len(archive)
+    for offset in reversed(range(len(archive))):
+        version = first_version + offset
+        document = archive[offset]
+        record = {
+            "entry_id": old_entry["_id"],
+            "version": version,
+            "archived_at": now,
+        }
+        if version % SNAPSHOT_INTERVAL == 0:
+            record["snapshot"] = document
+        else:
+            record["diff"] = diff_documents(newer, document)
+        operations.append(
+            ReplaceOne(
+                {"entry_id": old_entry["_id"], "version": version}, record, upsert=True
+            )
+        )
+        newer = document
+    return operations, new_version
+
+
+def load_version_history(collection: Collection, entry_id: ObjectId) -> List[dict]:
+    """Load all previous versions of an entry, oldest first. This reads the live document and every history document of the entry.
+
+    Args:
+        collection (Collection): Live collection of the entry
+        entry_id (ObjectId): id of the entry
+
+    Returns:
+        List[dict]: Previous versions of the entry, oldest first. Each has a "version" field. Empty if the entry is not in the database.
+    """
+    live = collection.find_one({"_id": entry_id})
+    if live is None:
+        return []
+    if "version_history" in live:
+        # not migrated yet
+        return [
+            {**_versioned_fields(old), "version": version}
+            for version, old in enumerate(live["version_history"], start=1)
+        ]
+
+    versions = []
+    newer = _versioned_fields(live)
+    for record in (
+        get_history_collection(collection)
+        .find({"entry_id": entry_id})
+        .sort("version", pymongo.DESCENDING)
+    ):
+        document = _rebuild(newer, record)
+        versions.append({**document, "version": record["version"]})
+        newer = document
+    versions.reverse()
+    return versions
+
+
+def load_version(
+    collection: Collection, entry_id: ObjectId, version: int
+) -> Optional[dict]:
+    """Load a single version of an entry. Only the history documents between the requested version and the next snapshot (or the live document) are read.
+
+    Args:
+        collection (Collection): Live collection of the entry
+        entry_id (ObjectId): id of the entry
+        version (int): Version to load
+
+    Returns:
+        Optional[dict]: The requested version of the entry, with a "version" field. None if the entry or version does not exist.
+    """
+    records: List[dict] = []
+    for record in (
+        get_history_collection(collection)
+        .find({"entry_id": entry_id, "version": {"$gte": version}})
+        .sort("version", pymongo.ASCENDING)
+    ):
+        records.append(record)
+        if "snapshot" in record:
+            break
+
+    if len(records) > 0 and "snapshot" in records[-1]:
+        newer = None
+    else:
+        live = collection.find_one({"_id": entry_id})
+        if live is None:
+            return None
+        if current_version(live) == version:
+            return {**_versioned_fields(live), "version": version}
+        if "version_history" in live:
+            # not migrated yet
+            if version < 1 or version > len(live["version_history"]):
+                return None
+            old = live["version_history"][version - 1]
+            return {**_versioned_fields(old), "version": version}
+        newer = _versioned_fields(live)
+
+    if len(records) == 0 or records[0]["version"] != version:
+        return None
+    for record in reversed(records):
+        newer = _rebuild(newer, record)
+    return {**newer, "version": version}
+
+
+def _rebuild(newer: Optional[dict], record: Dict[str, Any]) -> dict:
+    if "snapshot" in record:
+        return dict(record["snapshot"])
+    return apply_diff(newer, record["diff"])
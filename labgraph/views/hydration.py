@@ -0,0 +1,294 @@
+"""
+Batched retrieval of nodes from the database. Instead of fetching every node (and its actor) one document at a time, we gather the ids we need per collection, fetch them with a single ``$in`` query per collection, and build the node objects from that in-memory set.
+
+The ``$in`` queries can also be run concurrently on a thread pool (see `hydrate_nodes`), which helps when a single query would return a very large number of entries.
+
+Nodes referenced by the retrieved nodes (ie the Materials used by an Action) are not retrieved unless they were requested too. They are represented by lazy references (see `labgraph.data.lazy`), which can be resolved together with `resolve_pending_references`.
+"""
+
+from collections import defaultdict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+from bson import ObjectId
+
+from labgraph.data.actors import Actor
+from labgraph.data.lazy import LazyReference, pending_references
+from labgraph.data.nodes import Action, Analysis, BaseNode, Material, Measurement
+from labgraph.utils.instrumentation import instrumented
+from labgraph.views.actor_cache import get_actor_cache
+from labgraph.views.session import Session, get_active_session
+
+THREADED_CHUNK_SIZE = 500  # ids per query when queries run on a thread pool
+
+NODE_CLASSES = {
+    "Material": Material,
+    "Action": Action,
+    "Measurement": Measurement,
+    "Analysis": Analysis,
+}
+
+
+def _node_dependencies(node_type: str, entry: dict) -> List[Tuple[str, ObjectId]]:
+    """List the nodes referenced by a node object built from its database entry. This mirrors the references made within the node's `from_dict` method. When a referenced node is retrieved in the same batch, it is built first so the real object is used instead of a lazy reference.
+
+    Args:
+        node_type (str): Type of the node (Material, Action, Measurement, Analysis)
+        entry (dict): Database entry of the node
+
+    Returns:
+        List[Tuple[str, ObjectId]]: (node_type, node_id) of each node referenced by this entry
+    """
+    if node_type == "Action":
+        return [
+            ("Material", ingredient["material_id"])
+            for ingredient in entry.get("ingredients", [])
+        ] + [
+            ("Material", ds["node_id"])
+            for ds in entry.get("downstream", [])
+            if ds["node_type"] == "Material"
+        ]
+    if node_type == "Measurement":
+        return [("Material", us["node_id"]) for us in entry.get("upstream", [])[:1]]
+    if node_type == "Analysis":
+        return [
+            (us["node_type"], us["node_id"])
+            for us in entry.get("upstream", [])
+            if us["node_type"] in ["Measurement", "Analysis"]
+        ]
+    return []
+
+
+@instrumented
+def fetch_node_entries(
+    node_ids: Dict[str, Iterable[ObjectId]],
+    session: Optional[Session] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: Optional[int] = None,
+) -> Tuple[Dict[ObjectId, Tuple[str, dict]], Dict[ObjectId, dict], Dict[ObjectId, Any]]:
+    """Fetch the database entries for the given nodes and all of their actors. This makes (at most) one query per node collection. Actors are taken from the process-wide actor cache (see `labgraph.views.actor_cache`) where possible. Nodes that are referenced by the given nodes, but were not requested, are not fetched.
+
+    Args:
+        node_ids (Dict[str, Iterable[ObjectId]]): node ids to retrieve, keyed by node type
+        session (Optional[Session], optional): Session whose identity map is checked before fetching anything. Defaults to None.
+        executor (Optional[Executor], optional): If given, the node queries are run concurrently on this executor, with up to `chunk_size` ids per query. Defaults to None (one query per collection, run one after another).
+        chunk_size (Optional[int], optional): Maximum number of ids per query when an executor is given. Defaults to None (THREADED_CHUNK_SIZE).
+
+    Returns:
+        Tuple[Dict[ObjectId, Tuple[str, dict]], Dict[ObjectId, dict], Dict[ObjectId, Any]]: (node entries, actor entries, cached objects). Node entries are keyed by node id and hold (node_type, entry). Actor entries are keyed by actor id. Cached objects are the nodes and actors that were found in the session instead of the database, keyed by id.
+    """
+    from labgraph.views import get_view_by_type
+
+    chunk_size = chunk_size or THREADED_CHUNK_SIZE
+    to_fetch, cached = split_cached_nodes(node_ids, session)
+    queries = []
+    for node_type, ids in to_fetch.items():
+        collection = get_view_by_type(node_type)._collection
+        if executor is None:
+            queries.append((node_type, collection, ids))
+        else:
+            for start in range(0, len(ids), chunk_size):
+                queries.append((node_type, collection, ids[start : start + chunk_size]))
+
+    def find(collection, ids) -> List[dict]:
+        return list(collection.find({"_id": {"$in": ids}}))
+
+    if executor is None:
+        results = [find(collection, ids) for _, collection, ids in queries]
+    else:
+        # queries run in the caller's context, so they are attributed to its operation (see labgraph.utils.instrumentation)
+        futures = [
+            executor.submit(copy_context().run, find, collection, ids)
+            for _, collection, ids in queries
+        ]
+        results = [future.result() for future in futures]
+
+    node_entries: Dict[ObjectId, Tuple[str, dict]] = {}
+    for (node_type, _, _), entries in zip(queries, results):
+        for entry in entries:
+            node_entries[entry["_id"]] = (node_type, entry)
+
+    actor_ids = split_cached_actors(node_entries, session, cached)
+    actor_entries = {}
+    if len(actor_ids) > 0:
+        actor_entries = get_actor_cache().get_entries(
+            get_view_by_type("Actor")._collection, actor_ids
+        )
+
+    return node_entries, actor_entries, cached
+
+
+def split_cached_nodes(
+    node_ids: Dict[str, Iterable[ObjectId]], session: Optional[Session]
+) -> Tuple[Dict[str, List[ObjectId]], Dict[ObjectId, Any]]:
+    """Split node ids into those that must be fetched from the database and those already held by the session.
+
+    Args:
+        node_ids (Dict[str, Iterable[ObjectId]]): node ids keyed by node type
+        session (Optional[Session]): Active session, if any
+
+    Returns:
+        Tuple[Dict[str, List[ObjectId]], Dict[ObjectId, Any]]: (ids to fetch keyed by node type, cached objects keyed by id). Node types with nothing to fetch are omitted.
+    """
+    to_fetch: Dict[str, List[ObjectId]] = {}
+    cached: Dict[ObjectId, Any] = {}
+    for node_type, ids in node_ids.items():
+        for id in set(ids):
+            obj = session.get(node_type, id) if session is not None else None
+            if obj is None:
+                to_fetch.setdefault(node_type, []).append(id)
+            else:
+                cached[id] = obj
+    return to_fetch, cached
+
+
+def split_cached_actors(
+    node_entries: Dict[ObjectId, Tuple[str, dict]],
+    session: Optional[Session],
+    cached: Dict[ObjectId, Any],
+) -> List[ObjectId]:
+    """Find the actors of the given nodes that must be fetched. Actors held by the session are added to `cached` instead.
+
+    Args:
+        node_entries (Dict[ObjectId, Tuple[str, dict]]): node entries, see `fetch_node_entries`
+        session (Optional[Session]): Active session, if any
+        cached (Dict[ObjectId, Any]): cached objects keyed by id. This is updated in place.
+
+    Returns:
+        List[ObjectId]: ids of the actors to fetch
+    """
+    actor_ids = set()
+    for _, entry in node_entries.values():
+        actor_id = entry.get("actor_id")
+        if actor_id is None or actor_id in cached:
+            continue
+        actor = session.get("Actor", actor_id) if session is not None else None
+        if actor is None:
+            actor_ids.add(actor_id)
+        else:
+            cached[actor_id] = actor
+    return list(actor_ids)
+
+
+def build_nodes(
+    node_entries: Dict[ObjectId, Tuple[str, dict]],
+    actor_entries: Dict[ObjectId, dict],
+    known: Optional[Dict[ObjectId, Any]] = None,
+) -> Dict[ObjectId, Any]:
+    """Build node and actor objects from their database entries. Nodes are built in dependency order, so every node referenced by another node is taken from this set instead of the database.
+
+    Args:
+        node_entries (Dict[ObjectId, Tuple[str, dict]]): node entries keyed by node id, holding (node_type, entry). See `fetch_node_entries`.
+        actor_entries (Dict[ObjectId, dict]): actor entries keyed by actor id.
+        known (Optional[Dict[ObjectId, Any]], optional): node and actor objects that are already built, keyed by id. Defaults to None.
+
+    Returns:
+        Dict[ObjectId, Any]: node and actor objects keyed by their id.
+    """
+    resolved: Dict[ObjectId, Any] = dict(known or {})
+    for actor_id, entry in actor_entries.items():
+        resolved[actor_id] = Actor.from_dict(entry)
+
+    dependency_graph = nx.DiGraph()
+    for node_id, (node_type, entry) in node_entries.items():
+        dependency_graph.add_node(node_id)
+        for _, dep_id in _node_dependencies(node_type, entry):
+            if dep_id in node_entries:
+                dependency_graph.add_edge(dep_id, node_id)
+
+    try:
+        build_order = list(nx.topological_sort(dependency_graph))
+    except nx.NetworkXUnfeasible:
+        # should never happen for a valid graph, but don't let a bad entry block retrieval. Any dependency built out of order is referenced lazily instead.
+        build_order = list(dependency_graph.nodes)
+
+    for node_id in build_order:
+        node_type, entry = node_entries[node_id]
+        resolved[node_id] = NODE_CLASSES[node_type].from_dict(entry, _resolved=resolved)
+
+    return resolved
+
+
+def hydrate_nodes(
+    node_ids: Dict[str, Iterable[ObjectId]], max_workers: Optional[int] = None
+) -> Dict[ObjectId, BaseNode]:
+    """Retrieve node objects for the given node ids, batching all database queries. This makes a handful of queries regardless of the number of nodes, as opposed to `BaseView.get` which makes several queries per node.
+
+    Args:
+        node_ids (Dict[str, Iterable[ObjectId]]): node ids to retrieve, keyed by node type (Material, Action, Measurement, Analysis)
+        max_workers (Optional[int], optional): If given, the queries are split into chunks of up to `THREADED_CHUNK_SIZE` ids and run concurrently on a thread pool with this many threads. Defaults to None (one query per collection, run one after another).
+
+    Returns:
+        Dict[ObjectId, BaseNode]: node objects keyed by node id. Nodes that were not found in the database are omitted. The actors of the requested nodes are also included.
+    """
+    session = get_active_session()
+    if max_workers is None:
+        node_entries, actor_entries, cached = fetch_node_entries(
+            node_ids, session=session
+        )
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            node_entries, actor_entries, cached = fetch_node_entries(
+                node_ids, session=session, executor=executor
+            )
+    resolved = build_nodes(node_entries, actor_entries, known=cached)
+    remember_in_session(session, node_entries, actor_entries, resolved)
+    return resolved
+
+
+def remember_in_session(
+    session: Optional[Session],
+    node_entries: Dict[ObjectId, Tuple[str, dict]],
+    actor_entries: Dict[ObjectId, dict],
+    resolved: Dict[ObjectId, Any],
+):
+    """Add freshly built nodes and actors to the session (if any), so repeated retrievals return the same objects.
+
+    Args:
+        session (Optional[Session]): Active session, if any
+        node_entries (Dict[ObjectId, Tuple[str, dict]]): node entries that were built, see `fetch_node_entries`
+        actor_entries (Dict[ObjectId, dict]): actor entries that were built
+        resolved (Dict[ObjectId, Any]): built objects keyed by id, see `build_nodes`
+    """
+    if session is None:
+        return
+    for id, (node_type, _) in node_entries.items():
+        session.put(node_type, id, resolved[id])
+    for id in actor_entries:
+        session.put("Actor", id, resolved[id])
+
+
+def resolve_pending_references() -> int:
+    """Retrieve the entries of all lazy references (see `labgraph.data.lazy`) that have not been resolved yet. This makes at most one query per collection, as opposed to one query per reference when each reference is resolved on first use.
+
+    Returns:
+        int: Number of references that were resolved. References whose entries are no longer in the database are left unresolved.
+    """
+    from labgraph.views import get_view_by_type
+
+    pending: List[LazyReference] = pending_references()
+    if len(pending) == 0:
+        return 0
+
+    node_ids: Dict[str, Set[ObjectId]] = defaultdict(set)
+    actor_ids: Set[ObjectId] = set()
+    for proxy in pending:
+        if proxy.labgraph_node_type == "Actor":
+            actor_ids.add(proxy.id)
+        else:
+            node_ids[proxy.labgraph_node_type].add(proxy.id)
+
+    resolved: Dict[ObjectId, Any] = hydrate_nodes(node_ids) if node_ids else {}
+    missing_actor_ids = actor_ids - set(resolved)
+    if len(missing_actor_ids) > 0:
+        resolved.update(get_view_by_type("Actor").get_many(missing_actor_ids))
+
+    count = 0
+    for proxy in pending:
+        target = resolved.get(proxy.id)
+        if target is not None:
+            proxy._set_target(target)
+            count += 1
+    return count
@@ -1,35 +1,104 @@
 from datetime import datetime
-from typing import List, Literal, Optional, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+)
 
+import networkx as nx
 import pymongo
-from labgraph.data import Action, Analysis, Material, Measurement, Sample
+from labgraph.data import Sample
 from labgraph.data.nodes import BaseNode
 from labgraph.utils.data_objects import get_collection
+from labgraph.utils.data_objects import transaction as db_transaction
+from labgraph.utils.instrumentation import instrumented
 from labgraph.views.nodes import (
     ActionView,
     MaterialView,
     AnalysisView,
     MeasurementView,
 )
-from .base import BaseView, NotFoundInDatabaseError, AlreadyInDatabaseError
+from .base import (
+    BaseNodeView,
+    BaseView,
+    NotFoundInDatabaseError,
+    AlreadyInDatabaseError,
+    WriteOperation,
+)
+from .history import plan_history_writes
+from .hydration import NODE_CLASSES, hydrate_nodes
+from .session import get_active_session
 from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.client_session import ClientSession
+
+HydrationMode = Literal["sequential", "batched", "threaded"]
 
 
 class SampleView(BaseView):
-    def __init__(self):
+    # samples whose nodes are retrieved together by iter_filter
+    _conversion_chunk_size = 100
+    # how the nodes of multiple samples are retrieved, see `_entries_to_objects`
+    hydration_mode: HydrationMode = "batched"
+    max_workers: int = 4
+
+    def __init__(
+        self,
+        hydration_mode: Optional[HydrationMode] = None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            hydration_mode (Optional[HydrationMode], optional): How the nodes of the Samples returned by a query are retrieved. "batched" fetches the nodes of all Samples together, with one query per node collection. "threaded" does the same, but splits the queries into chunks that run concurrently on a thread pool, which helps for very large result sets. "sequential" retrieves the nodes of one Sample at a time. Defaults to None (SampleView.hydration_mode, which is "batched").
+            max_workers (Optional[int], optional): Number of threads used by the "threaded" mode. Defaults to None (SampleView.max_workers, which is 4).
+
+        Raises:
+            ValueError: Invalid hydration mode
+        """
         super().__init__("samples", Sample)
+        if hydration_mode is not None:
+            if hydration_mode not in HydrationMode.__args__:
+                raise ValueError(
+                    f"Invalid hydration mode: {hydration_mode}. Must be one of {HydrationMode.__args__}"
+                )
+            self.hydration_mode = hydration_mode
+        if max_workers is not None:
+            self.max_workers = max_workers
         self._collection = get_collection("samples")
         self.actionview = ActionView()
         self.materialview = MaterialView()
         self.analysisview = AnalysisView()
         self.measurementview = MeasurementView()
 
+    @instrumented
     def add(
         self,
         entry: Sample,
         additional_incoming_node_ids: Optional[List[ObjectId]] = None,
         if_already_in_db: Literal["raise", "skip", "update"] = "raise",
+        transaction: bool = False,
     ) -> ObjectId:
+        """Adds a Sample, and all of its nodes, to the database. Nodes are diffed against the database with one query per node collection and written with one bulk write per node collection.
+
+        Args:
+            entry (Sample): Sample to be added
+            additional_incoming_node_ids (Optional[List[ObjectId]], optional): ids of nodes that are not in this Sample or the database yet, but are guaranteed to be added. Edges to these nodes are considered valid. Defaults to None.
+            if_already_in_db (Literal["raise", "skip", "update"], optional): What to do if the Sample is already in the database. Defaults to "raise".
+            transaction (bool, optional): If True, the nodes and the Sample are written in a single MongoDB transaction, so a failure will not leave some nodes written without the Sample. Requires MongoDB to be running as a replica set. Defaults to False.
+
+        Raises:
+            ValueError: Entry is not a Sample, or the Sample graph is not valid.
+            AlreadyInDatabaseError: Sample is already in the database and `if_already_in_db` is "raise".
+
+        Returns:
+            ObjectId: id of the Sample
+        """
         if not isinstance(entry, self._entry_class):
             raise ValueError(f"Entry must be of type {self._entry_class.__name__}")
 
@@ -38,12 +107,7 @@ class SampleView(BaseView):
                 "Sample graph is not valid! Check for isolated nodes or graph cycles."
             )
 
-        try:
-            self.get(id=entry.id)
-            found_in_db = True
-        except NotFoundInDatabaseError:
-            found_in_db = False
-        if found_in_db:
+        if self._exists(entry.id):
             if if_already_in_db == "raise":
                 raise AlreadyInDatabaseError(
                     f"{self._entry_class.__name__} (name={entry.name}, id={entry.id}) already exists in the database!"
@@ -51,7 +115,7 @@ class SampleView(BaseView):
             elif if_already_in_db == "skip":
                 return entry.id
             elif if_already_in_db == "update":
-                self.update(entry)
+                self.update(entry, transaction=transaction)
                 return entry.id
         self._check_if_nodes_are_valid(
             entry
@@ -64,32 +128,30 @@ class SampleView(BaseView):
                 "Sample graph is not valid! Check for isolated nodes, graph cycles, or node dependencies that are not covered by either 1. existing database entries 2. nodes in this Sample or 3. nodes in the `additional_incoming_nodes` list."
             )
 
-        for node in entry.nodes:
-            if isinstance(node, Action):
-                self.actionview.add(node, if_already_in_db="update")
-            elif isinstance(node, Material):
-                self.materialview.add(node, if_already_in_db="update")
-            elif isinstance(node, Analysis):
-                self.analysisview.add(node, if_already_in_db="update")
-            elif isinstance(node, Measurement):
-                self.measurementview.add(node, if_already_in_db="update")
-            else:
-                raise ValueError(f"Node {node} is not a valid node type")
         created_at = datetime.now().replace(
             microsecond=0
         )  # remove microseconds, they get lost in MongoDB anyways
-        result = self._collection.insert_one(
-            {
-                **entry.to_dict(),
-                "created_at": created_at,
-                "updated_at": created_at,  # same as created_at on first version in db
-            }
-        )
+
+        def insert_sample(db_session: Optional[ClientSession]):
+            self._collection.insert_one(
+                self._new_sample_document(entry, created_at), session=db_session
+            )
+
+        self._write_with_nodes(entry, insert_sample, transaction=transaction)
 
         # update local copy of entry to reflect database changes
         entry._created_at = created_at
         entry._updated_at = created_at
-        return cast(ObjectId, result.inserted_id)
+        return entry.id
+
+    @staticmethod
+    def _new_sample_document(entry: Sample, created_at: datetime) -> dict:
+        return {
+            **entry.to_dict(),
+            "created_at": created_at,
+            "updated_at": created_at,  # same as created_at on first version in db
+            "version": 1,
+        }
 
     def _check_if_nodes_are_valid(self, sample: Sample) -> bool:
         """ensure that all nodes contained within the sample can be encoded to BSON and added to the database. This will fail if user supplies data formats that cannot be encoded to BSON."""
@@ -110,7 +172,38 @@ class SampleView(BaseView):
         additional_incoming_node_ids: Optional[List[ObjectId]] = None,
     ) -> bool:
         # we need to check the graph in the db to make sure it is valid.
+        external_node_ids = self._external_node_ids(
+            sample, additional_incoming_node_ids
+        )
+        node_views = self._node_views()
+        for nodetype, node_ids in external_node_ids.items():
+            if len(node_ids) == 0:
+                continue
+            found = {
+                result["_id"]
+                for result in node_views[nodetype]._collection.find(
+                    {"_id": {"$in": list(node_ids)}}, {"_id": 1}
+                )
+            }
+            for node_id in node_ids - found:
+                print(f"Cannot find an {nodetype} with id: {node_id}")
+                return False
+        return True
 
+    @staticmethod
+    def _external_node_ids(
+        sample: Sample,
+        additional_incoming_node_ids: Optional[List[ObjectId]] = None,
+    ) -> Dict[str, Set[ObjectId]]:
+        """Gather the nodes that the Sample's nodes have edges to, but that are not part of the Sample (or `additional_incoming_node_ids`). These must already be in the database.
+
+        Args:
+            sample (Sample): Sample to check
+            additional_incoming_node_ids (Optional[List[ObjectId]], optional): ids of nodes that are guaranteed to be added along with this Sample. Defaults to None.
+
+        Returns:
+            Dict[str, Set[ObjectId]]: ids of the external nodes, keyed by node type
+        """
         upcoming_nodes = [
             node.id for node in sample.nodes
         ]  # all nodes that will be added along with this sample
@@ -118,37 +211,233 @@ class SampleView(BaseView):
         if additional_incoming_node_ids is not None:
             upcoming_nodes += additional_incoming_node_ids  # other nodes that should be considered valid (ie are guaranteed to be added).
 
-        # checkifvalid_methods = {
-        #     Action: self._is_valid_action,
-        #     Material: self._is_valid_material,
-        #     Measurement: self._is_valid_measurement,
-        #     Analysis: self._is_valid_analysis,
-        # }
-
-        checkifvalid_methods = {
-            "Action": self.actionview.get,
-            "Material": self.materialview.get,
-            "Measurement": self.measurementview.get,
-            "Analysis": self.analysisview.get,
-        }
-
+        # gather every edge that leaves this sample, then check that those nodes exist with one query per collection
+        external_node_ids = {nodetype: set() for nodetype in NODE_CLASSES}
         for node in sample.nodes:
             for related_node in node.upstream + node.downstream:
                 if related_node["node_id"] in upcoming_nodes:
                     continue
-                try:
-                    checkifvalid = checkifvalid_methods[related_node["node_type"]]
-                    checkifvalid(id=related_node["node_id"])
-                except NotFoundInDatabaseError as e:
-                    print(str(e))
-                    return False
-        return True
+                external_node_ids[related_node["node_type"]].add(
+                    related_node["node_id"]
+                )
+        return external_node_ids
+
+    def _node_views(self) -> Dict[str, BaseNodeView]:
+        return {
+            "Action": self.actionview,
+            "Material": self.materialview,
+            "Measurement": self.measurementview,
+            "Analysis": self.analysisview,
+        }
+
+    def _bulk_write_nodes(
+        self,
+        nodes: Iterable[BaseNode],
+        db_session: Optional[ClientSession] = None,
+    ) -> List[Tuple[BaseNode, Dict[str, Any]]]:
+        """Adds or updates many nodes at once. The nodes are diffed against the database with one `$in` query per node collection, then written with one unordered `bulk_write` per node collection. All writes are planned (and validated) before any are sent.
+
+        Args:
+            nodes (Iterable[BaseNode]): Nodes to add or update
+            db_session (Optional[ClientSession], optional): MongoDB session to run the reads and writes in (ie for transactions). Defaults to None.
+
+        Raises:
+            ValueError: Node is not a valid node type
+            ValueError: An existing node would lose an upstream or downstream edge.
+
+        Returns:
+            List[Tuple[BaseNode, Dict[str, Any]]]: (node, local changes) for every node that was written. The local changes are not applied to the node objects -- the caller should do this once the writes are final (ie the transaction has committed).
+        """
+        node_views = self._node_views()
+        nodes_by_type = self._group_nodes_by_type(nodes)
+        old_entries = {
+            nodetype: list(
+                node_views[nodetype]._collection.find(
+                    {"_id": {"$in": list(nodes_by_id)}}, session=db_session
+                )
+            )
+            for nodetype, nodes_by_id in nodes_by_type.items()
+        }
+        planned, history_writes, writes = self._plan_node_writes(
+            nodes_by_type, old_entries
+        )
+
+        # history first, so a failed update never loses the previous version
+        for nodetype, operations in history_writes:
+            node_views[nodetype]._history_collection.bulk_write(
+                operations, ordered=False, session=db_session
+            )
+        for nodetype, operations in writes:
+            node_views[nodetype]._collection.bulk_write(
+                operations, ordered=False, session=db_session
+            )
+        return planned
+
+    @staticmethod
+    def _group_nodes_by_type(
+        nodes: Iterable[BaseNode],
+    ) -> Dict[str, Dict[ObjectId, BaseNode]]:
+        """Group nodes by node type, then id. Node types without any nodes are omitted.
+
+        Raises:
+            ValueError: Node is not a valid node type
+        """
+        nodes_by_type: Dict[str, Dict[ObjectId, BaseNode]] = {}
+        for node in nodes:
+            nodetype = node.__class__.__name__
+            if nodetype not in NODE_CLASSES:
+                raise ValueError(f"Node {node} is not a valid node type")
+            nodes_by_type.setdefault(nodetype, {})[node.id] = node
+        return nodes_by_type
+
+    def _plan_node_writes(
+        self,
+        nodes_by_type: Dict[str, Dict[ObjectId, BaseNode]],
+        old_entries: Dict[str, Iterable[dict]],
+    ) -> Tuple[
+        List[Tuple[BaseNode, Dict[str, Any]]],
+        List[Tuple[str, List[ReplaceOne]]],
+        List[Tuple[str, List[WriteOperation]]],
+    ]:
+        """Plans the writes for many nodes, given their current database entries, without touching the database.
+
+        Args:
+            nodes_by_type (Dict[str, Dict[ObjectId, BaseNode]]): Nodes to write, see `_group_nodes_by_type`
+            old_entries (Dict[str, Iterable[dict]]): Current database entries of these nodes, keyed by node type. Nodes that are not in the database yet have no entry.
+
+        Raises:
+            ValueError: An existing node would lose an upstream or downstream edge.
+
+        Returns:
+            Tuple[List[Tuple[BaseNode, Dict[str, Any]]], List[Tuple[str, List[ReplaceOne]]], List[Tuple[str, List[WriteOperation]]]]: (planned, history writes, writes). Planned holds (node, local changes) for every node that will be written. History writes and writes hold (node type, operations) to send to that node type's history and live collections, respectively.
+        """
+        node_views = self._node_views()
+        now = datetime.now().replace(
+            microsecond=0
+        )  # remove microseconds, they get lost in MongoDB anyways
+        planned = []
+        history_writes = []
+        writes = []
+        for nodetype, nodes_by_id in nodes_by_type.items():
+            view = node_views[nodetype]
+            old_entries_by_id = {
+                old_entry["_id"]: old_entry for old_entry in old_entries[nodetype]
+            }
+            operations = []
+            history_operations = []
+            for node_id, node in nodes_by_id.items():
+                operation, node_history_operations, local_changes = view._plan_write(
+                    node, old_entry=old_entries_by_id.get(node_id), now=now
+                )
+                if operation is not None:
+                    operations.append(operation)
+                    history_operations.extend(node_history_operations)
+                    planned.append((node, local_changes))
+            if len(history_operations) > 0:
+                history_writes.append((nodetype, history_operations))
+            if len(operations) > 0:
+                writes.append((nodetype, operations))
+        return planned, history_writes, writes
+
+    def _write_with_nodes(
+        self,
+        entry: Sample,
+        write_sample: Callable[[Optional[ClientSession]], Any],
+        transaction: bool = False,
+    ):
+        """Writes all nodes of a Sample, then the Sample itself. Local copies of the nodes are only updated once everything has been written.
+
+        Args:
+            entry (Sample): Sample whose nodes should be written
+            write_sample (Callable[[Optional[ClientSession]], Any]): Function that writes the Sample entry, given the MongoDB session to write in.
+            transaction (bool, optional): If True, everything is written in a single MongoDB transaction. Defaults to False.
+        """
+        if transaction:
+            with db_transaction() as db_session:
+                written_nodes = self._bulk_write_nodes(
+                    entry.nodes, db_session=db_session
+                )
+                write_sample(db_session)
+        else:
+            written_nodes = self._bulk_write_nodes(entry.nodes)
+            write_sample(None)
+
+        self._apply_written_nodes(written_nodes)
+
+    def _apply_written_nodes(
+        self, written_nodes: List[Tuple[BaseNode, Dict[str, Any]]]
+    ):
+        # update local copies of the nodes to reflect database changes
+        node_views = self._node_views()
+        for node, local_changes in written_nodes:
+            for attribute, value in local_changes.items():
+                setattr(node, attribute, value)
+            node_views[node.__class__.__name__]._invalidate_in_session(node.id)
 
     def _entry_to_object(self, entry: dict):
+        return self._entries_to_objects([entry])[0]
+
+    def _entries_to_objects(self, entries: Iterable[dict]) -> List[Sample]:
+        """Build Sample objects from their database entries. By default, the nodes of all Samples are retrieved together, with one query per node collection (plus one for actors), rather than one query per node. Node ids shared between Samples are only fetched once. See `SampleView.hydration_mode` for the alternatives.
+
+        Args:
+            entries (Iterable[dict]): Sample entries from the database
+
+        Returns:
+            List[Sample]: Sample objects, in the same order as the entries
+        """
+        entries = list(entries)
+        session = get_active_session()
+        samples_by_id = {}
+        if session is not None:
+            for entry in entries:
+                cached = session.get("Sample", entry["_id"])
+                if cached is not None:
+                    samples_by_id[entry["_id"]] = cached
+
+        sample_ids = [entry["_id"] for entry in entries]
+        to_build = [entry for entry in entries if entry["_id"] not in samples_by_id]
+        if self.hydration_mode == "sequential":
+            batches = [[entry] for entry in to_build]
+        else:
+            batches = [to_build]
+        max_workers = self.max_workers if self.hydration_mode == "threaded" else None
+
+        for batch in batches:
+            node_ids = {nodetype: set() for nodetype in NODE_CLASSES}
+            for entry in batch:
+                for nodetype, nodeids in entry["nodes"].items():
+                    node_ids[nodetype].update(nodeids)
+            resolved = hydrate_nodes(node_ids, max_workers=max_workers)
+            for entry in batch:
+                s = self._sample_from_entry(entry, resolved)
+                if session is not None:
+                    session.put("Sample", s.id, s)
+                samples_by_id[s.id] = s
+
+        return [samples_by_id[id] for id in sample_ids]
+
+    @staticmethod
+    def _sample_from_entry(entry: dict, resolved: Dict[ObjectId, BaseNode]) -> Sample:
+        """Build a Sample object from its database entry and its (already retrieved) nodes.
+
+        Args:
+            entry (dict): Sample entry from the database
+            resolved (Dict[ObjectId, BaseNode]): node objects keyed by id, see `labgraph.views.hydration.hydrate_nodes`
+
+        Raises:
+            NotFoundInDatabaseError: One of the Sample's nodes is not in the database
+
+        Returns:
+            Sample: Sample object
+        """
         id = entry.pop("_id")
         created_at = entry.pop("created_at")
         updated_at = entry.pop("updated_at")
-        version_history = entry.pop("version_history", [])
+        version_history = entry.pop(
+            "version_history", None
+        )  # only present on entries that predate the history collection
+        entry.pop("version", None)
         nodes = entry.pop("nodes")
         contents = entry.pop("contents")
 
@@ -157,25 +446,24 @@ class SampleView(BaseView):
 
         for nodetype, nodeids in nodes.items():
             for nodeid in nodeids:
-                if nodetype == "Action":
-                    node = self.actionview.get(id=nodeid)
-                elif nodetype == "Material":
-                    node = self.materialview.get(id=nodeid)
-                elif nodetype == "Measurement":
-                    node = self.measurementview.get(id=nodeid)
-                elif nodetype == "Analysis":
-                    node = self.analysisview.get(id=nodeid)
-                s.add_node(node)
+                if nodeid not in resolved:
+                    raise NotFoundInDatabaseError(
+                        f"Cannot find an {nodetype} with id: {nodeid}"
+                    )
+                s.add_node(resolved[nodeid])
         s._sort_nodes()
 
         s._created_at = created_at
         s._updated_at = updated_at
         s._version_history = version_history
         s._contents = contents
-
         return s
 
+    @instrumented
     def get(self, id: ObjectId) -> Sample:
+        cached = self._get_from_session(id)
+        if cached is not None:
+            return cached
         entry = self._collection.find_one({"_id": id})
         if entry is None:
             raise NotFoundInDatabaseError(
@@ -183,6 +471,70 @@ class SampleView(BaseView):
             )
         return self._entry_to_object(entry)
 
+    @instrumented
+    def get_graph(self, sample_ids: List[ObjectId]) -> nx.DiGraph:
+        """The union of the graphs of several Samples (see `Sample.graph`), read straight from the database. Only the node ids of the Samples, then the names and edges of their nodes are retrieved, with one query per node type, so this is much faster than retrieving the Samples.
+
+        Args:
+            sample_ids (List[ObjectId]): ids of the Samples
+
+        Raises:
+            NotFoundInDatabaseError: Some of the Samples are not in the database
+
+        Returns:
+            nx.DiGraph: Graph keyed by node id, nodes carry "type" and "name" attributes. Nodes outside of these Samples that are connected to them by an edge have an empty name.
+        """
+        nodes_by_type: Dict[str, List[ObjectId]] = {}
+        found = set()
+        for entry in self._collection.find({"_id": {"$in": sample_ids}}, {"nodes": 1}):
+            found.add(entry["_id"])
+            for node_type, ids in entry["nodes"].items():
+                nodes_by_type.setdefault(node_type, []).extend(ids)
+        missing = [id for id in sample_ids if id not in found]
+        if len(missing) > 0:
+            raise NotFoundInDatabaseError(
+                f"{self._entry_class.__name__}(s) with id(s) {', '.join(str(id) for id in missing)} not found in database!"
+            )
+        return self.get_graph_of_nodes(nodes_by_type)
+
+    def get_graph_of_nodes(
+        self, nodes_by_type: Dict[str, List[ObjectId]]
+    ) -> nx.DiGraph:
+        """The graph of a set of nodes, like `get_graph` but for nodes given by id instead of by Sample.
+
+        Args:
+            nodes_by_type (Dict[str, List[ObjectId]]): node ids keyed by node type, like the "nodes" field of a Sample document. Ids may be repeated.
+
+        Returns:
+            nx.DiGraph: Graph keyed by node id, nodes carry "type" and "name" attributes. Neighbors of these nodes have an empty name.
+        """
+        graph = nx.DiGraph()
+        neighbors = []
+        views = self._node_views()
+        for node_type, ids in nodes_by_type.items():
+            if len(ids) == 0:
+                continue
+            for node in views[node_type]._collection.find(
+                {"_id": {"$in": list(set(ids))}},
+                {"name": 1, "upstream": 1, "downstream": 1},
+            ):
+                graph.add_node(node["_id"], type=node_type, name=node["name"])
+                graph.add_edges_from(
+                    (upstream["node_id"], node["_id"]) for upstream in node["upstream"]
+                )
+                graph.add_edges_from(
+                    (node["_id"], downstream["node_id"])
+                    for downstream in node["downstream"]
+                )
+                neighbors.extend(node["upstream"])
+                neighbors.extend(node["downstream"])
+        for neighbor in neighbors:
+            attributes = graph.nodes[neighbor["node_id"]]
+            if "type" not in attributes:
+                attributes.update(type=neighbor["node_type"], name="")
+        return graph
+
+    @instrumented
     def get_by_contents(self, contents: dict) -> List[Sample]:
         """Return all Sample(s) that contain the given key-value pairs in their document.
 
@@ -196,13 +548,14 @@ class SampleView(BaseView):
             List[Sample]: List of Sample(s) with the specified contents. List is sorted from most recent to oldest.
         """
         result = self._collection.find(contents).sort("created_at", pymongo.DESCENDING)
-        entries = [self._entry_to_object(entry) for entry in entries]
+        entries = self._entries_to_objects(result)
         if len(entries) == 0:
             raise NotFoundInDatabaseError(
                 f"No Sample found that contains the following key-value pairs: {contents}!"
             )
         return entries
 
+    @instrumented
     def get_by_node(self, node: BaseNode) -> List[Sample]:
         """Return any Sample(s) that contain the given node
 
@@ -220,6 +573,7 @@ class SampleView(BaseView):
         node_id = node.id
         return self.get_by_node_info(node_type, node_id)
 
+    @instrumented
     def get_by_node_info(self, node_type: str, node_id: ObjectId) -> List[Sample]:
         """Return any Sample(s) that contain a node of the given type and ID
 
@@ -242,7 +596,7 @@ class SampleView(BaseView):
         result = self._collection.find({f"nodes.{node_type}": node_id}).sort(
             "created_at", pymongo.DESCENDING
         )
-        entries = [self._entry_to_object(entry) for entry in result]
+        entries = self._entries_to_objects(result)
         if len(entries) == 0:
             raise NotFoundInDatabaseError(
                 f"No Sample found containing node of type {node_type} with id {node_id}!"
@@ -261,11 +615,13 @@ class SampleView(BaseView):
     def get_by_analysis_node(self, analysis_id: ObjectId) -> List[Sample]:
         return self.get_by_node_info("Analysis", analysis_id)
 
-    def update(self, entry: Sample):
-        """Updates an entry in the database. The previous entry will be placed in a `version_history` field of the entry.
+    @instrumented
+    def update(self, entry: Sample, transaction: bool = False):
+        """Updates an entry in the database. The previous entry will be placed in the history collection (see `labgraph.views.history`).
 
         Args:
             entry (Sample): Sample object to be updated
+            transaction (bool, optional): If True, the nodes and the Sample are written in a single MongoDB transaction. Requires MongoDB to be running as a replica set. Defaults to False.
 
         Raises:
             TypeError: Node is of wrong type
@@ -290,18 +646,38 @@ class SampleView(BaseView):
             entry
         )  # will throw error if any nodes cannot be encoded to BSON
 
-        for node in entry.nodes:
-            if isinstance(node, Action):
-                self.actionview.add(node, if_already_in_db="update")
-            elif isinstance(node, Material):
-                self.materialview.add(node, if_already_in_db="update")
-            elif isinstance(node, Analysis):
-                self.analysisview.add(node, if_already_in_db="update")
-            elif isinstance(node, Measurement):
-                self.measurementview.add(node, if_already_in_db="update")
-            else:
-                raise ValueError(f"Node {node} is not a valid node type")
+        updated_at = datetime.now().replace(
+            microsecond=0
+        )  # remove microseconds, they get lost in MongoDB anyways
+        operation, history_operations, local_changes = self._plan_update(
+            entry, old_entry, updated_at
+        )
+
+        def write_sample(db_session: Optional[ClientSession]):
+            self._write_history(history_operations, db_session=db_session)
+            self._collection.bulk_write([operation], session=db_session)
+
+        self._write_with_nodes(entry, write_sample, transaction=transaction)
+
+        # update local copy of entry to reflect database changes
+        for attribute, value in local_changes.items():
+            setattr(entry, attribute, value)
+        self._invalidate_in_session(entry.id)
 
+    @staticmethod
+    def _plan_update(
+        entry: Sample, old_entry: dict, now: datetime
+    ) -> Tuple[WriteOperation, List[ReplaceOne], Dict[str, Any]]:
+        """Plans the database write that updates a Sample entry, without touching the database. Like `BaseNodeView._plan_write`, changes to the Sample's nodes alone update the current version in place, while any other change creates a new version.
+
+        Args:
+            entry (Sample): Sample object to be written
+            old_entry (dict): The Sample's current database entry
+            now (datetime): Timestamp to use for updated_at
+
+        Returns:
+            Tuple[WriteOperation, List[ReplaceOne], Dict[str, Any]]: (operation, history operations, local changes). The history operations go to the history collection, and should be written before the operation. The local changes are attributes to set on the Sample object once the operation has been written.
+        """
         new_entry = entry.to_dict()
 
         # If we are only adding new nodes, we won't consider this a version update. Will instead update the current version in place.
@@ -318,38 +694,50 @@ class SampleView(BaseView):
 
         if only_changing_nodes:
             # no need for version history if we are only adding nodes
-            updated_at = datetime.now().replace(microsecond=0)
-            self._collection.update_one(
-                {"_id": entry.id},
-                {
-                    "$set": {
-                        "nodes": new_entry["nodes"],
-                        "updated_at": updated_at,  # remove microseconds, they get lost in MongoDB anyways,
-                    }
-                },
+            history_operations, version = plan_history_writes(
+                old_entry, new_entry=None, now=now
             )
-            entry._updated_at = updated_at
+            update = {
+                "$set": {
+                    "nodes": new_entry["nodes"],
+                    "updated_at": now,
+                    "version": version,
+                }
+            }
+            if "version_history" in old_entry:
+                # embedded history was moved to the history collection
+                update["$unset"] = {"version_history": ""}
+            operation = UpdateOne({"_id": entry.id}, update)
+            return operation, history_operations, {"_updated_at": now}
+
+        # if other things are changing, lets keep a version history
+        new_entry["created_at"] = old_entry["created_at"]
+        new_entry["updated_at"] = now
+        history_operations, new_entry["version"] = plan_history_writes(
+            old_entry, new_entry=new_entry, now=now
+        )
+        operation = ReplaceOne({"_id": entry.id}, new_entry)
+        return (
+            operation,
+            history_operations,
+            {
+                "_updated_at": now,
+                "_created_at": new_entry["created_at"],
+                "_version_history": None,  # reloaded from the history collection when needed
+            },
+        )
 
-        else:
-            # if other things are changing, lets keep a version history
-            new_entry["created_at"] = old_entry["created_at"]
-            new_entry["updated_at"] = (
-                datetime.now().replace(microsecond=0),
-            )  # remove microseconds, they get lost in MongoDB anyways
-            new_entry["version_history"] = old_entry.get("version_history", [])
-            old_entry.pop(
-                "version_history", None
-            )  # dont nest version histories, instead append to the new entry's version history
-            new_entry["version_history"].append(old_entry)
-            self._collection.replace_one({"_id": entry.id}, new_entry)
-
-            # update local copy of entry to reflect database changes
-            entry._created_at = new_entry["created_at"]
-            entry._updated_at = new_entry["updated_at"]
-
-            if "version_history" in new_entry:
-                entry._version_history = new_entry["version_history"]
+    def _write_history(
+        self,
+        history_operations: List[ReplaceOne],
+        db_session: Optional[ClientSession] = None,
+    ):
+        if len(history_operations) > 0:
+            self._history_collection.bulk_write(
+                history_operations, ordered=False, session=db_session
+            )
 
+    @instrumented
     def remove(
         self, id: ObjectId, remove_nodes: bool = False, _force_dangerous: bool = False
     ):
@@ -384,6 +772,7 @@ class SampleView(BaseView):
                 )
 
         result = self._collection.delete_one({"_id": id})
+        self._invalidate_in_session(id)
         if result.deleted_count == 0 and not remove_nodes:
             # if removing nodes, this sample may have been deleted in the node removal sequence, so no error raise is needed
             raise NotFoundInDatabaseError(
@@ -0,0 +1,113 @@
+"""
+An opt-in identity map for the views. Within a ``Session``, retrieving the same entry twice returns the same Python object, and entries that were already retrieved are not read from the database again.
+
+.. code-block:: python
+
+    from labgraph.views import Session, MaterialView
+
+    with Session():
+        m1 = MaterialView().get(material_id)
+        m2 = MaterialView().get(material_id)  # no database call
+        assert m1 is m2
+"""
+
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Optional, Tuple
+
+from bson import ObjectId
+
+_ACTIVE_SESSION: ContextVar[Optional["Session"]] = ContextVar(
+    "labgraph_session", default=None
+)
+
+
+class Session:
+    """Identity map keyed by (type, id) of the retrieved entries (nodes, actors, and samples). Once the map holds `max_size` entries, the least recently used entries are evicted.
+
+    Entries are invalidated when they are updated or removed through a view. Removing nodes rewrites edges on many other nodes, so node removal clears the whole map.
+
+    Changes made to the database outside of this session (ie by another process) are not seen by entries that are already in the map. Keep sessions short-lived!
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Args:
+            max_size (int, optional): Maximum number of entries held in the identity map. Defaults to 10000.
+
+        Raises:
+            ValueError: max_size is not a positive integer.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer!")
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, ObjectId], Any]" = OrderedDict()
+        self._tokens = []
+
+    def __enter__(self) -> "Session":
+        self._tokens.append(_ACTIVE_SESSION.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _ACTIVE_SESSION.reset(self._tokens.pop())
+
+    def get(self, entry_type: str, id: ObjectId) -> Optional[Any]:
+        """Get an entry from the identity map.
+
+        Args:
+            entry_type (str): Type of the entry (Material, Action, Measurement, Analysis, Actor, Sample)
+            id (ObjectId): id of the entry
+
+        Returns:
+            Optional[Any]: The entry, or None if it is not in the identity map.
+        """
+        key = (entry_type, id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, entry_type: str, id: ObjectId, entry: Any):
+        """Add an entry to the identity map, evicting the least recently used entry if the map is full.
+
+        Args:
+            entry_type (str): Type of the entry (Material, Action, Measurement, Analysis, Actor, Sample)
+            id (ObjectId): id of the entry
+            entry (Any): The entry object
+        """
+        key = (entry_type, id)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, entry_type: str, id: ObjectId):
+        """Remove an entry from the identity map. The next retrieval will read it from the database.
+
+        Args:
+            entry_type (str): Type of the entry (Material, Action, Measurement, Analysis, Actor, Sample)
+            id (ObjectId): id of the entry
+        """
+        self._entries.pop((entry_type, id), None)
+
+    def clear(self):
+        """Remove all entries from the identity map."""
+        self._entries.clear()
+
+    def __contains__(self, key: Tuple[str, ObjectId]) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<Session: {len(self)}/{self.max_size} entries>"
+
+
+def get_active_session() -> Optional[Session]:
+    """Get the Session that is currently active, if any.
+
+    Returns:
+        Optional[Session]: The active Session, or None if no Session is active.
+    """
+    return _ACTIVE_SESSION.get()
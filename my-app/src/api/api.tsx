@@ -14,6 +14,28 @@ export interface SampleSummaryData {
     "tags": string[];
 }
 
+export interface NodeCounts {
+    [node_type: string]: number;
+}
+export interface SampleSummaryEntry {
+    "_id": string;
+    "name": string;
+    "description": string;
+    "created_at": string;
+    "node_counts": NodeCounts;
+    "tags": string[];
+}
+export interface SampleSummaryPage {
+    "samples": SampleSummaryEntry[];
+    "next_cursor": string | null;
+}
+export interface SampleSummaryQuery {
+    limit?: number;
+    cursor?: string | null;
+    tags?: string[];
+    name?: string;
+}
+
 export interface SampleData {
     "name": string;
     "description": string;
@@ -89,6 +111,22 @@ export class Api {
         return this.init().get("/sample/summary/" + count);
     };
 
+    getSampleSummaryPage = ({ limit = 50, cursor = null, tags = [], name = "" }: SampleSummaryQuery = {}): Promise<{ data: SampleSummaryPage }> => {
+        const params = new URLSearchParams({ limit: String(limit) });
+        if (cursor) {
+            params.append("cursor", cursor);
+        }
+        tags.forEach((tag) => params.append("tag", tag));
+        if (name) {
+            params.append("name", name);
+        }
+        return this.init().get("/sample/summary?" + params.toString());
+    };
+
+    getSampleTags = (): Promise<{ data: string[] }> => {
+        return this.init().get("/sample/tags");
+    };
+
     getSample = (sample_id: string): Promise<{ data: SampleData }> => {
         return this.init().get(`/sample/${sample_id}`);
     };
@@ -3,111 +3,94 @@
 import { useState, useEffect } from 'react';
 
 import {
+    Button,
+    Group,
     ScrollArea,
     MultiSelect,
+    TextInput,
 } from '@mantine/core';
 import { DataTable } from "mantine-datatable";
-import { Api, SampleData } from '../../api/api';
-import { samples } from '../../__mock__/samples';
-interface SortableRowData {
-    _id: string;
-    name: string;
-    description: string;
-    created_at: string;
-    // updated_at?: string;
-}
+import { Api, NodeCounts, SampleSummaryEntry } from '../../api/api';
 
-interface RowData extends SortableRowData {
-    tags: string[];
-    nodes: {
-        [node_type: string]: string[];
-    };
-}
+const ITEMS_PER_PAGE = 10;
 
-interface TableSortProps {
-    data: RowData[];
-}
-
-
-function uniqueTags(data: SampleData[]) {
-    console.log(data);
-    const tags = data.reduce((acc, { tags }) => {
-        tags.forEach((tag) => {
-            if (!acc.includes(tag)) {
-                acc.push(tag);
-            }
-        });
-        return acc;
-    }, [] as string[]);
-    tags.sort();
-    return tags;
-}
 export function SampleTable() {
     const api = new Api();
-    const ITEMS_PER_PAGE = 10;
 
-
-
-    const [data, setData] = useState(samples)
-    const [page, setPage] = useState(1);
-    const [taggedRecords, setTaggedRecords] = useState(data);
-    const [records, setRecords] = useState(taggedRecords.slice(0, ITEMS_PER_PAGE));
-    const allTags = uniqueTags(data);
+    const [records, setRecords] = useState<SampleSummaryEntry[]>([]);
+    const [allTags, setAllTags] = useState<string[]>([]);
     const [selectedTags, setSelectedTags] = useState<string[]>([]);
+    const [namePrefix, setNamePrefix] = useState("");
+    // cursors[i] is the cursor of page i. The first page has no cursor.
+    const [cursors, setCursors] = useState<(string | null)[]>([null]);
+    const [page, setPage] = useState(0);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-    const handleInitialSetup = (data: SampleData[]) => {
-        setData(data);
-        setTaggedRecords(data);
-        setRecords(data.slice(0, ITEMS_PER_PAGE));
-    }
-
-    useEffect(() => {
+    const loadPage = (pageIndex: number, pageCursors: (string | null)[], tags: string[], name: string) => {
         api
-            .getSampleSummary(0)
+            .getSampleSummaryPage({ limit: ITEMS_PER_PAGE, cursor: pageCursors[pageIndex], tags: tags, name: name })
             .then((response) => {
-                handleInitialSetup(response.data);
-                console.log("received " + response.data.length + " samples");
-
+                setRecords(response.data.samples);
+                setNextCursor(response.data.next_cursor);
+                setPage(pageIndex);
+                setCursors(pageCursors);
             })
             .catch((err) => {
                 console.log("error retrieving samples: " + err);
             });
+    };
 
+    useEffect(() => {
+        api
+            .getSampleTags()
+            .then((response) => setAllTags(response.data))
+            .catch((err) => {
+                console.log("error retrieving sample tags: " + err);
+            });
+        loadPage(0, [null], [], "");
     }, []);
 
+    // filters are applied by the server, starting over from the first page
     const handleTagChange = (tags: string[]) => {
         setSelectedTags(tags);
-        var thisTaggedRecords: SampleData[] = [];
-        if (tags.length === 0) {
-            thisTaggedRecords = data;
-        } else {
-            thisTaggedRecords = data.filter((row) => tags.every(this_tag => row.tags.includes(this_tag)));
-        }
-        setTaggedRecords(thisTaggedRecords);
-        setPage(1);
-        setRecords(thisTaggedRecords.slice(0, ITEMS_PER_PAGE));
+        loadPage(0, [null], tags, namePrefix);
+    };
+
+    const handleNameChange = (name: string) => {
+        setNamePrefix(name);
+        loadPage(0, [null], selectedTags, name);
     };
 
-    const handlePageChange = (page: number) => {
-        setPage(page);
-        const from = (page - 1) * ITEMS_PER_PAGE;
-        const to = from + ITEMS_PER_PAGE;
-        setRecords(taggedRecords.slice(from, to));
+    const handleNextPage = () => {
+        const pageCursors = cursors.slice(0, page + 1).concat([nextCursor]);
+        loadPage(page + 1, pageCursors, selectedTags, namePrefix);
+    };
+
+    const handlePreviousPage = () => {
+        loadPage(page - 1, cursors, selectedTags, namePrefix);
     };
 
     return (
         <ScrollArea>
-            <MultiSelect
-                label="Tags"
-                data={allTags}
-                value={selectedTags}
-                onChange={(value) => handleTagChange(value)}
-                placeholder="Select tags to filter the table."
-                searchable
-                clearable
-                clearButtonLabel='Clear selection'
-                maxDropdownHeight={160}
-            />
+            <Group grow>
+                <MultiSelect
+                    label="Tags"
+                    data={allTags}
+                    value={selectedTags}
+                    onChange={(value) => handleTagChange(value)}
+                    placeholder="Select tags to filter the table."
+                    searchable
+                    clearable
+                    clearButtonLabel='Clear selection'
+                    maxDropdownHeight={160}
+                />
+                <TextInput
+                    label="Name"
+                    value={namePrefix}
+                    onChange={(event) => handleNameChange(event.currentTarget.value)}
+                    placeholder="Filter by the start of the sample name."
+                />
+            </Group>
             <DataTable
                 withBorder
                 borderRadius="sm"
@@ -116,10 +99,7 @@ export function SampleTable() {
                 highlightOnHover
                 // provide data
                 records={records}
-                recordsPerPage={ITEMS_PER_PAGE}
-                page={page}
-                totalRecords={taggedRecords.length}
-                onPageChange={(page) => handlePageChange(page)}
+                idAccessor="_id"
                 // define columns
                 columns={[
                     {
@@ -128,22 +108,28 @@ export function SampleTable() {
                     {
                         accessor: 'description',
                     },
-                    // {
-                    //     accessor: 'nodes',
-                    //     render: (nodes: NodeList) => {
-                    //         return (
-                    //             <Text>{nodes.Action.length + nodes.Analysis.length + nodes.Measurement.length + nodes.Material.length}</Text>
-                    //         );
-                    //     },
-                    // },
+                    {
+                        accessor: 'node_counts',
+                        title: 'Nodes',
+                        render: ({ node_counts }: { node_counts: NodeCounts }) =>
+                            Object.values(node_counts).reduce((total, count) => total + count, 0),
+                    },
                     {
                         accessor: 'created_at',
                     },
                 ]}
-                onRowClick={({ name, description, nodes }) =>
-                    alert(`You clicked on ${name}, a ${description.toLowerCase()} president born in ${nodes}`)
+                onRowClick={({ name, description, node_counts }) =>
+                    alert(`You clicked on ${name} (${description}), which has ${JSON.stringify(node_counts)} nodes`)
                 }
             />
+            <Group position="right" mt="xs">
+                <Button variant="default" disabled={page === 0} onClick={handlePreviousPage}>
+                    Previous
+                </Button>
+                <Button variant="default" disabled={nextCursor === null} onClick={handleNextPage}>
+                    Next
+                </Button>
+            </Group>
         </ScrollArea>
     );
-}
\ No newline at end of file
+}
@@ -59,7 +59,12 @@ setup(
             "pytest_reraise >= 2.1.1",
             "pylint >= 2.11.1",
             "pytest-env ~= 0.6.2",
-        ]
+            "pytest-benchmark",
+            "mongomock-motor",
+        ],
+        "async": [
+            "motor >= 3.0",
+        ],
     },
     packages=find_packages(),
     include_package_data=True,
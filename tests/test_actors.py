@@ -102,3 +102,59 @@ def test_Actor_classmethods(clean_db):
     assert a_["new_user_field"] == "new_user_field_value"
     assert a_.keys() == ["new_user_field"]
     assert a == a_
+
+
+def test_ActorCache(add_actors_to_db):
+    from datetime import datetime, timedelta
+    from labgraph.views import get_actor_cache
+
+    av = ActorView()
+    cache = get_actor_cache()
+    cache.clear()
+    cache.reset_stats()
+    ttl = cache.ttl
+
+    labman_id = av.get_by_name(name="LabMan")[0].id
+    try:
+        cache.ttl = 60
+        assert av.get(labman_id).name == "LabMan"
+        assert av.get(labman_id).name == "LabMan"
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hits"] == 1
+
+        # cached entries are copies, changing the object does not change the cache
+        labman = av.get(labman_id)
+        labman.tags.append("new_tag")
+        assert "new_tag" not in av.get(labman_id).tags
+
+        # updates through the view invalidate the cache
+        av.update(labman)
+        assert "new_tag" in av.get(labman_id).tags
+        assert cache.stats()["misses"] == 2
+
+        # changes made elsewhere are seen once the TTL has elapsed
+        av._collection.update_one(
+            {"_id": labman_id},
+            {
+                "$set": {
+                    "description": "changed elsewhere",
+                    "updated_at": datetime.now().replace(microsecond=0)
+                    + timedelta(seconds=1),
+                }
+            },
+        )
+        assert av.get(labman_id).description != "changed elsewhere"
+        cache.ttl = 0
+        assert av.get(labman_id).description == "changed elsewhere"
+        assert cache.stats()["misses"] == 3
+
+        # unchanged entries are revalidated without being read again
+        revalidations = cache.stats()["revalidations"]
+        av.get(labman_id)
+        assert cache.stats()["revalidations"] == revalidations + 1
+        assert cache.stats()["misses"] == 3
+
+        all_ids = [a.id for a in av.filter({})]
+        assert set(av.get_many(all_ids)) == set(all_ids)
+    finally:
+        cache.ttl = ttl
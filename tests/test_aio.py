@@ -0,0 +1,231 @@
+import asyncio
+import pytest
+from labgraph import (
+    Action,
+    Actor,
+    Analysis,
+    Material,
+    Measurement,
+    Sample,
+    WholeIngredient,
+)
+from labgraph.views.base import AlreadyInDatabaseError, NotFoundInDatabaseError
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from labgraph.views import aio  # noqa: E402
+
+
+@pytest.fixture
+def async_db():
+    """An in-process stand-in for MongoDB, used by the asyncio views."""
+    client = mongomock_motor.AsyncMongoMockClient()
+    previous = (aio._GetAsyncMongoCollection.client, aio._GetAsyncMongoCollection.db)
+    aio.set_async_database(client["Labgraph_async_test"])
+    yield
+    aio._GetAsyncMongoCollection.client, aio._GetAsyncMongoCollection.db = previous
+    aio._GetAsyncMongoCollection.indexed_collections = set()
+
+
+async def _add_sample(name: str) -> Sample:
+    actorview = aio.AsyncActorView()
+    operator = Actor(name=f"{name} operator", description="a person")
+    xrd = Actor(name=f"{name} xrd", description="a diffractometer")
+    await actorview.add(operator)
+    await actorview.add(xrd)
+
+    m0 = Material(name="Titanium Dioxide", formula="TiO2")
+    p0 = Action("procurement", generated_materials=[m0], actor=operator)
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    me0 = Measurement(name="XRD", material=m1, actor=xrd)
+    a0 = Analysis(name="Phase Identification", measurements=[me0], actor=xrd)
+
+    sample = Sample(name=name, nodes=[p0, m0, p1, m1, me0, a0], tags=["async"])
+    await aio.AsyncSampleView().add(sample)
+    return sample
+
+
+def test_AsyncSampleView(async_db):
+    async def main():
+        sampleview = aio.AsyncSampleView()
+        sample = await _add_sample("async sample")
+        assert sample.created_at == sample.updated_at
+
+        with pytest.raises(AlreadyInDatabaseError):
+            await sampleview.add(sample)
+
+        sample_ = await sampleview.get(sample.id)
+        assert sample_.name == "async sample"
+        assert [node.id for node in sample_.nodes] == [node.id for node in sample.nodes]
+        assert sample_.has_valid_graph
+
+        # nodes of the sample are built together, so they reference each other directly
+        grind = [node for node in sample_.nodes if node.name == "grind"][0]
+        assert grind.ingredients[0].material is sample_.get_node(
+            grind.ingredients[0].material.id
+        )
+        assert grind.actor.name == "async sample operator"
+
+        assert (await sampleview.get_by_node(grind))[0].id == sample.id
+        with pytest.raises(NotFoundInDatabaseError):
+            await sampleview.get_by_name("not a sample")
+
+        # updating a sample keeps the previous version in the history collection
+        sample_["note"] = "updated"
+        await sampleview.update(sample_)
+        assert (await sampleview.get(sample.id))["note"] == "updated"
+        assert (
+            await sampleview._history_collection.count_documents(
+                {"entry_id": sample.id}
+            )
+            == 1
+        )
+
+    asyncio.run(main())
+
+
+def test_AsyncNodeViews(async_db):
+    async def main():
+        sample = await _add_sample("async nodes")
+        materialview = aio.AsyncMaterialView()
+
+        material = (await materialview.get_by_name("Titanium Dioxide"))[0]
+        material["purity"] = 0.99
+        await materialview.update(material)
+        assert (await materialview.get(material.id))["purity"] == 0.99
+
+        # linked nodes are resolved lazily, in one batch
+        measurement = (await aio.AsyncMeasurementView().get_by_name("XRD"))[0]
+        assert not measurement.material.is_resolved
+        assert await aio.resolve_pending_references_async() >= 1
+        assert measurement.material.is_resolved
+        assert measurement.material.name == "Titanium Dioxide - grind"
+
+        actorview = aio.AsyncActorView()
+        actors = await actorview.filter({})
+        assert len(await actorview.get_many([a.id for a in actors])) == len(actors)
+        with pytest.raises(AlreadyInDatabaseError):
+            await actorview.add(Actor(name="async nodes xrd", description="again"))
+
+        # nodes are hydrated concurrently, one query per collection
+        node_ids = {}
+        for node in sample.nodes:
+            node_ids.setdefault(node.__class__.__name__, set()).add(node.id)
+        resolved = await aio.hydrate_nodes_async(node_ids)
+        assert all(node.id in resolved for node in sample.nodes)
+
+    asyncio.run(main())
+
+
+def test_AsyncRemoval(async_db, monkeypatch):
+    def not_allowed(*args, **kwargs):
+        raise AssertionError("async removal must not use the sync views or prompt")
+
+    monkeypatch.setattr("labgraph.views.base.get_collection", not_allowed)
+    monkeypatch.setattr("builtins.input", not_allowed)
+
+    async def main():
+        sampleview = aio.AsyncSampleView()
+        materialview = aio.AsyncMaterialView()
+        sample1 = await _add_sample("removal 1")
+        sample2 = await _add_sample("removal 2")
+        p0, m1, me0, a0 = [sample1.nodes[i] for i in [0, 3, 4, 5]]
+
+        # nothing is removed unless the caller accepts that other nodes and samples are affected
+        with pytest.raises(ValueError):
+            await aio.AsyncMeasurementView().remove(me0.id)
+        assert await aio.AsyncAnalysisView()._exists(a0.id)
+
+        # downstream nodes are removed too, and the remaining graph is cleaned up
+        await aio.AsyncMeasurementView().remove(me0, _force_dangerous=True)
+        assert not await aio.AsyncAnalysisView()._exists(a0.id)
+        sample1_ = await sampleview.get(sample1.id)
+        assert len(sample1_.nodes) == 4
+        assert sample1_.has_valid_graph
+        assert len((await materialview.get(m1.id)).downstream) == 0
+
+        # samples left with a broken graph are removed
+        await aio.AsyncActionView().remove(p0.id, _force_dangerous=True)
+        with pytest.raises(NotFoundInDatabaseError):
+            await sampleview.get(sample1.id)
+        assert len((await sampleview.get(sample2.id)).nodes) == 6
+
+        # a node outside of any sample is removed without confirmation
+        loose = Material(name="loose material")
+        await materialview.add(loose)
+        await materialview.remove(loose.id)
+        assert not await materialview._exists(loose.id)
+        with pytest.raises(NotFoundInDatabaseError):
+            await materialview.remove(loose.id)
+        await materialview.remove(loose.id, _force_dangerous=True)
+
+        # removing a sample keeps its nodes, unless asked otherwise
+        with pytest.raises(ValueError):
+            await sampleview.remove(sample2.id, remove_nodes=True)
+        await sampleview.remove(sample2.id, remove_nodes=True, _force_dangerous=True)
+        assert not await sampleview._exists(sample2.id)
+        for node in sample2.nodes:
+            assert not await aio.get_async_view_by_type(
+                node.__class__.__name__
+            )._exists(node.id)
+        with pytest.raises(NotFoundInDatabaseError):
+            await sampleview.remove(sample2.id)
+
+        sample3 = await _add_sample("removal 3")
+        await sampleview.remove(sample3.id)
+        assert not await sampleview._exists(sample3.id)
+        assert await materialview._exists(sample3.nodes[1].id)
+
+    asyncio.run(main())
+
+
+def test_AsyncIterFilter(async_db):
+    async def main():
+        sampleview = aio.AsyncSampleView()
+        for i in range(5):
+            await _add_sample(f"async sample {i}")
+
+        names = [s.name async for s in sampleview.iter_filter({"tags": "async"})]
+        assert sorted(names) == [f"async sample {i}" for i in range(5)]
+
+        names = [
+            s.name
+            async for s in sampleview.iter_filter({"tags": "async"}, batch_size=2)
+        ]
+        assert len(names) == 5
+
+        entries = [
+            entry
+            async for entry in sampleview.iter_filter(
+                {"tags": "async"}, projection=["name"], limit=2
+            )
+        ]
+        assert len(entries) == 2
+        assert set(entries[0].keys()) == {"_id", "name"}
+
+        assert len(await sampleview.filter({"tags": "async"}, skip=1, limit=3)) == 3
+        assert (await sampleview.filter_one({"tags": "async"})).name in names
+
+    asyncio.run(main())
+
+
+def test_AsyncViewsAreInstrumented(async_db):
+    from labgraph.utils.instrumentation import current_operations, track_queries
+
+    async def main():
+        sample = await _add_sample("instrumented sample")
+        sampleview = aio.AsyncSampleView()
+        seen = []
+        find_one = sampleview._collection.find_one
+
+        async def recording_find_one(*args, **kwargs):
+            seen.append(current_operations())
+            return await find_one(*args, **kwargs)
+
+        sampleview._collection.find_one = recording_find_one
+        with track_queries():
+            await sampleview.get(sample.id)
+        assert seen == [("AsyncSampleView.get",)]
+
+    asyncio.run(main())
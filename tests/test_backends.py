@@ -0,0 +1,295 @@
+from datetime import datetime
+import re
+
+import pytest
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from labgraph import Action, Actor, Material, Sample, WholeIngredient, views
+from labgraph.backends import (
+    MemoryBackend,
+    SQLiteBackend,
+    UnsupportedQueryError,
+    get_backend,
+    use_backend,
+)
+from labgraph.backends.query import apply_update, matches, project
+from labgraph.views.graph_integrity import get_affected_nodes
+
+
+@pytest.fixture
+def memory_backend():
+    with use_backend(MemoryBackend()) as backend:
+        yield backend
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "labgraph.sqlite"))
+    with use_backend(backend):
+        yield backend
+    backend.close()
+
+
+def test_QueryMatching():
+    id = ObjectId()
+    document = {
+        "_id": id,
+        "name": "grind",
+        "tags": ["a", "b"],
+        "count": 3,
+        "upstream": [{"node_type": "Material", "node_id": id}],
+        "nodes": {"Material": [id], "Action": []},
+    }
+
+    assert matches(document, {})
+    assert matches(document, {"name": "grind", "count": {"$gte": 3, "$lt": 4}})
+    assert not matches(document, {"count": {"$gt": "2"}})  # no cross-type comparison
+    assert matches(document, {"tags": "a"})  # any element of an array
+    assert matches(document, {"tags": ["a", "b"]})  # or the whole array
+    assert matches(document, {"tags": {"$all": ["b", "a"]}})
+    assert not matches(document, {"tags": {"$all": ["a", "c"]}})
+    assert matches(document, {"tags": {"$size": 2}})
+    assert matches(document, {"nodes.Material": {"$in": [ObjectId(), id]}})
+    assert matches(document, {"upstream": {"node_type": "Material", "node_id": id}})
+    assert matches(document, {"upstream.node_type": "Material"})
+    assert matches(document, {"upstream": {"$elemMatch": {"node_id": id}}})
+    assert matches(document, {"missing": None})
+    assert matches(document, {"missing": {"$exists": False}})
+    assert matches(document, {"name": re.compile("^gr")})
+    assert matches(document, {"name": {"$regex": "GRIND", "$options": "i"}})
+    assert matches(document, {"name": {"$not": {"$regex": "sinter"}}})
+    assert matches(document, {"$or": [{"name": "sinter"}, {"count": 3}]})
+    assert not matches(document, {"$nor": [{"name": "sinter"}, {"count": 3}]})
+    with pytest.raises(UnsupportedQueryError):
+        matches(document, {"$where": "this.count > 2"})
+
+    assert project(document, {"name": 1}) == {"_id": id, "name": "grind"}
+    assert project(document, ["upstream.node_type"]) == {
+        "_id": id,
+        "upstream": [{"node_type": "Material"}],
+    }
+    assert "nodes" not in project(document, {"nodes": 0})
+
+    apply_update(
+        document,
+        {
+            "$set": {"nodes.Action": [id]},
+            "$pull": {"upstream": {"node_type": "Material", "node_id": id}},
+            "$addToSet": {"tags": {"$each": ["a", "c"]}},
+            "$inc": {"count": 1},
+        },
+    )
+    assert document["nodes"]["Action"] == [id]
+    assert document["upstream"] == []
+    assert document["tags"] == ["a", "b", "c"]
+    assert document["count"] == 4
+
+
+def test_MemoryCollection(memory_backend):
+    collection = memory_backend.get_collection("materials")
+    ids = [
+        collection.insert_one(
+            {"name": f"material {i}", "tags": ["even" if i % 2 == 0 else "odd"]}
+        ).inserted_id
+        for i in range(10)
+    ]
+
+    # the declared indexes answer lookups without scanning the collection
+    assert "tags_1" in collection.index_information()
+    assert collection._plan({"tags": {"$all": ["even"]}}) == set(ids[::2])
+    assert collection._plan({"_id": {"$in": ids[:2]}}) == set(ids[:2])
+    assert collection._plan({"description": "not indexed"}) is None
+
+    assert collection.count_documents({"tags": "odd"}) == 5
+    names = [
+        entry["name"]
+        for entry in collection.find({"tags": "even"}, {"name": 1})
+        .sort("name", -1)
+        .skip(1)
+        .limit(2)
+    ]
+    assert names == ["material 6", "material 4"]
+
+    # stored documents are copies
+    entry = collection.find_one({"_id": ids[0]})
+    entry["name"] = "changed"
+    assert collection.find_one({"_id": ids[0]})["name"] == "material 0"
+
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"_id": ids[0]})
+
+    result = collection.update_many({"tags": "odd"}, {"$pull": {"tags": "odd"}})
+    assert result.matched_count == result.modified_count == 5
+    assert collection.count_documents({"tags": "odd"}) == 0
+    assert collection._plan({"tags": "odd"}) == set()
+
+    result = collection.bulk_write(
+        [
+            UpdateOne({"_id": ids[1]}, {"$set": {"name": "renamed"}}),
+            ReplaceOne({"_id": ids[2]}, {"name": "replaced"}),
+            ReplaceOne({"_id": ObjectId()}, {"name": "upserted"}, upsert=True),
+        ]
+    )
+    assert (result.matched_count, result.modified_count, result.upserted_count) == (
+        2,
+        2,
+        1,
+    )
+    assert collection.find_one({"name": "replaced"})["_id"] == ids[2]
+    with pytest.raises(BulkWriteError):
+        collection.bulk_write([InsertOne({"_id": ids[3]})])
+
+    assert collection.delete_many({"name": {"$regex": "^material"}}).deleted_count == 8
+    collection.drop()
+    assert collection.count_documents({}) == 0
+
+
+def test_MemoryTransaction(memory_backend):
+    collection = memory_backend.get_collection("samples")
+    id = collection.insert_one({"name": "before"}).inserted_id
+
+    with pytest.raises(RuntimeError):
+        with memory_backend.transaction() as session:
+            collection.update_many({"_id": id}, {"$set": {"name": "after"}})
+            collection.insert_one({"name": "new"}, session=session)
+            raise RuntimeError("abort!")
+
+    assert collection.find_one({"_id": id})["name"] == "before"
+    assert collection.count_documents({}) == 1
+    assert collection._plan({"name": "new"}) == set()
+
+    with memory_backend.transaction():
+        collection.insert_one({"name": "new"})
+    assert collection.count_documents({}) == 2
+
+
+def test_MemoryBackendViews(memory_backend):
+    assert get_backend() is memory_backend
+
+    operator = Actor(name="Operator", description="a person")
+    views.ActorView().add(operator)
+
+    m0 = Material(name="Titanium Dioxide", formula="TiO2")
+    p0 = Action("procurement", generated_materials=[m0], actor=operator)
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    sample = Sample(name="memory sample", nodes=[p0, m0, p1, m1], tags=["memory"])
+    views.SampleView().add(sample)
+
+    assert memory_backend.get_collection("samples").count_documents({}) == 1
+    retrieved = views.SampleView().get_by_tags(["memory"])[0]
+    assert retrieved == sample
+    assert views.MaterialView().get(m1.id).name == m1.name
+
+    # traversal happens inside the backend
+    affected = get_affected_nodes(m0)
+    assert {node["node_id"] for node in affected} == {p1.id, m1.id}
+
+    views.MaterialView().remove(m0.id, _force_dangerous=True)
+    assert memory_backend.get_collection("materials").count_documents({}) == 0
+    remaining = views.SampleView().get(sample.id)
+    assert [node.id for node in remaining.nodes] == [p0.id]
+
+
+def test_SQLiteCollection(sqlite_backend):
+    collection = sqlite_backend.get_collection("materials")
+    ids = [
+        collection.insert_one(
+            {
+                "name": f"material {i}",
+                "tags": ["even" if i % 2 == 0 else "odd"],
+                "created_at": datetime(2024, 1, 1 + i),
+            }
+        ).inserted_id
+        for i in range(10)
+    ]
+
+    # lookups on indexed fields are narrowed down in SQL
+    clauses, _ = collection._plan(
+        {"tags": "odd", "name": "material 1", "created_at": {"$gte": datetime.now()}}
+    )
+    assert len(clauses) == 3
+    assert collection._plan({"description": "not indexed"}) == ([], [])
+
+    assert collection.count_documents({"tags": {"$all": ["odd"]}}) == 5
+    assert collection.count_documents({"_id": {"$in": ids[:3]}}) == 3
+    assert (
+        collection.count_documents({"created_at": {"$gt": datetime(2024, 1, 5)}}) == 5
+    )
+    names = [
+        entry["name"]
+        for entry in collection.find({"tags": "even"}, {"name": 1})
+        .sort("name", -1)
+        .skip(1)
+        .limit(2)
+    ]
+    assert names == ["material 6", "material 4"]
+
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"_id": ids[0]})
+
+    result = collection.update_many({"tags": "odd"}, {"$pull": {"tags": "odd"}})
+    assert result.matched_count == result.modified_count == 5
+    assert collection.count_documents({"tags": "odd"}) == 0
+    assert collection.delete_many({"name": {"$regex": "^material"}}).deleted_count == 10
+
+    # the data lives in the database file
+    collection.insert_one({"name": "persisted", "tags": ["kept"]})
+    sqlite_backend.close()
+    reopened = SQLiteBackend(sqlite_backend.path).get_collection("materials")
+    assert reopened.find_one({"tags": "kept"})["name"] == "persisted"
+    assert "tags_1" in reopened.index_information()
+
+
+def test_SQLiteTransaction(sqlite_backend):
+    collection = sqlite_backend.get_collection("samples")
+    id = collection.insert_one({"name": "before"}).inserted_id
+
+    with pytest.raises(RuntimeError):
+        with sqlite_backend.transaction() as session:
+            collection.update_many({"_id": id}, {"$set": {"name": "after"}})
+            collection.insert_one({"name": "new"}, session=session)
+            raise RuntimeError("abort!")
+
+    assert collection.find_one({"_id": id})["name"] == "before"
+    assert collection.count_documents({"name": "new"}) == 0
+
+    with sqlite_backend.transaction():
+        collection.insert_one({"name": "new"})
+    assert collection.count_documents({}) == 2
+
+
+def test_SQLiteBackendViews(sqlite_backend):
+    operator = Actor(name="Operator", description="a person")
+    views.ActorView().add(operator)
+
+    m0 = Material(name="Titanium Dioxide", formula="TiO2")
+    p0 = Action("procurement", generated_materials=[m0], actor=operator)
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    sample = Sample(name="sqlite sample", nodes=[p0, m0, p1, m1], tags=["sqlite"])
+    views.SampleView().add(sample)
+
+    assert views.SampleView().get_by_tags(["sqlite"])[0] == sample
+    assert views.MaterialView().get(m1.id).name == m1.name
+
+    # traversals are a recursive query over the edges table
+    assert sqlite_backend.traverse(m0.downstream) == {
+        "Material": [m1.id],
+        "Action": [p1.id],
+        "Measurement": [],
+        "Analysis": [],
+    }
+    affected = get_affected_nodes(m0)
+    assert {node["node_id"] for node in affected} == {p1.id, m1.id}
+
+    # exporting (ie into MongoDB) upserts every document by id
+    target = MemoryBackend()
+    counts = sqlite_backend.export(target)
+    assert counts["samples"] == 1
+    assert counts["materials"] == 2
+    assert sqlite_backend.export(target) == counts
+    with use_backend(target):
+        assert views.SampleView().get(sample.id) == sample
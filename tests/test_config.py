@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from labgraph.utils.config.config import client_options, validate_config
+from labgraph.utils.data_objects import _GetMongoCollection
+
+
+def test_ClientOptions():
+    config = {
+        "mongodb": {
+            "host": "localhost",
+            "port": 27017,
+            "db_name": "Labgraph",
+            "max_pool_size": 50,
+            "min_pool_size": 5,
+            "compressors": ["zstd", "zlib"],
+            "read_preference": "secondaryPreferred",
+            "w": "majority",
+            "journal": True,
+            "server_selection_timeout_ms": 2000,
+        }
+    }
+    validate_config(config)
+
+    options = client_options(config["mongodb"])
+    assert options["host"] == "localhost"
+    assert options["maxPoolSize"] == 50
+    assert options["minPoolSize"] == 5
+    assert options["compressors"] == "zstd,zlib"
+    assert options["readPreference"] == "secondaryPreferred"
+    assert options["w"] == "majority"
+    assert options["journal"] is True
+    assert options["serverSelectionTimeoutMS"] == 2000
+
+    # settings that are not given are left to the pymongo defaults
+    assert "socketTimeoutMS" not in options
+    assert "connectTimeoutMS" not in options
+
+    # the original config file format is still valid
+    validate_config(
+        {"mongodb": {"host": "localhost", "port": 27017, "db_name": "Labgraph"}}
+    )
+
+    with pytest.raises(ValueError):
+        validate_config(
+            {
+                "mongodb": {
+                    "host": "localhost",
+                    "port": 27017,
+                    "db_name": "Labgraph",
+                    "compressors": ["lz4"],
+                }
+            }
+        )
+    with pytest.raises(ValueError):
+        validate_config(
+            {
+                "mongodb": {
+                    "host": "localhost",
+                    "port": 27017,
+                    "db_name": "Labgraph",
+                    "read_preference": "anywhere",
+                }
+            }
+        )
+
+
+def test_ClientRecreatedAfterFork():
+    db = _GetMongoCollection.get_database()
+    client = _GetMongoCollection.client
+    assert _GetMongoCollection.pid == os.getpid()
+
+    # same process -> same client
+    assert _GetMongoCollection.get_database() is db
+    assert _GetMongoCollection.client is client
+
+    # pretend the client was created by a parent process
+    _GetMongoCollection.pid = -1
+    _GetMongoCollection.get_database()
+    assert _GetMongoCollection.pid == os.getpid()
+    assert _GetMongoCollection.db_lock is None
@@ -0,0 +1,434 @@
+import time
+
+import pytest
+
+from labgraph import Action, Actor, Material, Sample, WholeIngredient, views
+
+
+@pytest.fixture
+def client(clean_db):
+    # the dashboard connects to the database when it is imported
+    from labgraph.dashboard import create_app
+
+    layout_cache().clear()
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app.test_client()
+
+
+def layout_cache():
+    from labgraph.dashboard.routes.graph import layout_cache
+
+    return layout_cache
+
+
+@pytest.fixture
+def graph_sample(clean_db):
+    operator = Actor(name="Operator", description="a person")
+    views.ActorView().add(operator)
+    m0 = Material(name="Titanium Dioxide", formula="TiO2")
+    p0 = Action("procurement", generated_materials=[m0], actor=operator)
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    sample = Sample(name="drawn", nodes=[p0, m0, p1, m1])
+    views.SampleView().add(sample)
+    return sample
+
+
+def test_GraphVersion(clean_db):
+    from bson import ObjectId
+    from datetime import datetime
+    from labgraph.dashboard.layout_cache import graph_version
+
+    a, b = ObjectId(), ObjectId()
+    early, late = datetime(2023, 1, 1), datetime(2023, 6, 1)
+
+    etag, last_modified = graph_version(
+        "samples",
+        [
+            {"_id": a, "version": 1, "updated_at": early},
+            {"_id": b, "version": 1, "updated_at": late},
+        ],
+    )
+    assert last_modified == late
+    # order does not matter, but the kind, version and timestamps do
+    assert (
+        graph_version(
+            "samples",
+            [
+                {"_id": b, "version": 1, "updated_at": late},
+                {"_id": a, "version": 1, "updated_at": early},
+            ],
+        )[0]
+        == etag
+    )
+    assert (
+        graph_version(
+            "complete",
+            [
+                {"_id": a, "version": 1, "updated_at": early},
+                {"_id": b, "version": 1, "updated_at": late},
+            ],
+        )[0]
+        != etag
+    )
+    assert (
+        graph_version(
+            "samples",
+            [
+                {"_id": a, "version": 2, "updated_at": early},
+                {"_id": b, "version": 1, "updated_at": late},
+            ],
+        )[0]
+        != etag
+    )
+    assert graph_version("samples", [{"_id": a}])[1] is None
+
+
+def test_LayoutCache(clean_db):
+    from labgraph.dashboard.layout_cache import LayoutCache
+
+    cache = LayoutCache(max_entries=2)
+    calls = []
+
+    def compute(body):
+        def f():
+            calls.append(body)
+            return body
+
+        return f
+
+    assert cache.get_or_compute("a", None, compute(b"a")).body == b"a"
+    assert cache.get_or_compute("a", None, compute(b"a")).body == b"a"
+    assert calls == [b"a"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get_or_compute("b", None, compute(b"b"))
+    cache.get("a")  # "b" is now the least recently used
+    cache.get_or_compute("c", None, compute(b"c"))
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+    # not waiting for a slow layout
+    def slow():
+        time.sleep(0.2)
+        return b"slow"
+
+    assert cache.get_or_compute("slow", None, slow, timeout=0) is None
+    assert cache.get_or_compute("slow", None, slow).body == b"slow"
+
+    # errors are raised to the caller, and nothing is cached
+    def broken():
+        raise ValueError("no layout")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute("broken", None, broken)
+    assert "broken" not in cache
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_SamplesGraph(client, graph_sample):
+    response = client.get(f"/api/graph/samples?ids={graph_sample.id}")
+    assert response.status_code == 200
+    graph_ = response.get_json()
+    assert len(graph_["nodes"]) == 4
+    assert len(graph_["edges"]) == 3
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    # revalidation does not lay out the graph again
+    misses = layout_cache().misses
+    response = client.get(
+        f"/api/graph/samples?ids={graph_sample.id}",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+    response = client.post(
+        "/api/graph/samples", json={"sample_ids": [str(graph_sample.id)]}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+    assert layout_cache().misses == misses
+
+    # editing a node gives a new version
+    material = graph_sample.nodes[1]
+    material["color"] = "white"
+    views.MaterialView().update(material)
+    response = client.get(
+        f"/api/graph/samples?ids={graph_sample.id}",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert layout_cache().misses == misses + 1
+
+    # bad requests
+    assert client.get("/api/graph/samples?ids=nope").status_code == 400
+    assert (
+        client.get("/api/graph/samples?ids=000000000000000000000000").status_code == 404
+    )
+
+
+def test_CompleteGraph(client, graph_sample):
+    response = client.get("/api/graph/complete?wait=false")
+    assert response.status_code in [200, 202]
+    for _ in range(100):
+        if response.status_code == 200:
+            break
+        time.sleep(0.05)
+        response = client.get("/api/graph/complete?wait=false")
+    assert response.status_code == 200
+    assert len(response.get_json()["nodes"]) == 4
+
+    response = client.get(
+        "/api/graph/complete",
+        headers={"If-Modified-Since": response.headers["Last-Modified"]},
+    )
+    assert response.status_code == 304
+
+
+def test_SampleSummaryPages(client, clean_db):
+    operator = Actor(name="Operator", description="a person")
+    views.ActorView().add(operator)
+    names = []
+    for i in range(7):
+        m = Material(name="Titanium Dioxide", formula="TiO2")
+        p = Action("procurement", generated_materials=[m], actor=operator)
+        tags = ["even"] if i % 2 == 0 else ["odd"]
+        views.SampleView().add(
+            Sample(name=f"batch{i // 4} sample{i}", nodes=[p, m], tags=tags)
+        )
+        names.append(f"batch{i // 4} sample{i}")
+
+    # walk the pages. Samples added within the same second are ordered by id
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        url = "/api/sample/summary?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page["samples"]) <= 3
+        seen.extend(entry["name"] for entry in page["samples"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert sorted(seen) == sorted(names)
+    assert len(set(seen)) == len(seen)
+
+    entry = page["samples"][0]
+    assert entry["node_counts"] == {
+        "Material": 1,
+        "Action": 1,
+        "Measurement": 0,
+        "Analysis": 0,
+    }
+    assert "nodes" not in entry
+
+    # filters
+    assert client.get("/api/sample/tags").get_json() == ["even", "odd"]
+    page = client.get("/api/sample/summary?tag=odd").get_json()
+    assert len(page["samples"]) == 3
+    assert page["next_cursor"] is None
+    page = client.get("/api/sample/summary?name=batch1").get_json()
+    assert sorted(entry["name"] for entry in page["samples"]) == names[4:]
+    page = client.get("/api/sample/summary?name=batch1&tag=even").get_json()
+    assert len(page["samples"]) == 2
+    page = client.get("/api/sample/summary?name=batch.").get_json()
+    assert len(page["samples"]) == 0  # prefixes are not regular expressions
+
+    # bad requests
+    assert client.get("/api/sample/summary?cursor=nope").status_code == 400
+    assert client.get("/api/sample/summary?limit=0").status_code == 400
+
+
+def test_GraphNDJSON(client, graph_sample):
+    import json
+
+    expected = client.get(f"/api/graph/samples?ids={graph_sample.id}").get_json()
+
+    response = client.get(f"/api/graph/samples?ids={graph_sample.id}&format=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line.pop("type") for line in lines] == ["node"] * 4 + ["edge"] * 3
+    # same graph and layout as the JSON response, in another representation
+    assert lines[:4] == expected["nodes"]
+    assert lines[4:] == expected["edges"]
+    etag = response.headers["ETag"]
+    assert (
+        etag != client.get(f"/api/graph/samples?ids={graph_sample.id}").headers["ETag"]
+    )
+    response = client.get(
+        f"/api/graph/samples?ids={graph_sample.id}",
+        headers={"Accept": "application/x-ndjson", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+    # the complete graph streams the full node documents
+    response = client.get(
+        "/api/graph/complete", headers={"Accept": "application/x-ndjson"}
+    )
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    nodes = [line for line in lines if line["type"] == "node"]
+    assert len(nodes) == 4
+    assert {node["contents"]["name"] for node in nodes} == {
+        "Titanium Dioxide",
+        "procurement",
+        "grind",
+        graph_sample.nodes[3].name,
+    }
+    assert all("upstream" not in node["contents"] for node in nodes)
+
+
+@pytest.fixture
+def small_lab(clean_db):
+    """A procured material, used by two samples. One step of the first sample is done by a furnace."""
+    from labgraph.dashboard.overview import overview_cache
+
+    overview_cache.clear()
+    operator = Actor(name="Operator", description="a person")
+    furnace = Actor(name="Furnace", description="a furnace")
+    views.ActorView().add(operator)
+    views.ActorView().add(furnace)
+
+    m0 = Material(name="Titanium Dioxide", formula="TiO2")
+    p0 = Action("procurement", generated_materials=[m0], actor=operator)
+    procurement = Sample(name="procurement", nodes=[p0, m0])
+    views.SampleView().add(procurement)
+
+    mix = Action("mix", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = mix.make_generic_generated_material()
+    sinter = Action("sinter", ingredients=[WholeIngredient(m1)], actor=furnace)
+    m2 = sinter.make_generic_generated_material()
+    sintered = Sample(name="sintered", nodes=[mix, m1, sinter, m2])
+    views.SampleView().add(sintered)
+
+    grind = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m3 = grind.make_generic_generated_material()
+    ground = Sample(name="ground", nodes=[grind, m3])
+    views.SampleView().add(ground)
+    return {
+        "samples": [procurement, sintered, ground],
+        "actors": [operator, furnace],
+    }
+
+
+def test_Overview(small_lab):
+    from labgraph.dashboard.overview import compute_overview
+
+    procurement, sintered, ground = [
+        f"sample:{sample.id}" for sample in small_lab["samples"]
+    ]
+    overview = compute_overview("sample")
+    nodes = {node.id: node for node in overview.nodes}
+    assert overview.nodes[0].id == sintered  # largest first
+    assert (nodes[sintered].label, nodes[sintered].size) == ("sintered", 4)
+    assert nodes[sintered].node_counts["Action"] == 2
+    assert [nodes[id].internal_edges for id in [procurement, sintered, ground]] == [
+        1,
+        3,
+        1,
+    ]
+    assert {(edge.source, edge.target, edge.count) for edge in overview.edges} == {
+        (procurement, sintered, 1),
+        (procurement, ground, 1),
+    }
+
+    operator, furnace = [f"actor:{actor.id}" for actor in small_lab["actors"]]
+    overview = compute_overview("actor")
+    nodes = {node.id: node for node in overview.nodes}
+    assert nodes[operator].label == "Operator"
+    assert (nodes["actor:none"].label, nodes["actor:none"].size) == ("No actor", 4)
+    assert {(edge.source, edge.target, edge.count) for edge in overview.edges} == {
+        (operator, "actor:none", 3),
+        ("actor:none", operator, 2),
+        ("actor:none", furnace, 1),
+        (furnace, "actor:none", 1),
+    }
+
+    overview = compute_overview("type")
+    assert {(node.id, node.size) for node in overview.nodes} == {
+        ("type:Action", 4),
+        ("type:Material", 4),
+    }
+    assert {(edge.source, edge.target, edge.count) for edge in overview.edges} == {
+        ("type:Action", "type:Material", 4),
+        ("type:Material", "type:Action", 3),
+    }
+
+
+def test_LevelOfDetailGraph(client, small_lab):
+    procurement, sintered, ground = [
+        f"sample:{sample.id}" for sample in small_lab["samples"]
+    ]
+
+    graph_ = client.get("/api/graph/lod").get_json()
+    assert {node["_id"] for node in graph_["nodes"]} == {procurement, sintered, ground}
+    assert {
+        (edge["source"], edge["target"], edge["contents"]["count"])
+        for edge in graph_["edges"]
+    } == {(procurement, sintered, 1), (procurement, ground, 1)}
+
+    # smaller groups are merged
+    graph_ = client.get("/api/graph/lod?max_groups=1").get_json()
+    nodes = {node["_id"]: node for node in graph_["nodes"]}
+    assert set(nodes) == {sintered, "sample:other"}
+    assert nodes["sample:other"]["contents"]["size"] == 4
+    assert nodes["sample:other"]["contents"]["internal_edges"] == 3
+    assert [(edge["source"], edge["target"]) for edge in graph_["edges"]] == [
+        ("sample:other", sintered)
+    ]
+
+    # expanding a group shows its nodes, and their edges to other groups
+    mix = small_lab["samples"][1].nodes[0]
+    graph_ = client.get(f"/api/graph/lod?expand={sintered}").get_json()
+    nodes = {node["_id"]: node for node in graph_["nodes"]}
+    assert len(nodes) == 6
+    assert nodes[str(mix.id)]["label"] == "mix"
+    assert nodes[str(mix.id)]["contents"]["group"] == sintered
+    edges = {(edge["source"], edge["target"]) for edge in graph_["edges"]}
+    assert len(edges) == 5
+    assert (procurement, str(mix.id)) in edges
+    assert (procurement, ground) in edges
+
+    # edges to the later samples that use a node of the expanded group
+    m0 = small_lab["samples"][0].nodes[-1]
+    graph_ = client.get(f"/api/graph/lod?expand={procurement}").get_json()
+    edges = {(edge["source"], edge["target"]) for edge in graph_["edges"]}
+    assert {(str(m0.id), sintered), (str(m0.id), ground)} <= edges
+
+    graph_ = client.get(f"/api/graph/lod?expand={sintered}&max_nodes=3").get_json()
+    more = [node for node in graph_["nodes"] if node["contents"]["kind"] == "more"]
+    assert [node["label"] for node in more] == ["1 more nodes"]
+
+    # other groupings, and bad requests
+    graph_ = client.get("/api/graph/lod?group_by=type&expand=type:Material").get_json()
+    assert len(graph_["nodes"]) == 5
+    assert client.get("/api/graph/lod?group_by=nope").status_code == 400
+    assert (
+        client.get(f"/api/graph/lod?group_by=actor&expand={sintered}").status_code
+        == 400
+    )
+    assert (
+        client.get("/api/graph/lod?expand=sample:000000000000000000000000").status_code
+        == 404
+    )
+
+
+def test_CompleteGraphTooLarge(client, small_lab, monkeypatch):
+    from labgraph.dashboard.routes import graph
+
+    assert client.get("/api/graph/complete").status_code == 200
+    monkeypatch.setattr(graph, "COMPLETE_GRAPH_MAX_NODES", 5)
+    response = client.get("/api/graph/complete")
+    assert response.status_code == 422
+    assert "/api/graph/lod" in response.get_json()["errors"]
@@ -0,0 +1,68 @@
+import networkx as nx
+
+from labgraph.utils.graph import hierarchical_layout
+
+
+def _crossings(graph: nx.DiGraph, layout: dict) -> int:
+    edges = [(layout[u], layout[v]) for u, v in graph.edges]
+    count = 0
+    for i, ((x0, y0), (x1, y1)) in enumerate(edges):
+        for (a0, b0), (a1, b1) in edges[i + 1 :]:
+            if (y0, y1) == (b0, b1) and (x0 - a0) * (x1 - a1) < 0:
+                count += 1
+    return count
+
+
+def test_HierarchicalLayout():
+    assert hierarchical_layout(nx.DiGraph()) == {}
+
+    # two processes that share a precursor, and an unrelated one
+    graph = nx.DiGraph(
+        [
+            ("precursor", "mix"),
+            ("mix", "heat"),
+            ("heat", "product"),
+            ("precursor", "grind"),
+            ("grind", "powder"),
+            ("other precursor", "other action"),
+        ]
+    )
+    graph.add_edge("late precursor", "heat")
+    layout = hierarchical_layout(graph)
+    assert set(layout) == set(graph.nodes)
+
+    # every edge points down one or more layers, nodes do not overlap
+    for u, v in graph.edges:
+        assert layout[u][1] > layout[v][1]
+    assert len(set(layout.values())) == len(layout)
+    # precursors sit right above the first node that uses them
+    assert layout["late precursor"][1] == layout["heat"][1] + 1
+    assert layout["precursor"][1] == layout["mix"][1] + 1
+
+    # connected components are side by side
+    x = lambda nodes: [layout[node][0] for node in nodes]
+    other = ["other precursor", "other action"]
+    rest = [node for node in graph.nodes if node not in other]
+    assert min(x(other)) > max(x(rest)) or max(x(other)) < min(x(rest))
+
+    layout = hierarchical_layout(graph, node_separation=72, layer_separation=10)
+    assert layout["precursor"][1] - layout["mix"][1] == 10
+
+
+def test_HierarchicalLayoutCrossings():
+    # a layer ordered badly at first: every edge crosses the others
+    graph = nx.DiGraph([(f"a{i}", f"b{3 - i}") for i in range(4)])
+    graph.add_edges_from([(f"b{i}", f"c{i}") for i in range(4)])
+    assert _crossings(graph, hierarchical_layout(graph)) == 0
+
+
+def test_HierarchicalLayoutLargeGraphs():
+    # deep chains do not hit the recursion limit
+    chain = nx.path_graph(5000, create_using=nx.DiGraph)
+    layout = hierarchical_layout(chain)
+    assert layout[0][1] == 4999 and layout[4999][1] == 0
+
+    # cycles and self loops are laid out too
+    graph = nx.DiGraph([(0, 1), (1, 2), (2, 0), (2, 2), (2, 3)])
+    layout = hierarchical_layout(graph)
+    assert len(set(layout.values())) == 4
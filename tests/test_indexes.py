@@ -0,0 +1,41 @@
+from labgraph import views
+from labgraph.utils.data_objects import get_database
+from labgraph.utils.indexes import ensure_indexes, missing_indexes, INDEXES
+
+
+def test_IndexesCreatedOnFirstUse(clean_db):
+    # views request their collections through get_collection, which creates the declared indexes
+    views.SampleView()
+    views.ActorView()
+
+    db = get_database()
+    missing = missing_indexes(db)
+    for collection_name in INDEXES:
+        assert missing[collection_name] == []
+
+    samples = db["samples"]
+    index_names = samples.index_information().keys()
+    assert "nodes.Material_1" in index_names
+    assert "created_at_-1" in index_names
+
+
+def test_MissingIndexes(clean_db):
+    materials = views.MaterialView()._collection
+    materials.drop_index("tags_1")
+
+    missing = missing_indexes(get_database())
+    assert missing["materials"] == ["tags_1"]
+
+    # creating indexes is idempotent
+    ensure_indexes(materials)
+    ensure_indexes(materials)
+    assert missing_indexes(get_database())["materials"] == []
+
+
+def test_IndexesCreatedForNewClient(clean_db):
+    from labgraph.utils.data_objects import _GetMongoCollection
+
+    # a new client may point to a database that has none of our indexes yet
+    _GetMongoCollection.indexed_collections.add("samples")
+    _GetMongoCollection.init()
+    assert _GetMongoCollection.indexed_collections == set()
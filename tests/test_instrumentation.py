@@ -0,0 +1,135 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from labgraph import Action, Actor, Material, Sample, WholeIngredient, views
+from labgraph.backends import MemoryBackend, use_backend
+from labgraph.utils.instrumentation import (
+    QueryBudgetExceeded,
+    assert_max_queries,
+    command_listener,
+    current_operations,
+    instrumented,
+    is_enabled,
+    log_commands,
+    remove_command_hook,
+    track_queries,
+)
+
+
+@pytest.fixture
+def sample_in_memory():
+    with use_backend(MemoryBackend()):
+        operator = Actor(name="Operator", description="a person")
+        views.ActorView().add(operator)
+        m0 = Material(name="Titanium Dioxide", formula="TiO2")
+        p0 = Action("procurement", generated_materials=[m0], actor=operator)
+        p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+        m1 = p1.make_generic_generated_material()
+        sample = Sample(name="tracked", nodes=[p0, m0, p1, m1])
+        views.SampleView().add(sample)
+        yield sample
+
+
+def test_TrackQueries(sample_in_memory):
+    assert not is_enabled()
+    with track_queries() as tracker:
+        assert is_enabled()
+        views.SampleView().get(sample_in_memory.id)
+    assert not is_enabled()
+
+    # the sample, one query per node collection, and the actors
+    assert tracker.count == 4
+    assert tracker.count_for("SampleView.get") == 4
+    stats = tracker.by_operation()
+    assert stats["SampleView.get"].command_names == {"find": 1}
+    assert stats["fetch_node_entries"].commands == 3
+    assert list(tracker.by_operation(outermost=True)) == ["SampleView.get"]
+    assert "SampleView.get" in tracker.summary()
+
+    # commands outside of labgraph operations are tracked too
+    with track_queries() as tracker:
+        views.SampleView()._collection.find_one({})
+    assert tracker.by_operation()[None].commands == 1
+
+    # actors are cached now
+    with assert_max_queries(3):
+        views.SampleView().get(sample_in_memory.id)
+    with pytest.raises(QueryBudgetExceeded, match="at most 2"):
+        with assert_max_queries(2, operation="SampleView.get"):
+            views.SampleView().get(sample_in_memory.id)
+
+
+def test_LogCommands(sample_in_memory, caplog):
+    hook = log_commands()
+    try:
+        with caplog.at_level(logging.DEBUG, logger="labgraph.utils.instrumentation"):
+            views.MaterialView().get_by_name("Titanium Dioxide")
+    finally:
+        remove_command_hook(hook)
+    assert not is_enabled()
+
+    record = caplog.records[0]
+    assert record.labgraph_command["command_name"] == "find"
+    assert record.labgraph_command["collection"] == "materials"
+    assert record.labgraph_command["operations"] == ("MaterialView.get_by_name",)
+
+
+def test_CommandListener():
+    @instrumented
+    def some_operation():
+        command_listener.started(
+            SimpleNamespace(
+                command_name="find",
+                command={"find": "samples", "filter": {}},
+                request_id=1,
+                connection_id=("localhost", 27017),
+            )
+        )
+
+    with track_queries() as tracker:
+        some_operation()
+        command_listener.succeeded(
+            SimpleNamespace(
+                command_name="find",
+                database_name="Labgraph",
+                request_id=1,
+                connection_id=("localhost", 27017),
+                duration_micros=1500,
+                reply={"ok": 1},
+            )
+        )
+
+    record = tracker.records[0]
+    assert record.operation == "some_operation"
+    assert record.collection == "samples"
+    assert record.duration == pytest.approx(0.0015)
+    assert record.request_bytes > 0 and record.reply_bytes > 0
+
+
+class AsyncView:
+    @instrumented
+    async def get(self):
+        return current_operations()
+
+    @instrumented
+    async def iter_filter(self):
+        for i in range(2):
+            yield current_operations()
+
+
+def test_InstrumentedAsync():
+    import asyncio
+
+    async def main():
+        view = AsyncView()
+        with track_queries():
+            assert await view.get() == ("AsyncView.get",)
+            # the operation is only active while the generator runs
+            async for operations in view.iter_filter():
+                assert operations == ("AsyncView.iter_filter",)
+                assert current_operations() == ()
+        assert await view.get() == ()
+
+    asyncio.run(main())
@@ -2,9 +2,11 @@ import time
 import pytest
 from labgraph import (
     Action,
+    Actor,
     Material,
     Measurement,
     Analysis,
+    WholeIngredient,
     views,
 )
 from labgraph.views.base import NotFoundInDatabaseError
@@ -207,6 +209,49 @@ def test_NodeFilterByTime():
     )
 
 
+def test_NodeIterFilter(clean_db):
+    materialview = views.MaterialView()
+    now = datetime.datetime.now().replace(microsecond=0)
+    ids = []
+    for i in range(10):
+        _id = materialview.add(Material(name=f"material {i}", index=i))
+        materialview._collection.update_one(
+            {"_id": _id},
+            {"$set": {"created_at": now - datetime.timedelta(minutes=i)}},
+        )
+        ids.append(_id)
+
+    # results are yielded lazily, most recent first
+    results = materialview.iter_filter({}, batch_size=3)
+    assert not isinstance(results, list)
+    assert [m.id for m in results] == ids
+
+    assert [m.id for m in materialview.iter_filter({}, skip=2, limit=3)] == ids[2:5]
+    assert [m.id for m in materialview.filter({}, skip=2, limit=3)] == ids[2:5]
+
+    # a projection yields raw entries
+    entries = list(materialview.iter_filter({}, projection=["name"], limit=2))
+    assert entries == [
+        {"_id": ids[0], "name": "material 0"},
+        {"_id": ids[1], "name": "material 1"},
+    ]
+
+    # both datetime bounds apply, and the filter passed in is not modified
+    filter_dict = {"created_at": {"$ne": None}}
+    window = materialview.filter(
+        filter_dict,
+        datetime_min=now - datetime.timedelta(minutes=5, seconds=30),
+        datetime_max=now - datetime.timedelta(minutes=1, seconds=30),
+    )
+    assert [m.id for m in window] == ids[2:6]
+    assert filter_dict == {"created_at": {"$ne": None}}
+
+    assert materialview.filter_one({}).id == ids[0]
+    assert materialview.filter_one({"contents.index": {"$gte": 4}}).id == ids[4]
+    with pytest.raises(NotFoundInDatabaseError):
+        materialview.filter_one({"name": "not a material"})
+
+
 def test_NodeDeletion(add_single_sample):
     # deleting a node without any downstream nodes
     s = views.SampleView().get_by_name("first sample")[0]
@@ -268,3 +313,238 @@ def test_Node_classmethods(add_single_sample):
 
         node_ = cls.filter_one({"contents.new_field": "new_value"})
         assert node == node_
+
+
+def test_Session(add_single_sample):
+    materialview = views.MaterialView()
+    m = materialview.get_by_name("Titanium Dioxide")[0]
+
+    # outside of a session, each retrieval builds a new object
+    assert materialview.get(m.id) is not materialview.get(m.id)
+
+    with views.Session() as session:
+        m1 = materialview.get(m.id)
+        m2 = materialview.get(m.id)
+        assert m1 is m2
+        assert ("Material", m.id) in session
+
+        # nodes retrieved through a sample are shared too
+        sample = views.SampleView().get_by_name("first sample")[0]
+        assert views.SampleView().get(sample.id) is sample
+        for node in sample.nodes:
+            assert get_view(node).get(node.id) is node
+
+        # updates invalidate the entry
+        m1["purity"] = 0.99
+        materialview.update(m1)
+        assert ("Material", m.id) not in session
+        m3 = materialview.get(m.id)
+        assert m3 is not m1
+        assert m3["purity"] == 0.99
+
+    # session is no longer active
+    assert materialview.get(m.id) is not m3
+
+
+def test_SessionEviction(add_single_sample):
+    materialview = views.MaterialView()
+    materials = materialview.filter({})
+    assert len(materials) > 2
+
+    with views.Session(max_size=2) as session:
+        for m in materials:
+            materialview.get(m.id)
+        assert len(session) == 2
+
+        # least recently used entries are evicted first
+        assert ("Material", materials[-1].id) in session
+        assert ("Material", materials[0].id) not in session
+
+    with pytest.raises(ValueError):
+        views.Session(max_size=0)
+
+
+def test_NodeList():
+    from bson import BSON
+    from labgraph.data.nodes import NodeList
+
+    materials = [Material(name=f"material {i}") for i in range(3)]
+    nodelist = NodeList()
+    for material in materials + materials:
+        nodelist.append(material)
+    nodelist.append({"node_type": "Material", "node_id": materials[0].id})
+    assert len(nodelist) == 3
+
+    for material in materials:
+        assert material in nodelist
+        assert {"node_type": "Material", "node_id": material.id} in nodelist
+    assert Material(name="another material") not in nodelist
+    assert "not a node" not in nodelist
+
+    # entries behave like the dicts stored in the database
+    expected = [{"node_type": "Material", "node_id": m.id} for m in materials]
+    assert nodelist == expected
+    assert nodelist[0]["node_id"] == materials[0].id
+    assert nodelist.to_dict() == expected
+    assert all(type(entry) is dict for entry in nodelist.to_dict())
+
+    with pytest.raises(ValueError):
+        nodelist.append({"node_type": "Material"})
+    with pytest.raises(ValueError):
+        nodelist.append("not a node")
+
+    # removing entries keeps the membership set in sync
+    nodelist.remove(expected[0])
+    assert materials[0] not in nodelist
+    nodelist.append(materials[0])
+    assert len(nodelist) == 3
+
+    # nodes serialize to the same BSON as before
+    material = Material(name="hub")
+    for i in range(5):
+        Action(
+            name=f"action {i}",
+            ingredients=[WholeIngredient(material)],
+            actor=Actor(name="actor", description="test actor"),
+        )
+    material.add_downstream(Action(name="extra", actor=Actor("actor", "test")))
+    entry = material.to_dict()
+    assert len(entry["downstream"]) == 6
+    assert all(type(ds) is dict for ds in entry["downstream"])
+    assert BSON.decode(BSON.encode(entry))["downstream"] == entry["downstream"]
+
+
+def test_NodePickle():
+    import copy
+    import pickle
+
+    actor = Actor(name="actor", description="test actor")
+    material = Material(name="Titanium Dioxide", formula="TiO2")
+    action = Action("grind", ingredients=[WholeIngredient(material)], actor=actor)
+
+    for copied in [pickle.loads(pickle.dumps(material)), copy.copy(material)]:
+        assert copied.id == material.id
+        assert copied.to_dict() == material.to_dict()
+        # edges of the copy are its own
+        copied.add_downstream(Action("extra", actor=actor))
+        assert len(copied.downstream) == 2
+        assert len(material.downstream) == 1
+
+    copied = pickle.loads(pickle.dumps(action))
+    assert copied.to_dict() == action.to_dict()
+
+
+def test_NodeVersionHistory(add_single_sample):
+    from labgraph.views.history import SNAPSHOT_INTERVAL, load_version
+
+    materialview = views.MaterialView()
+    m = materialview.get_by_name("Titanium Dioxide")[0]
+    assert m.version_history == []
+
+    num_updates = SNAPSHOT_INTERVAL + 3
+    for i in range(num_updates):
+        m["step"] = i
+        materialview.update(m)
+
+    # the live document only carries a version counter
+    entry = materialview._collection.find_one({"_id": m.id})
+    assert entry["version"] == num_updates + 1
+    assert "version_history" not in entry
+
+    # previous versions are rebuilt from diffs and snapshots in the history collection
+    history = materialview._history_collection
+    assert history.count_documents({"entry_id": m.id}) == num_updates
+    assert history.count_documents({"entry_id": m.id, "snapshot": {"$exists": 1}}) == 1
+
+    m_ = materialview.get(m.id)
+    assert m_._version_history is None  # not loaded until needed
+    versions = m_.version_history
+    assert [v["version"] for v in versions] == list(range(1, num_updates + 1))
+    assert "step" not in versions[0]["contents"]
+    for i, version in enumerate(versions[1:]):
+        assert version["contents"]["step"] == i
+        assert version["name"] == "Titanium Dioxide"
+    for version in versions:
+        assert (
+            load_version(materialview._collection, m.id, version["version"]) == version
+        )
+    assert load_version(materialview._collection, m.id, num_updates + 1)["contents"][
+        "step"
+    ] == (num_updates - 1)
+    assert load_version(materialview._collection, m.id, num_updates + 2) is None
+
+
+def test_NodeLegacyVersionHistory(add_single_sample):
+    materialview = views.MaterialView()
+    m = materialview.get_by_name("Titanium Dioxide")[0]
+
+    # documents written before the history collection embed their history
+    entry = materialview._collection.find_one({"_id": m.id})
+    legacy_versions = []
+    for i in range(2):
+        old = {k: v for k, v in entry.items() if k not in ["_id", "version"]}
+        old["contents"] = {"legacy_step": i}
+        legacy_versions.append(old)
+    materialview._collection.update_one(
+        {"_id": m.id},
+        {"$set": {"version_history": legacy_versions}, "$unset": {"version": ""}},
+    )
+    m_ = materialview.get(m.id)
+    assert [v["contents"] for v in m_.version_history] == [
+        {"legacy_step": 0},
+        {"legacy_step": 1},
+    ]
+
+    # the next update moves the embedded history to the history collection
+    m_["step"] = 0
+    materialview.update(m_)
+    entry = materialview._collection.find_one({"_id": m.id})
+    assert "version_history" not in entry
+    assert entry["version"] == 4
+    versions = materialview.get(m.id).version_history
+    assert [v["version"] for v in versions] == [1, 2, 3]
+    assert [v["contents"] for v in versions[:2]] == [
+        {"legacy_step": 0},
+        {"legacy_step": 1},
+    ]
+    assert "step" not in versions[2]["contents"]
+
+
+def test_LazyReferences(add_single_sample):
+    from labgraph.data.lazy import LazyReference
+
+    actionview = views.ActionView()
+    grind = actionview.get_by_name("grind")[0]
+
+    # referenced nodes are not retrieved until they are used
+    material = grind.ingredients[0].material
+    assert type(material) is LazyReference
+    assert not material.is_resolved
+    assert isinstance(material, Material)
+    assert material.id == grind.upstream[0]["node_id"]
+    assert not material.is_resolved
+
+    assert material.name == "Titanium Dioxide"
+    assert material.is_resolved
+    assert material == views.MaterialView().get(material.id)
+    assert isinstance(grind.actor, Actor)
+    assert grind.actor.name == "Operator"
+
+    # generated materials only include downstream Materials
+    assert [m.id for m in grind.generated_materials] == [
+        ds["node_id"] for ds in grind.downstream
+    ]
+
+    # all pending references are resolved in one batch
+    sinter = actionview.get_by_name("sinter")[0]
+    measurement = views.MeasurementView().get_by_name("XRD")[0]
+    references = [
+        sinter.ingredients[0].material,
+        sinter.generated_materials[0],
+        sinter.actor,
+        measurement.material,
+    ]
+    assert not any(ref.is_resolved for ref in references)
+    assert views.resolve_pending_references() >= len(references)
+    assert all(ref.is_resolved for ref in references)
+    assert sinter.generated_materials[0].name == "Titanium Dioxide - grind - sinter"
@@ -14,6 +14,7 @@ from labgraph.views.base import AlreadyInDatabaseError, NotFoundInDatabaseError
 from labgraph.views import get_view
 from bson import ObjectId
 import random
+import networkx
 from labgraph.data.sample import action_sequence_distance
 
 ### helper
@@ -233,6 +234,43 @@ def test_PlotSample(add_single_sample):
     sample.plot()
 
 
+def test_SampleGraphUnion(add_single_sample):
+    from labgraph.utils.graph import union_of_sample_graphs
+    from labgraph.utils.plot import plot_multiple_samples
+
+    sv = views.SampleView()
+    samples = [sv.get(build_a_sample(f"sample{i}")) for i in range(3)]
+    samples.append(sv.get_by_name("first sample")[0])
+    sample_ids = [sample.id for sample in samples]
+
+    expected = networkx.DiGraph()
+    for sample in samples:
+        expected = networkx.compose(expected, sample.graph)
+    # unlike compose, nodes of a sample keep their name when they are a neighbor in another
+    names = {node.id: node.name for sample in samples for node in sample.nodes}
+
+    for graph in [
+        sv.get_graph(sample_ids),
+        union_of_sample_graphs(sample.graph for sample in samples),
+    ]:
+        assert set(graph.edges) == set(expected.edges)
+        assert set(graph.nodes) == set(expected.nodes)
+        for node, attributes in graph.nodes(data=True):
+            assert attributes["type"] == expected.nodes[node]["type"]
+            assert attributes["name"] == names.get(node, "")
+
+    # neighbors outside of the samples have no name
+    graph = sv.get_graph(sample_ids[:1])
+    sample = sv.get(sample_ids[0])
+    assert set(graph.edges) == set(sample.graph.edges)
+    assert dict(graph.nodes(data=True)) == dict(sample.graph.nodes(data=True))
+
+    with pytest.raises(NotFoundInDatabaseError):
+        sv.get_graph([ObjectId()])
+
+    plot_multiple_samples(samples[:2] + sample_ids[2:])
+
+
 def test_SampleEquality(add_single_sample):
     sv = views.SampleView()
     sample1 = sv.get_by_name("first sample")[0]
@@ -376,3 +414,319 @@ def test_Sample_classmethods(add_single_sample):
 
     node_ = cls.filter_one({"contents.new_field": "new_value"})
     assert node == node_
+
+
+def test_SampleBatchedHydration(add_single_sample):
+    build_a_sample("sample1")
+    build_a_sample("sample2")
+
+    sv = views.SampleView()
+    samples = sv.filter({"name": {"$in": ["sample1", "sample2"]}})
+    assert len(samples) == 2
+
+    # nodes built in a batch should match nodes retrieved one at a time
+    for sample in samples:
+        for node in sample.nodes:
+            node_ = get_view(node).get(node.id)
+            assert node == node_
+            assert node.to_dict() == node_.to_dict()
+
+    # ingredients shared between samples are only built once per batch
+    first_actions = [
+        node
+        for sample in samples
+        for node in sample.nodes
+        if isinstance(node, Action)
+        and node.name == "grind"
+        and node.ingredients[0].material.name == "Titanium Dioxide"
+    ]
+    assert len(first_actions) == 2
+    assert (
+        first_actions[0].ingredients[0].material
+        is first_actions[1].ingredients[0].material
+    )
+    assert first_actions[0].actor is first_actions[1].actor
+
+
+def test_AffectedNodesAndSamples(add_single_sample):
+    from labgraph.views.graph_integrity import get_affected_nodes, get_affected_samples
+
+    sample_id1 = build_a_sample("sample1")
+    sample_id2 = build_a_sample("sample2")
+
+    sv = views.SampleView()
+    sample1 = sv.get(sample_id1)
+    sample2 = sv.get(sample_id2)
+    root = sample1.nodes[0]  # this material is shared across all samples
+
+    # walk the downstream graph in memory to get the expected result
+    nodes_by_id = {
+        node.id: node for sample in [sample1, sample2] for node in sample.nodes
+    }
+    expected = set()
+    to_visit = [root]
+    while to_visit:
+        node = to_visit.pop()
+        for downstream in node.downstream:
+            if downstream["node_id"] not in expected:
+                expected.add(downstream["node_id"])
+                to_visit.append(nodes_by_id[downstream["node_id"]])
+
+    affected_nodes = get_affected_nodes(root)
+    affected_ids = [affected["node_id"] for affected in affected_nodes]
+    assert len(affected_ids) == len(set(affected_ids))
+    assert set(affected_ids) == expected
+
+    affected_samples = get_affected_samples(root, affected_nodes=affected_nodes)
+    assert sample1 in affected_samples
+    assert sample2 in affected_samples
+    assert affected_samples == get_affected_samples(root)
+
+    # a node downstream of nothing only affects the samples that contain it
+    leaf = sample1.nodes[-1]
+    assert len(get_affected_nodes(leaf)) == 0
+    assert get_affected_samples(leaf) == [sample1]
+
+
+def test_SampleBulkWrite(add_single_sample, monkeypatch):
+    sv = views.SampleView()
+    collection_class = type(sv._collection)
+    original_bulk_write = collection_class.bulk_write
+    bulk_writes = []
+
+    def bulk_write(self, requests, *args, **kwargs):
+        bulk_writes.append((self.name, kwargs.get("ordered", True)))
+        return original_bulk_write(self, requests, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "bulk_write", bulk_write)
+
+    sample_id = build_a_sample("bulk sample")
+
+    # at most one unordered bulk write per node collection
+    written_collections = [name for name, _ in bulk_writes]
+    assert len(written_collections) == len(set(written_collections))
+    assert set(written_collections) <= {
+        "materials",
+        "actions",
+        "measurements",
+        "analyses",
+    }
+    assert all(not ordered for _, ordered in bulk_writes)
+
+    sample = sv.get(sample_id)
+    for node in sample.nodes:
+        assert get_view(node).get(node.id) == node
+
+    # a bad node update is caught before anything is written
+    sample.name = "renamed bulk sample"
+    sample.nodes[-1]["new_field"] = "new_value"
+    sample.nodes[0].downstream = []
+    with pytest.raises(ValueError, match="Cannot remove outgoing edges"):
+        sv.update(sample)
+    assert sv.get(sample_id).name == "bulk sample"
+    node_ = get_view(sample.nodes[-1]).get(sample.nodes[-1].id)
+    assert "new_field" not in node_.keys()
+
+
+def test_SampleGraphIsMaintained(add_actors_to_db):
+    operator = views.ActorView().get_by_name(name="Operator")[0]
+
+    def rebuilt_graph(sample):
+        graph = networkx.DiGraph()
+        for node in sample.nodes:
+            Sample._add_node_to_graph(graph, node)
+        return graph
+
+    def assert_graph_is_current(sample):
+        graph = sample.graph
+        reference = rebuilt_graph(sample)
+        assert set(graph.edges) == set(reference.edges)
+        assert dict(graph.nodes(data=True)) == dict(reference.nodes(data=True))
+        assert sample.has_valid_graph == (
+            networkx.is_directed_acyclic_graph(reference)
+            and networkx.number_weakly_connected_components(reference) == 1
+        )
+
+    m0 = Material(name="Titanium Dioxide")
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    sample = Sample(name="maintained sample", nodes=[m0, p1])
+    assert_graph_is_current(sample)
+    assert sample.has_valid_graph
+
+    # edges added to nodes already in the sample
+    m1 = p1.make_generic_generated_material()
+    assert_graph_is_current(sample)
+    sample.add_node(m1)
+    assert_graph_is_current(sample)
+
+    # a node that is not connected yet, then connected
+    p2 = Action("sinter", actor=operator)
+    sample.add_node(p2)
+    assert not sample.has_valid_graph
+    p2.add_ingredient(WholeIngredient(m1))
+    assert_graph_is_current(sample)
+    assert sample.has_valid_graph
+
+    # renamed nodes are reflected in the graph
+    p2.name = "anneal"
+    assert sample.graph.nodes[p2.id]["name"] == "anneal"
+
+    # removing edges or nodes falls back to a rebuild
+    m1.downstream = []
+    p2.upstream = []
+    assert_graph_is_current(sample)
+    assert not sample.has_valid_graph
+    sample.nodes = [m0, p1, m1]
+    assert_graph_is_current(sample)
+    assert sample.has_valid_graph
+    assert sample.topological_order == [m0.id, p1.id, m1.id]
+
+    # the returned graph is a copy
+    sample.graph.remove_node(m0.id)
+    assert m0.id in sample.graph.nodes
+
+
+def test_SampleCopies(add_actors_to_db):
+    import copy
+    import pickle
+
+    operator = views.ActorView().get_by_name(name="Operator")[0]
+    m0 = Material(name="Titanium Dioxide")
+    p1 = Action("grind", ingredients=[WholeIngredient(m0)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    sample = Sample(name="copied sample", nodes=[m0, p1, m1])
+    assert len(sample.graph.edges) == 2
+
+    for copied in [copy.deepcopy(sample), pickle.loads(pickle.dumps(sample))]:
+        assert set(copied.graph.edges) == set(sample.graph.edges)
+        assert copied.has_valid_graph
+
+        # the copy keeps its graph up to date, the original is left alone
+        p2 = Action("sinter", actor=operator)
+        copied.add_node(p2)
+        p2.add_ingredient(WholeIngredient(copied.nodes[-2]))
+        assert len(copied.graph.edges) == 3
+        assert copied.has_valid_graph
+        assert copied.topological_order[-1] == p2.id
+        assert len(sample.graph.edges) == 2
+        assert len(m1.downstream) == 0
+
+
+def test_SampleCopiesFromDatabase(add_single_sample):
+    import copy
+    import pickle
+    from labgraph.data.lazy import LazyReference
+
+    # the procured material is used by the Sample, but is not one of its nodes
+    operator = views.ActorView().get_by_name(name="Operator")[0]
+    procured = views.MaterialView().get_by_name("Titanium Dioxide")[0]
+    procured["supplier"] = "Alfa Aesar"
+    procured.save()
+    p1 = Action("grind", ingredients=[WholeIngredient(procured)], actor=operator)
+    m1 = p1.make_generic_generated_material()
+    sample_id = views.SampleView().add(Sample(name="procured sample", nodes=[p1, m1]))
+
+    for resolve in [False, True]:
+        sample = views.SampleView().get(sample_id)
+        grind = next(node for node in sample.nodes if isinstance(node, Action))
+        reference = grind.ingredients[0].material
+        assert type(reference) is LazyReference
+        if resolve:
+            assert "supplier" in reference
+            assert "grade" not in reference
+            assert list(reference) == procured.keys()
+        assert reference.is_resolved == resolve
+
+        for copied in [copy.deepcopy(sample), pickle.loads(pickle.dumps(sample))]:
+            assert copied == sample
+            assert set(copied.graph.edges) == set(sample.graph.edges)
+            copied_grind = next(
+                node for node in copied.nodes if isinstance(node, Action)
+            )
+            copied_reference = copied_grind.ingredients[0].material
+            assert type(copied_reference) is LazyReference
+            assert copied_reference.is_resolved == resolve
+            assert copied_reference.id == procured.id
+            assert copied_reference.name == "Titanium Dioxide"
+
+        shallow = copy.copy(reference)
+        assert type(shallow) is LazyReference
+        assert shallow == reference
+
+
+def test_SampleNodeIndex(add_single_sample):
+    sample = views.SampleView().get_by_name("first sample")[0]
+    num_nodes = len(sample.nodes)
+
+    for node in sample.nodes:
+        assert sample.has_node(node)
+        assert sample.has_node(node.id)
+        assert sample.get_node(node.id) is node
+
+    # duplicates are ignored
+    sample.add_node(sample.nodes[0])
+    assert len(sample.nodes) == num_nodes
+
+    outside_material = Material(name="not in this sample")
+    assert not sample.has_node(outside_material)
+    with pytest.raises(KeyError):
+        sample.get_node(outside_material.id)
+
+    # reassigning the node list rebuilds the index
+    removed_node = sample.nodes[-1]
+    sample.nodes = sample.nodes[:-1]
+    assert not sample.has_node(removed_node)
+
+
+def test_SampleVersionHistory(add_single_sample):
+    sv = views.SampleView()
+    sample = sv.get_by_name("first sample")[0]
+    assert sample.version_history == []
+
+    sample.name = "renamed once"
+    sv.update(sample)
+    sample.name = "renamed twice"
+    sv.update(sample)
+
+    entry = sv._collection.find_one({"_id": sample.id})
+    assert entry["version"] == 3
+    assert "version_history" not in entry
+
+    sample_ = sv.get(sample.id)
+    assert [v["name"] for v in sample_.version_history] == [
+        "first sample",
+        "renamed once",
+    ]
+    assert [v["version"] for v in sample.version_history] == [1, 2]
+
+
+def test_SampleIterFilter(add_single_sample):
+    for i in range(5):
+        build_a_sample(f"sample{i}")
+    sv = views.SampleView()
+
+    samples = sv.filter({})
+    assert list(sv.iter_filter({}, batch_size=2)) == samples
+    assert list(sv.iter_filter({}, skip=1, limit=3)) == samples[1:4]
+    assert sv.filter_one({}) == samples[0]
+
+
+def test_SampleHydrationModes(add_single_sample, monkeypatch):
+    from labgraph.views import hydration
+
+    for i in range(4):
+        build_a_sample(f"sample{i}")
+
+    expected = views.SampleView().filter({})
+    assert len(expected) > 4
+
+    monkeypatch.setattr(hydration, "THREADED_CHUNK_SIZE", 2)
+    for mode in ["sequential", "batched", "threaded"]:
+        samples = views.SampleView(hydration_mode=mode, max_workers=3).filter({})
+        # same samples, in created_at order
+        assert [s.id for s in samples] == [s.id for s in expected]
+        for sample, sample_ in zip(samples, expected):
+            assert [n.id for n in sample.nodes] == [n.id for n in sample_.nodes]
+
+    with pytest.raises(ValueError):
+        views.SampleView(hydration_mode="parallel")